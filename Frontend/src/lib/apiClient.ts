@@ -168,6 +168,7 @@ export const api = {
     max_trades?: number;
     asset_symbols?: string[];
     include_price_points?: boolean;
+    max_points?: number;
     preload_prices?: boolean;
     trades_limit?: number;
     trades_offset?: number;
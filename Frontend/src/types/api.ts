@@ -217,6 +217,7 @@ export interface MultiWhaleBacktestRequest {
   max_trades?: number;
   asset_symbols?: string[];
   include_price_points?: boolean;
+  max_points?: number;
   preload_prices?: boolean;
   align_window_minutes?: number;
 }
@@ -0,0 +1,36 @@
+"""add price_coverage index of contiguous candle ranges
+
+Revision ID: 0008_price_coverage
+Revises: 0007_trades_unique_whale_tx
+Create Date: 2026-10-16 09:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008_price_coverage"
+down_revision = "0007_trades_unique_whale_tx"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "price_coverage",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("asset_symbol", sa.String(length=64), nullable=False),
+        sa.Column("timeframe", sa.String(length=8), nullable=False),
+        sa.Column("start_ts", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("end_ts", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_price_coverage_asset_tf_start", "price_coverage", ["asset_symbol", "timeframe", "start_ts"]
+    )
+    # Existing price_history rows are indexed by scripts/rebuild_price_coverage.py.
+
+
+def downgrade() -> None:
+    op.drop_index("ix_price_coverage_asset_tf_start", table_name="price_coverage")
+    op.drop_table("price_coverage")
@@ -0,0 +1,34 @@
+"""add price_rollups with 5m / 15m / 1h / 1d resolutions of price_history
+
+Revision ID: 0009_price_rollups
+Revises: 0008_price_coverage
+Create Date: 2026-10-16 11:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009_price_rollups"
+down_revision = "0008_price_coverage"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "price_rollups",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("asset_symbol", sa.String(length=64), nullable=False),
+        sa.Column("resolution", sa.String(length=8), nullable=False),
+        sa.Column("bucket_ts", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("source_ts", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("price_usd", sa.Numeric(30, 10), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("asset_symbol", "resolution", "bucket_ts", name="uq_price_rollups_asset_res_bucket"),
+    )
+    # Existing price_history rows are rolled up by scripts/rebuild_price_rollups.py.
+
+
+def downgrade() -> None:
+    op.drop_table("price_rollups")
@@ -0,0 +1,76 @@
+"""add wallet_asset_state running metrics and trade_daily_agg buckets
+
+Revision ID: 0010_wallet_state
+Revises: 0009_price_rollups
+Create Date: 2026-10-16 14:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0010_wallet_state"
+down_revision = "0009_price_rollups"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The tradedirection type already exists from 0001_initial.
+    trade_direction = postgresql.ENUM(
+        "buy",
+        "sell",
+        "deposit",
+        "withdraw",
+        "long",
+        "short",
+        "close_long",
+        "close_short",
+        name="tradedirection",
+        create_type=False,
+    )
+
+    op.create_index("ix_trades_whale_id", "trades", ["whale_id", "id"])
+    op.create_table(
+        "wallet_asset_state",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("whale_id", sa.String(length=36), nullable=False),
+        sa.Column("asset_symbol", sa.String(length=128), nullable=False),
+        sa.Column("qty", sa.Numeric(38, 18), nullable=True),
+        sa.Column("cost_usd", sa.Numeric(38, 18), nullable=True),
+        sa.Column("realized_usd", sa.Numeric(38, 18), nullable=False),
+        sa.Column("trade_pnl_usd", sa.Numeric(38, 18), nullable=False),
+        sa.Column("closes", sa.Integer(), nullable=False),
+        sa.Column("wins", sa.Integer(), nullable=False),
+        sa.Column("last_trade_id", sa.Integer(), nullable=False),
+        sa.Column("last_trade_ts", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["whale_id"], ["whales.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("whale_id", "asset_symbol", name="uq_wallet_asset_state"),
+    )
+    op.create_table(
+        "trade_daily_agg",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("whale_id", sa.String(length=36), nullable=False),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("base_asset", sa.String(length=128), nullable=False),
+        sa.Column("direction", trade_direction, nullable=False),
+        sa.Column("volume_usd", sa.Numeric(30, 10), nullable=False),
+        sa.Column("trades", sa.Integer(), nullable=False),
+        sa.Column("priced_trades", sa.Integer(), nullable=False),
+        sa.Column("pnl_usd", sa.Numeric(30, 10), nullable=False),
+        sa.Column("closes", sa.Integer(), nullable=False),
+        sa.Column("wins", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["whale_id"], ["whales.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("whale_id", "date", "base_asset", "direction", name="uq_trade_daily_agg"),
+    )
+    # Both tables fill themselves on the next metrics refresh; scripts/rebuild_wallet_state.py
+    # rebuilds them up front.
+
+
+def downgrade() -> None:
+    op.drop_table("trade_daily_agg")
+    op.drop_table("wallet_asset_state")
+    op.drop_index("ix_trades_whale_id", table_name="trades")
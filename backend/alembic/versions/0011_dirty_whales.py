@@ -0,0 +1,32 @@
+"""add dirty_whales so scheduled jobs only revisit active wallets
+
+Revision ID: 0011_dirty_whales
+Revises: 0010_wallet_state
+Create Date: 2026-10-16 16:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0011_dirty_whales"
+down_revision = "0010_wallet_state"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "dirty_whales",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("job", sa.String(length=32), nullable=False),
+        sa.Column("whale_id", sa.String(length=36), nullable=False),
+        sa.Column("marked_at", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["whale_id"], ["whales.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("job", "whale_id", name="uq_dirty_whales_job_whale"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("dirty_whales")
@@ -1,35 +1,64 @@
 from datetime import datetime, timedelta
 from types import SimpleNamespace
-from bisect import bisect_right
 from decimal import Decimal
-from typing import Iterable, Sequence, Any
+from typing import Callable, Iterable, Sequence
 
+import itertools
 import logging
 import time
+
+import numpy as np
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy import func, select, inspect
 from sqlalchemy.exc import OperationalError
 
-from app.db.session import SessionLocal
-from app.models import BacktestRun, Chain, CurrentWalletMetrics, PriceHistory, Trade, TradeDirection, Whale
+from app.db.session import SessionLocal, commit_with_retry
+from app.models import BacktestRun, Chain, CurrentWalletMetrics, Trade, TradeDirection, Whale
 from app.core.config import settings
 from app.schemas.api import (
+    BacktestCacheStats,
+    BacktestJobResult,
+    BacktestJobStatus,
+    BacktestEngine,
+    BacktestSampling,
     BacktestSummary,
     BacktestTradeResult,
     CopierSessionStatus,
     ChainId,
     CopierBacktestRequest,
     CopierBacktestResponse,
+    CopierBacktestSweepRequest,
+    CopierBacktestSweepResponse,
+    BacktestSweepResult,
     BacktestRunSummary,
     LiveTradesResponse,
+    PriceCoverageResponse,
+    PriceRange,
     StartCopierRequest,
     WhaleAssetsResponse,
     MultiWhaleBacktestRequest,
     MultiWhaleBacktestResponse,
 )
-from app.services.price_service import fetch_and_store_binance_prices
+from app.services.backtest_engine import (
+    DEFAULT_MAX_CURVE_POINTS,
+    SimulationOutcome,
+    _epoch_us_array,
+    load_fill_prices,
+    load_price_cache,
+    sample_step_ms,
+    simulate_copy_trades,
+    trade_assets,
+)
+from app.services.backtest_cache import backtest_cache, trade_watermark
+from app.services.backtest_jobs import BacktestJobQueueFull, ProgressReporter, backtest_jobs, no_progress
+from app.services.backtest_sweep import MAX_SWEEP_COMBINATIONS, SweepPoint, detach_trades, run_sweep
+from app.services.downsample import downsample_indices, drawdown_indices
+from app.services import price_coverage
+from app.services.price_rollups import resolution_for_step
+from app.services.price_store import BASE_RESOLUTION, from_epoch_ms
+from app.services.signal_alignment import align_entry_signals
 from app.services.copier_manager import copier_manager
-from app.services.metrics_service import _commit_with_retry
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -51,357 +80,125 @@ def _simulate_copy_trades(
     trades_limit: int,
     trades_offset: int,
     whale_portfolio_value: Decimal | None = None,
+    engine: BacktestEngine = "decimal",
+    sampling: BacktestSampling = "clock",
+    max_curve_points: int = DEFAULT_MAX_CURVE_POINTS,
+    max_points: int | None = None,
+    report: ProgressReporter = no_progress,
+    on_preload_failure: Callable[[], None] | None = None,
 ) -> tuple[BacktestSummary, list[BacktestTradeResult], list[dict], dict[str, list[dict]] | None, int]:
-    closing_dirs = {
-        TradeDirection.CLOSE_LONG,
-        TradeDirection.CLOSE_SHORT,
-        TradeDirection.SELL,
-        TradeDirection.WITHDRAW,
-    }
-    entry_dirs = {TradeDirection.LONG, TradeDirection.SHORT, TradeDirection.BUY}
-
-    # preload price history for marking open positions (best-effort)
-    assets = {(getattr(t, "base_asset", None) or "").upper() for t in trades if getattr(t, "base_asset", None)}
-    assets.discard("")
+    assets = trade_assets(trades)
     assets_used = sorted(asset_filter) if asset_filter else sorted(assets)
-    price_cache: dict[str, tuple[list[datetime], list[Decimal]]] = {}
+    # Lets a cancelled job stop inside the price preload and the simulation, not only between stages.
+    checkpoint = None if report is no_progress else (lambda: report(None, None))
+    report(20.0, "loading prices")
+    resolution = resolution_for_step(sample_step_ms(trades, sampling=sampling, max_curve_points=max_curve_points))
+    price_cache = load_price_cache(
+        session,
+        trades,
+        preload_prices=preload_prices,
+        resolution=resolution,
+        checkpoint=checkpoint,
+        on_preload_failure=on_preload_failure,
+    )
+    # Rollups only mark the equity curve; fills always use the 1m price at the trade.
+    fill_prices = load_fill_prices(session, trades) if resolution != BASE_RESOLUTION else None
+    report(50.0, "simulating")
+    outcome = simulate_copy_trades(
+        trades,
+        price_cache,
+        fill_prices=fill_prices,
+        initial_deposit=initial_deposit,
+        used_pct=used_pct,
+        fee_rate=fee_rate,
+        slippage_rate=slippage_rate,
+        leverage=leverage,
+        whale_portfolio_value=whale_portfolio_value,
+        engine=engine,
+        sampling=sampling,
+        max_curve_points=max_curve_points,
+        checkpoint=checkpoint,
+    )
+    report(85.0, "building results")
+    results = outcome.results
+    summary = _summary_from_outcome(
+        outcome,
+        trades,
+        initial_deposit=initial_deposit,
+        recommended_pct=recommended_pct,
+        used_pct=used_pct,
+        assets_used=assets_used,
+        trades_copied=len(results),
+    )
 
-    # determine backtest window for price fetch
-    start_ts = trades[0].timestamp.replace(second=0, microsecond=0) if trades else None
-    end_ts = trades[-1].timestamp.replace(second=0, microsecond=0) if trades else None
+    total_trades = len(results)
+    start_idx = min(trades_offset, total_trades)
+    end_idx = min(start_idx + trades_limit, total_trades)
+    trade_slice = results[start_idx:end_idx]
 
-    if assets and start_ts and end_ts:
-        if preload_prices:
-            try:
-                rows = (
-                    session.query(
-                        PriceHistory.asset_symbol, func.min(PriceHistory.timestamp), func.max(PriceHistory.timestamp)
-                    )
-                    .filter(PriceHistory.asset_symbol.in_(list(assets)))
-                    .group_by(PriceHistory.asset_symbol)
-                    .all()
-                )
-                covered: set[str] = set()
-                for sym, min_ts, max_ts in rows:
-                    if min_ts <= start_ts and max_ts >= end_ts:
-                        covered.add(sym)
-                missing_assets = assets - covered
-                if missing_assets:
-                    fetch_and_store_binance_prices(
-                        session,
-                        assets=list(missing_assets),
-                        timeframe="1m",
-                        since=start_ts - timedelta(minutes=1),
-                        until=end_ts + timedelta(minutes=1),
-                        limit=1500,
-                    )
-                    session.flush()
-                    _commit_with_retry(session)
-            except OperationalError as exc:
-                session.rollback()
-                logger.warning(
-                    "price preload commit failed; continuing without new prices: %s", exc
-                )
-            except Exception as exc:
-                session.rollback()
-                logger.warning(
-                    "price preload failed; continuing without new prices: %s", exc
-                )
+    equity_curve = outcome.equity_curve
+    if max_points is not None:
+        equity_curve = _downsample_equity_curve(equity_curve, results, max_points)
 
-        rows = (
-            session.query(PriceHistory.asset_symbol, PriceHistory.timestamp, PriceHistory.price_usd)
-            .filter(
-                PriceHistory.asset_symbol.in_(list(assets)),
-                PriceHistory.timestamp >= start_ts - timedelta(minutes=5),
-                PriceHistory.timestamp <= end_ts + timedelta(minutes=5),
-            )
-            .order_by(PriceHistory.asset_symbol, PriceHistory.timestamp)
-            .all()
-        )
-        for sym, ts, price in rows:
-            if price is None:
-                continue
-            ts_list, px_list = price_cache.setdefault(sym, ([], []))
-            ts_list.append(ts)
-            px_list.append(Decimal(price))
-
-    def _mark_price(sym: str | None, ts: datetime, fallback: Decimal | None) -> Decimal | None:
-        if sym is None:
-            return fallback
-        series = price_cache.get(sym)
-        if not series:
-            return fallback
-        ts_list, px_list = series
-        idx = bisect_right(ts_list, ts) - 1
-        if idx < 0:
-            return fallback
-        return px_list[idx]
-
-    def _derive_trade_leverage(trade_notional: Decimal) -> Decimal:
-        if leverage is not None and leverage > 0:
-            return leverage
-        if whale_portfolio_value is not None and whale_portfolio_value > 0 and trade_notional > 0:
-            derived = trade_notional / whale_portfolio_value
-            return max(Decimal("0.1"), min(derived, Decimal("100")))
-        return Decimal(1)
-
-    positions: dict[str, dict[str, Decimal]] = {}
-    cash = initial_deposit
-    cumulative_net = Decimal(0)
-    total_fees = Decimal(0)
-    total_slippage = Decimal(0)
-    gross_pnl = Decimal(0)
-    wins = 0
-    closing_count = 0
-    results: list[BacktestTradeResult] = []
-    equity_curve: list[dict] = []
-    used_leverages: list[Decimal] = []
-
-    def _compute_drawdown(curve: list[dict]) -> tuple[Decimal, Decimal]:
-        if not curve:
-            return Decimal(0), Decimal(0)
-        peak = Decimal(curve[0]["equity_usd"])
-        max_dd = Decimal(0)
-        max_dd_usd = Decimal(0)
-        for point in curve:
-            eq = Decimal(point["equity_usd"])
-            if eq > peak:
-                peak = eq
-            drawdown_abs = peak - eq
-            dd_ratio = drawdown_abs / peak if peak > 0 else Decimal(0)
-            if dd_ratio > max_dd:
-                max_dd = dd_ratio
-                max_dd_usd = drawdown_abs
-        return max_dd, max_dd_usd
-
-    def _unrealized_and_margin(ts: datetime) -> tuple[Decimal, Decimal]:
-        unreal = Decimal(0)
-        margin_total = Decimal(0)
-        for sym, pos in positions.items():
-            qty = pos.get("qty", Decimal(0))
-            margin_total += pos.get("margin", Decimal(0))
-            if qty == 0:
-                continue
-            avg = pos.get("avg_price", Decimal(0))
-            mark = _mark_price(sym, ts, avg)
-            if mark is None:
-                continue
-            if qty > 0:
-                unreal += (mark - avg) * qty
-            else:
-                unreal += (avg - mark) * abs(qty)
-        return unreal, margin_total
-
-    current_idx = 0
-    trade_count = len(trades)
-    trade_items = list(trades)
-
-    def _record_equity(ts: datetime) -> None:
-        unreal, margin_total = _unrealized_and_margin(ts)
-        equity = cash + margin_total + unreal
-        cumulative_net_local = equity - initial_deposit
-        equity_curve.append(
-            {"timestamp": ts, "equity_usd": float(equity), "unrealized_pnl_usd": float(unreal)}
-        )
-        return cumulative_net_local
-
-    # iterate minute by minute and process trades that occur within or before that minute
-    if start_ts and end_ts:
-        delta_minutes = int((end_ts - start_ts).total_seconds() // 60)
-        step_minutes = 1
-        if delta_minutes > 60 * 24 * 60:
-            step_minutes = 5
-        if delta_minutes > 60 * 24 * 180:
-            step_minutes = 15
-        ts = start_ts
-        while ts <= end_ts:
-            # process trades with timestamp <= end of this minute
-            minute_end = ts.replace(second=59, microsecond=999999)
-            while current_idx < trade_count and trade_items[current_idx].timestamp <= minute_end:
-                t = trade_items[current_idx]
-                current_idx += 1
-                direction_raw = getattr(t, "direction", None)
-                direction = direction_raw if hasattr(direction_raw, "value") else TradeDirection(str(direction_raw))
-                notional = Decimal(abs(getattr(t, "value_usd", 0) or 0))
-                scale = Decimal(used_pct)
-                trade_leverage = _derive_trade_leverage(notional)
-                used_leverages.append(trade_leverage)
-                current_unreal, current_margin = _unrealized_and_margin(t.timestamp)
-                equity_now = cash + current_margin + current_unreal
-                desired_notional = notional * scale
-                per_trade_cap_ratio = Decimal("0.05")  # at most 5% of levered equity per trade
-                if direction in closing_dirs:
-                    user_notional = desired_notional
-                else:
-                    max_notional_overall = equity_now * trade_leverage
-                    max_notional_per_trade = max_notional_overall * per_trade_cap_ratio
-                    user_notional = min(desired_notional, max_notional_per_trade) if max_notional_overall > 0 else Decimal(0)
-                if user_notional <= 0:
-                    continue
-                price = None
-                try:
-                    amount_base = getattr(t, "amount_base", None)
-                    if getattr(t, "value_usd", None) is not None and amount_base not in (None, 0):
-                        price = Decimal(abs(t.value_usd)) / Decimal(abs(amount_base))
-                except Exception:
-                    price = None
-                sym_key = (getattr(t, "base_asset", None) or "").upper() or None
-                price = _mark_price(sym_key, t.timestamp, price)
-                if price is None or price <= 0:
-                    continue
-                base_label = getattr(t, "base_asset", None) or "UNKNOWN"
-                pos_key = sym_key or base_label
-                pos = positions.setdefault(
-                    pos_key, {"qty": Decimal(0), "avg_price": Decimal(0), "margin": Decimal(0)}
-                )
+    price_points = None
+    if include_price_points:
+        aware = bool(trades) and trades[0].timestamp.tzinfo is not None
+        price_points = {}
+        for sym, (ts_arr, px_arr) in price_cache.items():
+            if max_points is not None:
+                trade_ms = _epoch_us_array([r.timestamp for r in results if (r.base_asset or "").upper() == sym]) // 1000
+                keep = np.searchsorted(ts_arr, trade_ms, side="right") - 1
+                idx = downsample_indices(ts_arr, px_arr, max_points, keep[keep >= 0].tolist())
+                ts_arr, px_arr = ts_arr[idx], px_arr[idx]
+            price_points[sym] = [
+                {"timestamp": ts, "price": p}
+                for ts, p in zip(from_epoch_ms(ts_arr.tolist(), aware=aware), px_arr.tolist())
+            ]
 
-                net_change = Decimal(0)
-                pnl = Decimal(0)
-                executed_notional = user_notional
-                fee = Decimal(0)
-                slip = Decimal(0)
-
-                if direction in entry_dirs:
-                    fee = user_notional * fee_rate
-                    slip = user_notional * slippage_rate
-                    eff_leverage = trade_leverage if trade_leverage > 0 else Decimal(1)
-                    margin_required = user_notional / eff_leverage
-                    total_cost = margin_required + fee + slip
-                    if total_cost > cash:
-                        afford_scale = cash / total_cost if total_cost > 0 else Decimal(0)
-                        user_notional *= afford_scale
-                        fee = user_notional * fee_rate
-                        slip = user_notional * slippage_rate
-                        margin_required = user_notional / eff_leverage
-                        total_cost = margin_required + fee + slip
-                        if user_notional <= 0 or total_cost > cash:
-                            continue
-                    executed_notional = user_notional
-                    total_fees += fee
-                    total_slippage += slip
-
-                    qty = user_notional / price
-                    signed_qty = qty if direction in {TradeDirection.LONG, TradeDirection.BUY} else -qty
-                    if signed_qty != 0:
-                        new_qty = pos["qty"] + signed_qty
-                        if new_qty == 0:
-                            pos["qty"] = Decimal(0)
-                            pos["avg_price"] = Decimal(0)
-                            pos["margin"] = Decimal(0)
-                        else:
-                            existing_cost = pos["avg_price"] * pos["qty"]
-                            added_cost = price * signed_qty
-                            pos["qty"] = new_qty
-                            pos["avg_price"] = (existing_cost + added_cost) / new_qty if new_qty != 0 else Decimal(0)
-                            pos["margin"] += margin_required
-                    cash -= (margin_required + fee + slip)
-                    net_change -= (fee + slip)
-                elif direction in closing_dirs:
-                    pos_qty = pos["qty"]
-                    if pos_qty == 0:
-                        continue
-                    qty = user_notional / price
-                    close_qty = min(abs(qty), abs(pos_qty))
-                    if close_qty <= 0:
-                        continue
-                    executed_notional = close_qty * price
-                    fee = executed_notional * fee_rate
-                    slip = executed_notional * slippage_rate
-                    total_fees += fee
-                    total_slippage += slip
-                    signed_close = close_qty if pos_qty > 0 else -close_qty
-                    avg = pos["avg_price"]
-                    pnl = (price - avg) * signed_close if pos_qty > 0 else (avg - price) * abs(signed_close)
-                    margin_release = pos["margin"] * (close_qty / abs(pos_qty)) if pos["margin"] else Decimal(0)
-                    pos["qty"] = pos_qty - signed_close
-                    if pos["qty"] == 0:
-                        pos["avg_price"] = Decimal(0)
-                        pos["margin"] = Decimal(0)
-                    else:
-                        pos["margin"] -= margin_release
-                    net = pnl - fee - slip
-                    gross_pnl += pnl
-                    net_change += net
-                    cash += margin_release + net
-                    closing_count += 1
-                    if net > 0:
-                        wins += 1
-                else:
-                    continue
+    return summary, trade_slice, equity_curve, price_points, total_trades
 
-                unreal, margin_total = _unrealized_and_margin(t.timestamp)
-                equity = cash + margin_total + unreal
-                cumulative_net = equity - initial_deposit
-                results.append(
-                    BacktestTradeResult(
-                        id=getattr(t, "id", None) or current_idx,
-                        timestamp=t.timestamp,
-                        direction=str(direction.value if hasattr(direction, "value") else direction),
-                        base_asset=getattr(t, "base_asset", None),
-                        notional_usd=float(executed_notional),
-                        pnl_usd=float(pnl),
-                        fee_usd=float(fee),
-                        slippage_usd=float(slip),
-                        net_pnl_usd=float(net_change if net_change != 0 else (pnl - fee - slip)),
-                        cumulative_pnl_usd=float(cumulative_net),
-                        equity_usd=float(equity),
-                        unrealized_pnl_usd=float(unreal),
-                        position_size_base=float(pos["qty"]) if pos["qty"] is not None else None,
-                    )
-                )
 
-            _record_equity(ts.replace(second=0, microsecond=0))
-            ts = ts + timedelta(minutes=step_minutes)
-
-    if not equity_curve and trades:
-        _record_equity(trades[-1].timestamp)
-
-    max_dd_ratio, max_dd_usd = _compute_drawdown(equity_curve)
-    roi = float(cumulative_net / initial_deposit * Decimal(100)) if initial_deposit > 0 else 0.0
-    win_rate = float(wins) / float(closing_count) * 100 if closing_count > 0 else None
-    max_drawdown_percent = float(max_dd_ratio * Decimal(100)) if max_dd_ratio is not None else None
-    max_drawdown_usd = float(max_dd_usd) if max_dd_usd is not None else None
-    leverage_used = (
-        float(leverage)
-        if leverage is not None
-        else float(sum(used_leverages) / len(used_leverages))
-        if used_leverages
-        else None
-    )
+def _downsample_equity_curve(curve: list[dict], results: Sequence[BacktestTradeResult], max_points: int) -> list[dict]:
+    """LTTB-reduce the equity curve, keeping the drawdown peak/trough and the sample of every copied trade."""
+    if len(curve) <= max_points:
+        return curve
+    x = _epoch_us_array([point["timestamp"] for point in curve])
+    y = np.fromiter((point["equity_usd"] for point in curve), dtype=np.float64, count=len(curve))
+    trade_us = _epoch_us_array([r.timestamp for r in results])
+    trade_idx = np.searchsorted(x, trade_us, side="right") - 1
+    keep = drawdown_indices(y) + trade_idx[trade_idx >= 0].tolist()
+    return [curve[i] for i in downsample_indices(x, y, max_points, keep).tolist()]
+
 
-    summary = BacktestSummary(
+def _summary_from_outcome(
+    outcome: SimulationOutcome,
+    trades: Sequence,
+    *,
+    initial_deposit: Decimal,
+    recommended_pct: float,
+    used_pct: float,
+    assets_used: list[str],
+    trades_copied: int,
+) -> BacktestSummary:
+    return BacktestSummary(
         initial_deposit_usd=float(initial_deposit),
         recommended_position_pct=recommended_pct * 100.0,
         used_position_pct=used_pct * 100.0,
-        leverage_used=leverage_used,
+        leverage_used=outcome.leverage_used,
         asset_symbols=assets_used,
-        total_fees_usd=float(total_fees),
-        total_slippage_usd=float(total_slippage),
-        gross_pnl_usd=float(gross_pnl),
-        net_pnl_usd=float(cumulative_net),
-        roi_percent=roi,
-        trades_copied=len(results),
-        win_rate_percent=win_rate,
-        max_drawdown_percent=max_drawdown_percent,
-        max_drawdown_usd=max_drawdown_usd,
+        total_fees_usd=outcome.total_fees,
+        total_slippage_usd=outcome.total_slippage,
+        gross_pnl_usd=outcome.gross_pnl,
+        net_pnl_usd=outcome.net_pnl,
+        roi_percent=outcome.roi_percent,
+        trades_copied=trades_copied,
+        win_rate_percent=outcome.win_rate_percent,
+        max_drawdown_percent=outcome.max_drawdown_percent,
+        max_drawdown_usd=outcome.max_drawdown_usd,
         start=trades[0].timestamp if trades else None,
         end=trades[-1].timestamp if trades else None,
     )
 
-    total_trades = len(results)
-    start_idx = min(trades_offset, total_trades)
-    end_idx = min(start_idx + trades_limit, total_trades)
-    trade_slice = results[start_idx:end_idx]
-
-    price_points = None
-    if include_price_points:
-        price_points = {
-            sym: [{"timestamp": ts, "price": float(p)} for ts, p in zip(series[0], series[1])]
-            for sym, series in price_cache.items()
-        }
-
-    return summary, trade_slice, equity_curve, price_points, total_trades
-
 
 def _ensure_backtest_runs_table(session, retries: int = 3, delay: float = 1.0) -> bool:
     """Create backtest_runs table on the fly if migrations haven't been applied."""
@@ -447,6 +244,78 @@ def _percentile(values: Sequence[Decimal], pct: float) -> Decimal:
     return (sorted_vals[f] * weight_f) + (sorted_vals[c] * weight_c)
 
 
+def _backtest_run_record(
+    whale_id: str,
+    summary: BacktestSummary,
+    *,
+    leverage: Decimal | None,
+    position_size_pct: float | None,
+    initial_deposit: Decimal,
+) -> BacktestRun:
+    return BacktestRun(
+        whale_id=whale_id,
+        leverage=leverage,
+        position_size_pct=position_size_pct,
+        asset_symbols=summary.asset_symbols,
+        win_rate_percent=summary.win_rate_percent,
+        trades_copied=summary.trades_copied,
+        max_drawdown_percent=summary.max_drawdown_percent,
+        max_drawdown_usd=Decimal(str(summary.max_drawdown_usd)) if summary.max_drawdown_usd is not None else None,
+        initial_deposit_usd=initial_deposit,
+        net_pnl_usd=Decimal(str(summary.net_pnl_usd)),
+        roi_percent=summary.roi_percent,
+    )
+
+
+def _copier_cache_key(
+    session,
+    whale_id: str,
+    payload: CopierBacktestRequest,
+    asset_filter: set[str] | None,
+    whale_portfolio_value: Decimal | None,
+) -> str:
+    watermark = trade_watermark(session, whale_id, start=payload.start, end=payload.end, asset_filter=asset_filter)
+    # The whale's portfolio value drives auto sizing and mirrored leverage, so it is part of the input.
+    watermark["portfolio_value"] = str(whale_portfolio_value) if whale_portfolio_value is not None else None
+    params = payload.model_dump(mode="json", exclude={"trades_limit", "trades_offset"})
+    return backtest_cache.make_key("copier", params, watermark)
+
+
+def _persist_backtest_run(session, run_record: BacktestRun) -> bool:
+    """Store a backtest run, tolerating a missing table or a locked SQLite file."""
+    try:
+        session.add(run_record)
+        commit_with_retry(session)
+    except OperationalError as exc:
+        session.rollback()
+        exc_str = str(exc).lower()
+        if "no such table" in exc_str and "backtest_runs" in exc_str:
+            created = _ensure_backtest_runs_table(session, retries=3, delay=1.5)
+            if created:
+                try:
+                    session.add(run_record)
+                    commit_with_retry(session)
+                    logger.info("Created missing backtest_runs table and retried commit")
+                except OperationalError as exc_retry:
+                    session.rollback()
+                    if "database is locked" in str(exc_retry).lower():
+                        logger.warning(
+                            "Could not persist backtest run due to SQLite lock after creating table; skipping persistence"
+                        )
+                    else:
+                        raise
+            else:
+                logger.error("backtest_runs table missing and automatic creation failed; skipping persistence")
+        elif "database is locked" in exc_str:
+            logger.warning("Could not persist backtest run due to SQLite lock; skipping persistence")
+        else:
+            raise
+    except Exception:
+        session.rollback()
+        raise
+    return run_record.id is not None
+
+
 def _resolve_whale(session, chain: ChainId, address: str) -> tuple[Whale, Chain]:
     chain_obj = session.scalar(select(Chain).where(Chain.slug == chain.lower()))
     if not chain_obj:
@@ -496,63 +365,138 @@ def _recommended_position_pct(initial_deposit: Decimal, entry_sizes: Iterable[De
     return max(0.0, min(pct, 1.0))
 
 
+def _load_copier_trades(
+    session,
+    whale_id: str,
+    *,
+    start: datetime | None,
+    end: datetime | None,
+    asset_filter: set[str] | None,
+    max_trades: int | None,
+) -> list[Trade]:
+    ignore_dirs = {TradeDirection.DEPOSIT}
+    trade_query = (
+        session.query(Trade)
+        .filter(Trade.whale_id == whale_id, Trade.direction.notin_(ignore_dirs))
+        .order_by(Trade.timestamp.asc(), Trade.id.asc())
+    )
+    if start:
+        trade_query = trade_query.filter(Trade.timestamp >= start)
+    if end:
+        trade_query = trade_query.filter(Trade.timestamp <= end)
+    if asset_filter:
+        trade_query = trade_query.filter(Trade.base_asset.in_(list(asset_filter)))
+    if max_trades is not None:
+        trade_query = trade_query.limit(max_trades)
+    return trade_query.all()
+
+
+def _recommended_copy_pct(
+    session,
+    whale_id: str,
+    initial_deposit: Decimal,
+    *,
+    start: datetime | None,
+    end: datetime | None,
+    asset_filter: set[str] | None,
+) -> tuple[float, Decimal | None]:
+    """Return the auto copy ratio (0-2) and the whale's cached portfolio value."""
+    entry_dirs = {TradeDirection.LONG, TradeDirection.SHORT, TradeDirection.BUY}
+    entry_query = session.query(Trade.value_usd).filter(
+        Trade.whale_id == whale_id,
+        Trade.direction.in_(entry_dirs),
+        Trade.value_usd.isnot(None),
+    )
+    if start:
+        entry_query = entry_query.filter(Trade.timestamp >= start)
+    if end:
+        entry_query = entry_query.filter(Trade.timestamp <= end)
+    if asset_filter:
+        entry_query = entry_query.filter(Trade.base_asset.in_(list(asset_filter)))
+
+    entry_query = entry_query.order_by(Trade.timestamp.asc())
+    entry_sizes = [Decimal(abs(v[0])) for v in entry_query.all() if v[0] is not None]
+    whale_portfolio_value = _current_portfolio_value(session, whale_id)
+    auto_pct = _auto_position_pct_by_wallet(initial_deposit, whale_portfolio_value)
+    recommended_pct = (
+        auto_pct / 100.0
+        if auto_pct is not None
+        else _recommended_position_pct(initial_deposit, entry_sizes)
+    )
+    return max(0.0, min(recommended_pct, 2.0)), whale_portfolio_value
+
+
 @router.post("/copier", response_model=CopierBacktestResponse)
 def run_copier_backtest(payload: CopierBacktestRequest) -> CopierBacktestResponse:
     """Simulate copying a trader's opens/closes with scaling, fees, slippage, and unrealized PnL."""
+    return _copier_backtest(
+        payload,
+        trades_offset=max(payload.trades_offset or 0, 0),
+        trades_limit=min(max(payload.trades_limit or 50, 1), 500),
+    )
+
+
+def _copier_backtest(
+    payload: CopierBacktestRequest,
+    *,
+    trades_offset: int,
+    trades_limit: int | None,
+    report: ProgressReporter = no_progress,
+) -> CopierBacktestResponse:
+    """Copier backtest returning trades[offset:offset+limit]; `trades_limit=None` returns every trade."""
     with SessionLocal() as session:
+        report(2.0, "resolving whale")
         whale, _ = _resolve_whale(session, payload.chain, payload.address)
 
-        trades_limit = min(max(payload.trades_limit or 50, 1), 500)
-        trades_offset = max(payload.trades_offset or 0, 0)
-
-        closing_dirs = {
-            TradeDirection.CLOSE_LONG,
-            TradeDirection.CLOSE_SHORT,
-            TradeDirection.SELL,
-            TradeDirection.WITHDRAW,
-        }
-        entry_dirs = {TradeDirection.LONG, TradeDirection.SHORT, TradeDirection.BUY}
-        ignore_dirs = {TradeDirection.DEPOSIT}
         asset_filter = {sym.upper() for sym in payload.asset_symbols} if payload.asset_symbols else None
-
-        trade_query = (
-            session.query(Trade)
-            .filter(Trade.whale_id == whale.id, Trade.direction.notin_(ignore_dirs))
-            .order_by(Trade.timestamp.asc(), Trade.id.asc())
-        )
-        if payload.start:
-            trade_query = trade_query.filter(Trade.timestamp >= payload.start)
-        if payload.end:
-            trade_query = trade_query.filter(Trade.timestamp <= payload.end)
-        if asset_filter:
-            trade_query = trade_query.filter(Trade.base_asset.in_(list(asset_filter)))
-        if payload.max_trades is not None:
-            trade_query = trade_query.limit(payload.max_trades)
-        trades = trade_query.all()
-
-        entry_query = session.query(Trade.value_usd).filter(
-            Trade.whale_id == whale.id,
-            Trade.direction.in_(entry_dirs),
-            Trade.value_usd.isnot(None),
-        )
-        if payload.start:
-            entry_query = entry_query.filter(Trade.timestamp >= payload.start)
-        if payload.end:
-            entry_query = entry_query.filter(Trade.timestamp <= payload.end)
-        if asset_filter:
-            entry_query = entry_query.filter(Trade.base_asset.in_(list(asset_filter)))
-
-        entry_query = entry_query.order_by(Trade.timestamp.asc())
-        entry_sizes = [Decimal(abs(v[0])) for v in entry_query.all() if v[0] is not None]
+        leverage = None
+        if payload.leverage is not None:
+            leverage = Decimal(payload.leverage)
+            leverage = max(Decimal("0.1"), min(leverage, Decimal("100")))
         initial_deposit = Decimal(payload.initial_deposit_usd)
         whale_portfolio_value = _current_portfolio_value(session, whale.id)
-        auto_pct = _auto_position_pct_by_wallet(initial_deposit, whale_portfolio_value)
-        recommended_pct = (
-            auto_pct / 100.0
-            if auto_pct is not None
-            else _recommended_position_pct(initial_deposit, entry_sizes)
+
+        cache_key = None
+        if backtest_cache.enabled:
+            cache_key = _copier_cache_key(session, whale.id, payload, asset_filter, whale_portfolio_value)
+            cached = backtest_cache.get(cache_key)
+            if cached is not None:
+                summary = BacktestSummary.model_validate(cached["summary"])
+                _persist_backtest_run(
+                    session,
+                    _backtest_run_record(
+                        whale.id,
+                        summary,
+                        leverage=leverage,
+                        position_size_pct=payload.position_size_pct,
+                        initial_deposit=initial_deposit,
+                    ),
+                )
+                trades_total = len(cached["trades"])
+                if trades_limit is None:
+                    trades_limit = trades_total
+                return CopierBacktestResponse(
+                    summary=summary,
+                    trades=cached["trades"][trades_offset : trades_offset + trades_limit],
+                    equity_curve=cached["equity_curve"],
+                    price_points=cached["price_points"],
+                    trades_total=trades_total,
+                    trades_limit=trades_limit,
+                    trades_offset=trades_offset,
+                )
+
+        report(5.0, "loading trades")
+        trades = _load_copier_trades(
+            session,
+            whale.id,
+            start=payload.start,
+            end=payload.end,
+            asset_filter=asset_filter,
+            max_trades=payload.max_trades,
+        )
+        recommended_pct, _ = _recommended_copy_pct(
+            session, whale.id, initial_deposit, start=payload.start, end=payload.end, asset_filter=asset_filter
         )
-        recommended_pct = max(0.0, min(recommended_pct, 2.0))
         used_pct = (
             float(payload.position_size_pct) / 100.0
             if payload.position_size_pct is not None
@@ -562,16 +506,13 @@ def run_copier_backtest(payload: CopierBacktestRequest) -> CopierBacktestRespons
 
         fee_rate = Decimal(payload.fee_bps) / Decimal(10_000)
         slippage_rate = Decimal(payload.slippage_bps) / Decimal(10_000)
-        leverage = None
-        if payload.leverage is not None:
-            leverage = Decimal(payload.leverage)
-            leverage = max(Decimal("0.1"), min(leverage, Decimal("100")))
 
-        # preload price history for marking open positions (best-effort)
         assets = {(t.base_asset or "").upper() for t in trades if t.base_asset}
         assets.discard("")
         assets_used = sorted(asset_filter) if asset_filter else sorted(assets)
-        price_cache: dict[str, tuple[list[datetime], list[Decimal]]] = {}
+
+        if trades_limit is None:
+            trades_limit = len(trades)
 
         # Gracefully return an empty backtest instead of 404 when no trades match filters.
         if not trades:
@@ -603,403 +544,64 @@ def run_copier_backtest(payload: CopierBacktestRequest) -> CopierBacktestRespons
                 trades_offset=trades_offset,
             )
 
-        # determine backtest window for price fetch
-        start_ts = trades[0].timestamp.replace(second=0, microsecond=0) if trades else None
-        end_ts = trades[-1].timestamp.replace(second=0, microsecond=0) if trades else None
-
-        def _has_price_coverage(session, assets: set[str], start_ts: datetime, end_ts: datetime) -> set[str]:
-            if not assets or not start_ts or not end_ts:
-                return set()
-            rows = (
-                session.query(
-                    PriceHistory.asset_symbol,
-                    func.min(PriceHistory.timestamp),
-                    func.max(PriceHistory.timestamp),
-                )
-                .filter(PriceHistory.asset_symbol.in_(list(assets)))
-                .group_by(PriceHistory.asset_symbol)
-                .all()
-            )
-            covered: set[str] = set()
-            for sym, min_ts, max_ts in rows:
-                if min_ts <= start_ts and max_ts >= end_ts:
-                    covered.add(sym)
-            return covered
+        # Simulate the full trade list so the cached entry can serve any page.
+        preload_failed: list[bool] = []
+        summary, trades_all, equity_curve, price_points, total_trades = _simulate_copy_trades(
+            session,
+            trades,
+            initial_deposit=initial_deposit,
+            recommended_pct=recommended_pct,
+            used_pct=used_pct,
+            fee_rate=fee_rate,
+            slippage_rate=slippage_rate,
+            leverage=leverage,
+            include_price_points=payload.include_price_points,
+            preload_prices=payload.preload_prices,
+            asset_filter=asset_filter,
+            trades_limit=len(trades),
+            trades_offset=0,
+            whale_portfolio_value=whale_portfolio_value,
+            engine=payload.engine,
+            sampling=payload.sampling,
+            max_curve_points=payload.max_curve_points,
+            max_points=payload.max_points,
+            report=report,
+            on_preload_failure=lambda: preload_failed.append(True),
+        )
 
-        if assets and start_ts and end_ts:
+        # A failed preload leaves the key unchanged; caching would pin the gappy result to it.
+        if cache_key is not None and not preload_failed:
             if payload.preload_prices:
-                try:
-                    covered = _has_price_coverage(session, assets, start_ts, end_ts)
-                    missing_assets = assets - covered
-                    if missing_assets:
-                        fetch_and_store_binance_prices(
-                            session,
-                            assets=list(missing_assets),
-                            timeframe="1m",
-                            since=start_ts - timedelta(minutes=1),
-                            until=end_ts + timedelta(minutes=1),
-                            limit=1500,
-                        )
-                        session.flush()
-                        _commit_with_retry(session)
-                except OperationalError as exc:
-                    session.rollback()
-                    logger.warning(
-                        "price preload commit failed; continuing without new prices: %s", exc
-                    )
-                except Exception as exc:
-                    session.rollback()
-                    logger.warning(
-                        "price preload failed; continuing without new prices: %s", exc
-                    )
-
-            rows = (
-                session.query(PriceHistory.asset_symbol, PriceHistory.timestamp, PriceHistory.price_usd)
-                .filter(
-                    PriceHistory.asset_symbol.in_(list(assets)),
-                    PriceHistory.timestamp >= start_ts - timedelta(minutes=5),
-                    PriceHistory.timestamp <= end_ts + timedelta(minutes=5),
-                )
-                .order_by(PriceHistory.asset_symbol, PriceHistory.timestamp)
-                .all()
-            )
-            for sym, ts, price in rows:
-                if price is None:
-                    continue
-                ts_list, px_list = price_cache.setdefault(sym, ([], []))
-                ts_list.append(ts)
-                px_list.append(Decimal(price))
-
-        def _mark_price(sym: str | None, ts: datetime, fallback: Decimal | None) -> Decimal | None:
-            if sym is None:
-                return fallback
-            series = price_cache.get(sym)
-            if not series:
-                return fallback
-            ts_list, px_list = series
-            idx = bisect_right(ts_list, ts) - 1
-            if idx < 0:
-                return fallback
-            return px_list[idx]
-
-        def _derive_trade_leverage(trade_notional: Decimal) -> Decimal:
-            if leverage is not None and leverage > 0:
-                return leverage
-            if whale_portfolio_value is not None and whale_portfolio_value > 0 and trade_notional > 0:
-                derived = trade_notional / whale_portfolio_value
-                return max(Decimal("0.1"), min(derived, Decimal("100")))
-            return Decimal(1)
-
-        positions: dict[str, dict[str, Decimal]] = {}
-        cash = initial_deposit
-        cumulative_net = Decimal(0)
-        total_fees = Decimal(0)
-        total_slippage = Decimal(0)
-        gross_pnl = Decimal(0)
-        wins = 0
-        closing_count = 0
-        results: list[BacktestTradeResult] = []
-        equity_curve: list[dict] = []
-        used_leverages: list[Decimal] = []
-
-        def _compute_drawdown(curve: list[dict]) -> tuple[Decimal, Decimal]:
-            if not curve:
-                return Decimal(0), Decimal(0)
-            peak = Decimal(curve[0]["equity_usd"])
-            max_dd = Decimal(0)
-            max_dd_usd = Decimal(0)
-            for point in curve:
-                eq = Decimal(point["equity_usd"])
-                if eq > peak:
-                    peak = eq
-                drawdown_abs = peak - eq
-                dd_ratio = drawdown_abs / peak if peak > 0 else Decimal(0)
-                if dd_ratio > max_dd:
-                    max_dd = dd_ratio
-                    max_dd_usd = drawdown_abs
-            return max_dd, max_dd_usd
-
-        def _unrealized_and_margin(ts: datetime) -> tuple[Decimal, Decimal]:
-            unreal = Decimal(0)
-            margin_total = Decimal(0)
-            for sym, pos in positions.items():
-                qty = pos.get("qty", Decimal(0))
-                margin_total += pos.get("margin", Decimal(0))
-                if qty == 0:
-                    continue
-                avg = pos.get("avg_price", Decimal(0))
-                mark = _mark_price(sym, ts, avg)
-                if mark is None:
-                    continue
-                if qty > 0:
-                    unreal += (mark - avg) * qty
-                else:
-                    unreal += (avg - mark) * abs(qty)
-            return unreal, margin_total
-
-        current_idx = 0
-        trade_count = len(trades)
-        # timeline minute loop
-        # start_ts and end_ts already computed above when fetching prices
-
-        def _record_equity(ts: datetime) -> None:
-            unreal, margin_total = _unrealized_and_margin(ts)
-            equity = cash + margin_total + unreal
-            cumulative_net_local = equity - initial_deposit
-            equity_curve.append(
-                {"timestamp": ts, "equity_usd": float(equity), "unrealized_pnl_usd": float(unreal)}
+                # The preload may have fetched prices; key the entry by the data it actually used.
+                cache_key = _copier_cache_key(session, whale.id, payload, asset_filter, whale_portfolio_value)
+            backtest_cache.put(
+                cache_key,
+                jsonable_encoder(
+                    {
+                        "summary": summary,
+                        "trades": trades_all,
+                        "equity_curve": equity_curve,
+                        "price_points": price_points,
+                    }
+                ),
             )
-            return cumulative_net_local
-
-        # iterate minute by minute and process trades that occur within or before that minute
-        if start_ts and end_ts:
-            delta_minutes = int((end_ts - start_ts).total_seconds() // 60)
-            step_minutes = 1
-            if delta_minutes > 60 * 24 * 60:
-                step_minutes = 5
-            if delta_minutes > 60 * 24 * 180:
-                step_minutes = 15
-            ts = start_ts
-            while ts <= end_ts:
-                # process trades with timestamp <= end of this minute
-                minute_end = ts.replace(second=59, microsecond=999999)
-                while current_idx < trade_count and trades[current_idx].timestamp <= minute_end:
-                    t = trades[current_idx]
-                    current_idx += 1
-                    # existing processing per trade
-                    direction = t.direction if hasattr(t.direction, "value") else TradeDirection(str(t.direction))
-                    notional = Decimal(abs(t.value_usd or 0))
-                    scale = Decimal(used_pct)
-                    trade_leverage = _derive_trade_leverage(notional)
-                    used_leverages.append(trade_leverage)
-                    current_unreal, current_margin = _unrealized_and_margin(t.timestamp)
-                    equity_now = cash + current_margin + current_unreal
-                    desired_notional = notional * scale
-                    per_trade_cap_ratio = Decimal("0.05")  # at most 5% of levered equity per trade
-                    if direction in closing_dirs:
-                        # Allow closes even when cash is depleted; position size will cap the executed notional.
-                        user_notional = desired_notional
-                    else:
-                        # Cap exposure by available equity * leverage to avoid oversizing; also per-trade cap to preserve dry powder
-                        max_notional_overall = equity_now * trade_leverage
-                        max_notional_per_trade = max_notional_overall * per_trade_cap_ratio
-                        user_notional = (
-                            min(desired_notional, max_notional_per_trade) if max_notional_overall > 0 else Decimal(0)
-                        )
-                    if user_notional <= 0:
-                        continue
-                    price = None
-                    try:
-                        if t.value_usd is not None and t.amount_base not in (None, 0):
-                            price = Decimal(abs(t.value_usd)) / Decimal(abs(t.amount_base))
-                    except Exception:
-                        price = None
-                    sym_key = (t.base_asset or "").upper() or None
-                    price = _mark_price(sym_key, t.timestamp, price)
-                    if price is None or price <= 0:
-                        continue
-                    base_label = t.base_asset or "UNKNOWN"
-                    pos_key = sym_key or base_label
-                    pos = positions.setdefault(
-                        pos_key, {"qty": Decimal(0), "avg_price": Decimal(0), "margin": Decimal(0)}
-                    )
-
-                    net_change = Decimal(0)
-                    pnl = Decimal(0)
-                    executed_notional = user_notional
-                    fee = Decimal(0)
-                    slip = Decimal(0)
-
-                    if direction in entry_dirs:
-                        fee = user_notional * fee_rate
-                        slip = user_notional * slippage_rate
-                        # adjust size if we can't afford margin + costs
-                        eff_leverage = trade_leverage if trade_leverage > 0 else Decimal(1)
-                        margin_required = user_notional / eff_leverage
-                        total_cost = margin_required + fee + slip
-                        if total_cost > cash:
-                            afford_scale = cash / total_cost if total_cost > 0 else Decimal(0)
-                            user_notional *= afford_scale
-                            fee = user_notional * fee_rate
-                            slip = user_notional * slippage_rate
-                            margin_required = user_notional / eff_leverage
-                            total_cost = margin_required + fee + slip
-                            if user_notional <= 0 or total_cost > cash:
-                                continue
-                        executed_notional = user_notional
-                        total_fees += fee
-                        total_slippage += slip
-
-                        qty = user_notional / price
-                        signed_qty = qty if direction in {TradeDirection.LONG, TradeDirection.BUY} else -qty
-                        if signed_qty != 0:
-                            new_qty = pos["qty"] + signed_qty
-                            if new_qty == 0:
-                                pos["qty"] = Decimal(0)
-                                pos["avg_price"] = Decimal(0)
-                                pos["margin"] = Decimal(0)
-                            else:
-                                existing_cost = pos["avg_price"] * pos["qty"]
-                                added_cost = price * signed_qty
-                                pos["qty"] = new_qty
-                                pos["avg_price"] = (existing_cost + added_cost) / new_qty if new_qty != 0 else Decimal(0)
-                                pos["margin"] += margin_required
-                        # pay margin + costs
-                        cash -= (margin_required + fee + slip)
-                        net_change -= (fee + slip)
-                    elif direction in closing_dirs:
-                        pos_qty = pos["qty"]
-                        if pos_qty == 0:
-                            continue
-                        qty = user_notional / price
-                        close_qty = min(abs(qty), abs(pos_qty))
-                        if close_qty <= 0:
-                            continue
-                        executed_notional = close_qty * price
-                        fee = executed_notional * fee_rate
-                        slip = executed_notional * slippage_rate
-                        total_fees += fee
-                        total_slippage += slip
-                        signed_close = close_qty if pos_qty > 0 else -close_qty
-                        avg = pos["avg_price"]
-                        pnl = (price - avg) * signed_close if pos_qty > 0 else (avg - price) * abs(signed_close)
-                        margin_release = pos["margin"] * (close_qty / abs(pos_qty)) if pos["margin"] else Decimal(0)
-                        pos["qty"] = pos_qty - signed_close
-                        if pos["qty"] == 0:
-                            pos["avg_price"] = Decimal(0)
-                            pos["margin"] = Decimal(0)
-                        else:
-                            pos["margin"] -= margin_release
-                        net = pnl - fee - slip
-                        gross_pnl += pnl
-                        net_change += net
-                        cash += margin_release + net
-                        closing_count += 1
-                        if net > 0:
-                            wins += 1
-                    else:
-                        continue
-
-                    unreal, margin_total = _unrealized_and_margin(t.timestamp)
-                    equity = cash + margin_total + unreal
-                    cumulative_net = equity - initial_deposit
-                    results.append(
-                        BacktestTradeResult(
-                            id=t.id,
-                            timestamp=t.timestamp,
-                            direction=str(direction.value if hasattr(direction, "value") else direction),
-                            base_asset=t.base_asset,
-                            notional_usd=float(executed_notional),
-                            pnl_usd=float(pnl),
-                            fee_usd=float(fee),
-                            slippage_usd=float(slip),
-                            net_pnl_usd=float(net_change if net_change != 0 else (pnl - fee - slip)),
-                            cumulative_pnl_usd=float(cumulative_net),
-                            equity_usd=float(equity),
-                            unrealized_pnl_usd=float(unreal),
-                            position_size_base=float(pos["qty"]) if pos["qty"] is not None else None,
-                        )
-                    )
-
-                _record_equity(ts.replace(second=0, microsecond=0))
-                ts = ts + timedelta(minutes=step_minutes)
-
-        # Ensure at least one equity point if trades existed
-        if not equity_curve and trades:
-            _record_equity(trades[-1].timestamp)
-
-        max_dd_ratio, max_dd_usd = _compute_drawdown(equity_curve)
-        roi = float(cumulative_net / initial_deposit * Decimal(100)) if initial_deposit > 0 else 0.0
-        win_rate = float(wins) / float(closing_count) * 100 if closing_count > 0 else None
-        max_drawdown_percent = float(max_dd_ratio * Decimal(100)) if max_dd_ratio is not None else None
-        max_drawdown_usd = float(max_dd_usd) if max_dd_usd is not None else None
-        leverage_used = (
-            float(leverage)
-            if leverage is not None
-            else float(sum(used_leverages) / len(used_leverages))
-            if used_leverages
-            else None
-        )
-
-        summary = BacktestSummary(
-            initial_deposit_usd=float(initial_deposit),
-            recommended_position_pct=recommended_pct * 100.0,
-            used_position_pct=used_pct * 100.0,
-            leverage_used=leverage_used,
-            asset_symbols=assets_used,
-            total_fees_usd=float(total_fees),
-            total_slippage_usd=float(total_slippage),
-            gross_pnl_usd=float(gross_pnl),
-            net_pnl_usd=float(cumulative_net),
-            roi_percent=roi,
-            trades_copied=len(results),
-            win_rate_percent=win_rate,
-            max_drawdown_percent=max_drawdown_percent,
-            max_drawdown_usd=max_drawdown_usd,
-            start=trades[0].timestamp if trades else None,
-            end=trades[-1].timestamp if trades else None,
-        )
-
-        total_trades = len(results)
-        start_idx = min(trades_offset, total_trades)
-        end_idx = min(start_idx + trades_limit, total_trades)
-        trade_slice = results[start_idx:end_idx]
 
         # Persist backtest parameters and key stats for later copier creation
-        run_record = BacktestRun(
-            whale_id=whale.id,
-            leverage=leverage,
-            position_size_pct=payload.position_size_pct,
-            asset_symbols=assets_used,
-            win_rate_percent=win_rate,
-            trades_copied=len(results),
-            max_drawdown_percent=max_drawdown_percent,
-            max_drawdown_usd=Decimal(max_drawdown_usd) if max_drawdown_usd is not None else None,
-            initial_deposit_usd=initial_deposit,
-            net_pnl_usd=cumulative_net,
-            roi_percent=roi,
+        report(95.0, "saving run")
+        _persist_backtest_run(
+            session,
+            _backtest_run_record(
+                whale.id,
+                summary,
+                leverage=leverage,
+                position_size_pct=payload.position_size_pct,
+                initial_deposit=initial_deposit,
+            ),
         )
-        try:
-            session.add(run_record)
-            _commit_with_retry(session)
-        except OperationalError as exc:
-            session.rollback()
-            exc_str = str(exc).lower()
-            if "no such table" in exc_str and "backtest_runs" in exc_str:
-                created = _ensure_backtest_runs_table(session, retries=3, delay=1.5)
-                if created:
-                    try:
-                        session.add(run_record)
-                        _commit_with_retry(session)
-                        logger.info("Created missing backtest_runs table and retried commit")
-                    except OperationalError as exc_retry:
-                        session.rollback()
-                        if "database is locked" in str(exc_retry).lower():
-                            logger.warning(
-                                "Could not persist backtest run due to SQLite lock after creating table; skipping persistence"
-                            )
-                        else:
-                            raise
-                else:
-                    logger.error("backtest_runs table missing and automatic creation failed; skipping persistence")
-            elif "database is locked" in exc_str:
-                logger.warning("Could not persist backtest run due to SQLite lock; skipping persistence")
-            else:
-                raise
-        except Exception:
-            session.rollback()
-            raise
-
-        price_points = None
-        if payload.include_price_points:
-            price_points = {
-                sym: [{"timestamp": ts, "price": float(p)} for ts, p in zip(series[0], series[1])]
-                for sym, series in price_cache.items()
-            }
 
         return CopierBacktestResponse(
             summary=summary,
-            trades=trade_slice,
+            trades=trades_all[trades_offset : trades_offset + trades_limit],
             equity_curve=equity_curve,
             price_points=price_points,
             trades_total=total_trades,
@@ -1008,9 +610,140 @@ def run_copier_backtest(payload: CopierBacktestRequest) -> CopierBacktestRespons
         )
 
 
+@router.post("/copier/sweep", response_model=CopierBacktestSweepResponse)
+def run_copier_backtest_sweep(payload: CopierBacktestSweepRequest) -> CopierBacktestSweepResponse:
+    """Backtest a grid of copier parameters over one load of trades and prices, ranked by `rank_by`."""
+    grid = list(
+        itertools.product(
+            payload.leverages,
+            payload.position_size_pcts,
+            payload.fee_bps_values,
+            payload.slippage_bps_values,
+        )
+    )
+    if len(grid) > MAX_SWEEP_COMBINATIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Sweep has {len(grid)} combinations; the maximum is {MAX_SWEEP_COMBINATIONS}",
+        )
+
+    with SessionLocal() as session:
+        whale, _ = _resolve_whale(session, payload.chain, payload.address)
+        asset_filter = {sym.upper() for sym in payload.asset_symbols} if payload.asset_symbols else None
+        trades = _load_copier_trades(
+            session,
+            whale.id,
+            start=payload.start,
+            end=payload.end,
+            asset_filter=asset_filter,
+            max_trades=payload.max_trades,
+        )
+        if not trades:
+            return CopierBacktestSweepResponse(
+                results=[], combinations=len(grid), trades_total=0, rank_by=payload.rank_by
+            )
+
+        initial_deposit = Decimal(payload.initial_deposit_usd)
+        recommended_pct, whale_portfolio_value = _recommended_copy_pct(
+            session, whale.id, initial_deposit, start=payload.start, end=payload.end, asset_filter=asset_filter
+        )
+        assets_used = sorted(asset_filter) if asset_filter else sorted(trade_assets(trades))
+        step_ms = sample_step_ms(trades, sampling=payload.sampling, max_curve_points=payload.max_curve_points)
+        resolution = resolution_for_step(step_ms)
+        price_cache = load_price_cache(session, trades, preload_prices=payload.preload_prices, resolution=resolution)
+        fill_prices = load_fill_prices(session, trades) if resolution != BASE_RESOLUTION else None
+        sim_trades = detach_trades(trades)
+
+        points: list[SweepPoint] = []
+        for leverage_value, pct_value, fee_bps, slippage_bps in grid:
+            leverage = None
+            if leverage_value is not None:
+                leverage = max(Decimal("0.1"), min(Decimal(leverage_value), Decimal("100")))
+            used_pct = float(pct_value) / 100.0 if pct_value is not None else recommended_pct
+            points.append(
+                SweepPoint(
+                    leverage=leverage,
+                    used_pct=max(0.0, min(used_pct, 2.0)),
+                    fee_rate=Decimal(max(fee_bps, 0.0)) / Decimal(10_000),
+                    slippage_rate=Decimal(max(slippage_bps, 0.0)) / Decimal(10_000),
+                )
+            )
+
+        outcomes = run_sweep(
+            sim_trades,
+            price_cache,
+            points,
+            initial_deposit=initial_deposit,
+            whale_portfolio_value=whale_portfolio_value,
+            engine=payload.engine,
+            sampling=payload.sampling,
+            max_curve_points=payload.max_curve_points,
+            fill_prices=fill_prices,
+        )
+
+        rows: list[BacktestSweepResult] = []
+        for (leverage_value, pct_value, fee_bps, slippage_bps), swept in zip(grid, outcomes):
+            summary = _summary_from_outcome(
+                swept.outcome,
+                trades,
+                initial_deposit=initial_deposit,
+                recommended_pct=recommended_pct,
+                used_pct=swept.point.used_pct,
+                assets_used=assets_used,
+                trades_copied=swept.trades_copied,
+            )
+            rows.append(
+                BacktestSweepResult(
+                    rank=0,
+                    leverage=float(swept.point.leverage) if swept.point.leverage is not None else None,
+                    position_size_pct=pct_value,
+                    fee_bps=fee_bps,
+                    slippage_bps=slippage_bps,
+                    summary=summary,
+                )
+            )
+
+        lowest_first = payload.rank_by == "max_drawdown_percent"
+
+        def _rank_key(row: BacktestSweepResult) -> tuple[bool, float]:
+            value = getattr(row.summary, payload.rank_by)
+            if value is None:
+                return True, 0.0
+            return False, value if lowest_first else -value
+
+        rows.sort(key=_rank_key)
+        for idx, row in enumerate(rows, start=1):
+            row.rank = idx
+
+        for row in rows[: payload.persist_top]:
+            run_record = _backtest_run_record(
+                whale.id,
+                row.summary,
+                leverage=Decimal(str(row.leverage)) if row.leverage is not None else None,
+                position_size_pct=row.position_size_pct,
+                initial_deposit=initial_deposit,
+            )
+            if _persist_backtest_run(session, run_record):
+                row.run_id = run_record.id
+
+        return CopierBacktestSweepResponse(
+            results=rows,
+            combinations=len(grid),
+            trades_total=len(trades),
+            rank_by=payload.rank_by,
+        )
+
+
 @router.post("/copier/multi", response_model=MultiWhaleBacktestResponse)
 def run_multi_whale_backtest(payload: MultiWhaleBacktestRequest) -> MultiWhaleBacktestResponse:
+    return _multi_whale_backtest(payload)
+
+
+def _multi_whale_backtest(
+    payload: MultiWhaleBacktestRequest, report: ProgressReporter = no_progress
+) -> MultiWhaleBacktestResponse:
     with SessionLocal() as session:
+        report(2.0, "resolving whales")
         if not payload.addresses:
             raise HTTPException(status_code=400, detail="At least one address is required")
         chain_obj = session.scalar(select(Chain).where(Chain.slug == payload.chain.lower()))
@@ -1032,9 +765,12 @@ def run_multi_whale_backtest(payload: MultiWhaleBacktestRequest) -> MultiWhaleBa
         entry_dirs = {TradeDirection.LONG, TradeDirection.SHORT, TradeDirection.BUY}
         asset_filter = {sym.upper() for sym in payload.asset_symbols} if payload.asset_symbols else None
 
+        # Only the aligned columns are read, streamed in timestamp order so long windows over many
+        # whales never materialize full ORM rows.
         trade_query = (
-            session.query(Trade)
+            session.query(Trade.timestamp, Trade.base_asset, Trade.direction, Trade.value_usd, Trade.whale_id)
             .filter(Trade.whale_id.in_([w.id for w in whales]), Trade.direction.in_(entry_dirs))
+            .filter(Trade.base_asset.isnot(None), Trade.value_usd.isnot(None))
             .order_by(Trade.timestamp.asc(), Trade.id.asc())
         )
         if payload.start:
@@ -1043,7 +779,6 @@ def run_multi_whale_backtest(payload: MultiWhaleBacktestRequest) -> MultiWhaleBa
             trade_query = trade_query.filter(Trade.timestamp <= payload.end)
         if asset_filter:
             trade_query = trade_query.filter(Trade.base_asset.in_(list(asset_filter)))
-        trades = trade_query.all()
 
         initial_deposit = Decimal(payload.initial_deposit_usd)
         used_pct = (
@@ -1060,62 +795,13 @@ def run_multi_whale_backtest(payload: MultiWhaleBacktestRequest) -> MultiWhaleBa
             leverage = Decimal(payload.leverage)
             leverage = max(Decimal("0.1"), min(leverage, Decimal("100")))
 
-        window = timedelta(minutes=payload.align_window_minutes)
-        entries = [
-            (
-                t.timestamp,
-                (t.base_asset or "").upper(),
-                TradeDirection(t.direction) if isinstance(t.direction, str) else t.direction,
-                t.value_usd,
-                t.whale_id,
-            )
-            for t in trades
-            if t.base_asset and t.value_usd is not None
-        ]
-        entries.sort(key=lambda x: x[0])
-
-        signals: list[dict[str, Any]] = []
-        last_signal_time: dict[tuple[str, str], datetime] = {}
-        for i, (ts, asset, direction, value_usd, wid) in enumerate(entries):
-            if not asset:
-                continue
-            dir_sign = TradeDirection.LONG if direction in {TradeDirection.LONG, TradeDirection.BUY} else TradeDirection.SHORT
-            key = (asset, dir_sign.value if hasattr(dir_sign, "value") else str(dir_sign))
-            if key in last_signal_time and (ts - last_signal_time[key]) <= window:
-                continue
-            aligned_ids = {wid}
-            notionals: list[float] = []
-            try:
-                notionals.append(abs(float(value_usd)))
-            except Exception:
-                pass
-            j = i + 1
-            while j < len(entries) and entries[j][0] - ts <= window:
-                ts2, asset2, dir2, val2, wid2 = entries[j]
-                dir2_sign = TradeDirection.LONG if dir2 in {TradeDirection.LONG, TradeDirection.BUY} else TradeDirection.SHORT
-                if asset2 == asset and dir2_sign == dir_sign:
-                    aligned_ids.add(wid2)
-                    try:
-                        notionals.append(abs(float(val2)))
-                    except Exception:
-                        pass
-                j += 1
-            if len(aligned_ids) >= payload.min_whales:
-                notional_avg = sum(notionals) / len(notionals) if notionals else 0.0
-                if notional_avg <= 0:
-                    continue
-                signals.append(
-                    {
-                        "timestamp": ts,
-                        "asset": asset,
-                        "direction": dir_sign,
-                        "notional_usd": notional_avg,
-                        "whales": aligned_ids,
-                    }
-                )
-                last_signal_time[key] = ts
-            if payload.max_trades and len(signals) >= payload.max_trades:
-                break
+        report(5.0, "aligning signals")
+        signals = align_entry_signals(
+            trade_query.yield_per(5000),
+            window=timedelta(minutes=payload.align_window_minutes),
+            min_whales=payload.min_whales,
+            max_signals=payload.max_trades,
+        )
 
         pseudo_trades: list[SimpleNamespace] = []
         for idx, sig in enumerate(signals, start=1):
@@ -1172,6 +858,11 @@ def run_multi_whale_backtest(payload: MultiWhaleBacktestRequest) -> MultiWhaleBa
             asset_filter=asset_filter,
             trades_limit=len(pseudo_trades),
             trades_offset=0,
+            engine=payload.engine,
+            sampling=payload.sampling,
+            max_curve_points=payload.max_curve_points,
+            max_points=payload.max_points,
+            report=report,
         )
 
         return MultiWhaleBacktestResponse(
@@ -1184,6 +875,107 @@ def run_multi_whale_backtest(payload: MultiWhaleBacktestRequest) -> MultiWhaleBa
         )
 
 
+def _submit_job(kind: str, runner: Callable[[ProgressReporter], object]) -> BacktestJobStatus:
+    try:
+        job = backtest_jobs.submit(kind, runner)
+    except BacktestJobQueueFull as exc:
+        raise HTTPException(status_code=429, detail=f"Too many pending backtest jobs: {exc}")
+    return BacktestJobStatus(**job)
+
+
+@router.post("/jobs/copier", response_model=BacktestJobStatus, status_code=202)
+def submit_copier_backtest_job(payload: CopierBacktestRequest) -> BacktestJobStatus:
+    """Queue a copier backtest; poll `/jobs/{job_id}` and page trades from `/jobs/{job_id}/result`."""
+    return _submit_job(
+        "copier",
+        lambda report: _copier_backtest(payload, trades_offset=0, trades_limit=None, report=report),
+    )
+
+
+@router.post("/jobs/multi", response_model=BacktestJobStatus, status_code=202)
+def submit_multi_whale_backtest_job(payload: MultiWhaleBacktestRequest) -> BacktestJobStatus:
+    return _submit_job("multi", lambda report: _multi_whale_backtest(payload, report=report))
+
+
+@router.get("/jobs/{job_id}", response_model=BacktestJobStatus)
+def backtest_job_status(job_id: str) -> BacktestJobStatus:
+    job = backtest_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Backtest job not found")
+    return BacktestJobStatus(**job)
+
+
+@router.get("/jobs/{job_id}/result", response_model=BacktestJobResult)
+def backtest_job_result(
+    job_id: str,
+    trades_offset: int = Query(default=0, ge=0),
+    trades_limit: int = Query(default=50, ge=1, le=500),
+    include_curve: bool = Query(default=True, description="Set false when only paging through trades"),
+) -> BacktestJobResult:
+    job = backtest_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Backtest job not found")
+    result = backtest_jobs.result(job_id)
+    if job["status"] != "done" or result is None:
+        raise HTTPException(status_code=409, detail=f"Backtest job is {job['status']}")
+    return BacktestJobResult(
+        job_id=job_id,
+        kind=job["kind"],
+        summary=result.summary,
+        trades=result.trades[trades_offset : trades_offset + trades_limit],
+        equity_curve=result.equity_curve if include_curve else None,
+        price_points=result.price_points if include_curve else None,
+        trades_total=len(result.trades),
+        trades_limit=trades_limit,
+        trades_offset=trades_offset,
+        signals_total=getattr(result, "signals_total", None),
+    )
+
+
+@router.delete("/jobs/{job_id}", response_model=BacktestJobStatus)
+def cancel_backtest_job(job_id: str) -> BacktestJobStatus:
+    job = backtest_jobs.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Backtest job not found")
+    return BacktestJobStatus(**job)
+
+
+@router.get("/cache/stats", response_model=BacktestCacheStats)
+def backtest_cache_stats() -> BacktestCacheStats:
+    """Hit/miss counters for the copier backtest result cache."""
+    return BacktestCacheStats(**backtest_cache.stats())
+
+
+@router.get("/prices/missing", response_model=PriceCoverageResponse)
+def price_coverage_gaps(
+    asset: str = Query(...),
+    start: datetime = Query(...),
+    end: datetime = Query(...),
+    timeframe: str = Query("1m"),
+) -> PriceCoverageResponse:
+    """Stored and missing candle ranges for one asset, read from the price_coverage index."""
+    if timeframe not in price_coverage.TIMEFRAME_MS:
+        raise HTTPException(status_code=400, detail=f"Unsupported timeframe: {timeframe}")
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    with SessionLocal() as session:
+        covered = price_coverage.covered_intervals(session, asset, start, end, timeframe)
+        missing = price_coverage.missing_ranges(session, asset, start, end, timeframe)
+        session.commit()
+
+    def as_ranges(intervals: list[tuple[int, int]]) -> list[PriceRange]:
+        return [PriceRange(start=lo, end=hi) for lo, hi in (from_epoch_ms(pair, aware=True) for pair in intervals)]
+
+    return PriceCoverageResponse(
+        asset=asset.upper(),
+        timeframe=timeframe,
+        start=start,
+        end=end,
+        covered=as_ranges(covered),
+        missing=as_ranges(missing),
+    )
+
+
 @router.get("/assets", response_model=WhaleAssetsResponse)
 def list_whale_assets(chain: ChainId = Query(...), address: str = Query(...)) -> WhaleAssetsResponse:
     """List distinct assets a whale has traded to build selection UI."""
@@ -6,6 +6,10 @@ from sqlalchemy import func, select, String
 from app.db.session import SessionLocal
 from app.models import Trade, Whale, WalletMetricsDaily, Chain
 from app.schemas.api import DashboardSummary
+from app.services.http_pool import http_pool
+from app.services.hyperliquid_client import info_cache, info_flights, info_rate_limiter
+from app.services.price_prefetch import price_prefetcher
+from app.services.wallet_state import volume_since
 from app.core.time_utils import now
 
 router = APIRouter()
@@ -26,14 +30,7 @@ async def get_dashboard_summary() -> DashboardSummary:
             or 0
         )
 
-        volume_24h = (
-            session.scalar(
-                select(func.coalesce(func.sum(Trade.value_usd), 0)).where(
-                    Trade.timestamp >= active_since
-                )
-            )
-            or 0
-        )
+        volume_24h = volume_since(session, active_since)
 
         hyperliquid_whales = session.scalar(
             select(func.count())
@@ -66,3 +63,22 @@ async def ingestion_status() -> dict:
             "latest_wallet_metrics_daily": str(latest_daily) if latest_daily else None,
             "total_trades": int(session.scalar(select(func.count()).select_from(Trade)) or 0),
         }
+
+
+@router.get("/http-stats")
+async def http_stats() -> dict:
+    """Per-host request counts and latency of the shared outbound HTTP clients."""
+    return http_pool.stats()
+
+
+@router.get("/rate-limits")
+async def rate_limits() -> dict:
+    """Tokens, adaptive rate and per-lane wait times of the shared outbound rate limiters.
+
+    `hyperliquid_info_dedup` shows the /info calls saved by coalescing and the state cache.
+    """
+    return {
+        "hyperliquid_info": info_rate_limiter.snapshot(),
+        "hyperliquid_info_dedup": {"flights": info_flights.stats(), "cache": info_cache.stats()},
+        "binance": price_prefetcher.limiter.snapshot() if price_prefetcher.limiter else None,
+    }
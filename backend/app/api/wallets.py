@@ -30,6 +30,7 @@ from app.schemas.api import (
     WalletMetrics,
     WalletSummary,
 )
+from app.services.dirty_whales import mark_dirty
 from app.services.hyperliquid_client import hyperliquid_client
 from app.services.metrics_service import (
     recompute_wallet_metrics,
@@ -295,6 +296,7 @@ def _sync_hyperliquid_activity(session, whale: Whale, chain_obj: Chain, max_page
         wrote = True
     if wrote:
         recompute_wallet_metrics(session, whale)
+        mark_dirty(session, [whale.id])
         _commit_with_retry(session)
 
 
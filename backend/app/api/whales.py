@@ -6,7 +6,7 @@ from fastapi import APIRouter, Query, HTTPException
 from sqlalchemy import and_, func, or_, select, String, cast, case
 from sqlalchemy.exc import OperationalError
 
-from app.db.session import SessionLocal
+from app.db.session import SessionLocal, commit_with_retry
 from app.models import (
     Chain,
     CurrentWalletMetrics,
@@ -29,9 +29,11 @@ from app.schemas.api import (
 )
 from app.services.backfill_progress import backfill_progress
 from app.services.backfill_service import backfill_wallet_history
+from app.services.dirty_whales import mark_dirty
 from app.services.hyperliquid_client import hyperliquid_client
-from app.services.metrics_service import recompute_wallet_metrics, _commit_with_retry
+from app.services.metrics_service import recompute_wallet_metrics
 from app.services.holdings_service import refresh_holdings_for_whales
+from app.services.wallet_state import clear_wallet_state
 from app.core.time_utils import now
 from app.workers.hyperliquid_ingestor import HyperliquidIngestor
 
@@ -41,7 +43,7 @@ logger = logging.getLogger(__name__)
 
 def _commit_or_503(session, action: str) -> None:
     try:
-        _commit_with_retry(session)
+        commit_with_retry(session)
     except OperationalError as exc:
         session.rollback()
         raise HTTPException(status_code=503, detail=f"{action} unavailable, database is busy") from exc
@@ -211,6 +213,8 @@ async def create_whale(payload: WhaleCreateRequest) -> WhaleSummary:
             labels=labels,
         )
         session.add(whale)
+        session.flush()
+        mark_dirty(session, [whale.id])
         _commit_or_503(session, "create whale")
 
         # Kick off backfill in background thread to avoid blocking the API
@@ -311,11 +315,11 @@ def _run_backfill_sync(whale_id: str) -> None:
         try:
             backfilled = backfill_wallet_history(session, whale, progress_cb=progress_cb)
             # Release locks from ingestion before downstream recompute work.
-            _commit_with_retry(session)
+            commit_with_retry(session)
             if chain and chain.slug != "hyperliquid":
                 refresh_holdings_for_whales(session, [whale])
                 recompute_wallet_metrics(session, whale)
-            _commit_with_retry(session)
+            commit_with_retry(session)
             backfill_progress.finish(
                 whale.id,
                 success=bool(backfilled),
@@ -402,6 +406,8 @@ def _reset_hyperliquid_sync(whale_id: str) -> None:
             session.query(IngestionCheckpoint).filter(IngestionCheckpoint.whale_id == whale.id).delete(
                 synchronize_session=False
             )
+            # Re-imported trades may reuse ids below the old watermark.
+            clear_wallet_state(session, whale.id)
             session.commit()
         except Exception as exc:
             session.rollback()
@@ -33,14 +33,50 @@ class Settings(BaseSettings):
 
     hyperliquid_info_url: str = "https://api.hyperliquid.xyz/info"
     hyperliquid_max_rps: float = Field(default=3.0, alias="HYPERLIQUID_MAX_RPS")
+    # /info budget in Hyperliquid request weight (clearinghouseState=2, fills pages=20+).
+    hyperliquid_info_weight_per_min: float = Field(default=1200.0, alias="HYPERLIQUID_INFO_WEIGHT_PER_MIN")
+    hyperliquid_info_burst: float = Field(default=120.0, alias="HYPERLIQUID_INFO_BURST")
+    # Whales the Hyperliquid ingestor fetches at once per tick; 1 keeps the sequential thread path.
+    hyperliquid_ingest_concurrency: int = Field(default=1, alias="HYPERLIQUID_INGEST_CONCURRENCY")
+    # "poll" or "websocket" (push fills for up to HYPERLIQUID_WS_MAX_SUBSCRIPTIONS / 2 whales, poll the rest)
+    hyperliquid_ingest_mode: str = Field(default="poll", alias="HYPERLIQUID_INGEST_MODE")
+    hyperliquid_ws_url: str = Field(default="wss://api.hyperliquid.xyz/ws", alias="HYPERLIQUID_WS_URL")
+    hyperliquid_ws_max_subscriptions: int = Field(default=20, alias="HYPERLIQUID_WS_MAX_SUBSCRIPTIONS")
     hyperliquid_private_key: str | None = Field(default=None, alias="HYPERLIQUID_PRIVATE_KEY")
     hyperliquid_address: str | None = Field(default=None, alias="HYPERLIQUID_ADDRESS")
     hyperliquid_slippage_pct: float = Field(default=1.0, alias="HYPERLIQUID_SLIPPAGE_PCT")
 
+    # Shared keep-alive HTTP clients (app/services/http_pool.py); HTTP/2 needs the optional h2 package.
+    http_pool_http2: bool = Field(default=True, alias="HTTP_POOL_HTTP2")
+    http_pool_max_connections: int = Field(default=20, alias="HTTP_POOL_MAX_CONNECTIONS")
+    http_pool_max_keepalive: int = Field(default=10, alias="HTTP_POOL_MAX_KEEPALIVE")
+    http_pool_keepalive_expiry: float = Field(default=30.0, alias="HTTP_POOL_KEEPALIVE_EXPIRY")
+
     aws_profile: str | None = Field(default=None, alias="AWS_PROFILE")
 
     coingecko_api_base_url: str = "https://api.coingecko.com/api/v3"
 
+    backtest_sweep_workers: int | None = Field(default=None, alias="BACKTEST_SWEEP_WORKERS")
+    backtest_cache_max_mb: int = Field(default=64, alias="BACKTEST_CACHE_MAX_MB")
+    backtest_cache_dir: str | None = Field(default=None, alias="BACKTEST_CACHE_DIR")
+    price_store_max_mb: int = Field(default=256, alias="PRICE_STORE_MAX_MB")
+    price_archive_dir: str | None = Field(default=None, alias="PRICE_ARCHIVE_DIR")
+    # With an archive configured, price_history keeps only this many days; 0 keeps everything.
+    price_db_retention_days: int = Field(default=0, alias="PRICE_DB_RETENTION_DAYS")
+    price_prefetch_workers: int = Field(default=4, alias="PRICE_PREFETCH_WORKERS")
+    binance_max_rps: float = Field(default=10.0, alias="BINANCE_MAX_RPS")
+    binance_burst: float = Field(default=10.0, alias="BINANCE_BURST")
+    backtest_job_workers: int = Field(default=2, alias="BACKTEST_JOB_WORKERS")
+    backtest_job_retention: int = Field(default=50, alias="BACKTEST_JOB_RETENTION")
+    # Queued plus running jobs accepted before new submissions are refused.
+    backtest_job_max_pending: int = Field(default=20, alias="BACKTEST_JOB_MAX_PENDING")
+    # Scheduled metric / classifier refreshes visit only whales with new activity, plus every
+    # whale this often.
+    dirty_full_sweep_minutes: int = Field(default=60, alias="DIRTY_FULL_SWEEP_MINUTES")
+    # Worker processes for the nightly history rebuild; unset uses one per CPU, 1 runs in-process.
+    # Ignored on SQLite, where the rebuild always runs in-process.
+    history_rebuild_workers: int | None = Field(default=None, alias="HISTORY_REBUILD_WORKERS")
+
     model_config = SettingsConfigDict(
         env_file=PROJECT_ROOT / ".env",
         env_file_encoding="utf-8",
@@ -7,10 +7,15 @@ from apscheduler.executors.pool import ThreadPoolExecutor
 
 from apscheduler.schedulers.background import BackgroundScheduler
 
-from app.db.session import SessionLocal
-from app.models import Chain, Whale
+from app.db.session import SessionLocal, commit_with_retry
+from app.models import Chain
+from app.services.dirty_whales import CLASSIFY_JOB, METRICS_JOB, finish_run, whales_to_process
+from app.services.history_rebuild import rebuild_histories_partitioned
 from app.services.holdings_service import refresh_holdings_for_whales
-from app.services.metrics_service import rebuild_all_portfolio_histories, recompute_wallet_metrics, _commit_with_retry
+from app.services.metrics_service import (
+    recompute_wallet_metrics_batch,
+)
+from app.services.price_service import prune_price_history, retention_cutoff
 from app.services.price_updater import update_prices
 from app.workers.classifier import classifier
 from app.core.time_utils import now
@@ -23,20 +28,25 @@ def _refresh_holdings_and_metrics() -> None:
     logger.info("scheduler: refresh_holdings_and_metrics start")
     try:
         with SessionLocal() as session:
-            whales = session.query(Whale).all()
+            whales, full, marks = whales_to_process(session, METRICS_JOB, started)
             chain_map = {c.id: c for c in session.query(Chain).all()}
             # Hyperliquid whales are updated by the ingestor; skip to avoid redundant /info calls.
             non_hl_whales = [
                 w for w in whales if chain_map.get(w.chain_id) and chain_map[w.chain_id].slug != "hyperliquid"
             ]
             refresh_holdings_for_whales(session, non_hl_whales)
-            for whale in non_hl_whales:
-                recompute_wallet_metrics(session, whale)
-            _commit_with_retry(session)
+            recompute_wallet_metrics_batch(session, non_hl_whales)
+            finish_run(session, METRICS_JOB, started, marks, full)
+            commit_with_retry(session)
     except Exception:
         logger.exception("scheduler: refresh_holdings_and_metrics failed")
         return
-    logger.info("scheduler: refresh_holdings_and_metrics done in %.2fs", (now() - started).total_seconds())
+    logger.info(
+        "scheduler: refresh_holdings_and_metrics done in %.2fs (%d whales, full_sweep=%s)",
+        (now() - started).total_seconds(),
+        len(non_hl_whales),
+        full,
+    )
 
 
 def _rebuild_histories_job() -> None:
@@ -44,22 +54,36 @@ def _rebuild_histories_job() -> None:
     logger.info("scheduler: rebuild_histories start")
     try:
         with SessionLocal() as session:
-            rebuild_all_portfolio_histories(session)
+            partitions = rebuild_histories_partitioned(session)
     except Exception:
         logger.exception("scheduler: rebuild_histories failed")
         return
-    logger.info("scheduler: rebuild_histories done in %.2fs", (now() - started).total_seconds())
+    logger.info(
+        "scheduler: rebuild_histories done in %.2fs (%d partitions, %d whales)",
+        (now() - started).total_seconds(),
+        len(partitions),
+        sum(p.whales for p in partitions),
+    )
 
 
 def _classify_whales() -> None:
     started = now()
     logger.info("scheduler: classify_whales start")
     try:
-        classifier.run()
+        with SessionLocal() as session:
+            whales, full, marks = whales_to_process(session, CLASSIFY_JOB, started)
+            classifier.classify_whales(session, whales)
+            finish_run(session, CLASSIFY_JOB, started, marks, full)
+            commit_with_retry(session)
     except Exception:
         logger.exception("scheduler: classify_whales failed")
         return
-    logger.info("scheduler: classify_whales done in %.2fs", (now() - started).total_seconds())
+    logger.info(
+        "scheduler: classify_whales done in %.2fs (%d whales, full_sweep=%s)",
+        (now() - started).total_seconds(),
+        len(whales),
+        full,
+    )
 
 
 def _update_prices_job() -> None:
@@ -74,6 +98,18 @@ def _update_prices_job() -> None:
     logger.info("scheduler: update_prices done in %.2fs", (now() - started).total_seconds())
 
 
+def _prune_price_history_job() -> None:
+    started = now()
+    logger.info("scheduler: prune_price_history start")
+    try:
+        with SessionLocal() as session:
+            prune_price_history(session)
+    except Exception:
+        logger.exception("scheduler: prune_price_history failed")
+        return
+    logger.info("scheduler: prune_price_history done in %.2fs", (now() - started).total_seconds())
+
+
 def start_scheduler() -> BackgroundScheduler:
     scheduler = BackgroundScheduler(executors={"default": ThreadPoolExecutor(max_workers=5)})
     scheduler.add_job(
@@ -106,6 +142,17 @@ def start_scheduler() -> BackgroundScheduler:
         coalesce=True,
         max_instances=1,
     )
+    if retention_cutoff() is not None:
+        scheduler.add_job(
+            _prune_price_history_job,
+            "cron",
+            hour=4,
+            minute=0,
+            id="prune_price_history",
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1,
+        )
     scheduler.add_job(
         _classify_whales,
         "interval",
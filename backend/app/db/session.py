@@ -1,7 +1,15 @@
+import logging
+import time
+import weakref
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Sequence
 
-from sqlalchemy import create_engine, event
+from sqlalchemy import create_engine, event, func, inspect
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError, PendingRollbackError
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 from app.core.config import settings, PROJECT_ROOT
@@ -66,3 +74,100 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+logger = logging.getLogger(__name__)
+
+# Engines whose derived tables (indexes, rollups) are known to exist, keyed by engine.
+_ready_tables: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+# Dialects where DDL implicitly commits the connection's open transaction.
+_IMPLICIT_DDL_COMMIT = {"mysql", "mariadb"}
+
+
+def ensure_table(session, model) -> bool:
+    """Create `model`'s table if migrations have not been applied, leaving the caller's transaction intact.
+
+    Meant for tables derived from other data, whose writers should degrade rather than fail when
+    the table is missing; returns False (and logs) if it cannot be created.
+    """
+    bind = session.get_bind()
+    name = model.__tablename__
+    if name in _ready_tables.get(bind, ()):
+        return True
+    try:
+        if inspect(session.connection()).has_table(name):
+            _ready_tables.setdefault(bind, set()).add(name)
+        elif bind.dialect.name in _IMPLICIT_DDL_COMMIT:
+            # DDL would commit the caller's half-done work; create the table on its own connection.
+            with bind.engine.begin() as conn:
+                model.__table__.create(conn, checkfirst=True)
+        else:
+            # A savepoint keeps a failed or racing CREATE from aborting the caller's transaction.
+            with session.begin_nested():
+                model.__table__.create(session.connection(), checkfirst=True)
+        return True
+    except Exception as exc:
+        logger.warning("ensure %s table failed: %s", name, exc)
+        return False
+
+
+def commit_with_retry(session, retries: int = 3, delay: float = 0.5) -> None:
+    """Commit, retrying transient OperationalErrors (e.g. SQLite "database is locked")."""
+    for attempt in range(retries):
+        try:
+            session.commit()
+            return
+        except PendingRollbackError:
+            session.rollback()
+            raise
+        except OperationalError:
+            session.rollback()
+            if attempt == retries - 1:
+                raise
+            time.sleep(delay)
+
+
+def upsert_rows(
+    session,
+    model,
+    rows: list[dict],
+    *,
+    keys: Sequence[str],
+    update: Sequence[str] | None = None,
+    keep_existing: Sequence[str] = (),
+    touch_updated_at: bool = False,
+) -> None:
+    """One executemany INSERT .. ON CONFLICT upsert, with a per-row ORM fallback for other dialects.
+
+    `update` columns take the new value (default: every non-key column), `keep_existing` columns
+    keep a non-null stored value and otherwise take the new one.
+    """
+    if not rows:
+        return
+    update = [c for c in rows[0] if c not in keys and c not in keep_existing] if update is None else list(update)
+    bind = session.get_bind()
+    dialect = bind.dialect.name if bind else ""
+    if dialect in {"sqlite", "postgresql", "postgres"}:
+        # Compiled once and executed with every row as a parameter set; a multi-VALUES statement
+        # spends more time compiling than SQLite spends writing.
+        table = model.__table__
+        stmt = sqlite_insert(table) if dialect == "sqlite" else pg_insert(table)
+        set_: dict = {c: stmt.excluded[c] for c in update}
+        set_.update({c: func.coalesce(table.c[c], stmt.excluded[c]) for c in keep_existing})
+        if touch_updated_at:
+            set_["updated_at"] = func.now()
+        session.execute(stmt.on_conflict_do_update(index_elements=list(keys), set_=set_), rows)
+        return
+    for row in rows:
+        existing = session.query(model).filter_by(**{k: row[k] for k in keys}).one_or_none()
+        if existing is None:
+            session.add(model(**row))
+            continue
+        for column in update:
+            setattr(existing, column, row[column])
+        for column in keep_existing:
+            if getattr(existing, column) is None:
+                setattr(existing, column, row[column])
+        if touch_updated_at:
+            existing.updated_at = datetime.now(timezone.utc)
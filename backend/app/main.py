@@ -11,9 +11,12 @@ from app.api import router as api_router
 from app.core.config import settings
 from app.core.scheduler import start_scheduler
 from app.core.time_utils import now
+from app.services.backtest_jobs import backtest_jobs
+from app.services.http_pool import http_pool
 from app.workers.bitcoin_ingestor import BitcoinIngestor
 from app.workers.ethereum_ingestor import EthereumIngestor
 from app.workers.hyperliquid_ingestor import HyperliquidIngestor
+from app.workers.hyperliquid_ws import HyperliquidWsIngestor
 
 
 @asynccontextmanager
@@ -27,7 +30,7 @@ async def lifespan(app: FastAPI) -> Any:  # pragma: no cover - lifecycle wiring
         ingestors = [
             EthereumIngestor(),
             BitcoinIngestor(),
-            HyperliquidIngestor(),
+            HyperliquidWsIngestor() if settings.hyperliquid_ingest_mode == "websocket" else HyperliquidIngestor(),
         ]
         for ingestor in ingestors:
             tasks.append(asyncio.create_task(ingestor.run_forever()))
@@ -35,12 +38,15 @@ async def lifespan(app: FastAPI) -> Any:  # pragma: no cover - lifecycle wiring
     async def _graceful_shutdown() -> None:
         if scheduler:
             scheduler.shutdown(wait=False)
+        backtest_jobs.shutdown()
         for ingestor in ingestors:
             ingestor.stop()
         for task in tasks:
             task.cancel()
         if tasks:
             await asyncio.gather(*tasks, return_exceptions=True)
+        # Close pooled keep-alive connections once nothing is left to use them.
+        await http_pool.aclose()
 
     def _handle_signal() -> None:
         # Schedule cleanup promptly on CTRL+C / SIGTERM
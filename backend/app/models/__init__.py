@@ -3,15 +3,20 @@ from app.db.session import Base
 from app.models.tables import (
     Chain,
     CurrentWalletMetrics,
+    DirtyWhale,
     Event,
     EventType,
     IngestionCheckpoint,
     Holding,
     BacktestRun,
+    PriceCoverage,
     PriceHistory,
+    PriceRollup,
     Trade,
+    TradeDailyAgg,
     TradeDirection,
     TradeSource,
+    WalletAssetState,
     WalletMetricsDaily,
     Whale,
     WhaleType,
@@ -28,9 +33,14 @@ __all__ = [
     "Trade",
     "TradeSource",
     "TradeDirection",
+    "TradeDailyAgg",
+    "WalletAssetState",
+    "DirtyWhale",
     "Event",
     "EventType",
     "PriceHistory",
+    "PriceCoverage",
+    "PriceRollup",
     "IngestionCheckpoint",
     "BacktestRun",
 ]
@@ -156,6 +156,8 @@ class Trade(Base):
         Index("ix_trades_whale_timestamp", "whale_id", "timestamp"),
         Index("ix_trades_chain_timestamp", "chain_id", "timestamp"),
         UniqueConstraint("whale_id", "tx_hash", name="uq_trades_whale_tx_hash"),
+        # Incremental metric folds read a whale's trades past an id watermark.
+        Index("ix_trades_whale_id", "whale_id", "id"),
     )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -176,6 +178,63 @@ class Trade(Base):
     external_url = Column(Text, nullable=True)
 
 
+class WalletAssetState(Base):
+    """Running per-whale, per-asset trade state, folded forward from `last_trade_id`.
+
+    `qty` / `cost_usd` are the average-cost position (NULL until a fill with an amount arrives),
+    `realized_usd` the average-cost gain on reducing fills and `trade_pnl_usd` / `closes` / `wins`
+    the venue-reported PnL. Fills without a base asset are kept under an empty `asset_symbol`.
+    """
+
+    __tablename__ = "wallet_asset_state"
+    __table_args__ = (UniqueConstraint("whale_id", "asset_symbol", name="uq_wallet_asset_state"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    whale_id = Column(String(36), ForeignKey("whales.id", ondelete="CASCADE"), nullable=False)
+    asset_symbol = Column(String(128), nullable=False)
+    qty = Column(Numeric(38, 18), nullable=True)
+    cost_usd = Column(Numeric(38, 18), nullable=True)
+    realized_usd = Column(Numeric(38, 18), nullable=False, default=0)
+    trade_pnl_usd = Column(Numeric(38, 18), nullable=False, default=0)
+    closes = Column(Integer, nullable=False, default=0)
+    wins = Column(Integer, nullable=False, default=0)
+    last_trade_id = Column(Integer, nullable=False, default=0)
+    last_trade_ts = Column(DateTime(timezone=True), nullable=True)
+
+
+class TradeDailyAgg(Base):
+    """Per-day trade totals by whale, base asset ('' when unknown) and direction."""
+
+    __tablename__ = "trade_daily_agg"
+    __table_args__ = (
+        UniqueConstraint("whale_id", "date", "base_asset", "direction", name="uq_trade_daily_agg"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    whale_id = Column(String(36), ForeignKey("whales.id", ondelete="CASCADE"), nullable=False)
+    date = Column(Date, nullable=False)
+    base_asset = Column(String(128), nullable=False)
+    direction = Column(trade_direction_enum, nullable=False)
+    volume_usd = Column(Numeric(30, 10), nullable=False, default=0)
+    trades = Column(Integer, nullable=False, default=0)
+    priced_trades = Column(Integer, nullable=False, default=0)
+    pnl_usd = Column(Numeric(30, 10), nullable=False, default=0)
+    closes = Column(Integer, nullable=False, default=0)
+    wins = Column(Integer, nullable=False, default=0)
+
+
+class DirtyWhale(Base):
+    """Whales with activity a scheduled `job` has not processed yet."""
+
+    __tablename__ = "dirty_whales"
+    __table_args__ = (UniqueConstraint("job", "whale_id", name="uq_dirty_whales_job_whale"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job = Column(String(32), nullable=False)
+    whale_id = Column(String(36), ForeignKey("whales.id", ondelete="CASCADE"), nullable=False)
+    marked_at = Column(DateTime(timezone=True), nullable=False)
+
+
 class Event(Base):
     __tablename__ = "events"
     __table_args__ = (Index("ix_events_timestamp", "timestamp"),)
@@ -204,6 +263,39 @@ class PriceHistory(Base):
     price_usd = Column(Numeric(30, 10), nullable=True)
 
 
+class PriceCoverage(Base):
+    """Contiguous [start_ts, end_ts] ranges of `timeframe` candles present in price_history per asset."""
+
+    __tablename__ = "price_coverage"
+    __table_args__ = (Index("ix_price_coverage_asset_tf_start", "asset_symbol", "timeframe", "start_ts"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    asset_symbol = Column(String(64), nullable=False)
+    timeframe = Column(String(8), nullable=False)
+    start_ts = Column(DateTime(timezone=True), nullable=False)
+    end_ts = Column(DateTime(timezone=True), nullable=False)
+
+
+class PriceRollup(Base):
+    """Coarser price_history resolutions: the latest base price inside each bucket.
+
+    `source_ts` is the timestamp of the base row the price came from, so readers can treat a rollup
+    series as point-in-time observations without looking ahead into the bucket.
+    """
+
+    __tablename__ = "price_rollups"
+    __table_args__ = (
+        UniqueConstraint("asset_symbol", "resolution", "bucket_ts", name="uq_price_rollups_asset_res_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    asset_symbol = Column(String(64), nullable=False)
+    resolution = Column(String(8), nullable=False)
+    bucket_ts = Column(DateTime(timezone=True), nullable=False)
+    source_ts = Column(DateTime(timezone=True), nullable=False)
+    price_usd = Column(Numeric(30, 10), nullable=True)
+
+
 class IngestionCheckpoint(Base, TimestampMixin):
     __tablename__ = "ingestion_checkpoints"
     __table_args__ = (UniqueConstraint("whale_id", name="uq_ingestion_checkpoint_whale"),)
@@ -7,6 +7,8 @@ ChainId = Literal["ethereum", "bitcoin", "hyperliquid"]
 WhaleType = Literal["holder", "trader", "holder_trader"]
 TradeSource = Literal["onchain", "hyperliquid", "exchange_flow"]
 EventType = Literal["large_swap", "large_transfer", "exchange_flow", "perp_trade"]
+BacktestEngine = Literal["decimal", "numpy"]
+BacktestSampling = Literal["clock", "events"]
 
 
 class DashboardSummary(BaseModel):
@@ -218,6 +220,20 @@ class CopierBacktestRequest(BaseModel):
         le=5000,
         description="Optional limit on trades to simulate; defaults to 2000 if not provided",
     )
+    engine: BacktestEngine = Field(
+        default="decimal",
+        description="Simulation engine: exact Decimal replay, or vectorized float64 (faster, ~1e-6 relative tolerance)",
+    )
+    sampling: BacktestSampling = Field(
+        default="clock",
+        description="Equity sampling: fixed minute clock over the whole window, or only trades and price changes",
+    )
+    max_curve_points: int = Field(
+        default=1000,
+        ge=2,
+        le=20000,
+        description="Equity point budget when sampling='events'",
+    )
     trades_limit: int = Field(
         default=50,
         ge=1,
@@ -241,6 +257,12 @@ class CopierBacktestRequest(BaseModel):
         default=False,
         description="Return price points used for marking to avoid re-downloading later",
     )
+    max_points: int | None = Field(
+        default=None,
+        ge=3,
+        le=20000,
+        description="Downsample the equity curve and price points (LTTB) to about this many points each",
+    )
 
 
 class BacktestTradeResult(BaseModel):
@@ -340,6 +362,78 @@ class CopierBacktestResponse(BaseModel):
     trades_offset: int
 
 
+class CopierBacktestSweepRequest(BaseModel):
+    chain: ChainId
+    address: str
+    initial_deposit_usd: float = Field(gt=0, description="Starting capital for every run in the sweep")
+    leverages: list[float | None] = Field(
+        default_factory=lambda: [None],
+        min_length=1,
+        description="Leverage values to try (clamped to 0.1-100); null mirrors the whale",
+    )
+    position_size_pcts: list[float | None] = Field(
+        default_factory=lambda: [None],
+        min_length=1,
+        description="% of whale size values to try (clamped to 0-200); null uses the auto size",
+    )
+    fee_bps_values: list[float] = Field(default_factory=lambda: [5.0], min_length=1, description="Fee bps to try")
+    slippage_bps_values: list[float] = Field(
+        default_factory=lambda: [5.0], min_length=1, description="Slippage bps to try"
+    )
+    rank_by: Literal["roi_percent", "net_pnl_usd", "win_rate_percent", "max_drawdown_percent"] = Field(
+        default="roi_percent",
+        description="Ranking metric; max_drawdown_percent ranks lowest first, the others highest first",
+    )
+    persist_top: int = Field(default=0, ge=0, le=20, description="Persist the best N runs as backtest runs")
+    start: datetime | None = Field(default=None, description="Optional start time filter")
+    end: datetime | None = Field(default=None, description="Optional end time filter")
+    max_trades: int | None = Field(
+        default=2000,
+        ge=1,
+        le=5000,
+        description="Optional limit on trades to simulate; defaults to 2000 if not provided",
+    )
+    engine: BacktestEngine = Field(default="numpy", description="Simulation engine for every run")
+    sampling: BacktestSampling = Field(default="events", description="Equity sampling for every run")
+    max_curve_points: int = Field(default=1000, ge=2, le=20000, description="Equity point budget for events sampling")
+    asset_symbols: list[str] | None = Field(
+        default=None,
+        description="Optional allowlist of asset symbols to include; defaults to all traded assets",
+    )
+    preload_prices: bool = Field(
+        default=True,
+        description="Fetch missing Binance prices for the window once before the sweep",
+    )
+
+
+class BacktestSweepResult(BaseModel):
+    rank: int
+    leverage: float | None
+    position_size_pct: float | None
+    fee_bps: float
+    slippage_bps: float
+    summary: BacktestSummary
+    run_id: int | None = None
+
+
+class CopierBacktestSweepResponse(BaseModel):
+    results: list[BacktestSweepResult]
+    combinations: int
+    trades_total: int
+    rank_by: str
+
+
+class BacktestCacheStats(BaseModel):
+    hits: int
+    disk_hits: int
+    misses: int
+    hit_rate: float
+    memory_entries: int
+    memory_bytes: int
+    max_bytes: int
+    disk_enabled: bool
+
+
 class MultiWhaleBacktestRequest(BaseModel):
     chain: ChainId
     addresses: list[str]
@@ -364,6 +458,20 @@ class MultiWhaleBacktestRequest(BaseModel):
         le=10000,
         description="Optional limit on aligned trades to simulate; defaults to 2000 if not provided",
     )
+    engine: BacktestEngine = Field(
+        default="decimal",
+        description="Simulation engine: exact Decimal replay, or vectorized float64 (faster, ~1e-6 relative tolerance)",
+    )
+    sampling: BacktestSampling = Field(
+        default="clock",
+        description="Equity sampling: fixed minute clock over the whole window, or only trades and price changes",
+    )
+    max_curve_points: int = Field(
+        default=1000,
+        ge=2,
+        le=20000,
+        description="Equity point budget when sampling='events'",
+    )
     asset_symbols: list[str] | None = Field(
         default=None,
         description="Optional allowlist of asset symbols to include; defaults to all traded assets",
@@ -372,6 +480,12 @@ class MultiWhaleBacktestRequest(BaseModel):
         default=False,
         description="Return price points used for marking to avoid re-downloading later",
     )
+    max_points: int | None = Field(
+        default=None,
+        ge=3,
+        le=20000,
+        description="Downsample the equity curve and price points (LTTB) to about this many points each",
+    )
     preload_prices: bool = Field(
         default=True,
         description="Fetch missing Binance prices for the window; set false if prices are already cached.",
@@ -393,5 +507,48 @@ class MultiWhaleBacktestResponse(BaseModel):
     signals_total: int
 
 
+BacktestJobKind = Literal["copier", "multi"]
+
+
+class BacktestJobStatus(BaseModel):
+    job_id: str
+    kind: BacktestJobKind
+    status: Literal["queued", "running", "done", "error", "cancelled"]
+    progress: float
+    message: str | None = None
+    error: str | None = None
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    updated_at: datetime | None = None
+
+
+class BacktestJobResult(BaseModel):
+    job_id: str
+    kind: BacktestJobKind
+    summary: BacktestSummary
+    trades: list[BacktestTradeResult]
+    equity_curve: list[dict] | None = None
+    price_points: dict[str, list[dict]] | None = None
+    trades_total: int
+    trades_limit: int
+    trades_offset: int
+    signals_total: int | None = None
+
+
 class WhaleAssetsResponse(BaseModel):
     assets: list[str]
+
+
+class PriceRange(BaseModel):
+    start: datetime
+    end: datetime
+
+
+class PriceCoverageResponse(BaseModel):
+    asset: str
+    timeframe: str
+    start: datetime
+    end: datetime
+    covered: list[PriceRange]
+    missing: list[PriceRange]
@@ -5,12 +5,13 @@ from typing import Callable
 
 from sqlalchemy.orm import Session
 
+from app.db.session import commit_with_retry
 from app.models import Chain, Whale
 from app.services.metrics_service import (
-    _commit_with_retry,
     recompute_wallet_metrics,
     rebuild_portfolio_history_from_trades,
 )
+from app.services.rate_limiter import Priority, request_priority
 from app.workers.bitcoin_ingestor import BitcoinIngestor
 from app.workers.ethereum_ingestor import EthereumIngestor
 from app.workers.hyperliquid_ingestor import HyperliquidIngestor
@@ -32,22 +33,25 @@ def backfill_wallet_history(session: Session, whale: Whale, progress_cb: Progres
     progress(5.0, "backfill: starting")
     if chain.slug == "bitcoin":
         backfilled = BitcoinIngestor().backfill_whale(session, chain.id, whale, progress_cb=progress_cb)
-        _commit_with_retry(session)
+        commit_with_retry(session)
     elif chain.slug == "ethereum":
         progress(50.0, "backfill: ethereum not implemented; skipping")
         backfilled = EthereumIngestor().backfill_whale(session, chain.id, whale)
-        _commit_with_retry(session)
+        commit_with_retry(session)
     elif chain.slug == "hyperliquid":
         try:
             ingestor = HyperliquidIngestor(poll_interval=300.0)
-            backfilled = ingestor._process_account(session, chain.id, whale, max_pages=50, progress_cb=progress_cb)
-            _commit_with_retry(session)
+            with request_priority(Priority.BACKGROUND):
+                backfilled = ingestor._process_account(
+                    session, chain.id, whale, max_pages=50, progress_cb=progress_cb
+                )
+            commit_with_retry(session)
         except Exception as exc:
             logger.exception("Failed to backfill Hyperliquid whale %s: %s", whale.address, exc)
 
     if backfilled:
         recompute_wallet_metrics(session, whale)
         rebuild_portfolio_history_from_trades(session, whale)
-        _commit_with_retry(session)
+        commit_with_retry(session)
     progress(100.0, "backfill: done" if backfilled else "backfill: completed with no data")
     return backfilled
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import ensure_table
+from app.models import PriceCoverage, PriceHistory, Trade, TradeDirection
+
+logger = logging.getLogger(__name__)
+
+# Bump when simulator semantics change so entries computed by older code stop matching.
+CACHE_VERSION = 3
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, set):
+        return sorted(value)
+    return str(value)
+
+
+def trade_watermark(
+    session: Session,
+    whale_id: str,
+    *,
+    start: datetime | None,
+    end: datetime | None,
+    asset_filter: set[str] | None,
+) -> dict[str, Any]:
+    """Fingerprint of the trades and prices a copier backtest would read.
+
+    Covers per-asset trade count / max id / max timestamp for the filtered trade set and, for the
+    prices over that window, the `price_coverage` ranges and the newest stored timestamp, so new
+    fills or newly fetched prices produce a different cache key without counting price rows.
+    """
+    trade_query = session.query(
+        Trade.base_asset,
+        func.count(Trade.id),
+        func.max(Trade.id),
+        func.min(Trade.timestamp),
+        func.max(Trade.timestamp),
+    ).filter(Trade.whale_id == whale_id, Trade.direction != TradeDirection.DEPOSIT)
+    if start:
+        trade_query = trade_query.filter(Trade.timestamp >= start)
+    if end:
+        trade_query = trade_query.filter(Trade.timestamp <= end)
+    if asset_filter:
+        trade_query = trade_query.filter(Trade.base_asset.in_(list(asset_filter)))
+    trade_rows = trade_query.group_by(Trade.base_asset).order_by(Trade.base_asset).all()
+
+    trades = [[asset, count, max_id, str(max_ts)] for asset, count, max_id, _, max_ts in trade_rows]
+    prices: list[list] = []
+    assets = sorted({(asset or "").upper() for asset, *_ in trade_rows if asset})
+    first_ts = min((row[3] for row in trade_rows if row[3] is not None), default=None)
+    last_ts = max((row[4] for row in trade_rows if row[4] is not None), default=None)
+    if assets and first_ts and last_ts:
+        lo, hi = first_ts - timedelta(minutes=5), last_ts + timedelta(minutes=5)
+        # Candle backfills show up as changed coverage ranges and live ticks (which record no
+        # coverage) as a newer latest point; both are index reads, unlike counting the window.
+        coverage: dict[str, list[list]] = {asset: [] for asset in assets}
+        if ensure_table(session, PriceCoverage):
+            for asset, timeframe, cov_start, cov_end in (
+                session.query(
+                    PriceCoverage.asset_symbol, PriceCoverage.timeframe, PriceCoverage.start_ts, PriceCoverage.end_ts
+                )
+                .filter(PriceCoverage.asset_symbol.in_(assets), PriceCoverage.start_ts <= hi, PriceCoverage.end_ts >= lo)
+                .order_by(PriceCoverage.asset_symbol, PriceCoverage.timeframe, PriceCoverage.start_ts)
+            ):
+                coverage[asset].append([timeframe, str(cov_start), str(cov_end)])
+        for asset in assets:
+            newest = (
+                session.query(PriceHistory.timestamp)
+                .filter(PriceHistory.asset_symbol == asset, PriceHistory.timestamp >= lo, PriceHistory.timestamp <= hi)
+                .order_by(PriceHistory.timestamp.desc())
+                .limit(1)
+                .scalar()
+            )
+            prices.append([asset, str(newest), coverage[asset]])
+    return {"trades": trades, "prices": prices}
+
+
+class BacktestResultCache:
+    """Content-addressed store of finished backtest results.
+
+    Keys are a SHA-256 over the request parameters and a watermark of the data the run read, so new
+    fills or prices simply miss and stale entries age out; nothing has to be invalidated by hand.
+    Entries live in an LRU memory tier capped by their approximate JSON size and, when `directory`
+    is set, as gzipped JSON files on disk that survive restarts.
+    """
+
+    def __init__(
+        self, max_bytes: int = 64 * 1024 * 1024, directory: str | None = None, max_disk_entries: int = 1000
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.max_disk_entries = max_disk_entries
+        self._directory = Path(directory) if directory else None
+        self._memory: OrderedDict[str, tuple[dict, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or self._directory is not None
+
+    def make_key(self, kind: str, params: dict, watermark: Any) -> str:
+        blob = json.dumps(
+            {"v": CACHE_VERSION, "kind": kind, "params": params, "watermark": watermark},
+            sort_keys=True,
+            default=_json_default,
+        )
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+        stored = self._read_disk(key)
+        with self._lock:
+            if stored is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._disk_hits += 1
+            self._remember(key, *stored)
+        return stored[0]
+
+    def put(self, key: str, value: dict) -> None:
+        blob = json.dumps(value, default=_json_default)
+        with self._lock:
+            self._remember(key, value, len(blob))
+        self._write_disk(key, blob)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_enabled": self._directory is not None,
+            }
+
+    def _remember(self, key: str, value: dict, size: int) -> None:
+        # Results larger than the whole memory tier are only kept on disk.
+        if size > self.max_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._memory[key] = (value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._bytes -= evicted_size
+
+    def _path(self, key: str) -> Path | None:
+        return self._directory / f"{key}.json.gz" if self._directory else None
+
+    def _read_disk(self, key: str) -> tuple[dict, int] | None:
+        """The stored value and its JSON size, or None."""
+        path = self._path(key)
+        if path is None or not path.exists():
+            return None
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as fh:
+                blob = fh.read()
+            return json.loads(blob), len(blob)
+        except (OSError, ValueError) as exc:
+            logger.warning("backtest cache read failed for %s: %s", path, exc)
+            return None
+
+    def _write_disk(self, key: str, blob: str) -> None:
+        path = self._path(key)
+        if path is None:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".tmp{os.getpid()}")
+            with gzip.open(tmp, "wt", encoding="utf-8") as fh:
+                fh.write(blob)
+            os.replace(tmp, path)
+            self._prune_disk()
+        except OSError as exc:
+            logger.warning("backtest cache write failed for %s: %s", path, exc)
+
+    def _prune_disk(self) -> None:
+        files = list(self._directory.glob("*.json.gz"))
+        if len(files) <= self.max_disk_entries:
+            return
+        files.sort(key=lambda p: p.stat().st_mtime)
+        for stale in files[: len(files) - self.max_disk_entries]:
+            stale.unlink(missing_ok=True)
+
+
+backtest_cache = BacktestResultCache(
+    max_bytes=settings.backtest_cache_max_mb * 1024 * 1024,
+    directory=settings.backtest_cache_dir,
+)
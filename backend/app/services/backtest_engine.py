@@ -0,0 +1,1038 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Callable, Iterable, Iterator, Sequence
+
+import logging
+import numpy as np
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.db.session import commit_with_retry
+from app.models import TradeDirection
+from app.schemas.api import BacktestTradeResult
+from app.services.backtest_jobs import BacktestJobCancelled
+from app.services.price_coverage import timeframe_ms
+from app.services.price_prefetch import PrefetchIncomplete, price_prefetcher
+from app.services.price_store import BASE_RESOLUTION, PriceSeries, price_store, to_epoch_ms
+
+logger = logging.getLogger(__name__)
+
+CLOSING_DIRS = {
+    TradeDirection.CLOSE_LONG,
+    TradeDirection.CLOSE_SHORT,
+    TradeDirection.SELL,
+    TradeDirection.WITHDRAW,
+}
+ENTRY_DIRS = {TradeDirection.LONG, TradeDirection.SHORT, TradeDirection.BUY}
+LONG_DIRS = {TradeDirection.LONG, TradeDirection.BUY}
+PER_TRADE_CAP_RATIO = Decimal("0.05")  # at most 5% of levered equity per trade
+
+# The float64 engine agrees with the Decimal engine to this relative tolerance on PnL, fees and
+# equity. It follows the same fill rules, but two decisions compare rounded values exactly (an
+# afford-scaled entry's cost against cash, and whether an offset leaves the position at zero), so
+# each engine can settle those on its own last digit.
+NUMPY_ENGINE_RTOL = 1e-6
+
+# Default budget of equity points for event-driven sampling.
+DEFAULT_MAX_CURVE_POINTS = 1000
+
+# A simulation calls its `checkpoint` (which may raise to abort the run) once per this many trades
+# or equity samples.
+CHECKPOINT_EVERY = 1000
+
+# A position cursor steps forward over at most this many prices before bisecting the rest.
+SEEK_STEPS = 8
+
+# How far before a trade `load_fill_prices` looks for its 1m fill price (the marks' window padding).
+FILL_LOOKBACK = timedelta(minutes=5)
+
+# Upper-cased asset symbol -> (epoch-ms timestamps, prices) arrays, copied out of the price store.
+PriceCache = dict[str, PriceSeries]
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MINUTE_US = 60_000_000
+
+
+@dataclass
+class SimulationOutcome:
+    results: list[BacktestTradeResult] = field(default_factory=list)
+    equity_curve: list[dict] = field(default_factory=list)
+    total_fees: float = 0.0
+    total_slippage: float = 0.0
+    gross_pnl: float = 0.0
+    net_pnl: float = 0.0
+    roi_percent: float = 0.0
+    win_rate_percent: float | None = None
+    max_drawdown_percent: float | None = 0.0
+    max_drawdown_usd: float | None = 0.0
+    leverage_used: float | None = None
+
+
+def _direction(trade) -> TradeDirection:
+    direction_raw = getattr(trade, "direction", None)
+    return direction_raw if hasattr(direction_raw, "value") else TradeDirection(str(direction_raw))
+
+
+def _fill_price(trade) -> Decimal | None:
+    try:
+        amount_base = getattr(trade, "amount_base", None)
+        if getattr(trade, "value_usd", None) is not None and amount_base not in (None, 0):
+            return Decimal(abs(trade.value_usd)) / Decimal(abs(amount_base))
+    except Exception:
+        return None
+    return None
+
+
+def _epoch_us(ts: datetime) -> int:
+    """Exact integer microseconds since epoch; naive timestamps are treated as UTC."""
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return (ts - _EPOCH) // timedelta(microseconds=1)
+
+
+def _epoch_us_array(ts_list: Sequence[datetime]) -> np.ndarray:
+    if len(ts_list) and ts_list[0].tzinfo is not None:
+        return np.fromiter((_epoch_us(ts) for ts in ts_list), dtype=np.int64, count=len(ts_list))
+    return np.array(ts_list, dtype="datetime64[us]").astype(np.int64)
+
+
+def _from_epoch_us(values: Iterable[int], *, aware: bool) -> list[datetime]:
+    epoch = _EPOCH if aware else _EPOCH.replace(tzinfo=None)
+    return [epoch + timedelta(microseconds=v) for v in values]
+
+
+def _price_decimal(value: float) -> Decimal:
+    # Shortest repr round-trips the stored Numeric price for any realistic precision.
+    return Decimal(repr(float(value)))
+
+
+def clock_step_minutes(start_ts: datetime, end_ts: datetime) -> int:
+    """Equity sampling step used by the minute clock; coarser for long windows."""
+    delta_minutes = int((end_ts - start_ts).total_seconds() // 60)
+    step_minutes = 1
+    if delta_minutes > 60 * 24 * 60:
+        step_minutes = 5
+    if delta_minutes > 60 * 24 * 180:
+        step_minutes = 15
+    return step_minutes
+
+
+def clock_samples(start_ts: datetime, end_ts: datetime) -> Iterator[tuple[datetime, datetime]]:
+    """(mark_ts, bound) pairs for the minute clock: trades up to the end of each step minute."""
+    step = timedelta(minutes=clock_step_minutes(start_ts, end_ts))
+    ts = start_ts
+    while ts <= end_ts:
+        yield ts, ts.replace(second=59, microsecond=999999)
+        ts += step
+
+
+def _event_sample_us(trades: Sequence, price_cache: PriceCache, max_curve_points: int) -> np.ndarray:
+    trade_us = _epoch_us_array([t.timestamp for t in trades])
+    first_us, last_us = int(trade_us[0]), int(trade_us[-1])
+    parts = [trade_us]
+    for sym in trade_assets(trades):
+        series = price_cache.get(sym)
+        if series is None or not len(series[0]):
+            continue
+        ts_us = series[0] * 1000
+        lo = int(np.searchsorted(ts_us, first_us, side="left"))
+        hi = int(np.searchsorted(ts_us, last_us, side="right"))
+        if hi <= lo:
+            continue
+        px = series[1]
+        prev = np.concatenate(([px[lo - 1] if lo > 0 else np.nan], px[lo : hi - 1]))
+        parts.append(ts_us[lo:hi][px[lo:hi] != prev])
+    times = np.unique(np.concatenate(parts))
+    budget = max(max_curve_points, 2)
+    if len(times) > budget:
+        times = times[np.unique(np.linspace(0, len(times) - 1, budget).round().astype(np.int64))]
+    return times
+
+
+def event_sample_times(trades: Sequence, price_cache: PriceCache, max_curve_points: int) -> list[datetime]:
+    """Equity sample times for event-driven sampling.
+
+    Candidates are the trade timestamps plus every point where a traded asset's price changed
+    inside the trade window. If there are more candidates than `max_curve_points`, they are
+    thinned evenly (keeping the first and last), so cost scales with trades and the requested
+    resolution instead of the wall-clock span. The last trade timestamp is always sampled, so
+    every trade is processed.
+    """
+    if not trades:
+        return []
+    aware = trades[0].timestamp.tzinfo is not None
+    return _from_epoch_us(_event_sample_us(trades, price_cache, max_curve_points).tolist(), aware=aware)
+
+
+def equity_samples(
+    trades: Sequence, price_cache: PriceCache, *, sampling: str, max_curve_points: int
+) -> Iterable[tuple[datetime, datetime]]:
+    """(mark_ts, bound) pairs: trades with timestamp <= bound are applied, then equity is marked at mark_ts."""
+    if not trades:
+        return []
+    if sampling == "events":
+        return [(ts, ts) for ts in event_sample_times(trades, price_cache, max_curve_points)]
+    start_ts = trades[0].timestamp.replace(second=0, microsecond=0)
+    end_ts = trades[-1].timestamp.replace(second=0, microsecond=0)
+    return clock_samples(start_ts, end_ts)
+
+
+def trade_assets(trades: Sequence) -> set[str]:
+    assets = {(getattr(t, "base_asset", None) or "").upper() for t in trades if getattr(t, "base_asset", None)}
+    assets.discard("")
+    return assets
+
+
+def sample_step_ms(trades: Sequence, *, sampling: str, max_curve_points: int) -> int:
+    """Approximate spacing of equity marks, used to choose a price resolution for the window."""
+    if not trades:
+        return _MINUTE_US // 1000
+    start_ts = trades[0].timestamp.replace(second=0, microsecond=0)
+    end_ts = trades[-1].timestamp.replace(second=0, microsecond=0)
+    if sampling == "events":
+        span_ms = int((end_ts - start_ts).total_seconds() * 1000)
+        return max(_MINUTE_US // 1000, span_ms // max(max_curve_points, 2))
+    return clock_step_minutes(start_ts, end_ts) * (_MINUTE_US // 1000)
+
+
+def load_price_cache(
+    session: Session,
+    trades: Sequence,
+    *,
+    preload_prices: bool,
+    resolution: str = BASE_RESOLUTION,
+    checkpoint: Callable[[], None] | None = None,
+    on_preload_failure: Callable[[], None] | None = None,
+) -> PriceCache:
+    """Load (and optionally fetch missing) prices covering the trade window for marking positions.
+
+    `resolution` selects a price_rollups series instead of raw 1m rows; stretches of the window the
+    rollups leave uncovered (a whole asset, or just some buckets) fall back to price_history.
+    `checkpoint` is polled while the preload downloads prices (see `PricePrefetcher.prefetch`), and
+    `on_preload_failure` is called when the preload could not fetch or store everything it missed.
+    """
+    assets = trade_assets(trades)
+    start_ts = trades[0].timestamp.replace(second=0, microsecond=0) if trades else None
+    end_ts = trades[-1].timestamp.replace(second=0, microsecond=0) if trades else None
+    if not assets or not start_ts or not end_ts:
+        return {}
+
+    if preload_prices:
+        complete = True
+        try:
+            try:
+                written = price_prefetcher.prefetch(
+                    session, assets, start_ts - timedelta(minutes=1), end_ts + timedelta(minutes=1), checkpoint=checkpoint
+                )
+            except PrefetchIncomplete as exc:
+                # Keep the ranges that did download; the run just uses fewer prices than it could.
+                logger.warning("price preload incomplete; continuing with the prices fetched: %s", exc)
+                written, complete = exc.written, False
+            if written:
+                session.flush()
+                commit_with_retry(session)
+        except BacktestJobCancelled:
+            session.rollback()
+            raise
+        except OperationalError as exc:
+            session.rollback()
+            complete = False
+            logger.warning("price preload commit failed; continuing without new prices: %s", exc)
+        except Exception as exc:
+            session.rollback()
+            complete = False
+            logger.warning("price preload failed; continuing without new prices: %s", exc)
+        if not complete and on_preload_failure is not None:
+            on_preload_failure()
+
+    window = (start_ts - timedelta(minutes=5), end_ts + timedelta(minutes=5))
+    cache = price_store.load(session, assets, *window, resolution)
+    if resolution == BASE_RESOLUTION:
+        return cache
+    lo_ms, hi_ms = to_epoch_ms(window[0]), to_epoch_ms(window[1])
+    for asset in assets:
+        ts, px = cache.get(asset, (np.empty(0, dtype=np.int64), np.empty(0)))
+        parts = [(ts, px)]
+        for gap_lo, gap_hi in _rollup_gaps(ts, lo_ms, hi_ms, timeframe_ms(resolution)):
+            parts.append(price_store.series(session, asset, _from_ms(gap_lo), _from_ms(gap_hi)))
+        if len(parts) > 1:
+            merged_ts = np.concatenate([p[0] for p in parts])
+            order = np.argsort(merged_ts, kind="stable")
+            if len(order):
+                cache[asset] = (merged_ts[order], np.concatenate([p[1] for p in parts])[order])
+    return cache
+
+
+def _rollup_gaps(ts: np.ndarray, lo_ms: int, hi_ms: int, step_ms: int) -> list[tuple[int, int]]:
+    """Inclusive [lo, hi] ms ranges of [lo_ms, hi_ms] that a rollup series with `step_ms` buckets
+    leaves without a point for longer than one bucket."""
+    edges = np.concatenate([[lo_ms - 1], ts, [hi_ms + 1]]).astype(np.int64)
+    gaps = np.flatnonzero(np.diff(edges) > step_ms)
+    return [(int(edges[i]) + 1, int(edges[i + 1]) - 1) for i in gaps]
+
+
+def _from_ms(ms: int) -> datetime:
+    return _EPOCH + timedelta(milliseconds=ms)
+
+
+def load_fill_prices(session: Session, trades: Sequence) -> PriceCache:
+    """Base-resolution prices to fill `trades` at, when `load_price_cache` returned rollups.
+
+    Each asset is read with one windowed query covering only the FILL_LOOKBACK before each of its
+    trades, and keeps the last 1m price at or before each trade, so a long window marked from
+    rollups does not pull in its whole minute history. Trades with no 1m price inside the lookback
+    fill at the engine's usual fallback.
+    """
+    lookback_ms = FILL_LOOKBACK // timedelta(milliseconds=1)
+    trade_ms: dict[str, list[int]] = {}
+    for t in trades:
+        sym = (getattr(t, "base_asset", None) or "").upper()
+        if sym:
+            trade_ms.setdefault(sym, []).append(to_epoch_ms(t.timestamp))
+    cache: PriceCache = {}
+    for sym, times in trade_ms.items():
+        at_ms = np.unique(np.asarray(times, dtype=np.int64))
+        windows: list[tuple[int, int]] = []
+        for ms in at_ms.tolist():
+            if windows and ms - lookback_ms <= windows[-1][1]:
+                windows[-1] = (windows[-1][0], ms)
+            else:
+                windows.append((ms - lookback_ms, ms))
+        ts, px = price_store.windows(session, sym, windows)
+        idx = np.searchsorted(ts, at_ms, side="right") - 1
+        found = idx >= 0
+        found[found] = ts[idx[found]] >= at_ms[found] - lookback_ms
+        idx = np.unique(idx[found])
+        if len(idx):
+            cache[sym] = (ts[idx], px[idx])
+    return cache
+
+
+def simulate_copy_trades(
+    trades: Sequence,
+    price_cache: PriceCache,
+    *,
+    fill_prices: PriceCache | None = None,
+    initial_deposit: Decimal,
+    used_pct: float,
+    fee_rate: Decimal,
+    slippage_rate: Decimal,
+    leverage: Decimal | None,
+    whale_portfolio_value: Decimal | None = None,
+    engine: str = "decimal",
+    sampling: str = "clock",
+    max_curve_points: int = DEFAULT_MAX_CURVE_POINTS,
+    checkpoint: Callable[[], None] | None = None,
+) -> SimulationOutcome:
+    """Replay trades (ordered by timestamp) against a copier account using the selected engine.
+
+    `sampling="clock"` marks equity on the 1/5/15-minute clock across the whole window;
+    `sampling="events"` marks it only at trade times and price change points (see
+    `event_sample_times`).
+
+    Fills are priced from `fill_prices` when given (see `load_fill_prices`); `price_cache` then
+    only marks open positions, so it may hold coarser rollups. `checkpoint` is called every
+    CHECKPOINT_EVERY trades and samples, so a caller can abort a long run by raising from it.
+    """
+    kwargs = dict(
+        fill_prices=price_cache if fill_prices is None else fill_prices,
+        checkpoint=checkpoint or _no_checkpoint,
+        sampling=sampling,
+        max_curve_points=max_curve_points,
+        initial_deposit=initial_deposit,
+        used_pct=used_pct,
+        fee_rate=fee_rate,
+        slippage_rate=slippage_rate,
+        leverage=leverage,
+        whale_portfolio_value=whale_portfolio_value,
+    )
+    if engine == "numpy":
+        return _simulate_numpy(trades, price_cache, **kwargs)
+    return _simulate_decimal(trades, price_cache, **kwargs)
+
+
+def _no_checkpoint() -> None:
+    return None
+
+
+class _MarkSlot:
+    """Cursor into one held asset's price arrays plus its current unrealized contribution."""
+
+    __slots__ = ("ts", "px", "idx", "cur_ms", "next_ms", "mark", "pnl")
+
+    def __init__(self, ts: np.ndarray, px: np.ndarray) -> None:
+        self.ts = ts
+        self.px = px
+        self.idx = -1
+        self.cur_ms = -(2**63)
+        self.next_ms = -(2**63)
+        self.mark: Decimal | None = None
+        self.pnl = Decimal(0)
+
+    def seek(self, ms: int) -> bool:
+        """Point the cursor at the last price at or before `ms`; True when the mark price changed.
+
+        Forward moves step from the current index and bisect only the rest of the series once a
+        move is longer than `SEEK_STEPS` prices; backward moves try the previous price first.
+        """
+        ts = self.ts
+        n = len(ts)
+        idx = self.idx
+        if ms >= self.cur_ms:
+            stop = min(idx + SEEK_STEPS, n - 1)
+            while idx < stop and ts[idx + 1] <= ms:
+                idx += 1
+            if idx == stop and idx + 1 < n and ts[idx + 1] <= ms:
+                idx += int(np.searchsorted(ts[idx + 1 :], ms, side="right"))
+        elif idx >= 1 and ts[idx - 1] <= ms:
+            idx -= 1
+        else:
+            idx = int(np.searchsorted(ts[:idx], ms, side="right")) - 1
+        old_mark = self.mark
+        self.idx = idx
+        self.cur_ms = int(ts[idx]) if idx >= 0 else -(2**63)
+        self.next_ms = int(ts[idx + 1]) if idx + 1 < n else 2**63
+        if idx < 0:
+            self.mark = None
+        elif old_mark is None or float(self.px[idx]) != float(old_mark):
+            self.mark = _price_decimal(self.px[idx])
+        return self.mark != old_mark
+
+
+class PositionBook:
+    """Open copier positions with aggregate margin and incrementally maintained unrealized PnL.
+
+    Every held asset keeps a cursor into its price arrays, so `mark_to` only re-prices assets whose
+    cursor moved onto a different price since the previous call; everything else is an integer
+    comparison against the cached neighbouring timestamps. Cursors advance by stepping from their
+    current index, and moving backwards in time (the minute clock marks the start of a minute after
+    applying that minute's trades) usually steps back a single price.
+    """
+
+    def __init__(self, price_cache: PriceCache, fill_prices: PriceCache | None = None) -> None:
+        self.positions: dict[str, dict[str, Decimal]] = {}
+        self.margin_total = Decimal(0)
+        self.unrealized = Decimal(0)
+        self._prices = price_cache
+        self._fills = price_cache if fill_prices is None else fill_prices
+        self._ts: datetime | None = None
+        self._ms: int | None = None
+        self._margin: dict[str, Decimal] = {}
+        # Open positions that have a price series, keyed like `positions`.
+        self._marked: dict[str, _MarkSlot] = {}
+
+    def position(self, key: str) -> dict[str, Decimal]:
+        return self.positions.setdefault(key, {"qty": Decimal(0), "avg_price": Decimal(0), "margin": Decimal(0)})
+
+    def price_at(self, sym: str | None, ts: datetime, fallback: Decimal | None) -> Decimal | None:
+        if sym is None:
+            return fallback
+        slot = self._marked.get(sym) if ts == self._ts and self._fills is self._prices else None
+        if slot is not None:
+            return slot.mark if slot.mark is not None else fallback
+        series = self._fills.get(sym)
+        if series is None or not len(series[0]):
+            return fallback
+        idx = int(np.searchsorted(series[0], to_epoch_ms(ts), side="right")) - 1
+        if idx < 0:
+            return fallback
+        return _price_decimal(series[1][idx])
+
+    def mark_to(self, ts: datetime) -> tuple[Decimal, Decimal]:
+        """Revalue open positions at `ts`; returns (unrealized PnL, margin in use)."""
+        ms = to_epoch_ms(ts)
+        self._ts = ts
+        self._ms = ms
+        for key, slot in self._marked.items():
+            if slot.cur_ms <= ms < slot.next_ms:
+                continue
+            if slot.seek(ms):
+                self._set_pnl(key, slot)
+        return self.unrealized, self.margin_total
+
+    def refresh(self, key: str) -> None:
+        """Re-sync aggregates after the position under `key` was modified at the current mark time."""
+        pos = self.positions[key]
+        margin = pos["margin"]
+        self.margin_total += margin - self._margin.get(key, Decimal(0))
+        self._margin[key] = margin
+        series = self._prices.get(key)
+        if pos["qty"] == 0 or series is None or not len(series[0]):
+            slot = self._marked.pop(key, None)
+            if slot is not None:
+                self.unrealized -= slot.pnl
+            if not self._marked:
+                # Flat book: drop rounding residue left by the incremental updates.
+                self.unrealized = Decimal(0)
+            return
+        slot = self._marked.get(key)
+        if slot is None:
+            slot = self._marked[key] = _MarkSlot(series[0], series[1])
+            if self._ms is not None:
+                slot.seek(self._ms)
+        self._set_pnl(key, slot)
+
+    def _set_pnl(self, key: str, slot: _MarkSlot) -> None:
+        pos = self.positions[key]
+        qty = pos["qty"]
+        pnl = Decimal(0)
+        if slot.mark is not None:
+            mark = slot.mark
+            avg = pos["avg_price"]
+            pnl = (mark - avg) * qty if qty > 0 else (avg - mark) * abs(qty)
+        self.unrealized += pnl - slot.pnl
+        slot.pnl = pnl
+
+
+def _simulate_decimal(
+    trades: Sequence,
+    price_cache: PriceCache,
+    *,
+    fill_prices: PriceCache,
+    initial_deposit: Decimal,
+    used_pct: float,
+    fee_rate: Decimal,
+    slippage_rate: Decimal,
+    leverage: Decimal | None,
+    whale_portfolio_value: Decimal | None,
+    sampling: str,
+    max_curve_points: int,
+    checkpoint: Callable[[], None],
+) -> SimulationOutcome:
+    def _derive_trade_leverage(trade_notional: Decimal) -> Decimal:
+        if leverage is not None and leverage > 0:
+            return leverage
+        if whale_portfolio_value is not None and whale_portfolio_value > 0 and trade_notional > 0:
+            derived = trade_notional / whale_portfolio_value
+            return max(Decimal("0.1"), min(derived, Decimal("100")))
+        return Decimal(1)
+
+    book = PositionBook(price_cache, fill_prices)
+    cash = initial_deposit
+    cumulative_net = Decimal(0)
+    total_fees = Decimal(0)
+    total_slippage = Decimal(0)
+    gross_pnl = Decimal(0)
+    wins = 0
+    closing_count = 0
+    results: list[BacktestTradeResult] = []
+    equity_curve: list[dict] = []
+    used_leverages: list[Decimal] = []
+
+    def _compute_drawdown(curve: list[dict]) -> tuple[Decimal, Decimal]:
+        if not curve:
+            return Decimal(0), Decimal(0)
+        peak = Decimal(curve[0]["equity_usd"])
+        max_dd = Decimal(0)
+        max_dd_usd = Decimal(0)
+        for point in curve:
+            eq = Decimal(point["equity_usd"])
+            if eq > peak:
+                peak = eq
+            drawdown_abs = peak - eq
+            dd_ratio = drawdown_abs / peak if peak > 0 else Decimal(0)
+            if dd_ratio > max_dd:
+                max_dd = dd_ratio
+                max_dd_usd = drawdown_abs
+        return max_dd, max_dd_usd
+
+    current_idx = 0
+    trade_count = len(trades)
+    trade_items = list(trades)
+
+    def _record_equity(ts: datetime) -> None:
+        unreal, margin_total = book.mark_to(ts)
+        equity = cash + margin_total + unreal
+        equity_curve.append(
+            {"timestamp": ts, "equity_usd": float(equity), "unrealized_pnl_usd": float(unreal)}
+        )
+
+    # walk the sample points and process trades that occur at or before each one
+    if trades:
+        samples = equity_samples(trades, price_cache, sampling=sampling, max_curve_points=max_curve_points)
+        for sample_idx, (mark_ts, bound) in enumerate(samples):
+            if sample_idx % CHECKPOINT_EVERY == 0:
+                checkpoint()
+            while current_idx < trade_count and trade_items[current_idx].timestamp <= bound:
+                t = trade_items[current_idx]
+                current_idx += 1
+                if current_idx % CHECKPOINT_EVERY == 0:
+                    checkpoint()
+                direction = _direction(t)
+                notional = Decimal(abs(getattr(t, "value_usd", 0) or 0))
+                scale = Decimal(used_pct)
+                trade_leverage = _derive_trade_leverage(notional)
+                used_leverages.append(trade_leverage)
+                current_unreal, current_margin = book.mark_to(t.timestamp)
+                equity_now = cash + current_margin + current_unreal
+                desired_notional = notional * scale
+                if direction in CLOSING_DIRS:
+                    # Allow closes even when cash is depleted; position size will cap the executed notional.
+                    user_notional = desired_notional
+                else:
+                    # Cap exposure by available equity * leverage; also per-trade cap to preserve dry powder
+                    max_notional_overall = equity_now * trade_leverage
+                    max_notional_per_trade = max_notional_overall * PER_TRADE_CAP_RATIO
+                    user_notional = min(desired_notional, max_notional_per_trade) if max_notional_overall > 0 else Decimal(0)
+                if user_notional <= 0:
+                    continue
+                sym_key = (getattr(t, "base_asset", None) or "").upper() or None
+                price = book.price_at(sym_key, t.timestamp, _fill_price(t))
+                if price is None or price <= 0:
+                    continue
+                base_label = getattr(t, "base_asset", None) or "UNKNOWN"
+                pos_key = sym_key or base_label
+                pos = book.position(pos_key)
+
+                net_change = Decimal(0)
+                pnl = Decimal(0)
+                executed_notional = user_notional
+                fee = Decimal(0)
+                slip = Decimal(0)
+
+                if direction in ENTRY_DIRS:
+                    fee = user_notional * fee_rate
+                    slip = user_notional * slippage_rate
+                    # adjust size if we can't afford margin + costs
+                    eff_leverage = trade_leverage if trade_leverage > 0 else Decimal(1)
+                    margin_required = user_notional / eff_leverage
+                    total_cost = margin_required + fee + slip
+                    if total_cost > cash:
+                        afford_scale = cash / total_cost if total_cost > 0 else Decimal(0)
+                        user_notional *= afford_scale
+                        fee = user_notional * fee_rate
+                        slip = user_notional * slippage_rate
+                        margin_required = user_notional / eff_leverage
+                        total_cost = margin_required + fee + slip
+                        if user_notional <= 0 or total_cost > cash:
+                            continue
+                    executed_notional = user_notional
+                    total_fees += fee
+                    total_slippage += slip
+
+                    qty = user_notional / price
+                    signed_qty = qty if direction in LONG_DIRS else -qty
+                    if signed_qty != 0:
+                        new_qty = pos["qty"] + signed_qty
+                        if new_qty == 0:
+                            pos["qty"] = Decimal(0)
+                            pos["avg_price"] = Decimal(0)
+                            pos["margin"] = Decimal(0)
+                        else:
+                            existing_cost = pos["avg_price"] * pos["qty"]
+                            added_cost = price * signed_qty
+                            pos["qty"] = new_qty
+                            pos["avg_price"] = (existing_cost + added_cost) / new_qty
+                            pos["margin"] += margin_required
+                        book.refresh(pos_key)
+                    # pay margin + costs
+                    cash -= (margin_required + fee + slip)
+                    net_change -= (fee + slip)
+                elif direction in CLOSING_DIRS:
+                    pos_qty = pos["qty"]
+                    if pos_qty == 0:
+                        continue
+                    qty = user_notional / price
+                    close_qty = min(abs(qty), abs(pos_qty))
+                    if close_qty <= 0:
+                        continue
+                    executed_notional = close_qty * price
+                    fee = executed_notional * fee_rate
+                    slip = executed_notional * slippage_rate
+                    total_fees += fee
+                    total_slippage += slip
+                    signed_close = close_qty if pos_qty > 0 else -close_qty
+                    avg = pos["avg_price"]
+                    pnl = (price - avg) * signed_close if pos_qty > 0 else (avg - price) * abs(signed_close)
+                    margin_release = pos["margin"] * (close_qty / abs(pos_qty)) if pos["margin"] else Decimal(0)
+                    pos["qty"] = pos_qty - signed_close
+                    if pos["qty"] == 0:
+                        pos["avg_price"] = Decimal(0)
+                        pos["margin"] = Decimal(0)
+                    else:
+                        pos["margin"] -= margin_release
+                    book.refresh(pos_key)
+                    net = pnl - fee - slip
+                    gross_pnl += pnl
+                    net_change += net
+                    cash += margin_release + net
+                    closing_count += 1
+                    if net > 0:
+                        wins += 1
+                else:
+                    continue
+
+                unreal, margin_total = book.mark_to(t.timestamp)
+                equity = cash + margin_total + unreal
+                cumulative_net = equity - initial_deposit
+                results.append(
+                    BacktestTradeResult(
+                        id=getattr(t, "id", None) or current_idx,
+                        timestamp=t.timestamp,
+                        direction=str(direction.value if hasattr(direction, "value") else direction),
+                        base_asset=getattr(t, "base_asset", None),
+                        notional_usd=float(executed_notional),
+                        pnl_usd=float(pnl),
+                        fee_usd=float(fee),
+                        slippage_usd=float(slip),
+                        net_pnl_usd=float(net_change if net_change != 0 else (pnl - fee - slip)),
+                        cumulative_pnl_usd=float(cumulative_net),
+                        equity_usd=float(equity),
+                        unrealized_pnl_usd=float(unreal),
+                        position_size_base=float(pos["qty"]) if pos["qty"] is not None else None,
+                    )
+                )
+
+            _record_equity(mark_ts)
+
+    # Ensure at least one equity point if trades existed
+    if not equity_curve and trades:
+        _record_equity(trades[-1].timestamp)
+
+    max_dd_ratio, max_dd_usd = _compute_drawdown(equity_curve)
+    return SimulationOutcome(
+        results=results,
+        equity_curve=equity_curve,
+        total_fees=float(total_fees),
+        total_slippage=float(total_slippage),
+        gross_pnl=float(gross_pnl),
+        net_pnl=float(cumulative_net),
+        roi_percent=float(cumulative_net / initial_deposit * Decimal(100)) if initial_deposit > 0 else 0.0,
+        win_rate_percent=float(wins) / float(closing_count) * 100 if closing_count > 0 else None,
+        max_drawdown_percent=float(max_dd_ratio * Decimal(100)),
+        max_drawdown_usd=float(max_dd_usd),
+        leverage_used=(
+            float(leverage)
+            if leverage is not None
+            else float(sum(used_leverages) / len(used_leverages))
+            if used_leverages
+            else None
+        ),
+    )
+
+
+def _series_arrays(price_cache: PriceCache) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+    return {sym: (ts_ms * 1000, px) for sym, (ts_ms, px) in price_cache.items()}
+
+
+def _marks_at(series: tuple[np.ndarray, np.ndarray] | None, at_us: np.ndarray) -> np.ndarray:
+    """Last known price at each timestamp (NaN before the series starts or when it is missing)."""
+    if series is None or len(series[0]) == 0:
+        return np.full(len(at_us), np.nan)
+    ts_arr, px_arr = series
+    idx = np.searchsorted(ts_arr, at_us, side="right") - 1
+    return np.where(idx >= 0, px_arr[np.clip(idx, 0, None)], np.nan)
+
+
+def _stack_series(
+    series: dict[str, tuple[np.ndarray, np.ndarray]], asset_keys: Sequence[str], lo_us: int, hi_us: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, int, int]:
+    """Every asset's series in one array keyed by `asset * span + ms`, for `_stacked_marks`.
+
+    `lo_us`/`hi_us` bound the timestamps that will be looked up. A leading NaN sentinel keeps every
+    search result a valid index.
+    """
+    parts = [series[sym][0] // 1000 if sym in series else np.empty(0, dtype=np.int64) for sym in asset_keys]
+    lo_ms = min([lo_us // 1000] + [int(ts[0]) for ts in parts if len(ts)])
+    span = max([hi_us // 1000] + [int(ts[-1]) for ts in parts if len(ts)]) - lo_ms + 1
+    keys = np.concatenate([[-1]] + [a * span + (ts - lo_ms) for a, ts in enumerate(parts)]).astype(np.int64)
+    px = np.concatenate([[np.nan]] + [series[sym][1] for sym in asset_keys if sym in series]).astype(np.float64)
+    starts = 1 + np.concatenate([[0], np.cumsum([len(ts) for ts in parts])[:-1]]).astype(np.int64)
+    return keys, px, starts, span, lo_ms
+
+
+def _stacked_marks(
+    stack: tuple[np.ndarray, np.ndarray, np.ndarray, int, int], assets: np.ndarray, at_us: int
+) -> np.ndarray:
+    """Last known price of each of `assets` at `at_us` (NaN before its series starts), in one search."""
+    keys, px, starts, span, lo_ms = stack
+    idx = keys.searchsorted(assets * span + (at_us // 1000 - lo_ms), side="right") - 1
+    marks = px[idx]
+    marks[idx < starts[assets]] = np.nan
+    return marks
+
+
+def _max_drawdown(equity: np.ndarray) -> tuple[float, float]:
+    if len(equity) == 0:
+        return 0.0, 0.0
+    peak = np.maximum.accumulate(equity)
+    drawdown_abs = peak - equity
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(peak > 0, drawdown_abs / peak, 0.0)
+    worst = int(np.argmax(ratio))
+    if ratio[worst] <= 0:
+        return 0.0, 0.0
+    return float(ratio[worst]), float(drawdown_abs[worst])
+
+
+def _simulate_numpy(
+    trades: Sequence,
+    price_cache: PriceCache,
+    *,
+    fill_prices: PriceCache,
+    initial_deposit: Decimal,
+    used_pct: float,
+    fee_rate: Decimal,
+    slippage_rate: Decimal,
+    leverage: Decimal | None,
+    whale_portfolio_value: Decimal | None,
+    sampling: str,
+    max_curve_points: int,
+    checkpoint: Callable[[], None],
+) -> SimulationOutcome:
+    """Float64 port of the Decimal engine.
+
+    Trades are still applied one by one (each fill depends on the cash and equity left by the
+    previous one), but against flat float arrays. Each trade records the new quantity and entry of
+    the one asset it changed, so the equity curve can be evaluated for the whole clock with
+    per-asset `searchsorted` and array arithmetic instead of revaluing the book at every step.
+    """
+    if not trades:
+        return SimulationOutcome()
+    sample_times: list[datetime] | None = None
+    if sampling == "events":
+        grid_us = _event_sample_us(trades, price_cache, max_curve_points)
+        sample_times = _from_epoch_us(grid_us.tolist(), aware=trades[0].timestamp.tzinfo is not None)
+        bounds_us = grid_us
+    else:
+        start_ts = trades[0].timestamp.replace(second=0, microsecond=0)
+        end_ts = trades[-1].timestamp.replace(second=0, microsecond=0)
+        step_us = clock_step_minutes(start_ts, end_ts) * _MINUTE_US
+        start_us = _epoch_us(start_ts)
+        grid_offsets = np.arange((_epoch_us(end_ts) - start_us) // step_us + 1, dtype=np.int64) * step_us
+        grid_us = start_us + grid_offsets
+        # Trades after the last clock minute are never reached by the clock.
+        bounds_us = grid_us + (_MINUTE_US - 1)
+    n_steps = len(grid_us)
+
+    trade_us = _epoch_us_array([t.timestamp for t in trades])
+    n_proc = int(np.searchsorted(trade_us, bounds_us[-1], side="right"))
+
+    asset_index: dict[str, int] = {}
+    trade_asset = np.zeros(n_proc, dtype=np.int64)
+    trade_sym: list[str | None] = []
+    for j in range(n_proc):
+        t = trades[j]
+        sym_key = (getattr(t, "base_asset", None) or "").upper() or None
+        pos_key = sym_key or getattr(t, "base_asset", None) or "UNKNOWN"
+        trade_asset[j] = asset_index.setdefault(pos_key, len(asset_index))
+        trade_sym.append(sym_key)
+    asset_keys = list(asset_index)
+    n_assets = len(asset_keys)
+
+    series = _series_arrays({sym: price_cache[sym] for sym in asset_keys if sym in price_cache})
+    # Indices of each asset's own trades, in trade order.
+    order = np.argsort(trade_asset, kind="stable")
+    asset_trades = np.split(order, np.cumsum(np.bincount(trade_asset, minlength=n_assets))[:-1])
+    # Mark of the traded asset at each trade.
+    own_marks = np.full(n_proc, np.nan)
+    for a, sym in enumerate(asset_keys):
+        own_marks[asset_trades[a]] = _marks_at(series.get(sym), trade_us[asset_trades[a]])
+    if fill_prices is price_cache:
+        fills_at_trades = own_marks
+    else:
+        fills_at_trades = np.full(n_proc, np.nan)
+        for a, sym in enumerate(asset_keys):
+            if sym in fill_prices and len(asset_trades[a]):
+                fill_ts, fill_px = fill_prices[sym]
+                own = asset_trades[a]
+                fills_at_trades[own] = _marks_at((fill_ts * 1000, fill_px), trade_us[own])
+
+    init = float(initial_deposit)
+    fee_r = float(fee_rate)
+    slip_r = float(slippage_rate)
+    scale = float(used_pct)
+    lev_fixed = float(leverage) if leverage is not None and leverage > 0 else None
+    whale_value = float(whale_portfolio_value) if whale_portfolio_value is not None else None
+    cap_ratio = float(PER_TRADE_CAP_RATIO)
+
+    qty = np.zeros(n_assets)
+    avg = np.zeros(n_assets)
+    margin = np.zeros(n_assets)
+    # Quantity and entry of the traded asset after each trade.
+    qty_after = np.zeros(n_proc)
+    avg_after = np.zeros(n_proc)
+    base_hist = np.empty(n_proc + 1)
+    base_hist[0] = init
+    cash = init
+    cumulative_net = 0.0
+    total_fees = 0.0
+    total_slippage = 0.0
+    gross_pnl = 0.0
+    wins = 0
+    closing_count = 0
+    leverage_sum = 0.0
+    results: list[BacktestTradeResult] = []
+
+    # Held assets are marked at each trade with one search over all series stacked together.
+    stack = _stack_series(series, asset_keys, int(trade_us[0]), int(trade_us[n_proc - 1]) if n_proc else 0)
+
+    def _unrealized(j: int) -> float:
+        held = np.flatnonzero(qty)
+        if not len(held):
+            return 0.0
+        contrib = (_stacked_marks(stack, held, int(trade_us[j])) - avg[held]) * qty[held]
+        return float(np.sum(contrib[~np.isnan(contrib)]))
+
+    for j in range(n_proc):
+        if j % CHECKPOINT_EVERY == 0:
+            checkpoint()
+        t = trades[j]
+        a = trade_asset[j]
+        direction = _direction(t)
+        notional = abs(float(getattr(t, "value_usd", 0) or 0))
+        if lev_fixed is not None:
+            trade_leverage = lev_fixed
+        elif whale_value is not None and whale_value > 0 and notional > 0:
+            trade_leverage = max(0.1, min(notional / whale_value, 100.0))
+        else:
+            trade_leverage = 1.0
+        leverage_sum += trade_leverage
+
+        processed = False
+        desired_notional = notional * scale
+        if direction in CLOSING_DIRS:
+            user_notional = desired_notional
+        else:
+            equity_now = cash + float(margin.sum()) + _unrealized(j)
+            max_notional_overall = equity_now * trade_leverage
+            user_notional = min(desired_notional, max_notional_overall * cap_ratio) if max_notional_overall > 0 else 0.0
+        price: float | None = None
+        if user_notional > 0:
+            mark = fills_at_trades[j] if trade_sym[j] is not None else np.nan
+            if not np.isnan(mark):
+                price = float(mark)
+            else:
+                fill_price = _fill_price(t)
+                price = float(fill_price) if fill_price is not None else None
+
+        pnl = fee = slip = net_change = 0.0
+        executed_notional = user_notional
+        if price is not None and price > 0 and user_notional > 0:
+            if direction in ENTRY_DIRS:
+                # Same steps, in the same order, as the Decimal engine, so both take the same fills.
+                eff_leverage = trade_leverage if trade_leverage > 0 else 1.0
+                fee = user_notional * fee_r
+                slip = user_notional * slip_r
+                margin_required = user_notional / eff_leverage
+                total_cost = margin_required + fee + slip
+                processed = True
+                if total_cost > cash:
+                    afford_scale = cash / total_cost if total_cost > 0 else 0.0
+                    user_notional *= afford_scale
+                    fee = user_notional * fee_r
+                    slip = user_notional * slip_r
+                    margin_required = user_notional / eff_leverage
+                    total_cost = margin_required + fee + slip
+                    processed = user_notional > 0 and total_cost <= cash
+                if processed:
+                    executed_notional = user_notional
+                    total_fees += fee
+                    total_slippage += slip
+                    signed_qty = user_notional / price if direction in LONG_DIRS else -user_notional / price
+                    if signed_qty != 0:
+                        new_qty = qty[a] + signed_qty
+                        if new_qty == 0:
+                            qty[a] = avg[a] = margin[a] = 0.0
+                        else:
+                            avg[a] = (avg[a] * qty[a] + price * signed_qty) / new_qty
+                            qty[a] = new_qty
+                            margin[a] += margin_required
+                    cash -= margin_required + fee + slip
+                    net_change = -(fee + slip)
+            elif direction in CLOSING_DIRS and qty[a] != 0:
+                pos_qty = float(qty[a])
+                close_qty = min(user_notional / price, abs(pos_qty))
+                if close_qty > 0:
+                    processed = True
+                    executed_notional = close_qty * price
+                    fee = executed_notional * fee_r
+                    slip = executed_notional * slip_r
+                    total_fees += fee
+                    total_slippage += slip
+                    entry = float(avg[a])
+                    pnl = (price - entry) * close_qty if pos_qty > 0 else (entry - price) * close_qty
+                    margin_release = margin[a] * (close_qty / abs(pos_qty)) if margin[a] else 0.0
+                    qty[a] = pos_qty - (close_qty if pos_qty > 0 else -close_qty)
+                    if qty[a] == 0:
+                        avg[a] = margin[a] = 0.0
+                    else:
+                        margin[a] -= margin_release
+                    net = pnl - fee - slip
+                    gross_pnl += pnl
+                    net_change = net
+                    cash += margin_release + net
+                    closing_count += 1
+                    if net > 0:
+                        wins += 1
+
+        if processed:
+            unreal = _unrealized(j)
+            equity = cash + float(margin.sum()) + unreal
+            cumulative_net = equity - init
+            results.append(
+                BacktestTradeResult(
+                    id=getattr(t, "id", None) or j + 1,
+                    timestamp=t.timestamp,
+                    direction=str(direction.value),
+                    base_asset=getattr(t, "base_asset", None),
+                    notional_usd=executed_notional,
+                    pnl_usd=pnl,
+                    fee_usd=fee,
+                    slippage_usd=slip,
+                    net_pnl_usd=net_change if net_change != 0 else pnl - fee - slip,
+                    cumulative_pnl_usd=cumulative_net,
+                    equity_usd=equity,
+                    unrealized_pnl_usd=unreal,
+                    position_size_base=float(qty[a]),
+                )
+            )
+        qty_after[j] = qty[a]
+        avg_after[j] = avg[a]
+        base_hist[j + 1] = cash + float(margin.sum())
+
+    # Equity at every clock step: state after all trades up to the end of that minute, marked at
+    # the start of the minute. Each asset's state at a step comes from its latest trade by then.
+    state_idx = np.searchsorted(trade_us[:n_proc], bounds_us, side="right")
+    unrealized = np.zeros(n_steps)
+    held_assets = [a for a in range(n_assets) if np.any(qty_after[asset_trades[a]] != 0)]
+    chunk = 1_000_000
+    for lo in range(0, n_steps, chunk):
+        checkpoint()
+        hi = min(lo + chunk, n_steps)
+        for a in held_assets:
+            own = asset_trades[a]
+            last = np.searchsorted(own, state_idx[lo:hi], side="left") - 1
+            traded = last >= 0
+            last_trade = own[np.clip(last, 0, None)]
+            qty_a = np.where(traded, qty_after[last_trade], 0.0)
+            avg_a = np.where(traded, avg_after[last_trade], 0.0)
+            contrib = (_marks_at(series.get(asset_keys[a]), grid_us[lo:hi]) - avg_a) * qty_a
+            unrealized[lo:hi] += np.where(np.isnan(contrib), 0.0, contrib)
+    equity = base_hist[state_idx] + unrealized
+
+    if sample_times is None:
+        sample_times = [start_ts + timedelta(microseconds=off) for off in grid_offsets.tolist()]
+    equity_curve = [
+        {"timestamp": ts, "equity_usd": eq, "unrealized_pnl_usd": un}
+        for ts, eq, un in zip(sample_times, equity.tolist(), unrealized.tolist())
+    ]
+    max_dd_ratio, max_dd_usd = _max_drawdown(equity)
+    return SimulationOutcome(
+        results=results,
+        equity_curve=equity_curve,
+        total_fees=total_fees,
+        total_slippage=total_slippage,
+        gross_pnl=gross_pnl,
+        net_pnl=cumulative_net,
+        roi_percent=cumulative_net / init * 100 if init > 0 else 0.0,
+        win_rate_percent=float(wins) / float(closing_count) * 100 if closing_count > 0 else None,
+        max_drawdown_percent=max_dd_ratio * 100,
+        max_drawdown_usd=max_dd_usd,
+        leverage_used=(
+            float(leverage) if leverage is not None else leverage_sum / n_proc if n_proc else None
+        ),
+    )
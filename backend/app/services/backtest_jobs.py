@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = {"done", "error", "cancelled"}
+
+# Progress callback handed to job runners: report(progress_percent, message). It raises
+# BacktestJobCancelled once the job was cancelled, so every report is also a cancellation point.
+ProgressReporter = Callable[[float | None, str | None], None]
+
+
+class BacktestJobCancelled(Exception):
+    """Raised inside a job runner when the job was cancelled."""
+
+
+class BacktestJobQueueFull(Exception):
+    """Raised by `submit` when `max_pending` jobs are already queued or running."""
+
+
+def no_progress(progress: float | None = None, message: str | None = None) -> None:
+    return None
+
+
+class BacktestJobManager:
+    """Runs backtests on a bounded thread pool and keeps their status and results in memory.
+
+    Status entries mirror `BackfillProgressTracker` (status / progress / message / updated_at)
+    with `queued` and `cancelled` added. Cancellation is cooperative: queued jobs never start and
+    running jobs stop at their next progress report; long stages (price preloads, simulations)
+    also poll `report(None, None)` while they run. At most `max_pending` jobs may be queued or
+    running at once, since each holds its trades and closures until it finishes. The most recent
+    `max_retained` finished jobs keep their results so clients can page through them without
+    re-simulating.
+    """
+
+    def __init__(self, max_workers: int = 2, max_retained: int = 50, max_pending: int = 20) -> None:
+        self.max_workers = max(1, max_workers)
+        self.max_retained = max(1, max_retained)
+        self.max_pending = max(1, max_pending)
+        self._lock = threading.Lock()
+        self._jobs: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._results: dict[str, Any] = {}
+        self._cancel: dict[str, threading.Event] = {}
+        self._futures: dict[str, Future] = {}
+        self._pool: ThreadPoolExecutor | None = None
+
+    def submit(self, kind: str, runner: Callable[[ProgressReporter], Any]) -> dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            if len(self._futures) >= self.max_pending:
+                raise BacktestJobQueueFull(f"{len(self._futures)} backtest jobs already pending")
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "kind": kind,
+                "status": "queued",
+                "progress": 0.0,
+                "message": "queued",
+                "error": None,
+                "created_at": now,
+                "started_at": None,
+                "finished_at": None,
+                "updated_at": now,
+            }
+            self._cancel[job_id] = threading.Event()
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="backtest-job")
+            self._futures[job_id] = self._pool.submit(self._run, job_id, runner)
+            snapshot = dict(self._jobs[job_id])
+        return snapshot
+
+    def get(self, job_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            return dict(entry) if entry else None
+
+    def result(self, job_id: str) -> Any | None:
+        with self._lock:
+            return self._results.get(job_id)
+
+    def cancel(self, job_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if not entry:
+                return None
+            if entry["status"] not in FINISHED_STATUSES:
+                self._cancel[job_id].set()
+                future = self._futures.get(job_id)
+                if future is not None and future.cancel():
+                    self._finish_locked(job_id, "cancelled", message="cancelled before start")
+                else:
+                    entry["message"] = "cancelling"
+                    entry["updated_at"] = datetime.now(timezone.utc)
+            return dict(entry)
+
+    def shutdown(self) -> None:
+        """Cancel outstanding jobs and stop the pool without waiting for running simulations."""
+        with self._lock:
+            for event in self._cancel.values():
+                event.set()
+            pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        pool.shutdown(wait=False, cancel_futures=True)
+        # Queued jobs never reach `_run`; running ones finish as cancelled at their next report.
+        with self._lock:
+            for job_id, future in list(self._futures.items()):
+                if future.cancelled():
+                    self._finish_locked(job_id, "cancelled", message="cancelled at shutdown")
+
+    def _run(self, job_id: str, runner: Callable[[ProgressReporter], Any]) -> None:
+        cancel_event = self._cancel[job_id]
+
+        def report(progress: float | None = None, message: str | None = None) -> None:
+            if cancel_event.is_set():
+                raise BacktestJobCancelled()
+            with self._lock:
+                entry = self._jobs.get(job_id)
+                if entry is None:
+                    return
+                if progress is not None:
+                    entry["progress"] = max(0.0, min(100.0, float(progress)))
+                if message is not None:
+                    entry["message"] = message
+                entry["updated_at"] = datetime.now(timezone.utc)
+
+        with self._lock:
+            entry = self._jobs[job_id]
+            entry["status"] = "running"
+            entry["started_at"] = entry["updated_at"] = datetime.now(timezone.utc)
+            entry["message"] = "starting"
+        try:
+            report(None, None)
+            result = runner(report)
+        except BacktestJobCancelled:
+            with self._lock:
+                self._finish_locked(job_id, "cancelled", message="cancelled")
+            return
+        except Exception as exc:
+            detail = getattr(exc, "detail", None) or str(exc) or exc.__class__.__name__
+            # HTTP errors raised by the endpoint body (unknown wallet, bad filters) are expected outcomes.
+            logger.warning("backtest job %s failed: %s", job_id, detail, exc_info=not hasattr(exc, "status_code"))
+            with self._lock:
+                self._finish_locked(job_id, "error", message="error", error=str(detail))
+            return
+        with self._lock:
+            self._results[job_id] = result
+            self._finish_locked(job_id, "done", message="done")
+
+    def _finish_locked(self, job_id: str, status: str, *, message: str, error: str | None = None) -> None:
+        entry = self._jobs[job_id]
+        entry["status"] = status
+        if status == "done":
+            entry["progress"] = 100.0
+        entry["message"] = message
+        entry["error"] = error
+        entry["finished_at"] = entry["updated_at"] = datetime.now(timezone.utc)
+        self._futures.pop(job_id, None)
+        self._cancel.pop(job_id, None)
+        self._prune_locked()
+
+    def _prune_locked(self) -> None:
+        finished = [jid for jid, job in self._jobs.items() if job["status"] in FINISHED_STATUSES]
+        for job_id in finished[: max(0, len(finished) - self.max_retained)]:
+            self._jobs.pop(job_id, None)
+            self._results.pop(job_id, None)
+
+
+backtest_jobs = BacktestJobManager(
+    max_workers=settings.backtest_job_workers,
+    max_retained=settings.backtest_job_retention,
+    max_pending=settings.backtest_job_max_pending,
+)
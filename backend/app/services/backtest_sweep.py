@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import dataclasses
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Sequence
+
+from app.core.config import settings
+from app.services.backtest_engine import PriceCache, SimulationOutcome, simulate_copy_trades
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on grid size accepted by the sweep endpoint.
+MAX_SWEEP_COMBINATIONS = 500
+
+
+@dataclass(frozen=True)
+class SweepPoint:
+    leverage: Decimal | None
+    used_pct: float
+    fee_rate: Decimal
+    slippage_rate: Decimal
+
+
+@dataclass
+class SweepOutcome:
+    point: SweepPoint
+    outcome: SimulationOutcome
+    trades_copied: int
+
+
+# Per-process state installed once by the pool initializer, so the trades and price cache are
+# shipped to each worker a single time instead of with every grid point.
+_worker_trades: Sequence = ()
+_worker_prices: PriceCache = {}
+_worker_options: dict = {}
+
+
+def detach_trades(trades: Sequence) -> list[SimpleNamespace]:
+    """Plain, picklable copies of the trade fields the simulator reads."""
+    return [
+        SimpleNamespace(
+            id=t.id,
+            timestamp=t.timestamp,
+            base_asset=t.base_asset,
+            direction=t.direction,
+            value_usd=t.value_usd,
+            amount_base=t.amount_base,
+        )
+        for t in trades
+    ]
+
+
+def _init_worker(trades: Sequence, price_cache: PriceCache, options: dict) -> None:
+    global _worker_trades, _worker_prices, _worker_options
+    _worker_trades = trades
+    _worker_prices = price_cache
+    _worker_options = options
+
+
+def _run_point(point: SweepPoint) -> SweepOutcome:
+    outcome = simulate_copy_trades(
+        _worker_trades,
+        _worker_prices,
+        used_pct=point.used_pct,
+        fee_rate=point.fee_rate,
+        slippage_rate=point.slippage_rate,
+        leverage=point.leverage,
+        **_worker_options,
+    )
+    # Only the summary travels back to the parent; per-trade rows and the curve stay in the worker.
+    trades_copied = len(outcome.results)
+    return SweepOutcome(
+        point=point,
+        outcome=dataclasses.replace(outcome, results=[], equity_curve=[]),
+        trades_copied=trades_copied,
+    )
+
+
+def run_sweep(
+    trades: Sequence,
+    price_cache: PriceCache,
+    points: Sequence[SweepPoint],
+    *,
+    initial_deposit: Decimal,
+    whale_portfolio_value: Decimal | None,
+    engine: str,
+    sampling: str,
+    max_curve_points: int,
+    fill_prices: PriceCache | None = None,
+    max_workers: int | None = None,
+) -> list[SweepOutcome]:
+    """Simulate every grid point over the same trades and prices, in grid order."""
+    options = dict(
+        fill_prices=fill_prices,
+        initial_deposit=initial_deposit,
+        whale_portfolio_value=whale_portfolio_value,
+        engine=engine,
+        sampling=sampling,
+        max_curve_points=max_curve_points,
+    )
+    workers = max_workers or settings.backtest_sweep_workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(points)))
+    if workers > 1:
+        try:
+            # Spawned rather than forked: the API process runs ingestor, scheduler and pool threads
+            # whose locks a forked child could inherit mid-acquire.
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(trades, price_cache, options),
+            ) as pool:
+                return list(pool.map(_run_point, points, chunksize=max(1, len(points) // (workers * 4))))
+        except (BrokenProcessPool, OSError) as exc:
+            logger.warning("backtest sweep process pool failed; running serially: %s", exc)
+
+    _init_worker(trades, price_cache, options)
+    try:
+        return [_run_point(point) for point in points]
+    finally:
+        _init_worker((), {}, {})
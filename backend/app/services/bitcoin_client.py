@@ -5,6 +5,7 @@ from typing import Any
 import httpx
 
 from app.core.config import settings
+from app.services.http_pool import http_pool
 
 
 class BitcoinClient:
@@ -13,22 +14,21 @@ class BitcoinClient:
         self.timeout = timeout
 
     def _client(self) -> httpx.Client:
-        return httpx.Client(base_url=self.base_url, timeout=self.timeout)
+        # Shared keep-alive client; owned by http_pool, so never closed here.
+        return http_pool.client(self.base_url, self.timeout)
 
     def get_address(self, address: str) -> dict[str, Any]:
-        with self._client() as client:
-            resp = client.get(f"/address/{address}")
-            resp.raise_for_status()
-            return resp.json()
+        resp = self._client().get(f"/address/{address}")
+        resp.raise_for_status()
+        return resp.json()
 
     def get_address_txs(self, address: str, limit: int = 25, offset: int = 0) -> list[dict[str, Any]]:
-        with self._client() as client:
-            params = {"limit": limit}
-            if offset:
-                params["offset"] = offset
-            resp = client.get(f"/address/{address}/txs", params=params)
-            resp.raise_for_status()
-            return resp.json()
+        params = {"limit": limit}
+        if offset:
+            params["offset"] = offset
+        resp = self._client().get(f"/address/{address}/txs", params=params)
+        resp.raise_for_status()
+        return resp.json()
 
 
 bitcoin_client = BitcoinClient()
@@ -7,6 +7,7 @@ from typing import Dict, Optional
 from app.models import BacktestRun, Whale
 from app.services.hyperliquid_client import hyperliquid_client
 from app.services.hyperliquid_trading import hyperliquid_trading_client
+from app.services.rate_limiter import Priority, request_priority
 from app.services.throttle import Throttle
 
 logger = logging.getLogger(__name__)
@@ -175,7 +176,9 @@ class CopierManager:
     def _loop(self) -> None:
         while self._running:
             try:
-                self._tick()
+                # Live copying jumps the /info queue ahead of API handlers and background ingest.
+                with request_priority(Priority.LIVE):
+                    self._tick()
             except Exception as exc:  # noqa: PERF203
                 logger.exception("Copier tick failed: %s", exc)
             time.sleep(self.poll_interval)
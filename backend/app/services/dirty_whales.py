@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.time_utils import now
+from app.db.session import ensure_table, upsert_rows
+from app.models import DirtyWhale, Whale
+from app.services.wallet_state import BATCH_WHALE_IDS, chunked
+
+logger = logging.getLogger(__name__)
+
+# Scheduled jobs that only revisit whales with new activity.
+METRICS_JOB = "metrics"
+CLASSIFY_JOB = "classify"
+DIRTY_JOBS = (METRICS_JOB, CLASSIFY_JOB)
+
+_MARKED_KEY = "dirty_whales_marked"
+_sweep_lock = threading.Lock()
+_last_sweep: dict[str, datetime] = {}
+
+
+def mark_dirty(session: Session, whale_ids: Iterable[str], jobs: Iterable[str] = DIRTY_JOBS) -> None:
+    """Flag whales for the next run of each job, inside the caller's transaction.
+
+    Repeated marks for the same whale within one transaction are written once.
+    """
+    marked = session.info.get(_MARKED_KEY)
+    transaction = session.get_transaction()
+    if marked is None or transaction is None or marked[0] is not transaction:
+        marked = (transaction, set())
+    pending = [w for w in dict.fromkeys(whale_ids) if w and w not in marked[1]]
+    if not pending or not ensure_table(session, DirtyWhale):
+        return
+    marked_at = now()
+    upsert_rows(
+        session,
+        DirtyWhale,
+        [{"job": job, "whale_id": whale_id, "marked_at": marked_at} for job in jobs for whale_id in pending],
+        keys=["job", "whale_id"],
+    )
+    marked[1].update(pending)
+    session.info[_MARKED_KEY] = (session.get_transaction(), marked[1])
+
+
+def _sweep_due(job: str, started: datetime) -> bool:
+    interval = timedelta(minutes=max(settings.dirty_full_sweep_minutes, 0))
+    with _sweep_lock:
+        last = _last_sweep.get(job)
+    return last is None or started - last >= interval
+
+
+def whales_to_process(
+    session: Session, job: str, started: datetime
+) -> tuple[list[Whale], bool, list[tuple[str, datetime]]]:
+    """Whales `job` should visit now, whether this run is a full sweep, and the marks it covers.
+
+    A full sweep covers every whale: on the first run after start-up, every
+    DIRTY_FULL_SWEEP_MINUTES, and whenever the dirty table is unavailable. The marks are the
+    (whale_id, marked_at) rows visible now; pass them to `finish_run` to clear exactly those.
+    """
+    table_ready = ensure_table(session, DirtyWhale)
+    marks: list[tuple[str, datetime]] = []
+    if table_ready:
+        marks = [
+            (whale_id, marked_at)
+            for whale_id, marked_at in session.query(DirtyWhale.whale_id, DirtyWhale.marked_at).filter(
+                DirtyWhale.job == job
+            )
+        ]
+    if _sweep_due(job, started) or not table_ready:
+        return session.query(Whale).all(), True, marks
+    whales: list[Whale] = []
+    for chunk in chunked([whale_id for whale_id, _ in marks], BATCH_WHALE_IDS):
+        whales.extend(session.query(Whale).filter(Whale.id.in_(chunk)))
+    return whales, False, marks
+
+
+def finish_run(session: Session, job: str, started: datetime, marks: list[tuple[str, datetime]], full: bool) -> None:
+    """Clear the marks a run read at selection.
+
+    Only those exact rows go: ingestors stamp `marked_at` before they commit, so a mark can land
+    with an older timestamp after selection, and a whale marked again meanwhile has a newer one.
+    Both stay for the next run.
+    """
+    if marks and ensure_table(session, DirtyWhale):
+        for chunk in chunked(marks, BATCH_WHALE_IDS):
+            session.query(DirtyWhale).filter(
+                DirtyWhale.job == job, tuple_(DirtyWhale.whale_id, DirtyWhale.marked_at).in_(chunk)
+            ).delete(synchronize_session=False)
+    if full:
+        with _sweep_lock:
+            _last_sweep[job] = started
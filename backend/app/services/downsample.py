@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from typing import Iterable
+
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of `n_out` points that best keep the series' shape.
+
+    The first and last points are always kept; every bucket in between contributes the point that
+    forms the largest triangle with the previously chosen point and the next bucket's average.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = (np.arange(n_out - 1) * ((n - 2) / (n_out - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    out = np.empty(n_out, dtype=np.int64)
+    out[0] = 0
+    out[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[nxt_lo:nxt_hi].mean()
+        avg_y = y[nxt_lo:nxt_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def drawdown_indices(equity: np.ndarray) -> list[int]:
+    """Peak and trough of the largest relative drawdown (empty when equity never falls)."""
+    if len(equity) == 0:
+        return []
+    peak = np.maximum.accumulate(equity)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(peak > 0, (peak - equity) / peak, 0.0)
+    trough = int(np.argmax(ratio))
+    if ratio[trough] <= 0:
+        return []
+    return [int(np.argmax(equity[: trough + 1])), trough]
+
+
+def downsample_indices(x: np.ndarray, y: np.ndarray, max_points: int, keep: Iterable[int] = ()) -> np.ndarray:
+    """Sorted indices of an LTTB reduction to about `max_points`, always including `keep`.
+
+    Forced points take budget from LTTB first, so the result only exceeds `max_points` when
+    `keep` alone is larger than it.
+    """
+    n = len(x)
+    if n <= max_points:
+        return np.arange(n)
+    forced = np.unique(np.concatenate(([0, n - 1], np.fromiter(keep, dtype=np.int64)))).clip(0, n - 1)
+    chosen = lttb_indices(x, y, max(max_points - len(forced) + 2, 3))
+    return np.union1d(chosen, forced)
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Mapping, Sequence
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal, commit_with_retry, engine
+from app.models import Chain, Whale
+from app.services.metrics_service import (
+    fetch_clearinghouse_state,
+    rebuild_portfolio_histories,
+)
+from app.services.rate_limiter import Priority, request_priority
+from app.services.wallet_state import BATCH_WHALE_IDS, chunked
+
+logger = logging.getLogger(__name__)
+
+# Threads fetching clearinghouse states up front; the client's shared rate limit still spaces the
+# requests, the threads only overlap their round trips.
+STATE_PREFETCH_THREADS = 8
+
+
+@dataclass
+class PartitionResult:
+    index: int
+    whales: int
+    seconds: float
+
+
+def prefetch_hyperliquid_states(session: Session, max_threads: int = STATE_PREFETCH_THREADS) -> dict[str, Any]:
+    """Clearinghouse state for every Hyperliquid whale, keyed by lower-cased address."""
+    addresses = sorted(
+        {
+            address.lower()
+            for (address,) in session.query(Whale.address)
+            .join(Chain, Chain.id == Whale.chain_id)
+            .filter(Chain.slug == "hyperliquid")
+        }
+    )
+    if not addresses:
+        return {}
+    states: dict[str, Any] = {}
+    with ThreadPoolExecutor(max_workers=min(max_threads, len(addresses)), thread_name_prefix="hl-state") as pool:
+        futures = {pool.submit(_fetch_state_background, address): address for address in addresses}
+        for future in as_completed(futures):
+            states[futures[future]] = future.result()
+    return states
+
+
+def _fetch_state_background(address: str) -> Any:
+    # Executor threads start on the default lane; the nightly prefetch must not crowd out the copier.
+    with request_priority(Priority.BACKGROUND):
+        return fetch_clearinghouse_state(address)
+
+
+def _rebuild_partition(
+    session: Session, index: int, whale_ids: Sequence[str], states: Mapping[str, Any]
+) -> PartitionResult:
+    started = time.perf_counter()
+    whales = session.query(Whale).filter(Whale.id.in_(whale_ids)).all()
+    rebuild_portfolio_histories(session, whales, hyperliquid_states=states)
+    commit_with_retry(session)
+    return PartitionResult(index=index, whales=len(whales), seconds=time.perf_counter() - started)
+
+
+def _run_partition(index: int, whale_ids: Sequence[str], states: Mapping[str, Any]) -> PartitionResult:
+    # Worker processes open their own session on the engine their import of app.db created.
+    with SessionLocal() as session:
+        return _rebuild_partition(session, index, whale_ids, states)
+
+
+def rebuild_histories_partitioned(session: Session, max_workers: int | None = None) -> list[PartitionResult]:
+    """Rebuild every whale's portfolio history in whale-id partitions spread over worker processes.
+
+    Hyperliquid clearinghouse states are fetched concurrently before any partition starts, so the
+    workers only read trades and write WalletMetricsDaily. Each partition of BATCH_WHALE_IDS whales
+    commits on its own; a failed partition is logged and the others still land. Runs in-process
+    on `session` with one worker, when `session` is not bound to the application database, or on
+    SQLite, where the single write lock would serialize the workers' commits anyway.
+    """
+    addresses = dict(session.query(Whale.id, Whale.address).order_by(Whale.id))
+    partitions = [list(chunk) for chunk in chunked(list(addresses), BATCH_WHALE_IDS)]
+    if not partitions:
+        return []
+    started = time.perf_counter()
+    states = prefetch_hyperliquid_states(session)
+    logger.info(
+        "history rebuild: prefetched %d hyperliquid states in %.2fs", len(states), time.perf_counter() - started
+    )
+
+    workers = max_workers or settings.history_rebuild_workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(partitions)))
+    if engine.dialect.name == "sqlite":
+        workers = 1
+    results: list[PartitionResult] = []
+    pending = dict(enumerate(partitions))
+    if workers > 1 and session.get_bind() is engine:
+        session.commit()
+        try:
+            # Spawned rather than forked: the scheduler shares its process with API and ingestor threads.
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                futures = {
+                    # Each worker is only sent the prefetched states of its own whales.
+                    pool.submit(
+                        _run_partition,
+                        index,
+                        ids,
+                        {a: states[a] for a in (addresses[i].lower() for i in ids) if a in states},
+                    ): index
+                    for index, ids in pending.items()
+                }
+                for future in as_completed(futures):
+                    index = futures[future]
+                    try:
+                        results.append(_log_partition(future.result(), len(partitions)))
+                    except BrokenProcessPool:
+                        raise
+                    except Exception:
+                        logger.exception("history rebuild: partition %d failed", index)
+                    pending.pop(index, None)
+        except (BrokenProcessPool, OSError) as exc:
+            logger.warning("history rebuild process pool failed; running %d partitions serially: %s", len(pending), exc)
+
+    for index, ids in list(pending.items()):
+        try:
+            results.append(_log_partition(_rebuild_partition(session, index, ids, states), len(partitions)))
+        except Exception:
+            session.rollback()
+            logger.exception("history rebuild: partition %d failed", index)
+    return sorted(results, key=lambda r: r.index)
+
+
+def _log_partition(result: PartitionResult, total: int) -> PartitionResult:
+    logger.info(
+        "history rebuild: partition %d/%d (%d whales) done in %.2fs",
+        result.index + 1,
+        total,
+        result.whales,
+        result.seconds,
+    )
+    return result
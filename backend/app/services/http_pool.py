@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Recent latencies kept per host for the percentile stats.
+LATENCY_SAMPLES = 512
+
+_STARTED_KEY = "whales_started"
+
+
+def http2_available() -> bool:
+    """httpx only negotiates HTTP/2 when the optional `h2` package is installed."""
+    return importlib.util.find_spec("h2") is not None
+
+
+class _HostStats:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.http_versions: dict[str, int] = {}
+        self.recent: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+    def snapshot(self) -> dict[str, Any]:
+        recent = sorted(self.recent)
+
+        def pct(q: float) -> float | None:
+            return round(recent[min(len(recent) - 1, int(q * len(recent)))], 2) if recent else None
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "avg_ms": round(self.total_ms / self.requests, 2) if self.requests else None,
+            "p50_ms": pct(0.5),
+            "p95_ms": pct(0.95),
+            "max_ms": round(self.max_ms, 2),
+            "http_versions": dict(self.http_versions),
+        }
+
+
+class HttpPool:
+    """Long-lived httpx clients shared by every caller of the same base URL.
+
+    Reusing one client per base URL keeps TCP/TLS connections alive between calls instead of
+    handshaking for each request. Clients are thread-safe; callers must not close them, the app
+    lifespan does via `aclose()`. Time to response headers is recorded per host.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._clients: dict[tuple[str, float], httpx.Client] = {}
+        # Async clients are bound to the event loop that created them.
+        self._async_clients: dict[tuple[str, float, asyncio.AbstractEventLoop], httpx.AsyncClient] = {}
+        self._stats: dict[str, _HostStats] = {}
+
+    def client(self, base_url: str, timeout: float = 10.0) -> httpx.Client:
+        key = (base_url, timeout)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = httpx.Client(base_url=base_url, timeout=timeout, **self._client_options())
+                self._clients[key] = client
+            return client
+
+    def async_client(self, base_url: str, timeout: float = 10.0) -> httpx.AsyncClient:
+        """Shared AsyncClient for `base_url` on the running event loop."""
+        key = (base_url, timeout, asyncio.get_running_loop())
+        client = self._async_clients.get(key)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._async_clients.get(key)
+            if client is None:
+                options = self._client_options()
+                options["event_hooks"] = {"request": [self._on_request_async], "response": [self._on_response_async]}
+                client = httpx.AsyncClient(base_url=base_url, timeout=timeout, **options)
+                self._async_clients[key] = client
+            return client
+
+    def _client_options(self) -> dict[str, Any]:
+        http2 = settings.http_pool_http2 and http2_available()
+        return {
+            "http2": http2,
+            "limits": httpx.Limits(
+                max_connections=settings.http_pool_max_connections,
+                max_keepalive_connections=settings.http_pool_max_keepalive,
+                keepalive_expiry=settings.http_pool_keepalive_expiry,
+            ),
+            "event_hooks": {"request": [self._on_request], "response": [self._on_response]},
+        }
+
+    @staticmethod
+    def _on_request(request: httpx.Request) -> None:
+        request.extensions[_STARTED_KEY] = time.perf_counter()
+
+    def _on_response(self, response: httpx.Response) -> None:
+        started = response.request.extensions.get(_STARTED_KEY)
+        if started is None:
+            return
+        self.record(response.request.url.host, (time.perf_counter() - started) * 1000, response)
+
+    async def _on_request_async(self, request: httpx.Request) -> None:
+        self._on_request(request)
+
+    async def _on_response_async(self, response: httpx.Response) -> None:
+        self._on_response(response)
+
+    def record(self, host: str, elapsed_ms: float, response: httpx.Response | None = None) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(host, _HostStats())
+            stats.requests += 1
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            stats.recent.append(elapsed_ms)
+            if response is not None:
+                if response.status_code >= 400:
+                    stats.errors += 1
+                stats.http_versions[response.http_version] = stats.http_versions.get(response.http_version, 0) + 1
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            hosts = {host: stats.snapshot() for host, stats in sorted(self._stats.items())}
+            open_clients = len(self._clients) + len(self._async_clients)
+        return {
+            "http2_available": http2_available(),
+            "open_clients": open_clients,
+            "hosts": hosts,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            try:
+                client.close()
+            except Exception:
+                logger.debug("failed to close pooled http client", exc_info=True)
+
+    async def aclose(self) -> None:
+        """Close the sync clients and the async clients of the running loop."""
+        self.close()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            keys = [key for key in self._async_clients if key[2] is loop]
+            clients = [self._async_clients.pop(key) for key in keys]
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception:
+                logger.debug("failed to close pooled async http client", exc_info=True)
+
+
+http_pool = HttpPool()
@@ -1,40 +1,128 @@
 from __future__ import annotations
 
+import asyncio
 from typing import Any
-import threading
 import time
 
 import httpx
 from httpx import HTTPStatusError, RequestError
 
 from app.core.config import settings
+from app.services.http_pool import http_pool
+from app.services.rate_limiter import TokenBucket
+from app.services.single_flight import SingleFlight, TTLCache
 
+# userFillsByTime returns at most this many fills per page.
+FILLS_PAGE_SIZE = 2000
+
+
+# /info request weights against Hyperliquid's per-IP budget; anything not listed costs
+# DEFAULT_INFO_WEIGHT.
+INFO_WEIGHTS = {
+    "clearinghouseState": 2,
+    "spotClearinghouseState": 2,
+    "allMids": 2,
+    "l2Book": 2,
+    "orderStatus": 2,
+    "exchangeStatus": 2,
+    "userRole": 60,
+}
+DEFAULT_INFO_WEIGHT = 20
+# These also cost one unit per ITEMS_PER_EXTRA_WEIGHT items they return.
+ITEM_WEIGHTED_INFO = {"userFills", "userFillsByTime", "userFunding", "fundingHistory", "historicalOrders"}
+ITEMS_PER_EXTRA_WEIGHT = 20
+
+
+def info_weight(payload: dict[str, Any]) -> int:
+    return INFO_WEIGHTS.get(payload.get("type"), DEFAULT_INFO_WEIGHT)
+
+
+def response_weight(payload: dict[str, Any], data: Any) -> int:
+    """Weight charged after the fact for item-priced request types."""
+    if payload.get("type") in ITEM_WEIGHTED_INFO and isinstance(data, list):
+        return len(data) // ITEMS_PER_EXTRA_WEIGHT
+    return 0
+
+
+# One budget for every /info caller in the process (sync and async clients, trading meta).
+info_rate_limiter = TokenBucket(
+    rate=settings.hyperliquid_info_weight_per_min / 60.0,
+    burst=settings.hyperliquid_info_burst,
+)
+# Identical /info requests in flight at once (same type, user and params) share one call, from
+# threads and coroutines alike; clearinghouse states are then kept for their callers' TTLs.
+info_flights = SingleFlight()
+info_cache = TTLCache(max_entries=4096)
+
+
+def _info_key(payload: dict[str, Any]) -> tuple:
+    params = tuple(sorted((k, repr(v)) for k, v in payload.items() if k not in ("type", "user")))
+    return (payload.get("type"), str(payload.get("user") or "").lower(), params)
+
+
+class _FillsPager:
+    """Cursor bookkeeping for `userFillsByTime`, shared by the sync and async clients.
+
+    The standard `userFills` endpoint ignores pagination parameters and only returns the
+    latest ~2000 fills. `userFillsByTime` accepts a `startTime` cursor (ms) and returns fills
+    in ascending time order up to an optional `endTime`, capped at ~2000 per response.
+    We advance the cursor to the max timestamp + 1 on each page until we exhaust results
+    or hit `max_pages`.
+    """
+
+    def __init__(self, address: str, start_time: int | None, max_pages: int, end_time: int | None) -> None:
+        self.address = address
+        self.cursor = start_time or 0
+        self.end_time = end_time
+        self.pages_left = max_pages
+        self.fills: list[dict[str, Any]] = []
+        self._last_max_time: int | None = None
+
+    def next_payload(self) -> dict[str, Any] | None:
+        if self.pages_left <= 0:
+            return None
+        self.pages_left -= 1
+        payload: dict[str, Any] = {"type": "userFillsByTime", "user": self.address, "startTime": self.cursor}
+        if self.end_time is not None:
+            payload["endTime"] = self.end_time
+        return payload
+
+    def add(self, batch: Any) -> None:
+        if not isinstance(batch, list) or not batch:
+            self.pages_left = 0
+            return
+        self.fills.extend(batch)
+        times = [f.get("time") for f in batch if f.get("time") is not None]
+        if not times:
+            self.pages_left = 0
+            return
+        max_time = max(times)
+        # Prevent infinite loops if the API stops advancing
+        if self._last_max_time is not None and max_time <= self._last_max_time:
+            self.pages_left = 0
+            return
+        self._last_max_time = max_time
+        self.cursor = max_time + 1  # walk forward in time
+        # If we received fewer than a full page, we've likely reached the end of the window
+        if len(batch) < FILLS_PAGE_SIZE or (self.end_time is not None and self.cursor > self.end_time):
+            self.pages_left = 0
+
+
+class _InfoClientBase:
+    """Configuration, retry policy, coalescing and state cache shared by the sync and async /info clients.
+
+    Requests take their weight from `info_rate_limiter` in the caller's priority lane (see
+    `rate_limiter.request_priority`) and 429s slow the shared limiter down.
+    """
 
-class HyperliquidClient:
     def __init__(self, base_url: str | None = None, timeout: float = 10.0) -> None:
         # Accept either full /info URL or host; normalize to host and always POST to /info
         self.base_url = (base_url or settings.hyperliquid_info_url).rstrip("/info").rstrip("/")
         self.timeout = timeout
-        self.max_rps = max(0.1, float(getattr(settings, "hyperliquid_max_rps", 3.0) or 3.0))
-        self._min_interval = 1.0 / self.max_rps
-        self._last_request_ts = 0.0
-        self._lock = threading.Lock()
+        self._limiter = info_rate_limiter
         self._max_retries = 3
-        # Simple TTL cache to avoid hitting /info repeatedly for the same address within a short window
-        self._state_cache: dict[str, tuple[float, dict[str, Any]]] = {}
-
-    def _client(self) -> httpx.Client:
-        return httpx.Client(base_url=self.base_url, timeout=self.timeout)
-
-    def _throttle(self) -> None:
-        if self._min_interval <= 0:
-            return
-        with self._lock:
-            now = time.perf_counter()
-            sleep_for = self._min_interval - (now - self._last_request_ts)
-            if sleep_for > 0:
-                time.sleep(sleep_for)
-            self._last_request_ts = time.perf_counter()
+        self._flights = info_flights
+        self._cache = info_cache
 
     @staticmethod
     def _retry_after_seconds(headers: httpx.Headers) -> float:
@@ -43,49 +131,60 @@ class HyperliquidClient:
         except Exception:
             return 0.0
 
+    def _retry_delay(self, exc: Exception, attempt: int) -> float | None:
+        """Seconds to wait before retrying after `exc`, or None when it should be raised."""
+        if attempt >= self._max_retries:
+            return None
+        if isinstance(exc, HTTPStatusError):
+            if exc.response.status_code == 429:
+                self._limiter.penalize()
+            if exc.response.status_code in (429, 502, 503, 504):
+                # Respect server-provided Retry-After if present; otherwise exponential backoff.
+                return max(self._retry_after_seconds(exc.response.headers), min(30.0, 2.0**attempt))
+            return None
+        if isinstance(exc, RequestError):
+            return min(30.0, 2.0**attempt)
+        return None
+
+    @staticmethod
+    def _state_payload(address: str) -> dict[str, Any]:
+        return {"type": "clearinghouseState", "user": address}
+
+
+class HyperliquidClient(_InfoClientBase):
+    def _client(self) -> httpx.Client:
+        # Shared keep-alive client; owned by http_pool, so never closed here.
+        return http_pool.client(self.base_url, self.timeout)
+
     def _post_info(self, payload: dict[str, Any]) -> Any:
+        """POST to /info, joining an identical request already in flight."""
+        return self._flights.do(_info_key(payload), lambda: self._send_info(payload))
+
+    def _send_info(self, payload: dict[str, Any]) -> Any:
         """POST to /info with global rate limiting and limited retries on 429/5xx."""
-        last_err: Exception | None = None
         for attempt in range(1, self._max_retries + 1):
-            self._throttle()
+            self._limiter.acquire(info_weight(payload))
             try:
-                with self._client() as client:
-                    resp = client.post("/info", json=payload)
+                resp = self._client().post("/info", json=payload)
                 resp.raise_for_status()
-                return resp.json()
-            except HTTPStatusError as exc:  # noqa: PERF203
-                status = exc.response.status_code
-                retry_after = self._retry_after_seconds(exc.response.headers)
-                last_err = exc
-                if status in (429, 502, 503, 504) and attempt < self._max_retries:
-                    # Respect server-provided Retry-After if present; otherwise exponential backoff.
-                    delay = max(retry_after, min(30.0, 2.0**attempt))
-                    time.sleep(delay)
-                    continue
-                raise
-            except RequestError as exc:
-                last_err = exc
-                if attempt < self._max_retries:
-                    time.sleep(min(30.0, 2.0**attempt))
-                    continue
-                raise
-        if last_err:
-            raise last_err
+                data = resp.json()
+                self._limiter.debit(response_weight(payload, data))
+                return data
+            except (HTTPStatusError, RequestError) as exc:  # noqa: PERF203
+                delay = self._retry_delay(exc, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
 
     def get_clearinghouse_state(self, address: str, use_cache: bool = True, ttl: float = 10.0) -> dict[str, Any]:
-        """Fetch clearinghouse state with an optional short-lived cache to reduce duplicate calls."""
-        now_ts = time.time()
-        if use_cache:
-            cached = self._state_cache.get(address.lower())
-            if cached:
-                ts, payload = cached
-                if now_ts - ts <= ttl:
-                    return payload
-        payload = {"type": "clearinghouseState", "user": address}
+        """Fetch clearinghouse state, reusing one fetched within `ttl` seconds when `use_cache`."""
+        payload = self._state_payload(address)
+        key = _info_key(payload)
+        if use_cache and (cached := self._cache.get(key, ttl)) is not None:
+            return cached
         data = self._post_info(payload)
         state = data if isinstance(data, dict) else {}
-        if use_cache:
-            self._state_cache[address.lower()] = (now_ts, state)
+        self._cache.put(key, state)
         return state
 
     def get_user_fills(self, address: str, start_time: int | None = None) -> list[dict[str, Any]]:
@@ -102,44 +201,11 @@ class HyperliquidClient:
         max_pages: int = 10,
         end_time: int | None = None,
     ) -> list[dict[str, Any]]:
-        """Fetch user fills forward in time using the `userFillsByTime` windowed API.
-
-        The standard `userFills` endpoint ignores pagination parameters and only returns the
-        latest ~2000 fills. `userFillsByTime` accepts a `startTime` cursor (ms) and returns fills
-        in ascending time order up to an optional `endTime`, capped at ~2000 per response.
-        We advance the cursor to the max timestamp + 1 on each page until we exhaust results
-        or hit `max_pages`.
-        """
-        cursor = start_time or 0
-        all_fills: list[dict[str, Any]] = []
-        last_max_time: int | None = None
-
-        for _ in range(max_pages):
-            payload: dict[str, Any] = {"type": "userFillsByTime", "user": address, "startTime": cursor}
-            if end_time is not None:
-                payload["endTime"] = end_time
-            batch = self._post_info(payload)
-            if not isinstance(batch, list) or not batch:
-                break
-            all_fills.extend(batch)
-
-            times = [f.get("time") for f in batch if f.get("time") is not None]
-            if not times:
-                break
-            max_time = max(times)
-            # Prevent infinite loops if the API stops advancing
-            if last_max_time is not None and max_time <= last_max_time:
-                break
-            last_max_time = max_time
-
-            cursor = max_time + 1  # walk forward in time
-            # If we received fewer than 2000, we've likely reached the end of the window
-            if len(batch) < 2000:
-                break
-            if end_time is not None and cursor > end_time:
-                break
-
-        return all_fills
+        """Fetch user fills forward in time using the `userFillsByTime` windowed API (see _FillsPager)."""
+        pager = _FillsPager(address, start_time, max_pages, end_time)
+        while (payload := pager.next_payload()) is not None:
+            pager.add(self._post_info(payload))
+        return pager.fills
 
     def get_user_ledger(self, address: str, start_time: int | None = None, end_time: int | None = None) -> dict[str, Any]:
         payload: dict[str, Any] = {"type": "userLedger", "user": address}
@@ -151,4 +217,62 @@ class HyperliquidClient:
         return data if isinstance(data, dict) else {}
 
 
+class AsyncHyperliquidClient(_InfoClientBase):
+    """Event-loop `/info` client on a pooled httpx.AsyncClient, mirroring HyperliquidClient.
+
+    It shares the sync client's limiter, so threads and coroutines together stay under
+    HYPERLIQUID_INFO_WEIGHT_PER_MIN; waiting for tokens yields to the loop instead of blocking it.
+    """
+
+    def _client(self) -> httpx.AsyncClient:
+        # Shared keep-alive client for the running loop; owned by http_pool.
+        return http_pool.async_client(self.base_url, self.timeout)
+
+    async def _post_info(self, payload: dict[str, Any]) -> Any:
+        return await self._flights.do_async(_info_key(payload), lambda: self._send_info(payload))
+
+    async def _send_info(self, payload: dict[str, Any]) -> Any:
+        for attempt in range(1, self._max_retries + 1):
+            await self._limiter.acquire_async(info_weight(payload))
+            try:
+                resp = await self._client().post("/info", json=payload)
+                resp.raise_for_status()
+                data = resp.json()
+                self._limiter.debit(response_weight(payload, data))
+                return data
+            except (HTTPStatusError, RequestError) as exc:  # noqa: PERF203
+                delay = self._retry_delay(exc, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    async def get_clearinghouse_state(self, address: str, use_cache: bool = True, ttl: float = 10.0) -> dict[str, Any]:
+        payload = self._state_payload(address)
+        key = _info_key(payload)
+        if use_cache and (cached := self._cache.get(key, ttl)) is not None:
+            return cached
+        data = await self._post_info(payload)
+        state = data if isinstance(data, dict) else {}
+        self._cache.put(key, state)
+        return state
+
+    async def get_user_fills_paginated(
+        self,
+        address: str,
+        start_time: int | None = None,
+        max_pages: int = 10,
+        end_time: int | None = None,
+    ) -> list[dict[str, Any]]:
+        pager = _FillsPager(address, start_time, max_pages, end_time)
+        while (payload := pager.next_payload()) is not None:
+            pager.add(await self._post_info(payload))
+        return pager.fills
+
+
+def remember_clearinghouse_state(address: str, state: dict[str, Any]) -> None:
+    """Cache a state received some other way (e.g. a WebSocket push) as if just fetched."""
+    info_cache.put(_info_key({"type": "clearinghouseState", "user": address}), state)
+
+
 hyperliquid_client = HyperliquidClient()
+async_hyperliquid_client = AsyncHyperliquidClient()
@@ -22,8 +22,11 @@ from sqlalchemy import select
 from sqlalchemy.exc import SQLAlchemyError, OperationalError
 from sqlalchemy.orm import Session
 
+from app.db.session import commit_with_retry
 from app.models import Chain, Trade, TradeDirection, TradeSource, Whale
-from app.services.metrics_service import recompute_wallet_metrics, _commit_with_retry, rebuild_portfolio_history_from_trades
+from app.services import wallet_state
+from app.services.dirty_whales import mark_dirty
+from app.services.metrics_service import recompute_wallet_metrics, rebuild_portfolio_history_from_trades
 from app.core.time_utils import now
 from app.core.config import settings
 from app.services.backfill_progress import BackfillProgressTracker
@@ -394,8 +397,13 @@ def import_hl_history_from_s3(
                 continue
         marker_path.touch()
         try:
+            days = {wallet_state.utc_date(obj.timestamp) for obj in session.new if isinstance(obj, Trade)}
             session.flush()
-            _commit_with_retry(session)
+            # Keep the daily rollups in step with each file's inserts. Imported fills are usually
+            # back-dated, so the per-asset state is folded once after the last file instead.
+            if days and wallet_state.tables_ready(session):
+                wallet_state.refresh_daily_buckets(session, {whale.id: days})
+            commit_with_retry(session)
         except OperationalError as exc:
             # Deadlocks can happen on MySQL under concurrent writes; skip this file and continue.
             session.rollback()
@@ -408,7 +416,8 @@ def import_hl_history_from_s3(
     if imported > 0:
         recompute_wallet_metrics(session, whale)
         rebuild_portfolio_history_from_trades(session, whale)
-    _commit_with_retry(session)
+        mark_dirty(session, [whale.id])
+    commit_with_retry(session)
     _emit(100.0, f"Done. Imported {imported}, skipped {skipped}.")
     return {
         "imported": imported,
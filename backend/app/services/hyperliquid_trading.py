@@ -14,6 +14,8 @@ from eth_utils import keccak, to_hex
 import msgpack
 
 from app.core.config import settings
+from app.services.http_pool import http_pool
+from app.services.hyperliquid_client import info_rate_limiter, info_weight
 
 
 def _address_to_bytes(address: str) -> bytes:
@@ -88,10 +90,10 @@ class HyperliquidMeta:
         self._loaded = False
 
     def _post_info(self, payload: dict[str, Any]) -> Any:
-        with httpx.Client(base_url=self.base_url, timeout=self.timeout) as client:
-            resp = client.post('/info', json=payload)
-            resp.raise_for_status()
-            return resp.json()
+        info_rate_limiter.acquire(info_weight(payload))
+        resp = http_pool.client(self.base_url, self.timeout).post('/info', json=payload)
+        resp.raise_for_status()
+        return resp.json()
 
     def load(self) -> None:
         meta = self._post_info({"type": "meta"})
@@ -177,8 +179,7 @@ class HyperliquidTradingClient:
                     time.sleep(sleep_for)
                 self._last_ts = time.perf_counter()
             try:
-                with httpx.Client(base_url=self.base_url, timeout=self.timeout) as client:
-                    resp = client.post('/exchange', json=body)
+                resp = http_pool.client(self.base_url, self.timeout).post('/exchange', json=body)
                 if resp.status_code == 429:
                     retry_after = float(resp.headers.get("Retry-After", "0") or 0)
                     delay = retry_after if retry_after > 0 else min(2**attempt, 5)
@@ -2,25 +2,27 @@ from __future__ import annotations
 
 from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
-import time
-from typing import Any, Iterable
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Iterable, Iterator, Mapping, Sequence
 
-from sqlalchemy import func, select
-from sqlalchemy.exc import OperationalError, PendingRollbackError
+from sqlalchemy import func, select, tuple_
 from sqlalchemy.orm import Session
-from sqlalchemy.dialects.postgresql import insert as pg_insert
-from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
+from app.db.session import commit_with_retry, upsert_rows
 from app.models import (
     Chain,
     CurrentWalletMetrics,
     Holding,
     Trade,
+    TradeDailyAgg,
     TradeDirection,
     WalletMetricsDaily,
     Whale,
 )
+from app.services import wallet_state
 from app.services.hyperliquid_client import hyperliquid_client
+from app.services.wallet_state import BATCH_WHALE_IDS, chunked, day_start, utc_date
 from app.core.time_utils import now
 
 
@@ -32,21 +34,88 @@ def _safe_sum(values: Iterable[Decimal | None]) -> Decimal:
     return total
 
 
-def _volume_and_count_last_30d(session: Session, whale_id: str, days: int = 30) -> tuple[Decimal, int]:
-    window_start = now() - timedelta(days=days)
-    excluded_dirs = {TradeDirection.DEPOSIT, TradeDirection.WITHDRAW}
-    trades = (
-        session.query(Trade.value_usd)
-        .filter(
-            Trade.whale_id == whale_id,
-            Trade.timestamp >= window_start,
-            Trade.direction.notin_(excluded_dirs),
+# Directions excluded from volume windows.
+VOLUME_EXCLUDED_DIRS = {TradeDirection.DEPOSIT, TradeDirection.WITHDRAW}
+
+
+def _window_rows(query_for_chunk, whale_ids: Sequence[str]) -> dict[str, tuple[Decimal, int]]:
+    out: dict[str, tuple[Decimal, int]] = {}
+    for chunk in chunked(whale_ids, BATCH_WHALE_IDS):
+        for whale_id, volume, count in query_for_chunk(chunk):
+            out[whale_id] = (Decimal(volume or 0), int(count or 0))
+    return out
+
+
+def _window_aggregates_many(
+    session: Session, whale_ids: Sequence[str], *, use_buckets: bool = True
+) -> dict[str, dict[str, Any]]:
+    """Rolling 30d / 1d volume and trade counts per whale.
+
+    Whole days inside the 30d window come from trade_daily_agg; only the partial first day and the
+    last 24h are read from trades, so the cost is bounded by two days of fills per whale.
+    """
+    current = now()
+    cutoff_30d = current - timedelta(days=30)
+    first_full_day = utc_date(cutoff_30d) + timedelta(days=1)
+    raw_30d_end = day_start(first_full_day) if use_buckets else None
+
+    def raw(start: datetime, end: datetime | None):
+        def query(chunk):
+            q = session.query(Trade.whale_id, func.sum(Trade.value_usd), func.count(Trade.id)).filter(
+                Trade.whale_id.in_(chunk),
+                Trade.timestamp >= start,
+                Trade.direction.notin_(VOLUME_EXCLUDED_DIRS),
+            )
+            if end is not None:
+                q = q.filter(Trade.timestamp < end)
+            return q.group_by(Trade.whale_id)
+
+        return query
+
+    def bucketed(chunk):
+        return (
+            session.query(TradeDailyAgg.whale_id, func.sum(TradeDailyAgg.volume_usd), func.sum(TradeDailyAgg.trades))
+            .filter(
+                TradeDailyAgg.whale_id.in_(chunk),
+                TradeDailyAgg.date >= first_full_day,
+                TradeDailyAgg.direction.notin_(VOLUME_EXCLUDED_DIRS),
+            )
+            .group_by(TradeDailyAgg.whale_id)
         )
-        .all()
-    )
-    volume = _safe_sum((t.value_usd for t in trades))
-    count = len(trades)
-    return volume, count
+
+    head = _window_rows(raw(cutoff_30d, raw_30d_end), whale_ids)
+    tail = _window_rows(bucketed, whale_ids) if use_buckets else {}
+    last_day = _window_rows(raw(current - timedelta(days=1), None), whale_ids)
+    zero = (Decimal(0), 0)
+    out: dict[str, dict[str, Any]] = {}
+    for whale_id in whale_ids:
+        head_volume, head_count = head.get(whale_id, zero)
+        tail_volume, tail_count = tail.get(whale_id, zero)
+        volume_1d, trades_1d = last_day.get(whale_id, zero)
+        out[whale_id] = {
+            "volume_30d": head_volume + tail_volume,
+            "trades_30d": head_count + tail_count,
+            "volume_1d": volume_1d,
+            "trades_1d": trades_1d,
+        }
+    return out
+
+
+def wallet_states(
+    session: Session, whale_ids: Sequence[str], *, full: bool = False
+) -> tuple[dict[str, dict[str, dict[str, Any]]], bool]:
+    """Up-to-date per-asset state for the whales, and whether daily buckets are current.
+
+    Normally folds only trades past each whale's watermark; `full` rebuilds from every trade
+    (repair mode). Without the state tables, state is folded in memory from full history.
+    """
+    if not wallet_state.tables_ready(session):
+        return wallet_state.fold_states(session, whale_ids), False
+    if full:
+        wallet_state.rebuild_wallet_state(session, whale_ids)
+    else:
+        wallet_state.apply_new_trades(session, whale_ids)
+    return wallet_state.load_states(session, whale_ids), True
 
 
 def _cost_basis(session: Session, whale_id: str) -> tuple[Decimal, Decimal]:
@@ -88,50 +157,6 @@ def _cost_basis(session: Session, whale_id: str) -> tuple[Decimal, Decimal]:
     return total_cost, sum(realized_out.values(), Decimal(0))
 
 
-def _positions_cost_basis(session: Session, whale_id: str) -> tuple[dict[str, dict[str, Decimal]], Decimal]:
-    """Track per-asset qty and cost basis using average-cost outflows."""
-    trades = (
-        session.query(Trade)
-        .filter(Trade.whale_id == whale_id)
-        .order_by(Trade.timestamp.asc(), Trade.id.asc())
-        .all()
-    )
-    positions: dict[str, dict[str, Decimal]] = {}
-    realized = Decimal(0)
-
-    for trade in trades:
-        if not trade.base_asset or trade.amount_base is None:
-            continue
-        asset = trade.base_asset
-        qty = abs(Decimal(trade.amount_base))
-        value_usd = Decimal(trade.value_usd or 0)
-        pos = positions.setdefault(asset, {"qty": Decimal(0), "cost": Decimal(0)})
-
-        if trade.direction in {
-            TradeDirection.DEPOSIT,
-            TradeDirection.BUY,
-            TradeDirection.LONG,
-            TradeDirection.SHORT,
-        }:
-            pos["qty"] += qty
-            pos["cost"] += abs(value_usd)
-        elif trade.direction in {
-            TradeDirection.WITHDRAW,
-            TradeDirection.SELL,
-            TradeDirection.CLOSE_LONG,
-            TradeDirection.CLOSE_SHORT,
-        }:
-            if pos["qty"] <= 0:
-                continue
-            avg_cost = pos["cost"] / pos["qty"] if pos["qty"] != 0 else Decimal(0)
-            qty_out = min(qty, pos["qty"])
-            cost_out = avg_cost * qty_out
-            pos["qty"] -= qty_out
-            pos["cost"] -= cost_out
-            realized += value_usd - cost_out
-    return positions, realized
-
-
 def _update_holdings_cost_basis(holdings: list[Holding], positions: dict[str, dict[str, Decimal]]) -> None:
     for h in holdings:
         pos = positions.get(h.asset_symbol)
@@ -145,183 +170,164 @@ def _update_holdings_cost_basis(holdings: list[Holding], positions: dict[str, di
         )
 
 
-def recompute_wallet_metrics(session: Session, whale: Whale) -> None:
-    chain = session.get(Chain, whale.chain_id)
-    is_hyperliquid = chain is not None and chain.slug == "hyperliquid"
+def _hyperliquid_live_metrics(
+    state: Any, portfolio_value: Decimal, realized_pnl: Decimal
+) -> tuple[float, Decimal, float] | None:
+    """(portfolio value, unrealized PnL, ROI %) from clearinghouse state, or None without state."""
+    if not isinstance(state, dict):
+        return None
+    margin = state.get("marginSummary") or {}
+    try:
+        account_value = Decimal(margin.get("accountValue", "0"))
+    except Exception:
+        account_value = Decimal(portfolio_value)
+    try:
+        withdrawable = Decimal(state.get("withdrawable") or 0)
+    except Exception:
+        withdrawable = Decimal(0)
+    positions_raw = state.get("assetPositions") if isinstance(state.get("assetPositions"), list) else []
+    unrealized_positions = []
+    for pos in positions_raw:
+        position = pos.get("position") or {}
+        try:
+            unrealized_positions.append(Decimal(position.get("unrealizedPnl", "0")))
+        except Exception:
+            pass
+    unrealized_pnl = sum(unrealized_positions, Decimal(0))
+    total_pnl = realized_pnl + unrealized_pnl
+    cost_basis_total = account_value - total_pnl
+    if withdrawable > 0:
+        cost_basis_total = max(cost_basis_total, withdrawable)
+    roi_percent = float(total_pnl / cost_basis_total) * 100 if cost_basis_total > 0 else 0.0
+    return float(account_value), unrealized_pnl, roi_percent
 
-    holdings = session.query(Holding).filter(Holding.whale_id == whale.id).all()
-    portfolio_value = _safe_sum(h.value_usd for h in holdings)
 
-    volume_30d, trades_30d = _volume_and_count_last_30d(session, whale.id)
-    volume_1d, trades_1d = _volume_and_count_last_30d(session, whale.id, days=1)
+def recompute_wallet_metrics(session: Session, whale: Whale, *, full: bool = False) -> None:
+    recompute_wallet_metrics_batch(session, [whale], full=full)
 
-    positions: dict[str, dict[str, Decimal]] = {}
-    realized_from_sales = Decimal(0)
-    if not is_hyperliquid:
-        positions, realized_from_sales = _positions_cost_basis(session, whale.id)
-        _update_holdings_cost_basis(holdings, positions)
 
-    realized_trades = session.query(Trade.pnl_usd).filter(
-        Trade.whale_id == whale.id, Trade.pnl_usd.isnot(None)
-    )
-    realized_pnl = _safe_sum(t.pnl_usd for t in realized_trades) + realized_from_sales
+def recompute_wallet_metrics_batch(session: Session, whales: Iterable[Whale], *, full: bool = False) -> None:
+    """Recompute current and daily metrics for many whales with set-based queries.
 
-    # Win rate: only count realized closing fills, ignore zero-PnL entry legs
-    closing_dirs = {
-        TradeDirection.CLOSE_LONG,
-        TradeDirection.CLOSE_SHORT,
-        TradeDirection.SELL,
-    }
-    closing_fills = (
-        session.query(Trade.pnl_usd)
-        .filter(
-            Trade.whale_id == whale.id,
-            Trade.pnl_usd.isnot(None),
-            Trade.pnl_usd != 0,
-            Trade.direction.in_(closing_dirs),
-        )
-        .all()
-    )
-    wins = [t for t in closing_fills if Decimal(t.pnl_usd) > 0]
-    win_rate_percent = (
-        float(len(wins)) / float(len(closing_fills)) * 100 if closing_fills else None
-    )
+    Positions, realized PnL and win counts come from the running wallet_asset_state, advanced by
+    the trades since each whale's watermark (`full` refolds every trade instead), and volume
+    windows from trade_daily_agg. Holdings and window totals are read with one query per chunk
+    of whale ids and both metrics tables are written with multi-row upserts. Only Hyperliquid
+    clearinghouse state is still fetched per whale.
+    """
+    whales = list(whales)
+    if not whales:
+        return
+    slugs = dict(session.query(Chain.id, Chain.slug).all())
+    whale_ids = [w.id for w in whales]
+    hyperliquid_ids = {w.id for w in whales if slugs.get(w.chain_id) == "hyperliquid"}
 
-    cost_basis_total = _safe_sum(p["cost"] for p in positions.values())
-    unrealized_pnl = Decimal(portfolio_value) - cost_basis_total
-    roi_percent = (
-        float(realized_pnl + unrealized_pnl) / float(cost_basis_total) * 100
-        if cost_basis_total > 0
-        else 0.0
-    )
+    holdings_by_whale: dict[str, list[Holding]] = {}
+    for chunk in chunked(whale_ids, BATCH_WHALE_IDS):
+        for holding in session.query(Holding).filter(Holding.whale_id.in_(chunk)):
+            holdings_by_whale.setdefault(holding.whale_id, []).append(holding)
+    states, buckets_current = wallet_states(session, whale_ids, full=full)
+    windows = _window_aggregates_many(session, whale_ids, use_buckets=buckets_current)
 
-    # Hyperliquid: prefer clearinghouse state metrics to avoid inflating notional as portfolio value
-    if is_hyperliquid:
-        try:
-            state = hyperliquid_client.get_clearinghouse_state(whale.address, use_cache=True, ttl=10.0)
-        except Exception:
-            state = None
-        if isinstance(state, dict):
-            margin = state.get("marginSummary") or {}
-            try:
-                account_value = Decimal(margin.get("accountValue", "0"))
-            except Exception:
-                account_value = Decimal(portfolio_value)
+    today = now().date()
+    current_rows: list[dict[str, Any]] = []
+    daily_rows: list[dict[str, Any]] = []
+    for whale in whales:
+        is_hyperliquid = whale.id in hyperliquid_ids
+        holdings = holdings_by_whale.get(whale.id, [])
+        portfolio_value = _safe_sum(h.value_usd for h in holdings)
+        window = windows[whale.id]
+        assets = states.get(whale.id, {})
+
+        realized_pnl = _safe_sum(st["trade_pnl_usd"] for st in assets.values())
+        positions: dict[str, dict[str, Decimal]] = {}
+        if not is_hyperliquid:
+            realized_pnl += _safe_sum(st["realized_usd"] for st in assets.values())
+            positions = {
+                asset: {"qty": st["qty"], "cost": st["cost_usd"]}
+                for asset, st in assets.items()
+                if asset and st["qty"] is not None
+            }
+            _update_holdings_cost_basis(holdings, positions)
+
+        # Win rate: only count realized closing fills, ignore zero-PnL entry legs
+        closes = sum(st["closes"] for st in assets.values())
+        wins = sum(st["wins"] for st in assets.values())
+        win_rate_percent = float(wins) / float(closes) * 100 if closes else None
+
+        cost_basis_total = _safe_sum(p["cost"] for p in positions.values())
+        unrealized_pnl = Decimal(portfolio_value) - cost_basis_total
+        roi_percent = (
+            float(realized_pnl + unrealized_pnl) / float(cost_basis_total) * 100
+            if cost_basis_total > 0
+            else 0.0
+        )
+
+        # Hyperliquid: prefer clearinghouse state metrics to avoid inflating notional as portfolio value
+        if is_hyperliquid:
             try:
-                withdrawable = Decimal(state.get("withdrawable") or 0)
+                state = hyperliquid_client.get_clearinghouse_state(whale.address, use_cache=True, ttl=10.0)
             except Exception:
-                withdrawable = Decimal(0)
-            positions_raw = state.get("assetPositions") if isinstance(state.get("assetPositions"), list) else []
-            unrealized_positions = []
-            for pos in positions_raw:
-                position = pos.get("position") or {}
-                try:
-                    unrealized_positions.append(Decimal(position.get("unrealizedPnl", "0")))
-                except Exception:
-                    pass
-            unrealized_pnl = sum(unrealized_positions, Decimal(0))
-            portfolio_value = float(account_value)
-            total_pnl = realized_pnl + unrealized_pnl
-            cost_basis_total = account_value - total_pnl
-            if withdrawable > 0:
-                cost_basis_total = max(cost_basis_total, withdrawable)
-            if cost_basis_total > 0:
-                roi_percent = float(total_pnl / cost_basis_total) * 100
-            else:
-                cost_basis_total = Decimal(0)
-                roi_percent = 0.0
+                state = None
+            live = _hyperliquid_live_metrics(state, portfolio_value, realized_pnl)
+            if live is not None:
+                portfolio_value, unrealized_pnl, roi_percent = live
 
-    _upsert_current_metrics(
-        session,
-        {
+        shared = {
             "whale_id": whale.id,
             "portfolio_value_usd": portfolio_value,
             "roi_percent": roi_percent,
             "realized_pnl_usd": realized_pnl,
             "unrealized_pnl_usd": unrealized_pnl,
-            "volume_30d_usd": volume_30d,
-            "trades_30d": trades_30d,
             "win_rate_percent": win_rate_percent,
-        },
-    )
-
-    today = now().date()
-    pending_daily = next(
-        (
-            d
-            for d in session.new
-            if isinstance(d, WalletMetricsDaily) and d.whale_id == whale.id and d.date == today
-        ),
-        None,
-    )
-    existing_daily = (
-        pending_daily
-        or session.query(WalletMetricsDaily)
-        .filter(WalletMetricsDaily.whale_id == whale.id, WalletMetricsDaily.date == today)
-        .one_or_none()
-    )
-    if existing_daily:
-        existing_daily.portfolio_value_usd = portfolio_value
-        existing_daily.roi_percent = roi_percent
-        existing_daily.realized_pnl_usd = realized_pnl
-        existing_daily.unrealized_pnl_usd = unrealized_pnl
-        existing_daily.volume_1d_usd = volume_1d
-        existing_daily.trades_1d = trades_1d
-        existing_daily.win_rate_percent = win_rate_percent
-    else:
-        session.add(
-            WalletMetricsDaily(
-                whale_id=whale.id,
-                date=today,
-                portfolio_value_usd=portfolio_value,
-                roi_percent=roi_percent,
-                realized_pnl_usd=realized_pnl,
-                unrealized_pnl_usd=unrealized_pnl,
-                volume_1d_usd=volume_1d,
-                trades_1d=trades_1d,
-                win_rate_percent=win_rate_percent,
-            )
+        }
+        current_rows.append({**shared, "volume_30d_usd": window["volume_30d"], "trades_30d": window["trades_30d"]})
+        daily_rows.append(
+            {**shared, "date": today, "volume_1d_usd": window["volume_1d"], "trades_1d": window["trades_1d"]}
         )
 
+    _upsert_current_metrics_many(session, current_rows)
+    _upsert_daily_metrics_many(session, daily_rows)
 
-def _upsert_current_metrics(session: Session, payload: dict[str, Any]) -> None:
+
+def _upsert_current_metrics_many(session: Session, payloads: list[dict[str, Any]]) -> None:
     """DB-atomic upsert to avoid duplicate current_wallet_metrics rows."""
-    update_values = {k: v for k, v in payload.items() if k != "whale_id"}
-    dialect = session.bind.dialect.name if session.bind else ""  # type: ignore[attr-defined]
-    if dialect in {"sqlite", "postgresql", "postgres"}:
-        stmt = (
-            sqlite_insert(CurrentWalletMetrics)
-            if dialect == "sqlite"
-            else pg_insert(CurrentWalletMetrics)
-        ).values(**payload)
-        stmt = stmt.on_conflict_do_update(
-            index_elements=[CurrentWalletMetrics.whale_id],
-            set_={**update_values, "updated_at": func.now()},
-        )
-        session.execute(stmt)
-    else:
-        metrics = session.get(CurrentWalletMetrics, payload["whale_id"])
-        if metrics:
-            for key, value in update_values.items():
-                setattr(metrics, key, value)
-            metrics.updated_at = now()
-        else:
-            session.add(CurrentWalletMetrics(**payload))
+    upsert_rows(session, CurrentWalletMetrics, payloads, keys=["whale_id"], touch_updated_at=True)
 
 
-def recompute_all_wallet_metrics(session: Session) -> None:
-    whales = session.query(Whale).all()
-    for whale in whales:
-        recompute_wallet_metrics(session, whale)
-    _commit_with_retry(session)
+def _upsert_daily_metrics_many(session: Session, payloads: list[dict[str, Any]]) -> None:
+    """Write wallet_metrics_daily rows without loading them first."""
+    # A row for the same day may still be pending in this session (e.g. a history rebuild that has
+    # not flushed yet); update it in place so the flush does not collide with the upsert.
+    pending = {
+        (d.whale_id, d.date): d for d in session.new if isinstance(d, WalletMetricsDaily)
+    }
+    rows = []
+    for payload in payloads:
+        existing = pending.get((payload["whale_id"], payload["date"]))
+        if existing is None:
+            rows.append(payload)
+            continue
+        for key, value in payload.items():
+            setattr(existing, key, value)
+    upsert_rows(session, WalletMetricsDaily, rows, keys=["whale_id", "date"])
+
+
+def recompute_all_wallet_metrics(session: Session, *, full: bool = False) -> None:
+    recompute_wallet_metrics_batch(session, session.query(Whale).all(), full=full)
+    commit_with_retry(session)
 
 
 def rebuild_all_portfolio_histories(session: Session) -> None:
-    """Rebuild portfolio history for all whales from trades to restore charts."""
-    whales = session.query(Whale).all()
-    for whale in whales:
-        rebuild_portfolio_history_from_trades(session, whale)
-    _commit_with_retry(session)
+    """Rebuild portfolio history for all whales from trades to restore charts.
+
+    Commits after every BATCH_WHALE_IDS whales so no single transaction spans the whole table.
+    """
+    whale_ids = [whale_id for (whale_id,) in session.query(Whale.id).order_by(Whale.id)]
+    for chunk in chunked(whale_ids, BATCH_WHALE_IDS):
+        # Load each chunk after the previous commit so the rows are not expired and refetched one by one
+        rebuild_portfolio_histories(session, session.query(Whale).filter(Whale.id.in_(chunk)).all())
+        commit_with_retry(session)
 
 
 def touch_last_active(session: Session, whale: Whale, ts: datetime | None = None) -> None:
@@ -329,92 +335,223 @@ def touch_last_active(session: Session, whale: Whale, ts: datetime | None = None
     session.add(whale)
 
 
-def _commit_with_retry(session: Session, retries: int = 3, delay: float = 0.5) -> None:
-    for attempt in range(retries):
-        try:
-            session.commit()
-            return
-        except PendingRollbackError:
-            session.rollback()
-            raise
-        except OperationalError:
-            session.rollback()
-            if attempt == retries - 1:
-                raise
-            time.sleep(delay)
-
-
 def rebuild_portfolio_history_from_trades(session: Session, whale: Whale) -> None:
     """Populate WalletMetricsDaily rows from historical trades for charting."""
-    chain = session.get(Chain, whale.chain_id)
-    is_hyperliquid = chain is not None and chain.slug == "hyperliquid"
-    trades = (
-        session.query(Trade)
-        .filter(Trade.whale_id == whale.id, Trade.timestamp.isnot(None))
-        .order_by(Trade.timestamp.asc(), Trade.id.asc())
-        .all()
-    )
-    if not trades:
+    rebuild_portfolio_histories(session, [whale])
+
+
+# Daily history columns a generic (non-Hyperliquid) rebuild leaves alone when already set.
+_HISTORY_KEPT_COLUMNS = ("roi_percent", "realized_pnl_usd", "unrealized_pnl_usd")
+
+
+def rebuild_portfolio_histories(
+    session: Session,
+    whales: Iterable[Whale],
+    hyperliquid_states: Mapping[str, dict[str, Any] | None] | None = None,
+) -> None:
+    """Populate WalletMetricsDaily rows for many whales from per-day trade totals.
+
+    Days come from trade_daily_agg (brought up to date first) or, without it, from one streamed
+    (whale_id, timestamp, value_usd, pnl_usd) trade query per id chunk, so memory follows a
+    whale's active days rather than its fill count. Each chunk's days are written with one ON CONFLICT batch per path and stale Hyperliquid days with
+    one DELETE. `hyperliquid_states` holds clearinghouse states already fetched by lower-cased
+    address (None for a failed fetch); other Hyperliquid whales are fetched here.
+    """
+    whales = list(whales)
+    if not whales:
         return
-    if is_hyperliquid:
-        _rebuild_hyperliquid_history(session, whale, trades)
+    slugs = dict(session.query(Chain.id, Chain.slug).all())
+    by_id = {w.id: w for w in whales}
+    use_buckets = wallet_state.tables_ready(session)
+    for chunk in chunked(list(by_id), BATCH_WHALE_IDS):
+        if use_buckets:
+            wallet_state.apply_new_trades(session, chunk)
+        hyperliquid_ids = {wid for wid in chunk if slugs.get(by_id[wid].chain_id) == "hyperliquid"}
+        existing_dates: dict[str, set[date]] = {}
+        holdings_value: dict[str, list] = {}
+        if hyperliquid_ids:
+            for whale_id, d in session.query(WalletMetricsDaily.whale_id, WalletMetricsDaily.date).filter(
+                WalletMetricsDaily.whale_id.in_(hyperliquid_ids)
+            ):
+                existing_dates.setdefault(whale_id, set()).add(d)
+            for whale_id, value in session.query(Holding.whale_id, Holding.value_usd).filter(
+                Holding.whale_id.in_(hyperliquid_ids)
+            ):
+                holdings_value.setdefault(whale_id, []).append(value)
+        generic_rows: list[dict[str, Any]] = []
+        hyperliquid_rows: list[dict[str, Any]] = []
+        stale: list[tuple[str, date]] = []
+        for whale_id, daily in _daily_stats_by_whale(session, chunk, use_buckets):
+            if whale_id in hyperliquid_ids:
+                whale = by_id[whale_id]
+                address = whale.address.lower()
+                if hyperliquid_states is not None and address in hyperliquid_states:
+                    state = hyperliquid_states[address]
+                else:
+                    state = fetch_clearinghouse_state(whale.address)
+                days = _hyperliquid_history_rows(
+                    whale, daily, state, _safe_sum(holdings_value.get(whale_id, []))
+                )
+                hyperliquid_rows.extend(days)
+                # Remove any stale days that are no longer represented by trades
+                stale.extend((whale_id, d) for d in existing_dates.get(whale_id, set()).difference(daily))
+            else:
+                generic_rows.extend(_history_rows(whale_id, daily))
+
+        upsert_rows(
+            session,
+            WalletMetricsDaily,
+            generic_rows,
+            keys=["whale_id", "date"],
+            update=["portfolio_value_usd", "volume_1d_usd", "trades_1d"],
+            keep_existing=_HISTORY_KEPT_COLUMNS,
+        )
+        upsert_rows(
+            session,
+            WalletMetricsDaily,
+            hyperliquid_rows,
+            keys=["whale_id", "date"],
+            update=[
+                "portfolio_value_usd",
+                "volume_1d_usd",
+                "trades_1d",
+                "roi_percent",
+                "realized_pnl_usd",
+                "unrealized_pnl_usd",
+            ],
+        )
+        for part in chunked(stale, BATCH_WHALE_IDS):
+            session.query(WalletMetricsDaily).filter(
+                tuple_(WalletMetricsDaily.whale_id, WalletMetricsDaily.date).in_(part)
+            ).delete(synchronize_session="fetch")
+    session.flush()
+
+
+def _daily_stats_by_whale(
+    session: Session, whale_ids: Sequence[str], use_buckets: bool
+) -> Iterator[tuple[str, dict[date, dict[str, Any]]]]:
+    """(whale_id, per-day totals) for whales with trades, in the shape _daily_trade_stats builds."""
+    if not use_buckets:
+        rows = (
+            session.query(Trade.whale_id, Trade.timestamp, Trade.value_usd, Trade.pnl_usd)
+            .filter(Trade.whale_id.in_(whale_ids), Trade.timestamp.isnot(None))
+            .order_by(Trade.whale_id, Trade.timestamp.asc(), Trade.id.asc())
+            .yield_per(5000)
+        )
+        for whale_id, group in groupby(rows, key=itemgetter(0)):
+            yield whale_id, _daily_trade_stats(row[1:] for row in group)
         return
-    daily: dict[date, dict[str, Decimal | int]] = {}
-    cumulative = Decimal(0)
-    for t in trades:
-        if t.value_usd is None:
-            continue
-        trade_date = t.timestamp.date()
+    rows = (
+        session.query(
+            TradeDailyAgg.whale_id,
+            TradeDailyAgg.date,
+            func.sum(TradeDailyAgg.volume_usd),
+            # Buckets split by asset and direction, whose fills share a sign in practice.
+            func.sum(func.abs(TradeDailyAgg.volume_usd)),
+            func.sum(TradeDailyAgg.priced_trades),
+            func.sum(TradeDailyAgg.trades),
+            func.sum(TradeDailyAgg.pnl_usd),
+        )
+        .filter(TradeDailyAgg.whale_id.in_(whale_ids))
+        .group_by(TradeDailyAgg.whale_id, TradeDailyAgg.date)
+        .order_by(TradeDailyAgg.whale_id, TradeDailyAgg.date)
+    )
+    for whale_id, group in groupby(rows, key=itemgetter(0)):
+        daily: dict[date, dict[str, Any]] = {}
+        value_to_date = Decimal(0)
+        realized_to_date = Decimal(0)
+        for _, d, volume, abs_volume, priced, trades, pnl in group:
+            volume = Decimal(volume or 0)
+            priced = int(priced or 0)
+            if priced:
+                value_to_date += volume
+            realized_to_date += Decimal(pnl or 0)
+            daily[d] = {
+                "volume": volume,
+                "abs_volume": Decimal(abs_volume or 0),
+                "priced": priced,
+                "trades": int(trades or 0),
+                "value_to_date": value_to_date if priced else None,
+                "realized_to_date": realized_to_date,
+            }
+        yield whale_id, daily
+
+
+def _daily_trade_stats(trades: Iterable[tuple[datetime, Any, Any]]) -> dict[date, dict[str, Any]]:
+    """Per-day totals from time-ordered (timestamp, value_usd, pnl_usd) fills.
+
+    `volume` / `priced` / `value_to_date` cover fills with a value, `abs_volume` / `trades` /
+    `realized_to_date` every fill; the *_to_date figures are running totals at the day's end.
+    """
+    daily: dict[date, dict[str, Any]] = {}
+    value_to_date = Decimal(0)
+    realized_to_date = Decimal(0)
+    for timestamp, value_usd, pnl_usd in trades:
         stats = daily.setdefault(
-            trade_date, {"volume": Decimal(0), "trades": 0, "portfolio": None}
+            timestamp.date(),
+            {
+                "volume": Decimal(0),
+                "abs_volume": Decimal(0),
+                "priced": 0,
+                "trades": 0,
+                "value_to_date": None,
+                "realized_to_date": Decimal(0),
+            },
         )
-        stats["volume"] += Decimal(t.value_usd)
         stats["trades"] += 1
-        cumulative += Decimal(t.value_usd)
-        stats["portfolio"] = cumulative
-
-    for d, stats in daily.items():
-        existing = (
-            session.query(WalletMetricsDaily)
-            .filter(WalletMetricsDaily.whale_id == whale.id, WalletMetricsDaily.date == d)
-            .one_or_none()
-        )
-        portfolio_val = float(stats.get("portfolio") or 0)
-        if existing:
-            existing.portfolio_value_usd = portfolio_val
-            existing.volume_1d_usd = float(stats.get("volume") or 0)
-            existing.trades_1d = int(stats.get("trades") or 0)
-            existing.roi_percent = existing.roi_percent or 0.0
-            existing.realized_pnl_usd = existing.realized_pnl_usd or 0.0
-            existing.unrealized_pnl_usd = existing.unrealized_pnl_usd or 0.0
-        else:
-            session.add(
-                WalletMetricsDaily(
-                    whale_id=whale.id,
-                    date=d,
-                    portfolio_value_usd=portfolio_val,
-                    roi_percent=0.0,
-                    realized_pnl_usd=0.0,
-                    unrealized_pnl_usd=0.0,
-                    volume_1d_usd=float(stats.get("volume") or 0),
-                    trades_1d=int(stats.get("trades") or 0),
-                    win_rate_percent=None,
-                )
-            )
-    session.flush()
+        if value_usd is not None:
+            value = Decimal(value_usd)
+            stats["volume"] += value
+            stats["abs_volume"] += abs(value)
+            stats["priced"] += 1
+            value_to_date += value
+            stats["value_to_date"] = value_to_date
+        if pnl_usd is not None:
+            realized_to_date += Decimal(pnl_usd)
+        stats["realized_to_date"] = realized_to_date
+    return daily
+
+
+def _history_rows(whale_id: str, daily: dict[date, dict[str, Any]]) -> list[dict[str, Any]]:
+    """Daily volume, count and cumulative traded value over the days with priced fills."""
+    return [
+        {
+            "whale_id": whale_id,
+            "date": d,
+            "portfolio_value_usd": float(stats["value_to_date"] or 0),
+            "roi_percent": 0.0,
+            "realized_pnl_usd": 0.0,
+            "unrealized_pnl_usd": 0.0,
+            "volume_1d_usd": float(stats["volume"]),
+            "trades_1d": stats["priced"],
+            "win_rate_percent": None,
+        }
+        for d, stats in daily.items()
+        if stats["priced"]
+    ]
+
+
+def fetch_clearinghouse_state(address: str) -> dict[str, Any] | None:
+    """Live Hyperliquid account state for history rebuilds, or None when the fetch fails."""
+    try:
+        return hyperliquid_client.get_clearinghouse_state(address)
+    except Exception:
+        return None
 
 
-def _rebuild_hyperliquid_history(session: Session, whale: Whale, trades: list[Trade]) -> None:
+def _hyperliquid_history_rows(
+    whale: Whale,
+    daily: dict[date, dict[str, Any]],
+    state: dict[str, Any] | None,
+    holdings_value: Decimal,
+) -> list[dict[str, Any]]:
     """Approximate daily equity for Hyperliquid accounts from fills and live state."""
-    total_realized = _safe_sum(t.pnl_usd for t in trades if t.pnl_usd is not None)
+    last_day = max(daily) if daily else None
+    total_realized = daily[last_day]["realized_to_date"] if last_day else Decimal(0)
     latest_unrealized = Decimal(0)
     withdrawable = Decimal(0)
     account_value: Decimal | None = None
 
-    try:
-        state = hyperliquid_client.get_clearinghouse_state(whale.address)
-    except Exception:
-        state = None
     if isinstance(state, dict):
         margin = state.get("marginSummary") or {}
         try:
@@ -436,8 +573,7 @@ def _rebuild_hyperliquid_history(session: Session, whale: Whale, trades: list[Tr
             withdrawable = Decimal(0)
 
     if account_value is None:
-        holdings = session.query(Holding).filter(Holding.whale_id == whale.id).all()
-        account_value = _safe_sum(h.value_usd for h in holdings)
+        account_value = holdings_value
 
     cost_basis = account_value - total_realized - latest_unrealized
     if withdrawable > 0:
@@ -446,31 +582,10 @@ def _rebuild_hyperliquid_history(session: Session, whale: Whale, trades: list[Tr
         cost_basis = account_value if account_value and account_value > 0 else Decimal(0)
     starting_equity = cost_basis if cost_basis > 0 else account_value or Decimal(0)
 
-    # Rebuild daily data from scratch; drop stale rows to avoid ghost days with no trades
-    existing_dates = {
-        r.date
-        for r in session.query(WalletMetricsDaily.date)
-        .filter(WalletMetricsDaily.whale_id == whale.id)
-        .all()
-    }
-    daily: dict[date, dict[str, Decimal | int]] = {}
-    cumulative_realized = Decimal(0)
-    for t in trades:
-        trade_date = t.timestamp.date()
-        stats = daily.setdefault(
-            trade_date, {"volume": Decimal(0), "trades": 0, "realized": Decimal(0)}
-        )
-        if t.value_usd is not None:
-            stats["volume"] += abs(Decimal(t.value_usd))
-        stats["trades"] += 1
-        if t.pnl_usd is not None:
-            cumulative_realized += Decimal(t.pnl_usd)
-        stats["realized"] = cumulative_realized
-
-    last_day = max(daily.keys()) if daily else None
+    out: list[dict[str, Any]] = []
     for d in sorted(daily.keys()):
         stats = daily[d]
-        realized_to_date = Decimal(stats.get("realized") or 0)
+        realized_to_date = stats["realized_to_date"]
         equity = starting_equity + realized_to_date if starting_equity is not None else realized_to_date
         unrealized = latest_unrealized if last_day and d == last_day else Decimal(0)
         equity_with_unrealized = equity + unrealized
@@ -482,37 +597,17 @@ def _rebuild_hyperliquid_history(session: Session, whale: Whale, trades: list[Tr
             if cost_basis > 0
             else 0.0
         )
-        existing = (
-            session.query(WalletMetricsDaily)
-            .filter(WalletMetricsDaily.whale_id == whale.id, WalletMetricsDaily.date == d)
-            .one_or_none()
+        out.append(
+            {
+                "whale_id": whale.id,
+                "date": d,
+                "portfolio_value_usd": float(equity_with_unrealized),
+                "roi_percent": roi_percent,
+                "realized_pnl_usd": float(realized_to_date),
+                "unrealized_pnl_usd": float(unrealized),
+                "volume_1d_usd": float(stats["abs_volume"]),
+                "trades_1d": stats["trades"],
+                "win_rate_percent": None,
+            }
         )
-        if existing:
-            existing.portfolio_value_usd = float(equity_with_unrealized)
-            existing.volume_1d_usd = float(stats.get("volume") or 0)
-            existing.trades_1d = int(stats.get("trades") or 0)
-            existing.roi_percent = roi_percent
-            existing.realized_pnl_usd = float(realized_to_date)
-            existing.unrealized_pnl_usd = float(unrealized)
-        else:
-            session.add(
-                WalletMetricsDaily(
-                    whale_id=whale.id,
-                    date=d,
-                    portfolio_value_usd=float(equity_with_unrealized),
-                    roi_percent=roi_percent,
-                    realized_pnl_usd=float(realized_to_date),
-                    unrealized_pnl_usd=float(unrealized),
-                    volume_1d_usd=float(stats.get("volume") or 0),
-                    trades_1d=int(stats.get("trades") or 0),
-                    win_rate_percent=None,
-                )
-            )
-    # Remove any stale days that are no longer represented by trades
-    stale = existing_dates.difference(daily.keys())
-    if stale:
-        session.query(WalletMetricsDaily).filter(
-            WalletMetricsDaily.whale_id == whale.id,
-            WalletMetricsDaily.date.in_(stale),
-        ).delete(synchronize_session="fetch")
-    session.flush()
+    return out
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_EMPTY_TS = np.empty(0, dtype=np.int64)
+_EMPTY_PX = np.empty(0, dtype=np.float64)
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9_.@-]")
+# Asset-months kept mapped at once; each holds two file descriptors.
+MAX_OPEN_MONTHS = 64
+
+
+def _month_of(ts_ms: np.ndarray) -> np.ndarray:
+    """Months since 1970-01 for epoch-ms timestamps."""
+    return ts_ms.astype("datetime64[ms]").astype("datetime64[M]").astype(np.int64)
+
+
+def _month_start_ms(month: int) -> int:
+    return int(np.datetime64(month, "M").astype("datetime64[ms]").astype(np.int64))
+
+
+class PriceArchive:
+    """Append-only columnar archive of historical closes, one pair of files per asset and month.
+
+    `<directory>/<ASSET>/<YYYY-MM>.ts` holds sorted little-endian int64 epoch-ms timestamps and the
+    matching `.px` file float64 closes. Reads map the files with `numpy.memmap` and return copies
+    of the requested slices, so at most `max_open_months` mappings stay open (least recently used
+    first to close) and nothing handed out pins one. Points newer than a month's last
+    timestamp are appended (timestamps first, so a torn append leaves an aligned prefix); anything
+    else rewrites that month through temp files, closes first. A month whose closes outnumber its
+    timestamps can only come from a torn rewrite and is skipped with a warning.
+    """
+
+    def __init__(self, directory: str | os.PathLike | None, max_open_months: int = MAX_OPEN_MONTHS) -> None:
+        self.directory = Path(directory) if directory else None
+        self.max_open_months = max(1, max_open_months)
+        self._lock = threading.RLock()
+        self._maps: OrderedDict[tuple[str, int], tuple[np.ndarray, np.ndarray]] = OrderedDict()
+        self._appends = 0
+        self._rewrites = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def write(self, asset: str, ts_ms: np.ndarray, px: np.ndarray) -> int:
+        """Store closes for `asset`; later values win on equal timestamps. Returns points written."""
+        if self.directory is None or not len(ts_ms):
+            return 0
+        ts_ms = np.asarray(ts_ms, dtype=np.int64)
+        px = np.asarray(px, dtype=np.float64)
+        order = np.argsort(ts_ms, kind="stable")
+        ts_ms, px = ts_ms[order], px[order]
+        keep = np.append(ts_ms[1:] != ts_ms[:-1], True)
+        ts_ms, px = ts_ms[keep], px[keep]
+        months = _month_of(ts_ms)
+        bounds = np.flatnonzero(np.diff(months)) + 1
+        with self._lock:
+            for lo, hi in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [len(ts_ms)]))):
+                self._write_month(asset.upper(), int(months[lo]), ts_ms[lo:hi], px[lo:hi])
+        return len(ts_ms)
+
+    def read(self, asset: str, start_ms: int, end_ms: int) -> tuple[np.ndarray, np.ndarray]:
+        """Closes with start_ms <= ts < end_ms, copied out of the mapped months."""
+        if self.directory is None or end_ms <= start_ms:
+            return _EMPTY_TS, _EMPTY_PX
+        asset = asset.upper()
+        first, last = (int(m) for m in _month_of(np.array([start_ms, end_ms - 1], dtype=np.int64)))
+        parts = []
+        with self._lock:
+            for month in range(first, last + 1):
+                ts, px = self._open(asset, month)
+                lo = int(np.searchsorted(ts, start_ms, side="left"))
+                hi = int(np.searchsorted(ts, end_ms, side="left"))
+                if hi > lo:
+                    parts.append((np.array(ts[lo:hi]), np.array(px[lo:hi])))
+        if not parts:
+            return _EMPTY_TS, _EMPTY_PX
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "open_months": len(self._maps),
+                "max_open_months": self.max_open_months,
+                "appends": self._appends,
+                "rewrites": self._rewrites,
+            }
+
+    def _paths(self, asset: str, month: int) -> tuple[Path, Path]:
+        assert self.directory is not None
+        label = str(np.datetime64(month, "M"))
+        folder = self.directory / _UNSAFE_CHARS.sub("_", asset)
+        return folder / f"{label}.ts", folder / f"{label}.px"
+
+    def _open(self, asset: str, month: int) -> tuple[np.ndarray, np.ndarray]:
+        cached = self._maps.get((asset, month))
+        if cached is not None:
+            self._maps.move_to_end((asset, month))
+            return cached
+        ts_path, px_path = self._paths(asset, month)
+        n_ts = ts_path.stat().st_size // 8 if ts_path.exists() else 0
+        n_px = px_path.stat().st_size // 8 if px_path.exists() else 0
+        if n_px > n_ts:
+            logger.warning("price archive %s %s is torn (%d closes, %d timestamps); skipping", asset, ts_path.stem, n_px, n_ts)
+            n_ts = n_px = 0
+        n = min(n_ts, n_px)
+        if n == 0:
+            arrays = (_EMPTY_TS, _EMPTY_PX)
+        else:
+            arrays = (
+                np.memmap(ts_path, dtype="<i8", mode="r", shape=(n,)),
+                np.memmap(px_path, dtype="<f8", mode="r", shape=(n,)),
+            )
+        self._maps[(asset, month)] = arrays
+        while len(self._maps) > self.max_open_months:
+            # Reads only hand out copies, so dropping the arrays unmaps the files.
+            self._maps.popitem(last=False)
+        return arrays
+
+    def _write_month(self, asset: str, month: int, ts: np.ndarray, px: np.ndarray) -> None:
+        old_ts, old_px = self._open(asset, month)
+        ts_path, px_path = self._paths(asset, month)
+        ts_path.parent.mkdir(parents=True, exist_ok=True)
+        self._maps.pop((asset, month), None)
+        if not len(old_ts) or ts[0] > old_ts[-1]:
+            # Drop any unmatched tail from an interrupted append before extending both columns.
+            n = len(old_ts)
+            for path in (ts_path, px_path):
+                if path.exists() and path.stat().st_size != n * 8:
+                    os.truncate(path, n * 8)
+            with open(ts_path, "ab") as fh:
+                fh.write(ts.astype("<i8").tobytes())
+            with open(px_path, "ab") as fh:
+                fh.write(px.astype("<f8").tobytes())
+            self._appends += 1
+            return
+        merged_ts = np.concatenate([np.asarray(old_ts), ts])
+        merged_px = np.concatenate([np.asarray(old_px), px])
+        order = np.argsort(merged_ts, kind="stable")
+        merged_ts, merged_px = merged_ts[order], merged_px[order]
+        keep = np.append(merged_ts[1:] != merged_ts[:-1], True)
+        del old_ts, old_px
+        for path, values, dtype in ((px_path, merged_px[keep], "<f8"), (ts_path, merged_ts[keep], "<i8")):
+            tmp = path.with_suffix(path.suffix + ".tmp")
+            values.astype(dtype).tofile(tmp)
+            os.replace(tmp, path)
+        self._rewrites += 1
+
+
+price_archive = PriceArchive(settings.price_archive_dir)
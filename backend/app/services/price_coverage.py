@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable
+
+from sqlalchemy.orm import Session
+
+from app.db.session import ensure_table
+from app.models import PriceCoverage
+from app.services.price_store import to_epoch_ms
+
+TIMEFRAME_MS = {
+    "1m": 60_000,
+    "3m": 180_000,
+    "5m": 300_000,
+    "15m": 900_000,
+    "30m": 1_800_000,
+    "1h": 3_600_000,
+    "2h": 7_200_000,
+    "4h": 14_400_000,
+    "1d": 86_400_000,
+}
+# Holes of up to this many candles between two covered stretches (exchange hiccups) do not split
+# coverage or count as missing; uncovered window edges always do.
+GAP_CANDLES = 5
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def timeframe_ms(timeframe: str) -> int:
+    try:
+        return TIMEFRAME_MS[timeframe]
+    except KeyError:
+        raise ValueError(f"Unsupported timeframe: {timeframe}") from None
+
+
+def to_dt(ms: int) -> datetime:
+    return _EPOCH + timedelta(milliseconds=ms)
+
+
+def mark_covered(session: Session, asset: str, timeframe: str, start: datetime | int, end: datetime | int) -> None:
+    """Record that every `timeframe` candle for `asset` in [start, end] is stored (or does not exist)."""
+    if not ensure_table(session, PriceCoverage):
+        return
+    step = timeframe_ms(timeframe)
+    lo = start if isinstance(start, int) else to_epoch_ms(start)
+    hi = end if isinstance(end, int) else to_epoch_ms(end)
+    if hi < lo:
+        return
+    asset = asset.upper()
+    tolerance = GAP_CANDLES * step
+    overlapping = (
+        session.query(PriceCoverage)
+        .filter(
+            PriceCoverage.asset_symbol == asset,
+            PriceCoverage.timeframe == timeframe,
+            PriceCoverage.start_ts <= to_dt(hi + tolerance),
+            PriceCoverage.end_ts >= to_dt(lo - tolerance),
+        )
+        .all()
+    )
+    for row in overlapping:
+        lo = min(lo, to_epoch_ms(row.start_ts))
+        hi = max(hi, to_epoch_ms(row.end_ts))
+        session.delete(row)
+    session.add(PriceCoverage(asset_symbol=asset, timeframe=timeframe, start_ts=to_dt(lo), end_ts=to_dt(hi)))
+
+
+def contiguous_runs(timestamps_ms: Iterable[int], timeframe: str) -> list[tuple[int, int]]:
+    """Split sorted candle timestamps into runs whose internal holes are within the gap tolerance."""
+    tolerance = GAP_CANDLES * timeframe_ms(timeframe)
+    runs: list[tuple[int, int]] = []
+    for ts in timestamps_ms:
+        if runs and ts - runs[-1][1] <= tolerance:
+            runs[-1] = (runs[-1][0], max(runs[-1][1], ts))
+        else:
+            runs.append((ts, ts))
+    return runs
+
+
+def record_rows(session: Session, rows: Iterable[dict[str, Any]], timeframe: str) -> None:
+    """Extend coverage with freshly upserted price_history rows of a known candle timeframe."""
+    by_asset: dict[str, list[int]] = {}
+    for row in rows:
+        ts = row.get("timestamp")
+        asset = (row.get("asset_symbol") or "").upper()
+        if ts is None or not asset or row.get("price_usd") is None:
+            continue
+        by_asset.setdefault(asset, []).append(to_epoch_ms(ts))
+    for asset, stamps in by_asset.items():
+        for lo, hi in contiguous_runs(sorted(stamps), timeframe):
+            mark_covered(session, asset, timeframe, lo, hi)
+
+
+def covered_intervals(
+    session: Session, asset: str, start: datetime, end: datetime, timeframe: str = "1m"
+) -> list[tuple[int, int]]:
+    """Epoch-ms coverage intervals intersecting [start, end], ordered by start."""
+    if not ensure_table(session, PriceCoverage):
+        return []
+    tolerance = GAP_CANDLES * timeframe_ms(timeframe)
+    rows = (
+        session.query(PriceCoverage.start_ts, PriceCoverage.end_ts)
+        .filter(
+            PriceCoverage.asset_symbol == asset.upper(),
+            PriceCoverage.timeframe == timeframe,
+            PriceCoverage.start_ts <= end + timedelta(milliseconds=tolerance),
+            PriceCoverage.end_ts >= start - timedelta(milliseconds=tolerance),
+        )
+        .order_by(PriceCoverage.start_ts)
+        .all()
+    )
+    return [(to_epoch_ms(lo), to_epoch_ms(hi)) for lo, hi in rows]
+
+
+def missing_ranges(
+    session: Session, asset: str, start: datetime, end: datetime, timeframe: str = "1m"
+) -> list[tuple[int, int]]:
+    """Epoch-ms [lo, hi] ranges of `timeframe` candles for `asset` in [start, end] not yet stored.
+
+    Holes of up to GAP_CANDLES between two covered intervals are ignored; uncovered stretches
+    before the first or after the last interval are always reported. Reads only the handful of
+    coverage intervals touching the window, so the cost does not depend on how many candles
+    price_history holds.
+    """
+    step = timeframe_ms(timeframe)
+    tolerance = GAP_CANDLES * step
+    start_ms, end_ms = to_epoch_ms(start), to_epoch_ms(end)
+    if end_ms < start_ms:
+        return []
+    missing: list[tuple[int, int]] = []
+
+    def add(lo: int, hi: int) -> None:
+        lo, hi = max(lo, start_ms), min(hi, end_ms)
+        if lo <= hi:
+            missing.append((lo, hi))
+
+    prev_end: int | None = None
+    for lo, hi in covered_intervals(session, asset, start, end, timeframe):
+        if prev_end is None:
+            add(start_ms, lo - step)
+        elif lo - prev_end > tolerance:
+            add(prev_end + step, lo - step)
+        prev_end = hi if prev_end is None else max(prev_end, hi)
+        if prev_end >= end_ms:
+            return missing
+    # Nothing covers the window's tail (or any of it): missing regardless of the tolerance.
+    add(start_ms if prev_end is None else prev_end + step, end_ms)
+    return missing
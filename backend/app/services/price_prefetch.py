@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Iterable
+
+import ccxt  # type: ignore
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.services import price_coverage
+from app.services.price_coverage import timeframe_ms
+from app.services.price_service import iter_binance_closes, store_price_rows
+from app.services.price_store import to_epoch_ms
+from app.services.rate_limiter import Priority, TokenBucket, current_priority
+
+logger = logging.getLogger(__name__)
+
+# ccxt caps Binance spot fetch_ohlcv at 1000 candles per call.
+CANDLES_PER_REQUEST = 1000
+UPSERT_BATCH_SIZE = 3000
+# How often a prefetch polls its caller's checkpoint while ranges download.
+CHECKPOINT_SECONDS = 1.0
+
+
+class _PrefetchStopped(Exception):
+    """Raised inside fetch workers once their prefetch was aborted."""
+
+
+class PrefetchIncomplete(Exception):
+    """Raised by `PricePrefetcher.prefetch` after storing what it could when some ranges failed."""
+
+    def __init__(self, written: int, failed: int) -> None:
+        super().__init__(f"{failed} price range(s) failed to download")
+        self.written = written
+        self.failed = failed
+
+
+class PricePrefetcher:
+    """Fills only the 1m candle gaps a backtest window is missing, fetching assets concurrently.
+
+    Missing sub-ranges come from the `price_coverage` index (any hole wider than its gap tolerance
+    counts), nearby holes are fetched with one paginated request run, and fetches run on a small
+    thread pool sharing one Binance `TokenBucket` in the caller's priority lane. Workers hand rows
+    back in `UPSERT_BATCH_SIZE` chunks through a bounded queue, and the caller's session upserts
+    them in large batches, marking each range covered up to where its pagination got. That includes
+    stretches Binance had no candles for (e.g. before an asset was listed), so they are not
+    re-requested by every backtest; symbols Binance does not list are skipped for `negative_ttl_seconds`.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        max_rps: float = 10.0,
+        burst: float = 10.0,
+        negative_ttl_seconds: float = 6 * 3600,
+    ) -> None:
+        self.max_workers = max(1, max_workers)
+        self.negative_ttl_seconds = negative_ttl_seconds
+        # max_rps <= 0 disables throttling (tests, local mirrors).
+        self.limiter = TokenBucket(rate=max_rps, burst=burst) if max_rps > 0 else None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._unsupported: dict[str, float] = {}
+
+    def missing_ranges(
+        self, session: Session, assets: Iterable[str], start: datetime, end: datetime, timeframe: str = "1m"
+    ) -> dict[str, list[tuple[int, int]]]:
+        """Per asset, the epoch-ms [lo, hi] ranges inside [start, end] without `timeframe` coverage."""
+        now = time.monotonic()
+        out: dict[str, list[tuple[int, int]]] = {}
+        for asset in sorted({a.upper() for a in assets if a}):
+            if self._unsupported.get(asset, 0.0) > now:
+                continue
+            ranges = price_coverage.missing_ranges(session, asset, start, end, timeframe)
+            if ranges:
+                out[asset] = self._coalesce(ranges, timeframe)
+        return out
+
+    def prefetch(
+        self,
+        session: Session,
+        assets: Iterable[str],
+        start: datetime,
+        end: datetime,
+        timeframe: str = "1m",
+        checkpoint: Callable[[], None] | None = None,
+    ) -> int:
+        """Fetch and upsert missing candles for `assets` over [start, end]; returns rows written.
+
+        `checkpoint` is polled while ranges download; whatever it raises stops the outstanding
+        fetches and propagates. If any range fails to download, the rest are still stored and
+        marked covered, then `PrefetchIncomplete` is raised.
+        """
+        missing = self.missing_ranges(session, assets, start, end, timeframe)
+        tasks = [(asset, lo, hi) for asset, ranges in missing.items() for lo, hi in ranges]
+        if not tasks:
+            return 0
+        logger.info(
+            "prefetching %d price ranges for %d assets (%s)",
+            len(tasks),
+            len(missing),
+            ", ".join(sorted(missing)),
+        )
+        written = failed = 0
+        batch: list[dict[str, Any]] = []
+        covered: list[tuple[str, int, int]] = []
+        # Candles near "now" may not exist yet, so coverage never reaches past this horizon.
+        horizon = int(time.time() * 1000) - 2 * timeframe_ms(timeframe)
+
+        def flush() -> None:
+            nonlocal batch, covered
+            if batch:
+                store_price_rows(session, batch, timeframe=timeframe)
+            for asset, lo, hi in covered:
+                price_coverage.mark_covered(session, asset, timeframe, lo, min(hi, horizon))
+            batch, covered = [], []
+
+        workers = min(self.max_workers, len(tasks))
+        # Bounded, so slow upserts hold workers back instead of piling whole ranges up in memory.
+        chunks: queue.Queue = queue.Queue(maxsize=2 * workers)
+        stop = threading.Event()
+        # Worker threads start on the default lane; carry the caller's over explicitly.
+        priority = current_priority()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="price-prefetch") as pool:
+            futures = {
+                pool.submit(self._fetch_range, asset, lo, hi, timeframe, stop, priority, chunks): (asset, lo, hi)
+                for asset, lo, hi in tasks
+            }
+            pending = set(futures)
+            try:
+                # A finished worker has already queued all of its chunks, so drain before stopping.
+                while pending or not chunks.empty():
+                    try:
+                        asset, lo, rows, reached = chunks.get(timeout=CHECKPOINT_SECONDS)
+                    except queue.Empty:
+                        rows = None
+                    if checkpoint is not None:
+                        checkpoint()
+                    if rows is not None:
+                        # Upserts stay on the caller's thread and session; workers only talk to Binance.
+                        batch.extend(rows)
+                        written += len(rows)
+                        # Pagination only moves past candles Binance returned, so holes before the
+                        # cursor (such as the stretch before a listing) really are empty.
+                        covered.append((asset, lo, reached - 1))
+                        if len(batch) >= UPSERT_BATCH_SIZE:
+                            flush()
+                    for future in [f for f in pending if f.done()]:
+                        pending.discard(future)
+                        if future.exception() is not None:
+                            asset, lo, hi = futures[future]
+                            logger.warning(
+                                "price prefetch failed for %s [%s, %s]: %s", asset, lo, hi, future.exception()
+                            )
+                            failed += 1
+            except BaseException:
+                stop.set()
+                for future in pending:
+                    future.cancel()
+                raise
+        flush()
+        if failed:
+            raise PrefetchIncomplete(written, failed)
+        return written
+
+    def _fetch_range(
+        self,
+        asset: str,
+        lo: int,
+        hi: int,
+        timeframe: str,
+        stop: threading.Event,
+        priority: Priority,
+        chunks: queue.Queue,
+    ) -> None:
+        """Page through [lo, hi], queueing `(asset, lo, rows, reached)` every `UPSERT_BATCH_SIZE` rows.
+
+        `reached` is the cursor the pagination got to (see `iter_binance_closes`), so a range that
+        fails partway keeps the chunks queued before the failure.
+        """
+        client = getattr(self._local, "client", None)
+        if client is None:
+            # ccxt clients are not thread-safe; one per worker, throttled by the shared limiter.
+            client = self._local.client = ccxt.binance({"enableRateLimit": False})
+
+        def throttle() -> None:
+            if stop.is_set():
+                raise _PrefetchStopped()
+            if self.limiter is not None:
+                self.limiter.acquire(priority=priority)
+
+        def send(rows: list[dict[str, Any]], reached: int) -> None:
+            while True:
+                if stop.is_set():
+                    raise _PrefetchStopped()
+                try:
+                    chunks.put((asset, lo, rows, reached), timeout=CHECKPOINT_SECONDS)
+                    return
+                except queue.Full:
+                    continue
+
+        rows: list[dict[str, Any]] = []
+        pages = iter_binance_closes(client, asset, timeframe, lo, hi, CANDLES_PER_REQUEST, throttle=throttle)
+        try:
+            while True:
+                rows.append(next(pages))
+                if len(rows) >= UPSERT_BATCH_SIZE:
+                    # Every candle up to the last one yielded has been seen.
+                    send(rows, to_epoch_ms(rows[-1]["timestamp"]) + 1)
+                    rows = []
+        except StopIteration as done:
+            send(rows, done.value)
+        except ccxt.BadSymbol:
+            with self._lock:
+                self._unsupported[asset] = time.monotonic() + self.negative_ttl_seconds
+            logger.info("Binance does not list %s; skipping price prefetch for it", asset)
+
+    def _coalesce(self, ranges: list[tuple[int, int]], timeframe: str) -> list[tuple[int, int]]:
+        # Bridging a hole shorter than half a request is cheaper than starting another request run.
+        bridge_ms = CANDLES_PER_REQUEST // 2 * timeframe_ms(timeframe)
+        merged = [ranges[0]]
+        for lo, hi in ranges[1:]:
+            if lo - merged[-1][1] <= bridge_ms:
+                merged[-1] = (merged[-1][0], hi)
+            else:
+                merged.append((lo, hi))
+        return merged
+
+
+price_prefetcher = PricePrefetcher(
+    max_workers=settings.price_prefetch_workers,
+    max_rps=settings.binance_max_rps,
+    burst=settings.binance_burst,
+)
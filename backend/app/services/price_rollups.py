@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from typing import Any, Iterable
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.db.session import ensure_table
+from app.models import PriceRollup
+from app.services.price_coverage import timeframe_ms, to_dt
+from app.services.price_store import BASE_RESOLUTION, to_epoch_ms
+
+# Rollups kept alongside price_history, finest first.
+ROLLUP_RESOLUTIONS = ("5m", "15m", "1h", "1d")
+# Keeps multi-row upserts under SQLite's bound-parameter limit.
+UPSERT_CHUNK_ROWS = 1000
+
+
+def resolution_for_step(step_ms: int) -> str:
+    """Coarsest stored resolution whose spacing does not exceed a reader's step size."""
+    chosen = BASE_RESOLUTION
+    for resolution in ROLLUP_RESOLUTIONS:
+        if timeframe_ms(resolution) <= step_ms:
+            chosen = resolution
+    return chosen
+
+
+def rollup_rows(rows: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Per (asset, resolution, bucket), the latest of `rows` as a price_rollups row."""
+    latest: dict[tuple[str, str, int], tuple[int, Any]] = {}
+    for row in rows:
+        ts = row.get("timestamp")
+        price = row.get("price_usd")
+        asset = (row.get("asset_symbol") or "").upper()
+        if ts is None or price is None or not asset:
+            continue
+        ms = to_epoch_ms(ts)
+        for resolution in ROLLUP_RESOLUTIONS:
+            step = timeframe_ms(resolution)
+            key = (asset, resolution, ms - ms % step)
+            current = latest.get(key)
+            if current is None or ms >= current[0]:
+                latest[key] = (ms, price)
+    return [
+        {
+            "asset_symbol": asset,
+            "resolution": resolution,
+            "bucket_ts": to_dt(bucket_ms),
+            "source_ts": to_dt(source_ms),
+            "price_usd": price,
+        }
+        for (asset, resolution, bucket_ms), (source_ms, price) in latest.items()
+    ]
+
+
+def upsert_rollups(session: Session, rows: Iterable[dict[str, Any]]) -> None:
+    """Fold freshly upserted price_history rows into every rollup resolution.
+
+    A bucket only moves to a base row at least as recent as the one it already holds, so batches
+    can arrive in any order (backfills, prefetches, live updates) and the result stays the bucket's
+    last known price.
+    """
+    rollups = rollup_rows(rows)
+    if not rollups or not ensure_table(session, PriceRollup):
+        return
+
+    bind = session.get_bind()
+    dialect = bind.dialect.name if bind else ""
+    if dialect in {"sqlite", "postgresql", "postgres"}:
+        insert = sqlite_insert if dialect == "sqlite" else pg_insert
+        for offset in range(0, len(rollups), UPSERT_CHUNK_ROWS):
+            stmt = insert(PriceRollup).values(rollups[offset : offset + UPSERT_CHUNK_ROWS])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["asset_symbol", "resolution", "bucket_ts"],
+                set_={"source_ts": stmt.excluded.source_ts, "price_usd": stmt.excluded.price_usd},
+                where=stmt.excluded.source_ts >= PriceRollup.__table__.c.source_ts,
+            )
+            session.execute(stmt)
+        return
+
+    for row in rollups:
+        existing = (
+            session.query(PriceRollup)
+            .filter(
+                PriceRollup.asset_symbol == row["asset_symbol"],
+                PriceRollup.resolution == row["resolution"],
+                PriceRollup.bucket_ts == row["bucket_ts"],
+            )
+            .one_or_none()
+        )
+        if existing is None:
+            session.add(PriceRollup(**row))
+        elif to_epoch_ms(row["source_ts"]) >= to_epoch_ms(existing.source_ts):
+            existing.source_ts = row["source_ts"]
+            existing.price_usd = row["price_usd"]
@@ -1,15 +1,24 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
+import logging
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
-from typing import Any, Sequence
+from typing import Any, Callable, Generator, Sequence
 
 import ccxt  # type: ignore
+import numpy as np
 from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
 from app.models import PriceHistory
+from app.core.config import settings
+from app.services.price_archive import price_archive
+from app.services.price_coverage import record_rows
+from app.services.price_rollups import upsert_rollups
+from app.services.price_store import price_store, to_epoch_ms
+
+logger = logging.getLogger(__name__)
 
 
 exchange = ccxt.binance({"enableRateLimit": True})
@@ -22,7 +31,8 @@ def _exchange_symbol(asset: str) -> str:
     return f"{base}/USDT"
 
 
-def bulk_upsert_prices(session: Session, rows: list[dict[str, Any]]) -> None:
+def bulk_upsert_prices(session: Session, rows: list[dict[str, Any]], timeframe: str | None = None) -> None:
+    """Upsert price_history rows and their rollups; with a candle `timeframe`, also extend price_coverage."""
     if not rows:
         return
 
@@ -43,6 +53,133 @@ def bulk_upsert_prices(session: Session, rows: list[dict[str, Any]]) -> None:
         session.execute(stmt)
     else:
         session.add_all([PriceHistory(**row) for row in rows])
+    upsert_rollups(session, rows)
+    price_store.merge_on_commit(session, rows)
+    if timeframe is not None:
+        record_rows(session, rows, timeframe)
+
+
+def retention_cutoff() -> datetime | None:
+    """Oldest timestamp price_history keeps once an archive is configured, else None."""
+    if not price_archive.enabled or settings.price_db_retention_days <= 0:
+        return None
+    return datetime.now(timezone.utc) - timedelta(days=settings.price_db_retention_days)
+
+
+def archive_rows(rows: Sequence[dict[str, Any]]) -> int:
+    """Append price_history-shaped rows to the on-disk price archive."""
+    by_asset: dict[str, list[tuple[int, float]]] = {}
+    for row in rows:
+        asset = (row.get("asset_symbol") or "").upper()
+        if not asset or row.get("timestamp") is None or row.get("price_usd") is None:
+            continue
+        by_asset.setdefault(asset, []).append((to_epoch_ms(row["timestamp"]), float(row["price_usd"])))
+    written = 0
+    for asset, points in by_asset.items():
+        ts = np.fromiter((p[0] for p in points), dtype=np.int64, count=len(points))
+        px = np.fromiter((p[1] for p in points), dtype=np.float64, count=len(points))
+        written += price_archive.write(asset, ts, px)
+    return written
+
+
+def store_price_rows(session: Session, rows: list[dict[str, Any]], timeframe: str | None = None) -> None:
+    """Like `bulk_upsert_prices`, but rows older than the DB retention window go to the archive."""
+    cutoff = retention_cutoff()
+    if cutoff is None:
+        bulk_upsert_prices(session, rows, timeframe=timeframe)
+        return
+    cutoff_ms = to_epoch_ms(cutoff)
+    cold = [row for row in rows if to_epoch_ms(row["timestamp"]) < cutoff_ms]
+    hot = [row for row in rows if to_epoch_ms(row["timestamp"]) >= cutoff_ms] if cold else rows
+    if hot:
+        bulk_upsert_prices(session, hot, timeframe=timeframe)
+    if cold:
+        archive_rows(cold)
+        upsert_rollups(session, cold)
+        # Already on disk whatever the transaction does, so readers may see them right away.
+        price_store.merge(cold)
+        if timeframe is not None:
+            record_rows(session, cold, timeframe)
+
+
+def prune_price_history(session: Session, batch_size: int = 50_000) -> int:
+    """Move price_history rows older than the retention window into the archive; returns rows moved.
+
+    Rows are archived per asset before they are deleted, and each asset commits on its own, so an
+    interrupted prune never drops prices that are not yet on disk.
+    """
+    cutoff = retention_cutoff()
+    if cutoff is None:
+        return 0
+    assets = [
+        r[0]
+        for r in session.query(PriceHistory.asset_symbol).filter(PriceHistory.timestamp < cutoff).distinct()
+        if r[0]
+    ]
+    moved = 0
+    for asset in sorted(assets):
+        old = (
+            session.query(PriceHistory.timestamp, PriceHistory.price_usd)
+            .filter(PriceHistory.asset_symbol == asset, PriceHistory.timestamp < cutoff)
+            .order_by(PriceHistory.timestamp)
+            .yield_per(batch_size)
+        )
+        batch: list[dict[str, Any]] = []
+        for ts, price in old:
+            batch.append({"asset_symbol": asset, "timestamp": ts, "price_usd": price})
+            if len(batch) >= batch_size:
+                moved += archive_rows(batch)
+                batch = []
+        if batch:
+            moved += archive_rows(batch)
+        session.query(PriceHistory).filter(
+            PriceHistory.asset_symbol == asset, PriceHistory.timestamp < cutoff
+        ).delete(synchronize_session=False)
+        session.commit()
+    if moved:
+        logger.info("archived and pruned %d price_history rows older than %s", moved, cutoff.isoformat())
+    return moved
+
+
+def iter_binance_closes(
+    client: Any,
+    asset: str,
+    timeframe: str,
+    since_ms: int | None,
+    until_ms: int | None,
+    limit: int = 1000,
+    throttle: Callable[[], None] | None = None,
+) -> Generator[dict[str, Any], None, int | None]:
+    """Yield price_history rows of candle closes for `asset`, paginating `fetch_ohlcv` up to `until_ms`.
+
+    Pages end on an empty response or once the cursor passes `until_ms`, never on a short page:
+    ccxt clamps `limit` to the market's own maximum, so a page shorter than asked is not the end.
+    Returns the final cursor: every candle Binance has before it (from `since_ms`) was yielded.
+    """
+    market = _exchange_symbol(asset)
+    cursor = since_ms
+    while True:
+        if throttle is not None:
+            throttle()
+        ohlcv = client.fetch_ohlcv(market, timeframe=timeframe, since=cursor, limit=limit)
+        if not ohlcv:
+            return cursor
+        for ts_ms, _, _, _, close, _ in ohlcv:
+            if until_ms and ts_ms > until_ms:
+                break
+            try:
+                price = Decimal(close)
+            except Exception:
+                continue
+            yield {
+                "asset_symbol": asset.upper(),
+                "timestamp": datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc),
+                "price_usd": price,
+            }
+        # paginate
+        cursor = ohlcv[-1][0] + 1
+        if until_ms and cursor > until_ms:
+            return cursor
 
 
 def fetch_and_store_binance_prices(
@@ -51,10 +188,11 @@ def fetch_and_store_binance_prices(
     timeframe: str = "1h",
     since: datetime | None = None,
     until: datetime | None = None,
-    limit: int = 1500,
+    limit: int = 1000,
 ) -> int:
     """
-    Fetch OHLCV closes from Binance via ccxt for the given assets and persist to price_history.
+    Fetch OHLCV closes from Binance via ccxt for the given assets and persist to price_history
+    (or to the price archive for candles older than the DB retention window).
 
     Args:
         session: SQLAlchemy session.
@@ -62,7 +200,7 @@ def fetch_and_store_binance_prices(
         timeframe: ccxt timeframe (e.g., "1h", "4h", "1d").
         since: Optional start datetime (UTC); defaults to None (Binance default).
         until: Optional end datetime (UTC); used to stop pagination.
-        limit: Max candles per ccxt call (Binance supports up to 1500 depending on market/timeframe).
+        limit: Max candles per ccxt call (ccxt caps Binance spot at 1000).
 
     Returns:
         int: Number of price rows written/upserted.
@@ -75,37 +213,16 @@ def fetch_and_store_binance_prices(
     for asset in assets:
         batch: list[dict[str, Any]] = []
         try:
-            market = _exchange_symbol(asset)
-            cursor = since_ms
-            while True:
-                ohlcv = exchange.fetch_ohlcv(market, timeframe=timeframe, since=cursor, limit=limit)
-                if not ohlcv:
-                    break
-                for ts_ms, _, _, _, close, _ in ohlcv:
-                    ts = datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc)
-                    if until_ms and ts_ms > until_ms:
-                        break
-                    try:
-                        price = Decimal(close)
-                    except Exception:
-                        continue
-                    batch.append(
-                        {"asset_symbol": asset.upper(), "timestamp": ts, "price_usd": price}
-                    )
-                    if len(batch) >= batch_size:
-                        bulk_upsert_prices(session, batch)
-                        batch.clear()
-                    written += 1
-                if len(ohlcv) < limit:
-                    break
-                # paginate
-                cursor = ohlcv[-1][0] + 1
-                if until_ms and cursor > until_ms:
-                    break
+            for row in iter_binance_closes(exchange, asset, timeframe, since_ms, until_ms, limit):
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    store_price_rows(session, batch, timeframe=timeframe)
+                    batch.clear()
+                written += 1
         except Exception:
             continue
         finally:
             if batch:
-                bulk_upsert_prices(session, batch)
+                store_price_rows(session, batch, timeframe=timeframe)
                 batch.clear()
     return written
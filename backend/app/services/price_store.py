@@ -0,0 +1,364 @@
+from __future__ import annotations
+
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable, Sequence
+
+import numpy as np
+from sqlalchemy import and_, event, or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import ensure_table
+from app.models import PriceCoverage, PriceHistory, PriceRollup
+from app.services.price_archive import price_archive
+
+logger = logging.getLogger(__name__)
+
+CHUNK_MS = 7 * 86_400_000  # one week of prices per asset chunk
+BASE_RESOLUTION = "1m"  # price_history itself; coarser resolutions come from price_rollups
+# Time windows OR'd into one `windows` query, keeping bound parameters under SQLite's limit.
+WINDOWS_PER_QUERY = 200
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Session.info key holding rows written in the open transaction (see `merge_on_commit`).
+_PENDING_KEY = "price_store_pending"
+_EMPTY_TS = np.empty(0, dtype=np.int64)
+_EMPTY_PX = np.empty(0, dtype=np.float64)
+
+# Per-asset price series: (epoch-ms int64 timestamps, float64 prices), sorted by timestamp.
+PriceSeries = tuple[np.ndarray, np.ndarray]
+
+
+def to_epoch_ms(ts: datetime) -> int:
+    """Integer milliseconds since epoch (floored); naive timestamps are treated as UTC."""
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return (ts - _EPOCH) // timedelta(milliseconds=1)
+
+
+def from_epoch_ms(values: Iterable[int], *, aware: bool) -> list[datetime]:
+    """Datetimes for epoch-ms values, tz-aware UTC or naive UTC to match the caller's timestamps."""
+    if aware:
+        return [_EPOCH + timedelta(milliseconds=int(v)) for v in values]
+    naive_epoch = _EPOCH.replace(tzinfo=None)
+    return [naive_epoch + timedelta(milliseconds=int(v)) for v in values]
+
+
+def series_from_points(timestamps: Sequence[datetime], prices: Sequence[Any]) -> PriceSeries:
+    ts = np.fromiter((to_epoch_ms(t) for t in timestamps), dtype=np.int64, count=len(timestamps))
+    px = np.fromiter((float(p) for p in prices), dtype=np.float64, count=len(prices))
+    order = np.argsort(ts, kind="stable")
+    return ts[order], px[order]
+
+
+def _overlay(base: PriceSeries, top: PriceSeries) -> PriceSeries:
+    """Union of two series; `top` wins where both have a timestamp."""
+    ts = np.concatenate([base[0], top[0]])
+    px = np.concatenate([base[1], top[1]])
+    order = np.argsort(ts, kind="stable")
+    ts, px = ts[order], px[order]
+    # Stable sort keeps `top` values last within equal timestamps; keep those.
+    keep = np.append(ts[1:] != ts[:-1], True)
+    return ts[keep], px[keep]
+
+
+class PriceStore:
+    """Process-wide columnar cache of `price_history`.
+
+    Prices are held per asset in week-long chunks of int64 epoch-ms / float64 arrays, loaded lazily
+    for the requested range and shared by every backtest in the process. Rows written through
+    `bulk_upsert_prices` are merged into chunks that are already resident once their transaction
+    commits, and the least recently used chunks are evicted once the store exceeds its memory cap.
+    Writes made by other processes are picked up through `price_coverage`: a resident chunk is
+    reloaded once the coverage ranges inside it differ from those it was loaded under.
+
+    Base chunks also read the on-disk price archive when one is configured; rows still in the
+    database win on equal timestamps. Coarser resolutions are read from `price_rollups` into their
+    own chunks, timestamped with each bucket's source timestamp so lookups stay point-in-time. Resident rollup chunks touched by a
+    merge are dropped and reloaded on next use rather than recomputed here.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._chunks: OrderedDict[tuple[str, str, int], PriceSeries] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        # Coverage ranges each resident chunk was loaded under (see `_coverage`).
+        self._coverage_seen: dict[tuple[str, str, int], tuple] = {}
+        # Bumped by merges and invalidations so loads racing them do not cache what they read.
+        self._generation = 0
+        self._chunk_hits = 0
+        self._chunk_loads = 0
+        self._evictions = 0
+
+    def series(
+        self, session: Session, asset: str, start: datetime, end: datetime, resolution: str = BASE_RESOLUTION
+    ) -> PriceSeries:
+        """Prices for `asset` with start <= timestamp <= end (copies, safe to keep)."""
+        return self.load(session, [asset], start, end, resolution).get(asset.upper(), (_EMPTY_TS, _EMPTY_PX))
+
+    def load(
+        self,
+        session: Session,
+        assets: Iterable[str],
+        start: datetime,
+        end: datetime,
+        resolution: str = BASE_RESOLUTION,
+    ) -> dict[str, PriceSeries]:
+        start_ms, end_ms = to_epoch_ms(start), to_epoch_ms(end)
+        first_chunk, last_chunk = start_ms // CHUNK_MS, end_ms // CHUNK_MS
+        out: dict[str, PriceSeries] = {}
+        for asset in sorted({a.upper() for a in assets if a}):
+            parts = self._chunks_for(session, asset, resolution, first_chunk, last_chunk)
+            ts = np.concatenate([p[0] for p in parts])
+            px = np.concatenate([p[1] for p in parts])
+            lo = int(np.searchsorted(ts, start_ms, side="left"))
+            hi = int(np.searchsorted(ts, end_ms, side="right"))
+            if hi > lo:
+                out[asset] = (ts[lo:hi], px[lo:hi])
+        with self._lock:
+            self._evict()
+        return out
+
+    def windows(self, session: Session, asset: str, windows: Sequence[tuple[int, int]]) -> PriceSeries:
+        """Base prices for `asset` inside the sorted, disjoint [lo_ms, hi_ms] `windows`.
+
+        Read straight from `price_history` (and the archive) without loading or caching chunks, for
+        callers that need a few points scattered over a long range.
+        """
+        asset = asset.upper()
+        parts: list[PriceSeries] = []
+        for offset in range(0, len(windows), WINDOWS_PER_QUERY):
+            group = windows[offset : offset + WINDOWS_PER_QUERY]
+            rows = (
+                session.query(PriceHistory.timestamp, PriceHistory.price_usd)
+                .filter(
+                    PriceHistory.asset_symbol == asset,
+                    or_(
+                        *(
+                            and_(
+                                PriceHistory.timestamp >= _EPOCH + timedelta(milliseconds=lo),
+                                PriceHistory.timestamp <= _EPOCH + timedelta(milliseconds=hi),
+                            )
+                            for lo, hi in group
+                        )
+                    ),
+                )
+                .all()
+            )
+            points = [(ts, price) for ts, price in rows if price is not None]
+            parts.append(series_from_points([p[0] for p in points], [p[1] for p in points]))
+        ts_arr = np.concatenate([p[0] for p in parts]) if parts else _EMPTY_TS
+        px_arr = np.concatenate([p[1] for p in parts]) if parts else _EMPTY_PX
+        if price_archive.enabled:
+            archived = [price_archive.read(asset, lo, hi + 1) for lo, hi in windows]
+            archived = [a for a in archived if len(a[0])]
+            if archived:
+                base = (np.concatenate([a[0] for a in archived]), np.concatenate([a[1] for a in archived]))
+                ts_arr, px_arr = _overlay(base, (ts_arr, px_arr))
+        return ts_arr, px_arr
+
+    def merge(self, rows: Iterable[dict[str, Any]]) -> None:
+        """Fold freshly upserted `price_history` rows into resident chunks (others load later)."""
+        grouped: dict[tuple[str, str, int], list[tuple[int, float]]] = {}
+        stale_rollups: set[tuple[str, int]] = set()
+        with self._lock:
+            self._generation += 1
+            if not self._chunks:
+                return
+            for row in rows:
+                price = row.get("price_usd")
+                ts = row.get("timestamp")
+                asset = (row.get("asset_symbol") or "").upper()
+                if price is None or ts is None or not asset:
+                    continue
+                ms = to_epoch_ms(ts)
+                key = (asset, BASE_RESOLUTION, ms // CHUNK_MS)
+                if key in self._chunks:
+                    grouped.setdefault(key, []).append((ms, float(price)))
+                stale_rollups.add((asset, ms // CHUNK_MS))
+            for key in [k for k in self._chunks if k[1] != BASE_RESOLUTION and (k[0], k[2]) in stale_rollups]:
+                self._replace(key, None)
+            for key, points in grouped.items():
+                new_ts = np.fromiter((p[0] for p in points), dtype=np.int64, count=len(points))
+                new_px = np.fromiter((p[1] for p in points), dtype=np.float64, count=len(points))
+                self._replace(key, _overlay(self._chunks[key], (new_ts, new_px)))
+            self._evict()
+
+    def merge_on_commit(self, session: Session, rows: Iterable[dict[str, Any]]) -> None:
+        """Queue rows written through `session` and `merge` them once it commits.
+
+        A rollback drops them with the transaction, so the store never holds prices the database
+        did not keep.
+        """
+        pending = session.info.get(_PENDING_KEY)
+        if pending is None:
+            pending = session.info[_PENDING_KEY] = []
+            event.listen(session, "after_commit", self._merge_pending)
+            event.listen(session, "after_rollback", self._drop_pending)
+        pending.extend(rows)
+
+    def _merge_pending(self, session: Session) -> None:
+        pending = session.info.get(_PENDING_KEY)
+        if pending:
+            rows = pending[:]
+            pending.clear()
+            self.merge(rows)
+
+    def _drop_pending(self, session: Session) -> None:
+        pending = session.info.get(_PENDING_KEY)
+        if pending:
+            pending.clear()
+
+    def invalidate(self, asset: str | None = None) -> None:
+        with self._lock:
+            self._generation += 1
+            for key in [k for k in self._chunks if asset is None or k[0] == asset.upper()]:
+                self._replace(key, None)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "chunks": len(self._chunks),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "chunk_hits": self._chunk_hits,
+                "chunk_loads": self._chunk_loads,
+                "evictions": self._evictions,
+            }
+
+    def _chunks_for(
+        self, session: Session, asset: str, resolution: str, first_chunk: int, last_chunk: int
+    ) -> list[PriceSeries]:
+        """The asset's chunks in order, reloading missing ones and those whose coverage changed.
+
+        Database reads happen outside the lock, so concurrent backtests only serialize on the
+        in-memory bookkeeping; a chunk another thread loaded meanwhile is shared, not replaced.
+        """
+        coverage = self._coverage(session, asset, first_chunk, last_chunk)
+        found: dict[int, PriceSeries] = {}
+        with self._lock:
+            generation = self._generation
+            for chunk_id in range(first_chunk, last_chunk + 1):
+                key = (asset, resolution, chunk_id)
+                chunk = self._chunks.get(key)
+                if chunk is not None and self._coverage_seen.get(key) == coverage[chunk_id]:
+                    self._chunks.move_to_end(key)
+                    found[chunk_id] = chunk
+            self._chunk_hits += len(found)
+        missing = [c for c in range(first_chunk, last_chunk + 1) if c not in found]
+        if missing:
+            loaded = self._read_chunks(session, asset, resolution, missing)
+            with self._lock:
+                for chunk_id, chunk in loaded.items():
+                    key = (asset, resolution, chunk_id)
+                    current = self._chunks.get(key)
+                    if current is not None and self._coverage_seen.get(key) == coverage[chunk_id]:
+                        found[chunk_id] = current
+                        continue
+                    found[chunk_id] = chunk
+                    self._chunk_loads += 1
+                    # A merge or invalidation while reading may have made this copy stale; use it
+                    # for this call only.
+                    if self._generation == generation:
+                        self._replace(key, chunk)
+                        self._coverage_seen[key] = coverage[chunk_id]
+        return [found[c] for c in range(first_chunk, last_chunk + 1)]
+
+    def _coverage(self, session: Session, asset: str, first_chunk: int, last_chunk: int) -> dict[int, tuple]:
+        """Per chunk, the `price_coverage` ranges clipped to it.
+
+        Every candle write records coverage, in whichever process makes it, so a resident chunk
+        whose ranges differ from these is stale. Without the table every chunk reads as unchanged.
+        """
+        clipped: dict[int, list[tuple[str, int, int]]] = {c: [] for c in range(first_chunk, last_chunk + 1)}
+        if ensure_table(session, PriceCoverage):
+            lo_ms, hi_ms = first_chunk * CHUNK_MS, (last_chunk + 1) * CHUNK_MS
+            rows = session.query(PriceCoverage.timeframe, PriceCoverage.start_ts, PriceCoverage.end_ts).filter(
+                PriceCoverage.asset_symbol == asset,
+                PriceCoverage.start_ts < _EPOCH + timedelta(milliseconds=hi_ms),
+                PriceCoverage.end_ts >= _EPOCH + timedelta(milliseconds=lo_ms),
+            )
+            for timeframe, cov_start, cov_end in rows:
+                cov_lo, cov_hi = to_epoch_ms(cov_start), to_epoch_ms(cov_end)
+                for chunk_id in range(max(first_chunk, cov_lo // CHUNK_MS), min(last_chunk, cov_hi // CHUNK_MS) + 1):
+                    chunk_lo = chunk_id * CHUNK_MS
+                    clipped[chunk_id].append(
+                        (timeframe, max(cov_lo, chunk_lo), min(cov_hi, chunk_lo + CHUNK_MS - 1))
+                    )
+        return {c: tuple(sorted(ranges)) for c, ranges in clipped.items()}
+
+    def _read_chunks(
+        self, session: Session, asset: str, resolution: str, chunk_ids: list[int]
+    ) -> dict[int, PriceSeries]:
+        # Load each contiguous run of chunks with one range query.
+        runs: list[list[int]] = []
+        for chunk_id in chunk_ids:
+            if runs and runs[-1][-1] == chunk_id - 1:
+                runs[-1].append(chunk_id)
+            else:
+                runs.append([chunk_id])
+        chunks: dict[int, PriceSeries] = {}
+        for run in runs:
+            lo_ms, hi_ms = run[0] * CHUNK_MS, (run[-1] + 1) * CHUNK_MS
+            rows = self._query_rows(session, asset, resolution, lo_ms, hi_ms)
+            points = [(ts, price) for ts, price in rows if price is not None]
+            ts_arr, px_arr = series_from_points([p[0] for p in points], [p[1] for p in points])
+            if resolution == BASE_RESOLUTION and price_archive.enabled:
+                archived = price_archive.read(asset, lo_ms, hi_ms)
+                if len(archived[0]) and len(ts_arr):
+                    ts_arr, px_arr = _overlay(archived, (ts_arr, px_arr))
+                elif len(archived[0]):
+                    ts_arr, px_arr = archived
+            bounds = np.searchsorted(ts_arr, [c * CHUNK_MS for c in run] + [hi_ms], side="left")
+            for idx, chunk_id in enumerate(run):
+                a, b = int(bounds[idx]), int(bounds[idx + 1])
+                chunks[chunk_id] = (ts_arr[a:b].copy(), px_arr[a:b].copy())
+        return chunks
+
+    def _query_rows(self, session: Session, asset: str, resolution: str, lo_ms: int, hi_ms: int) -> list:
+        lo, hi = _EPOCH + timedelta(milliseconds=lo_ms), _EPOCH + timedelta(milliseconds=hi_ms)
+        if resolution == BASE_RESOLUTION:
+            return (
+                session.query(PriceHistory.timestamp, PriceHistory.price_usd)
+                .filter(PriceHistory.asset_symbol == asset, PriceHistory.timestamp >= lo, PriceHistory.timestamp < hi)
+                .order_by(PriceHistory.timestamp)
+                .all()
+            )
+        if not ensure_table(session, PriceRollup):
+            return []
+        # Rollup buckets never straddle a chunk boundary, so the bucket range selects the same rows
+        # as the source timestamps they are keyed by in memory.
+        return (
+            session.query(PriceRollup.source_ts, PriceRollup.price_usd)
+            .filter(
+                PriceRollup.asset_symbol == asset,
+                PriceRollup.resolution == resolution,
+                PriceRollup.bucket_ts >= lo,
+                PriceRollup.bucket_ts < hi,
+            )
+            .order_by(PriceRollup.bucket_ts)
+            .all()
+        )
+
+    def _replace(self, key: tuple[str, str, int], chunk: PriceSeries | None) -> None:
+        old = self._chunks.pop(key, None)
+        if chunk is None:
+            self._coverage_seen.pop(key, None)
+        if old is not None:
+            self._bytes -= old[0].nbytes + old[1].nbytes
+        if chunk is not None:
+            self._chunks[key] = chunk
+            self._bytes += chunk[0].nbytes + chunk[1].nbytes
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._chunks:
+            key = next(iter(self._chunks))
+            self._replace(key, None)
+            self._evictions += 1
+
+
+price_store = PriceStore(max_bytes=settings.price_store_max_mb * 1024 * 1024)
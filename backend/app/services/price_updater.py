@@ -7,7 +7,7 @@ from sqlalchemy.exc import OperationalError
 
 from sqlalchemy.orm import Session
 
-from app.models import PriceHistory
+from app.services.price_service import bulk_upsert_prices
 from app.services.coingecko_client import coingecko_client
 
 
@@ -17,17 +17,13 @@ ASSETS = ["bitcoin", "ethereum"]
 def update_prices(session: Session) -> None:
     prices = coingecko_client.get_simple_price(ASSETS)
     now = datetime.now(timezone.utc)
-    for asset in ASSETS:
-        price = prices.get(asset)
-        if price is None:
-            continue
-        session.add(
-            PriceHistory(
-                asset_symbol=asset.upper(),
-                timestamp=now,
-                price_usd=price,
-            )
-        )
+    rows = [
+        {"asset_symbol": asset.upper(), "timestamp": now, "price_usd": prices[asset]}
+        for asset in ASSETS
+        if prices.get(asset) is not None
+    ]
+    # Through the shared upsert so rollups and the in-process price store see live points too.
+    bulk_upsert_prices(session, rows)
     _commit_with_retry(session)
 
 
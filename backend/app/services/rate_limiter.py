@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Any, Callable, Iterator
+
+
+class Priority(IntEnum):
+    """Lanes for a shared limiter; lower values are served first."""
+
+    LIVE = 0  # copy-trading loop
+    INTERACTIVE = 1  # API handlers (default)
+    BACKGROUND = 2  # ingestor ticks, backfills, nightly rebuilds
+
+
+_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar("request_priority", default=Priority.INTERACTIVE)
+
+# Waiters re-check at least this often so a higher lane arriving later can overtake them.
+_MAX_POLL_SECONDS = 0.25
+_MIN_POLL_SECONDS = 0.005
+
+
+@contextmanager
+def request_priority(priority: Priority) -> Iterator[None]:
+    """Run the block's limiter acquisitions in `priority`'s lane.
+
+    The lane is a context variable: it follows coroutines into tasks they create, but threads
+    (including executor workers) start on the default lane and must set their own.
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> Priority:
+    return _priority.get()
+
+
+class _LaneStats:
+    def __init__(self) -> None:
+        self.acquired = 0
+        self.weight = 0.0
+        self.waiting = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "acquired": self.acquired,
+            "weight": round(self.weight, 2),
+            "waiting": self.waiting,
+            "avg_wait_ms": round(self.total_wait * 1000 / self.acquired, 2) if self.acquired else None,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+        }
+
+
+class TokenBucket:
+    """Weighted token bucket shared by threads and event loops, with priority lanes.
+
+    Tokens refill at `rate` per second up to `burst`, so idle periods bank credit for a later
+    burst. Waiters queue by (priority, arrival) and only the head of the queue may take tokens,
+    so a LIVE request overtakes queued BACKGROUND ones. `penalize()` halves the rate after a 429;
+    every `recover_after` seconds without one it climbs back by a tenth of `max_rate`.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        *,
+        min_rate: float | None = None,
+        recover_after: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_rate = max(0.01, float(rate))
+        self.rate = self.max_rate
+        self.min_rate = min(self.max_rate, min_rate if min_rate is not None else self.max_rate / 8)
+        self.burst = max(1.0, float(burst))
+        self.recover_after = recover_after
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated = clock()
+        self._last_adjust = self._updated
+        self._queue: list[tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._lanes = {p: _LaneStats() for p in Priority}
+        self.throttled = 0
+
+    def _refill(self, now: float) -> None:
+        if self.rate < self.max_rate and now - self._last_adjust >= self.recover_after:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+            self._last_adjust = now
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _enqueue(self, priority: Priority) -> tuple[int, int]:
+        ticket = (int(priority), next(self._seq))
+        with self._lock:
+            heapq.heappush(self._queue, ticket)
+            self._lanes[priority].waiting += 1
+        return ticket
+
+    def _attempt(self, ticket: tuple[int, int], weight: float) -> float:
+        """Take `weight` tokens if `ticket` is at the head; otherwise seconds until the next check."""
+        with self._lock:
+            self._refill(self._clock())
+            if self._queue[0] == ticket and self._tokens >= weight:
+                heapq.heappop(self._queue)
+                self._tokens -= weight
+                return 0.0
+            deficit = max(weight - self._tokens, 0.0) or weight
+        return min(_MAX_POLL_SECONDS, max(_MIN_POLL_SECONDS, deficit / self.rate))
+
+    def _finish(self, ticket: tuple[int, int], weight: float, started: float, granted: bool) -> float:
+        waited = self._clock() - started
+        with self._lock:
+            lane = self._lanes[Priority(ticket[0])]
+            lane.waiting -= 1
+            if not granted:
+                # Cancelled or interrupted while queued; leave the queue without taking tokens.
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                return waited
+            lane.acquired += 1
+            lane.weight += weight
+            lane.total_wait += waited
+            lane.max_wait = max(lane.max_wait, waited)
+        return waited
+
+    def acquire(self, weight: float = 1.0, priority: Priority | None = None) -> float:
+        """Block until `weight` tokens are taken; returns the seconds spent waiting."""
+        weight = min(float(weight), self.burst)
+        ticket = self._enqueue(current_priority() if priority is None else priority)
+        started = self._clock()
+        granted = False
+        try:
+            while (delay := self._attempt(ticket, weight)) > 0:
+                time.sleep(delay)
+            granted = True
+        finally:
+            waited = self._finish(ticket, weight, started, granted)
+        return waited
+
+    async def acquire_async(self, weight: float = 1.0, priority: Priority | None = None) -> float:
+        """Like `acquire`, but waits on the event loop."""
+        weight = min(float(weight), self.burst)
+        ticket = self._enqueue(current_priority() if priority is None else priority)
+        started = self._clock()
+        granted = False
+        try:
+            while (delay := self._attempt(ticket, weight)) > 0:
+                await asyncio.sleep(delay)
+            granted = True
+        finally:
+            waited = self._finish(ticket, weight, started, granted)
+        return waited
+
+    def debit(self, weight: float) -> None:
+        """Charge weight only known after the response (e.g. per returned item); may go negative."""
+        if weight <= 0:
+            return
+        with self._lock:
+            self._refill(self._clock())
+            self._tokens -= weight
+
+    def penalize(self) -> None:
+        """Back off after the server throttled us: halve the rate and drop banked credit."""
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            self._last_adjust = now
+            self.throttled += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            self._refill(self._clock())
+            return {
+                "tokens": round(self._tokens, 2),
+                "burst": self.burst,
+                "rate": round(self.rate, 3),
+                "max_rate": round(self.max_rate, 3),
+                "throttled": self.throttled,
+                "lanes": {p.name.lower(): lane.snapshot() for p, lane in self._lanes.items()},
+            }
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Iterable
+
+from app.models import TradeDirection
+
+LONG_ENTRY_DIRS = {TradeDirection.LONG, TradeDirection.BUY}
+# TradeDirection is a str enum, so this resolves both members and raw column strings.
+_ENTRY_SIDE = {d: TradeDirection.LONG if d in LONG_ENTRY_DIRS else TradeDirection.SHORT for d in TradeDirection}
+
+
+@dataclass
+class _Lane:
+    """Pending entries for one (asset, side) plus rolling aggregates over all of them."""
+
+    pending: deque = field(default_factory=deque)
+    whales: Counter = field(default_factory=Counter)
+    positive_notionals: int = 0
+    last_signal: datetime | None = None
+
+
+def align_entry_signals(
+    entries: Iterable[tuple[datetime, str | None, Any, Any, Any]],
+    *,
+    window: timedelta,
+    min_whales: int,
+    max_signals: int | None = None,
+) -> list[dict[str, Any]]:
+    """Entries opened by at least `min_whales` distinct whales within `window` of each other.
+
+    `entries` are (timestamp, asset, direction, value_usd, whale_id) tuples in timestamp order and
+    may be a lazy stream. An entry starts a signal when the distinct whales among it and the later
+    same-asset, same-side entries within `window` reach `min_whales`, unless that lane already
+    signalled within `window`; the signal notional is the average over those entries.
+
+    Each (asset, side) lane keeps a deque of entries whose forward window is still open plus a
+    counter of whale ids across the deque, so every entry is pushed and popped once. With
+    `max_signals`, reading stops once that many signals are found and no lane still holds an entry
+    older than the last of them, since no earlier signal can appear after that.
+    """
+    lanes: dict[tuple[str, TradeDirection], _Lane] = {}
+    found: list[tuple[int, dict[str, Any]]] = []
+
+    def _resolve_head(key: tuple[str, TradeDirection], lane: _Lane) -> None:
+        seq, ts, wid, notional = lane.pending[0]
+        recent = lane.last_signal is not None and ts - lane.last_signal <= window
+        if not recent and len(lane.whales) >= min_whales and lane.positive_notionals:
+            # Lanes signal at most once per window, so summing the open window here stays linear overall.
+            notionals = [item[3] for item in lane.pending if item[3] is not None]
+            avg = sum(notionals) / len(notionals)
+            if avg > 0:
+                found.append(
+                    (
+                        seq,
+                        {
+                            "timestamp": ts,
+                            "asset": key[0],
+                            "direction": key[1],
+                            "notional_usd": avg,
+                            "whales": set(lane.whales),
+                        },
+                    )
+                )
+                lane.last_signal = ts
+        # The head leaves every later entry's window.
+        lane.pending.popleft()
+        lane.whales[wid] -= 1
+        if not lane.whales[wid]:
+            del lane.whales[wid]
+        if notional:
+            lane.positive_notionals -= 1
+
+    def _settled(now: datetime) -> bool:
+        """Whether the first `max_signals` signals are final once entries up to `now` were read."""
+        # Entries arrive in timestamp order, so heads whose window closed before `now` are complete
+        # in every lane, not only in the lane `now` was read into.
+        for key, lane in lanes.items():
+            while lane.pending and now - lane.pending[0][1] > window:
+                _resolve_head(key, lane)
+        cutoff = sorted(seq for seq, _ in found)[max_signals - 1]
+        return all(lane.pending[0][0] > cutoff for lane in lanes.values() if lane.pending)
+
+    for seq, (ts, asset, direction, value_usd, wid) in enumerate(entries):
+        asset = (asset or "").upper()
+        if not asset or value_usd is None:
+            continue
+        key = (asset, _ENTRY_SIDE.get(direction, TradeDirection.SHORT))
+        lane = lanes.get(key)
+        if lane is None:
+            lane = lanes[key] = _Lane()
+        # Heads whose window closed before this entry have seen every entry they will ever see.
+        while lane.pending and ts - lane.pending[0][1] > window:
+            _resolve_head(key, lane)
+        if max_signals and len(found) >= max_signals and _settled(ts):
+            break
+        try:
+            notional = abs(float(value_usd))
+        except (TypeError, ValueError):
+            notional = None
+        lane.pending.append((seq, ts, wid, notional))
+        lane.whales[wid] += 1
+        if notional:
+            lane.positive_notionals += 1
+    else:
+        # The stream ran out: every remaining head has seen all the entries it will see.
+        for key, lane in lanes.items():
+            while lane.pending:
+                _resolve_head(key, lane)
+
+    found.sort(key=lambda item: item[0])
+    signals = [signal for _, signal in found]
+    return signals[:max_signals] if max_signals else signals
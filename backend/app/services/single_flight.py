@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class TTLCache:
+    """Bounded, thread-safe LRU cache whose readers choose how old an entry may be.
+
+    `get(key, max_age)` returns None on a miss, so None itself is never cached.
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries = max(1, max_entries)
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, max_age: float) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > max_age:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if value is None:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def _running_loop() -> asyncio.AbstractEventLoop | None:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class SingleFlight:
+    """Collapses concurrent identical calls into one.
+
+    The first caller for a key runs the call; callers arriving while it is in flight wait for
+    and share its result or exception. Threads and coroutines (on any loop) coalesce with each
+    other because the shared result is a `concurrent.futures.Future`. Nothing is kept once the
+    call finishes; pair with `TTLCache` to reuse results afterwards.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # key -> (shared future, loop running the leader or None for a thread)
+        self._inflight: dict[Hashable, tuple[Future, asyncio.AbstractEventLoop | None]] = {}
+        self.calls = 0
+        self.shared = 0
+
+    def _join(self, key: Hashable, loop: asyncio.AbstractEventLoop | None) -> tuple[Future, bool]:
+        with self._lock:
+            entry = self._inflight.get(key)
+            if entry is not None:
+                future, leader_loop = entry
+                # A blocking (sync) follower on the thread running the leader's loop would stall
+                # that leader forever; such callers make their own call instead.
+                stalls_leader = loop is None and leader_loop is not None and leader_loop is _running_loop()
+                if not stalls_leader:
+                    self.shared += 1
+                    return future, False
+                self.calls += 1
+                return Future(), True
+            future = Future()
+            self._inflight[key] = (future, loop)
+            self.calls += 1
+            return future, True
+
+    def _settle(self, key: Hashable, future: Future, result: Any = None, exc: BaseException | None = None) -> None:
+        with self._lock:
+            entry = self._inflight.get(key)
+            if entry is not None and entry[0] is future:
+                del self._inflight[key]
+        if exc is not None:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        future, leader = self._join(key, None)
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as exc:
+            self._settle(key, future, exc=exc)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        future, leader = self._join(key, asyncio.get_running_loop())
+        if not leader:
+            # Shielded so a cancelled follower does not cancel the shared future under the leader.
+            return await asyncio.shield(asyncio.wrap_future(future))
+        try:
+            result = await fn()
+        except BaseException as exc:
+            self._settle(key, future, exc=exc)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._inflight)}
@@ -0,0 +1,365 @@
+from __future__ import annotations
+
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Iterable, Iterator, Sequence
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+
+from app.db.session import ensure_table, upsert_rows
+from app.models import Trade, TradeDailyAgg, TradeDirection, WalletAssetState
+
+logger = logging.getLogger(__name__)
+
+# Fills that open or add to a position at their cost, and those that reduce it at average cost.
+ENTRY_DIRS = {TradeDirection.DEPOSIT, TradeDirection.BUY, TradeDirection.LONG, TradeDirection.SHORT}
+EXIT_DIRS = {TradeDirection.WITHDRAW, TradeDirection.SELL, TradeDirection.CLOSE_LONG, TradeDirection.CLOSE_SHORT}
+# Closing fills that count towards win rate when they carry a non-zero PnL.
+CLOSING_DIRS = {TradeDirection.CLOSE_LONG, TradeDirection.CLOSE_SHORT, TradeDirection.SELL}
+# Whale ids per IN (...) list, within SQLite's bound-parameter limit.
+BATCH_WHALE_IDS = 500
+
+# (id, timestamp, base_asset, amount_base, value_usd, pnl_usd, direction), the shape fold_trade takes.
+_FOLD_COLUMNS = (
+    Trade.id,
+    Trade.timestamp,
+    Trade.base_asset,
+    Trade.amount_base,
+    Trade.value_usd,
+    Trade.pnl_usd,
+    Trade.direction,
+)
+_STATE_COLUMNS = ("qty", "cost_usd", "realized_usd", "trade_pnl_usd", "closes", "wins", "last_trade_id", "last_trade_ts")
+
+
+def chunked(items: Sequence, size: int) -> Iterator[Sequence]:
+    for offset in range(0, len(items), size):
+        yield items[offset : offset + size]
+
+
+def utc_date(ts: datetime) -> date:
+    return ts.astimezone(timezone.utc).date() if ts.tzinfo else ts.date()
+
+
+def day_start(d: date) -> datetime:
+    return datetime.combine(d, time.min, tzinfo=timezone.utc)
+
+
+def tables_ready(session: Session) -> bool:
+    return ensure_table(session, WalletAssetState) and ensure_table(session, TradeDailyAgg)
+
+
+def _new_state() -> dict[str, Any]:
+    return {
+        "qty": None,
+        "cost_usd": None,
+        "realized_usd": Decimal(0),
+        "trade_pnl_usd": Decimal(0),
+        "closes": 0,
+        "wins": 0,
+        "last_trade_id": 0,
+        "last_trade_ts": None,
+    }
+
+
+def fold_trade(state: dict[str, dict[str, Any]], trade: Sequence) -> None:
+    """Apply one fill, in (timestamp, id) order, to a whale's per-asset state.
+
+    Watermarks are left to the caller: ids only follow insertion order, not trade time.
+    """
+    _, timestamp, asset, amount_base, value_raw, pnl_raw, direction = trade
+    st = state.setdefault(asset or "", _new_state())
+    st["last_trade_ts"] = timestamp
+
+    if pnl_raw is not None:
+        pnl = Decimal(pnl_raw)
+        st["trade_pnl_usd"] += pnl
+        if pnl != 0 and direction in CLOSING_DIRS:
+            st["closes"] += 1
+            st["wins"] += int(pnl > 0)
+
+    if not asset or amount_base is None:
+        return
+    if st["qty"] is None:
+        st["qty"], st["cost_usd"] = Decimal(0), Decimal(0)
+    qty = abs(Decimal(amount_base))
+    value_usd = Decimal(value_raw or 0)
+    if direction in ENTRY_DIRS:
+        st["qty"] += qty
+        st["cost_usd"] += abs(value_usd)
+    elif direction in EXIT_DIRS and st["qty"] > 0:
+        avg_cost = st["cost_usd"] / st["qty"]
+        qty_out = min(qty, st["qty"])
+        cost_out = avg_cost * qty_out
+        st["qty"] -= qty_out
+        st["cost_usd"] -= cost_out
+        st["realized_usd"] += value_usd - cost_out
+
+
+def _bucket_add(buckets: dict[tuple, dict[str, Any]], whale_id: str, trade: Sequence) -> None:
+    _, timestamp, asset, _, value_raw, pnl_raw, direction = trade
+    bucket = buckets.setdefault(
+        (whale_id, utc_date(timestamp), asset or "", direction),
+        {"volume_usd": Decimal(0), "trades": 0, "priced_trades": 0, "pnl_usd": Decimal(0), "closes": 0, "wins": 0},
+    )
+    bucket["trades"] += 1
+    if value_raw is not None:
+        bucket["volume_usd"] += Decimal(value_raw)
+        bucket["priced_trades"] += 1
+    if pnl_raw is not None:
+        pnl = Decimal(pnl_raw)
+        bucket["pnl_usd"] += pnl
+        if pnl != 0 and direction in CLOSING_DIRS:
+            bucket["closes"] += 1
+            bucket["wins"] += int(pnl > 0)
+
+
+def _bucket_rows(buckets: dict[tuple, dict[str, Any]]) -> list[dict[str, Any]]:
+    return [
+        {"whale_id": whale_id, "date": d, "base_asset": asset, "direction": direction, **values}
+        for (whale_id, d, asset, direction), values in buckets.items()
+    ]
+
+
+def load_states(session: Session, whale_ids: Sequence[str]) -> dict[str, dict[str, dict[str, Any]]]:
+    """Stored per-asset state for each whale, as dicts fold_trade can continue from."""
+    out: dict[str, dict[str, dict[str, Any]]] = {}
+    for chunk in chunked(whale_ids, BATCH_WHALE_IDS):
+        rows = session.query(WalletAssetState).filter(WalletAssetState.whale_id.in_(chunk))
+        for row in rows:
+            st = {column: getattr(row, column) for column in _STATE_COLUMNS}
+            st["realized_usd"] = Decimal(st["realized_usd"] or 0)
+            st["trade_pnl_usd"] = Decimal(st["trade_pnl_usd"] or 0)
+            if st["qty"] is not None:
+                st["qty"], st["cost_usd"] = Decimal(st["qty"]), Decimal(st["cost_usd"] or 0)
+            out.setdefault(row.whale_id, {})[row.asset_symbol] = st
+    return out
+
+
+def fold_states(session: Session, whale_ids: Sequence[str]) -> dict[str, dict[str, dict[str, Any]]]:
+    """Per-asset state for each whale folded from its full trade history, without writing it."""
+    states, _ = _fold_history(session, whale_ids)
+    return states
+
+
+def _fold_history(
+    session: Session, whale_ids: Sequence[str]
+) -> tuple[dict[str, dict[str, dict[str, Any]]], dict[tuple, dict[str, Any]]]:
+    states: dict[str, dict[str, dict[str, Any]]] = {}
+    buckets: dict[tuple, dict[str, Any]] = {}
+    for chunk in chunked(whale_ids, BATCH_WHALE_IDS):
+        # Stream only the needed columns; whales can have hundreds of thousands of fills.
+        rows = (
+            session.query(Trade.whale_id, *_FOLD_COLUMNS)
+            .filter(Trade.whale_id.in_(chunk), Trade.timestamp.isnot(None))
+            .order_by(Trade.whale_id, Trade.timestamp.asc(), Trade.id.asc())
+            .yield_per(5000)
+        )
+        for whale_id, group in groupby(rows, key=itemgetter(0)):
+            state = states.setdefault(whale_id, {})
+            top = 0
+            for row in group:
+                trade = row[1:]
+                fold_trade(state, trade)
+                _bucket_add(buckets, whale_id, trade)
+                top = max(top, trade[0])
+            for st in state.values():
+                st["last_trade_id"] = top
+    return states, buckets
+
+
+def _write_states(session: Session, states: dict[str, dict[str, dict[str, Any]]]) -> None:
+    upsert_rows(
+        session,
+        WalletAssetState,
+        [
+            {"whale_id": whale_id, "asset_symbol": asset, **st}
+            for whale_id, state in states.items()
+            for asset, st in state.items()
+        ],
+        keys=["whale_id", "asset_symbol"],
+    )
+
+
+def _unapplied(state: dict[str, dict[str, Any]], trades: list[Sequence]) -> list[Sequence] | None:
+    """Fills past their asset's watermark, or None if one predates that asset's latest folded fill."""
+    pending = []
+    for trade in trades:
+        st = state.get(trade[2] or "")
+        if st is None:
+            pending.append(trade)
+        elif trade[0] > st["last_trade_id"]:
+            if st["last_trade_ts"] is not None and trade[1] < st["last_trade_ts"]:
+                return None
+            pending.append(trade)
+    return pending
+
+
+def apply_new_trades(session: Session, whale_ids: Iterable[str]) -> None:
+    """Fold trades past each whale's watermark into wallet_asset_state and refresh their days.
+
+    Trades are read by (whale_id, id > watermark), so the cost follows new activity rather than
+    history length. A fill that lands behind an asset's latest folded fill (a backfill) cannot be
+    applied at average cost incrementally, so that whale is rebuilt from scratch instead. State is
+    written as absolute values and touched days are re-aggregated, so overlapping folds converge.
+    """
+    whale_ids = list(dict.fromkeys(whale_ids))
+    if not whale_ids or not tables_ready(session):
+        return
+    rebuild: list[str] = []
+    for chunk in chunked(whale_ids, BATCH_WHALE_IDS):
+        states = load_states(session, chunk)
+        marks = {
+            whale_id: min((st["last_trade_id"] for st in states.get(whale_id, {}).values()), default=0)
+            for whale_id in chunk
+        }
+        rows = (
+            session.query(Trade.whale_id, *_FOLD_COLUMNS)
+            .filter(
+                or_(*(and_(Trade.whale_id == whale_id, Trade.id > mark) for whale_id, mark in marks.items())),
+                Trade.timestamp.isnot(None),
+            )
+            .order_by(Trade.whale_id, Trade.timestamp.asc(), Trade.id.asc())
+        )
+        changed: dict[str, dict[str, dict[str, Any]]] = {}
+        touched: dict[str, set[date]] = {}
+        # Whales without state just had their whole history read; bucket it from memory.
+        fresh: dict[tuple, dict[str, Any]] = {}
+        fresh_ids: list[str] = []
+        for whale_id, group in groupby(rows, key=itemgetter(0)):
+            trades = [row[1:] for row in group]
+            if whale_id not in states:
+                fresh_ids.append(whale_id)
+                for trade in trades:
+                    _bucket_add(fresh, whale_id, trade)
+            state = states.setdefault(whale_id, {})
+            pending = _unapplied(state, trades)
+            if pending is None:
+                rebuild.append(whale_id)
+                continue
+            for trade in pending:
+                fold_trade(state, trade)
+            top = max(trade[0] for trade in trades)
+            for st in state.values():
+                st["last_trade_id"] = max(st["last_trade_id"], top)
+            changed[whale_id] = state
+            if fresh_ids[-1:] != [whale_id]:
+                touched[whale_id] = {utc_date(trade[1]) for trade in pending}
+        _write_states(session, changed)
+        refresh_daily_buckets(session, touched)
+        if fresh_ids:
+            session.query(TradeDailyAgg).filter(TradeDailyAgg.whale_id.in_(fresh_ids)).delete(synchronize_session=False)
+            upsert_rows(session, TradeDailyAgg, _bucket_rows(fresh), keys=["whale_id", "date", "base_asset", "direction"])
+    if rebuild:
+        logger.info("wallet state: %d whales received back-dated trades; rebuilding", len(rebuild))
+        rebuild_wallet_state(session, rebuild)
+
+
+def refresh_daily_buckets(session: Session, days_by_whale: dict[str, set[date]]) -> None:
+    """Re-aggregate trade_daily_agg for the given whale days from their trades."""
+    for whale_id, days in days_by_whale.items():
+        if not days:
+            continue
+        ranges = []
+        for d in sorted(days):
+            if ranges and ranges[-1][1] == d:
+                ranges[-1][1] = d + timedelta(days=1)
+            else:
+                ranges.append([d, d + timedelta(days=1)])
+        rows = session.query(*_FOLD_COLUMNS).filter(
+            Trade.whale_id == whale_id,
+            or_(*(and_(Trade.timestamp >= day_start(lo), Trade.timestamp < day_start(hi)) for lo, hi in ranges)),
+        )
+        buckets: dict[tuple, dict[str, Any]] = {}
+        for trade in rows:
+            _bucket_add(buckets, whale_id, trade)
+        session.query(TradeDailyAgg).filter(
+            TradeDailyAgg.whale_id == whale_id, TradeDailyAgg.date.in_(days)
+        ).delete(synchronize_session=False)
+        upsert_rows(session, TradeDailyAgg, _bucket_rows(buckets), keys=["whale_id", "date", "base_asset", "direction"])
+
+
+def volume_since(session: Session, since: datetime) -> Decimal:
+    """Traded USD volume across every whale since `since`.
+
+    Whole days come from trade_daily_agg; trades are only read for the partial first day and for
+    whales that have no folded state yet (their buckets do not exist).
+    """
+    raw_volume = select(func.coalesce(func.sum(Trade.value_usd), 0)).where(Trade.timestamp >= since)
+    if not tables_ready(session):
+        return Decimal(session.scalar(raw_volume) or 0)
+    first_full_day = utc_date(since) + timedelta(days=1)
+    folded = select(WalletAssetState.whale_id).distinct()
+    raw = session.scalar(
+        raw_volume.where(or_(Trade.timestamp < day_start(first_full_day), Trade.whale_id.notin_(folded)))
+    )
+    bucketed = session.scalar(
+        select(func.coalesce(func.sum(TradeDailyAgg.volume_usd), 0)).where(TradeDailyAgg.date >= first_full_day)
+    )
+    return Decimal(raw or 0) + Decimal(bucketed or 0)
+
+
+def rebuild_wallet_state(session: Session, whale_ids: Sequence[str]) -> None:
+    """Repair mode: replace the whales' state and daily buckets with a fold of their full history."""
+    if not whale_ids or not tables_ready(session):
+        return
+    for chunk in chunked(list(whale_ids), BATCH_WHALE_IDS):
+        states, buckets = _fold_history(session, chunk)
+        session.query(WalletAssetState).filter(WalletAssetState.whale_id.in_(chunk)).delete(synchronize_session=False)
+        session.query(TradeDailyAgg).filter(TradeDailyAgg.whale_id.in_(chunk)).delete(synchronize_session=False)
+        _write_states(session, states)
+        upsert_rows(session, TradeDailyAgg, _bucket_rows(buckets), keys=["whale_id", "date", "base_asset", "direction"])
+
+
+def clear_wallet_state(session: Session, whale_id: str) -> None:
+    """Drop a whale's state and buckets, e.g. when its trades are wiped and ids may be reused."""
+    if not tables_ready(session):
+        return
+    session.query(WalletAssetState).filter(WalletAssetState.whale_id == whale_id).delete(synchronize_session=False)
+    session.query(TradeDailyAgg).filter(TradeDailyAgg.whale_id == whale_id).delete(synchronize_session=False)
+
+
+def verify_wallet_state(session: Session, whale_ids: Sequence[str], tolerance: float = 1e-9) -> list[str]:
+    """Whales whose stored state or daily buckets differ from a fresh fold of their history.
+
+    Amounts are compared with a relative `tolerance`, since dialects round numerics differently.
+    """
+    mismatched: list[str] = []
+    for chunk in chunked(list(whale_ids), BATCH_WHALE_IDS):
+        expected, buckets = _fold_history(session, chunk)
+        stored = load_states(session, chunk)
+        stored_buckets: dict[tuple, dict[str, Any]] = {}
+        for row in session.query(TradeDailyAgg).filter(TradeDailyAgg.whale_id.in_(chunk)):
+            stored_buckets[(row.whale_id, row.date, row.base_asset, row.direction)] = {
+                key: getattr(row, key) for key in ("volume_usd", "trades", "priced_trades", "pnl_usd", "closes", "wins")
+            }
+        for whale_id in chunk:
+            if not _same(expected.get(whale_id, {}), stored.get(whale_id, {}), tolerance, skip=("last_trade_ts",)):
+                mismatched.append(whale_id)
+                continue
+            mine = {k: v for k, v in buckets.items() if k[0] == whale_id}
+            theirs = {k: v for k, v in stored_buckets.items() if k[0] == whale_id}
+            if not _same(mine, theirs, tolerance):
+                mismatched.append(whale_id)
+    return mismatched
+
+
+def _same(a: dict, b: dict, tolerance: float, skip: Sequence[str] = ()) -> bool:
+    if a.keys() != b.keys():
+        return False
+    for key, left in a.items():
+        right = b[key]
+        for column, value in left.items():
+            if column in skip:
+                continue
+            other = right.get(column)
+            if value is None or other is None:
+                if value is not other:
+                    return False
+            elif abs(float(value) - float(other)) > tolerance * max(1.0, abs(float(value))):
+                return False
+    return True
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import asyncio
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 import time
 from typing import Callable
 
@@ -15,7 +15,10 @@ from app.models import Chain, Event, EventType, Trade, TradeDirection, TradeSour
 from app.services.broadcast import broadcast_manager
 from app.services.bitcoin_client import bitcoin_client
 from app.services.coingecko_client import coingecko_client
+from app.services.dirty_whales import mark_dirty
 from app.services.metrics_service import touch_last_active
+from app.services import wallet_state
+from app.services.wallet_state import apply_new_trades
 
 logger = logging.getLogger(__name__)
 
@@ -72,8 +75,16 @@ class BitcoinIngestor:
         except Exception:
             return None
 
-    def _ingest_transactions(self, session, chain_id: int, whale: Whale, txs: list[dict]) -> int:
+    def _ingest_transactions(
+        self, session, chain_id: int, whale: Whale, txs: list[dict], fold_state: bool = True
+    ) -> int:
+        """Insert the whale's new transfers from `txs`; returns how many were added.
+
+        With `fold_state=False` only the touched daily rollups are refreshed and folding the
+        per-asset state is left to the caller, as backfills do once after their last page.
+        """
         inserted = 0
+        days: set[date] = set()
         for tx in txs:
             txid = tx.get("txid")
             if txid:
@@ -136,7 +147,16 @@ class BitcoinIngestor:
                 summary=f"BTC {direction.value}",
             )
             touch_last_active(session, whale, timestamp)
+            mark_dirty(session, [whale.id])
+            days.add(wallet_state.utc_date(timestamp))
             inserted += 1
+        if inserted:
+            # Fold the new transfers into wallet state and daily rollups before the caller commits.
+            session.flush()
+            if fold_state:
+                apply_new_trades(session, [whale.id])
+            elif wallet_state.tables_ready(session):
+                wallet_state.refresh_daily_buckets(session, {whale.id: days})
         return inserted
 
     def _process_whale(self, session, chain_id: int, whale: Whale) -> None:
@@ -177,7 +197,9 @@ class BitcoinIngestor:
                 break
             if not txs:
                 break
-            inserted = self._ingest_transactions(session, chain_id, whale, txs)
+            # Pages go newest-first, so each one is back-dated against the last; folding per page
+            # would rebuild the whole history every time.
+            inserted = self._ingest_transactions(session, chain_id, whale, txs, fold_state=False)
             total_inserted += inserted
             offset += len(txs)
             # Commit each page to release locks when backfilling many transactions.
@@ -187,6 +209,9 @@ class BitcoinIngestor:
                 progress(pct, f"bitcoin backfill page {idx + 1}/{max_pages}")
             if len(txs) < batch_size or inserted == 0:
                 break
+        if total_inserted:
+            apply_new_trades(session, [whale.id])
+            self._commit_with_retry(session)
         return total_inserted > 0
 
     def _record_event(
@@ -1,9 +1,14 @@
 from __future__ import annotations
 
+from decimal import Decimal
+from typing import Iterable, Sequence
+
 from sqlalchemy import func
 
 from app.db.session import SessionLocal
-from app.models import Trade, Whale, WhaleType
+from app.models import Trade, TradeDailyAgg, Whale, WhaleType
+from app.services import wallet_state
+from app.services.wallet_state import BATCH_WHALE_IDS, chunked
 
 
 class WhaleClassifier:
@@ -11,28 +16,41 @@ class WhaleClassifier:
         self.trade_threshold = trade_threshold
         self.volume_threshold_usd = volume_threshold_usd
 
-    def classify_whale(self, session, whale: Whale) -> WhaleType:
-        trade_count = session.scalar(
-            session.query(func.count(Trade.id)).filter(Trade.whale_id == whale.id)
-        ) or 0
-        volume = session.scalar(
-            session.query(func.coalesce(func.sum(Trade.value_usd), 0)).filter(
-                Trade.whale_id == whale.id
-            )
-        ) or 0
-
+    def _activity(self, session, whale_ids: Sequence[str]) -> dict[str, tuple[int, Decimal]]:
+        """Lifetime trade count and USD volume per whale, summed from trade_daily_agg when available."""
+        if wallet_state.tables_ready(session):
+            # Bring the whales' daily buckets up to date before reading them.
+            wallet_state.apply_new_trades(session, whale_ids)
+            columns = (TradeDailyAgg.whale_id, func.sum(TradeDailyAgg.trades), func.sum(TradeDailyAgg.volume_usd))
+        else:
+            columns = (Trade.whale_id, func.count(Trade.id), func.sum(Trade.value_usd))
+        out: dict[str, tuple[int, Decimal]] = {}
+        for chunk in chunked(list(whale_ids), BATCH_WHALE_IDS):
+            rows = session.query(*columns).filter(columns[0].in_(chunk)).group_by(columns[0])
+            for whale_id, count, volume in rows:
+                out[whale_id] = (int(count or 0), Decimal(volume or 0))
+        return out
+
+    def _type_for(self, trade_count: int, volume: Decimal) -> WhaleType:
         if trade_count >= self.trade_threshold or float(volume) >= self.volume_threshold_usd:
             return WhaleType.TRADER
         return WhaleType.HOLDER
 
+    def classify_whale(self, session, whale: Whale) -> WhaleType:
+        return self._type_for(*self._activity(session, [whale.id]).get(whale.id, (0, Decimal(0))))
+
+    def classify_whales(self, session, whales: Iterable[Whale]) -> None:
+        whales = list(whales)
+        activity = self._activity(session, [w.id for w in whales])
+        for whale in whales:
+            new_type = self._type_for(*activity.get(whale.id, (0, Decimal(0))))
+            if whale.type != new_type:
+                whale.type = new_type
+                session.add(whale)
+
     def run(self) -> None:
         with SessionLocal() as session:
-            whales = session.query(Whale).all()
-            for whale in whales:
-                new_type = self.classify_whale(session, whale)
-                if whale.type != new_type:
-                    whale.type = new_type
-                    session.add(whale)
+            self.classify_whales(session, session.query(Whale).all())
             session.commit()
 
 
@@ -23,7 +23,9 @@ from app.services.ethereum_client import (
 )
 from app.services.broadcast import broadcast_manager
 from app.services.token_meta import ensure_token_meta
+from app.services.dirty_whales import mark_dirty
 from app.services.metrics_service import touch_last_active
+from app.services.wallet_state import apply_new_trades
 
 logger = logging.getLogger(__name__)
 
@@ -109,6 +111,10 @@ class EthereumIngestor:
                     if whale:
                         self._record_transfer(session, eth_chain.id, whale, tx, timestamp)
 
+            # Fold this block's trades into wallet state and daily rollups in the same transaction.
+            touched = {obj.whale_id for obj in session.new if isinstance(obj, Trade)}
+            session.flush()
+            apply_new_trades(session, touched)
             session.commit()
 
     def backfill_whale(self, session, chain_id: int, whale: Whale) -> bool:
@@ -176,6 +182,7 @@ class EthereumIngestor:
             summary=f"ETH {direction.value}",
         )
         touch_last_active(session, whale, timestamp)
+        mark_dirty(session, [whale.id])
 
     def _record_event(
         self,
@@ -317,6 +324,7 @@ class EthereumIngestor:
                     summary=f"{meta.get('symbol') or 'ERC20'} {direction.value}",
                 )
                 touch_last_active(session, whale, timestamp)
+                mark_dirty(session, [whale.id])
 
             elif topic0 == SWAP_TOPIC:
                 self._record_swap(session, chain_id, whales, whale_addresses, log, tx_hash_hex, timestamp)
@@ -452,6 +460,7 @@ class EthereumIngestor:
             summary=f"Swap {sold_symbol}->{bought_symbol}",
         )
         touch_last_active(session, whale, timestamp)
+        mark_dirty(session, [whale.id])
 
     def _classify(self, counterparty: str) -> tuple[TradeSource, str]:
         counterparty = counterparty.lower()
@@ -1,15 +1,17 @@
 from __future__ import annotations
 
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timezone, timedelta
 import time
 from typing import Any, Callable
 
 import logging
-from httpx import HTTPStatusError
 from sqlalchemy.exc import OperationalError
 from sqlalchemy import select
 
+from app.core.config import settings
 from app.db.session import SessionLocal
 from app.models import (
     Base,
@@ -24,18 +26,41 @@ from app.models import (
     Whale,
 )
 from app.services.broadcast import broadcast_manager
-from app.services.hyperliquid_client import hyperliquid_client
+from app.services.hyperliquid_client import FILLS_PAGE_SIZE, async_hyperliquid_client, hyperliquid_client
+from app.services.dirty_whales import mark_dirty
 from app.services.metrics_service import touch_last_active
 from app.services.metrics_service import recompute_wallet_metrics
+from app.services.rate_limiter import Priority, request_priority
+from app.services.wallet_state import apply_new_trades
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True)
+class _AccountPlan:
+    """What the concurrent mode fetches for one whale, decided up front on the writer thread."""
+
+    whale_id: str
+    address: str
+    chain_id: int
+    start_time: int
+    page_limit: int
+
+
 class HyperliquidIngestor:
-    def __init__(self, poll_interval: float = 300.0, max_pages_per_tick: int = 3, backfill_max_pages: int = 10) -> None:
+    def __init__(
+        self,
+        poll_interval: float = 300.0,
+        max_pages_per_tick: int = 3,
+        backfill_max_pages: int = 10,
+        concurrency: int | None = None,
+    ) -> None:
         self.poll_interval = poll_interval
         self.max_pages_per_tick = max_pages_per_tick
         self.backfill_max_pages = backfill_max_pages
+        # Above 1, ticks fetch that many whales at once on the event loop (process_accounts_async).
+        self.concurrency = max(1, concurrency or settings.hyperliquid_ingest_concurrency)
+        self._writer: ThreadPoolExecutor | None = None
         self._running = False
         self._failure_backoff: dict[str, tuple[int, datetime]] = {}
         self._max_backoff_seconds = 60
@@ -70,11 +95,18 @@ class HyperliquidIngestor:
     async def run_forever(self) -> None:
         self._running = True
         self._loop = asyncio.get_running_loop()
-        logger.info("Hyperliquid ingestor started (interval=%ss)", self.poll_interval)
+        logger.info(
+            "Hyperliquid ingestor started (interval=%ss, concurrency=%s)", self.poll_interval, self.concurrency
+        )
         while self._running:
             started = time.perf_counter()
             try:
-                await asyncio.to_thread(self.process_accounts)
+                # Ticks yield the shared /info budget to the copier and API handlers.
+                with request_priority(Priority.BACKGROUND):
+                    if self.concurrency > 1:
+                        await self.process_accounts_async()
+                    else:
+                        await asyncio.to_thread(self.process_accounts)
                 logger.debug("Hyperliquid ingestor tick finished in %.2fs", time.perf_counter() - started)
             except Exception:
                 logger.exception("Hyperliquid ingestor loop error")
@@ -83,6 +115,9 @@ class HyperliquidIngestor:
 
     def stop(self) -> None:
         self._running = False
+        if self._writer is not None:
+            self._writer.shutdown(wait=False)
+            self._writer = None
 
     def run_once_for_whale(self, whale_id: str, max_pages: int | None = None) -> bool:
         with SessionLocal() as session:
@@ -92,9 +127,10 @@ class HyperliquidIngestor:
             chain = session.get(Chain, whale.chain_id)
             if not chain or chain.slug != "hyperliquid":
                 return False
-            wrote = self._process_account(
-                session, chain.id, whale, max_pages=max_pages or self.backfill_max_pages
-            )
+            with request_priority(Priority.BACKGROUND):
+                wrote = self._process_account(
+                    session, chain.id, whale, max_pages=max_pages or self.backfill_max_pages
+                )
             self._commit_with_retry(session)
             return wrote
 
@@ -121,6 +157,124 @@ class HyperliquidIngestor:
                 # Commit after each whale to release SQLite locks quickly and avoid blocking API reads.
                 self._commit_with_retry(session)
 
+    async def process_accounts_async(self, only: Callable[[str], bool] | None = None) -> set[str]:
+        """One tick fetching fills and positions for up to `concurrency` whales at a time.
+
+        Requests go through the async client under the shared /info rate limit, so a tick takes
+        about (request weight / HYPERLIQUID_INFO_WEIGHT_PER_MIN) instead of the sum of every round trip. All DB work,
+        planning and storing, runs in order on one writer thread, so SQLite sees a single writer.
+        `only`, given a lower-cased address, limits the tick to the whales it accepts. Returns the
+        lower-cased addresses whose fills were fetched and stored up to the present, i.e. not
+        skipped for backoff, failed, or cut off by the page limit.
+        """
+        loop = asyncio.get_running_loop()
+        writer = self.writer()
+        started = time.perf_counter()
+        plans = await loop.run_in_executor(writer, self._plan_accounts, only)
+        if not plans:
+            return set()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def ingest(plan: _AccountPlan) -> tuple[bool, bool]:
+            async with semaphore:
+                fills, state, caught_up = await self._fetch_account_async(plan)
+            # Queue the write and free the slot; the writer drains stores in arrival order.
+            wrote = await loop.run_in_executor(writer, self._store_planned, plan, fills, state)
+            return wrote, caught_up
+
+        results = await asyncio.gather(*(ingest(plan) for plan in plans), return_exceptions=True)
+        caught_up: set[str] = set()
+        wrote = 0
+        for plan, result in zip(plans, results):
+            if isinstance(result, BaseException):
+                logger.error("HL ingest failed whale=%s: %s", plan.address, result, exc_info=result)
+                continue
+            wrote += result[0]
+            if result[1]:
+                caught_up.add(plan.address.lower())
+        logger.info(
+            "HL ingest tick whales=%d wrote=%d concurrency=%d in %.2fs",
+            len(plans),
+            wrote,
+            self.concurrency,
+            time.perf_counter() - started,
+        )
+        return caught_up
+
+    def writer(self) -> ThreadPoolExecutor:
+        """The single thread all of this ingestor's async-mode DB work runs on."""
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hl-writer")
+        return self._writer
+
+    def _plan_accounts(self, only: Callable[[str], bool] | None = None) -> list[_AccountPlan]:
+        with SessionLocal() as session:
+            self._ensure_checkpoint_table(session)
+            chain = session.query(Chain).filter(Chain.slug == "hyperliquid").one_or_none()
+            if not chain:
+                logger.debug("Hyperliquid chain missing in DB; skipping tick")
+                return []
+            plans: list[_AccountPlan] = []
+            for whale in session.query(Whale).filter(Whale.chain_id == chain.id).all():
+                if only is not None and not only(whale.address.lower()):
+                    continue
+                if self._backoff_active(whale.address):
+                    logger.warning("Skipping Hyperliquid fill fetch for %s due to backoff", whale.address)
+                    continue
+                _, start_time, page_limit = self._fill_window(session, whale, self.max_pages_per_tick)
+                plans.append(_AccountPlan(whale.id, whale.address, chain.id, start_time, page_limit))
+            # Persist created or reseeded checkpoints before the stores reload them.
+            self._commit_with_retry(session)
+            return plans
+
+    async def _fetch_account_async(
+        self, plan: _AccountPlan
+    ) -> tuple[list[dict[str, Any]], dict[str, Any] | None, bool]:
+        """Fills, clearinghouse state, and whether the fills reach the present."""
+        try:
+            fills = await async_hyperliquid_client.get_user_fills_paginated(
+                plan.address, start_time=plan.start_time + 1, max_pages=plan.page_limit
+            )
+            self._clear_backoff(plan.address)
+            # The pager stops early on a short page; only a run of full pages may have been cut off.
+            caught_up = len(fills) < plan.page_limit * FILLS_PAGE_SIZE
+        except Exception as exc:
+            fills = []
+            caught_up = False
+            self._record_backoff(plan.address, exc)
+        state = None
+        if not self._backoff_active(plan.address):
+            try:
+                state = await async_hyperliquid_client.get_clearinghouse_state(plan.address, use_cache=True, ttl=5.0)
+                self._clear_backoff(plan.address)
+            except Exception as exc:
+                self._record_backoff(plan.address, exc)
+        return fills, state, caught_up
+
+    def _store_planned(
+        self, plan: _AccountPlan, fills: list[dict[str, Any]], state: dict[str, Any] | None
+    ) -> bool:
+        with SessionLocal() as session:
+            whale = session.get(Whale, plan.whale_id)
+            if whale is None:
+                return False
+            self._reset_session(session)
+            checkpoint = self._get_or_create_checkpoint(session, whale)
+            logger.info("HL ingest start whale=%s", whale.address)
+            wrote = self._store_account(
+                session,
+                plan.chain_id,
+                whale,
+                checkpoint,
+                plan.start_time,
+                fills,
+                datetime.now(timezone.utc),
+                lambda pct, msg=None: None,
+                positions_state=lambda: state,
+            )
+            logger.info("HL ingest end whale=%s wrote=%s", whale.address, wrote)
+            return wrote
+
     def _commit_with_retry(self, session, retries: int = 3, delay: float = 0.5) -> None:
         for attempt in range(retries):
             try:
@@ -140,6 +294,37 @@ class HyperliquidIngestor:
         max_pages: int = 20,
         progress_cb: Callable[[float, str | None], None] | None = None,
     ) -> bool:
+        self._reset_session(session)
+        now = datetime.now(timezone.utc)
+        progress = progress_cb or (lambda pct, msg=None: None)
+        progress(5.0, "hyperliquid: fetching fills")
+        checkpoint, start_time, page_limit = self._fill_window(session, whale, max_pages)
+        # Fills (trades)
+        if self._backoff_active(whale.address):
+            logger.warning("Skipping Hyperliquid fill fetch for %s due to backoff", whale.address)
+            progress(100.0, "hyperliquid: skipped due to backoff")
+            return False
+        try:
+            fills = hyperliquid_client.get_user_fills_paginated(
+                whale.address, start_time=start_time + 1, max_pages=page_limit
+            )
+            self._clear_backoff(whale.address)
+        except Exception as exc:
+            fills = []
+            self._record_backoff(whale.address, exc)
+        return self._store_account(
+            session,
+            chain_id,
+            whale,
+            checkpoint,
+            start_time,
+            fills,
+            now,
+            progress,
+            positions_state=lambda: self._fetch_positions_state(whale.address),
+        )
+
+    def _reset_session(self, session) -> None:
         # Clear any stale transaction state to avoid cascading lock timeouts.
         session.rollback()
         try:
@@ -147,10 +332,9 @@ class HyperliquidIngestor:
         except Exception:
             # Not all DBs support this; continue best-effort.
             session.rollback()
-        now = datetime.now(timezone.utc)
-        progress = progress_cb or (lambda pct, msg=None: None)
-        progress(5.0, "hyperliquid: fetching fills")
-        wrote = False
+
+    def _fill_window(self, session, whale: Whale, max_pages: int) -> tuple[IngestionCheckpoint, int, int]:
+        """The whale's checkpoint, the fill time to resume after, and how many pages to fetch."""
         checkpoint = self._get_or_create_checkpoint(session, whale)
         # If trades were wiped but a checkpoint remains, reset to force full backfill.
         existing_trades = session.scalar(select(Trade.id).where(Trade.whale_id == whale.id))
@@ -167,26 +351,24 @@ class HyperliquidIngestor:
             whale.address,
             start_time,
         )
-        # Fills (trades)
-        if self._backoff_active(whale.address):
-            logger.warning("Skipping Hyperliquid fill fetch for %s due to backoff", whale.address)
-            progress(100.0, "hyperliquid: skipped due to backoff")
-            return False
-        try:
-            is_new = checkpoint.last_fill_time in (None, 0)
-            page_limit = max(self.backfill_max_pages if is_new else self.max_pages_per_tick, max(1, max_pages))
-            cursor = (start_time + 1) if start_time is not None else None
-            fills = hyperliquid_client.get_user_fills_paginated(
-                whale.address, start_time=cursor, max_pages=page_limit
-            )
-            self._clear_backoff(whale.address)
-        except HTTPStatusError as exc:
-            self._record_backoff(whale.address, exc)
-            fills = []
-        except Exception as exc:
-            fills = []
-            self._record_backoff(whale.address, exc)
+        is_new = checkpoint.last_fill_time in (None, 0)
+        page_limit = max(self.backfill_max_pages if is_new else self.max_pages_per_tick, max(1, max_pages))
+        return checkpoint, start_time, page_limit
 
+    def _store_account(
+        self,
+        session,
+        chain_id: int,
+        whale: Whale,
+        checkpoint: IngestionCheckpoint,
+        start_time: int,
+        fills: list[dict[str, Any]],
+        now: datetime,
+        progress: Callable[..., None],
+        positions_state: Callable[[], dict[str, Any] | None],
+    ) -> bool:
+        """Write fetched fills and positions for one whale; `positions_state` supplies its state."""
+        wrote = False
         existing_hashes: set[str] = set()
         if checkpoint.last_fill_time:
             cutoff_dt = datetime.fromtimestamp(checkpoint.last_fill_time / 1000, tz=timezone.utc)
@@ -315,6 +497,9 @@ class HyperliquidIngestor:
                 len(new_fills),
                 checkpoint.last_fill_time,
             )
+            # Fold the new fills into the running metrics state in the same transaction.
+            session.flush()
+            apply_new_trades(session, [whale.id])
             # Commit early to release write locks during long backfills.
             self._commit_with_retry(session)
         else:
@@ -330,7 +515,8 @@ class HyperliquidIngestor:
 
         touch_last_active(session, whale, now)
         progress(85.0, "hyperliquid: fetching positions")
-        positions_written = self._process_positions(session, chain_id, whale, now)
+        state = positions_state()
+        positions_written = self._apply_positions(session, chain_id, whale, state) if state is not None else False
         wrote = wrote or positions_written
         if positions_written:
             checkpoint.last_position_time = now
@@ -340,25 +526,26 @@ class HyperliquidIngestor:
             logger.debug("HL ingest positions whale=%s no positions written", whale.address)
         if wrote:
             recompute_wallet_metrics(session, whale)
+            mark_dirty(session, [whale.id])
         # Commit after metrics/holdings updates to keep transactions short.
         self._commit_with_retry(session)
         progress(100.0, "hyperliquid: backfill done")
         return wrote
 
-    def _process_positions(self, session, chain_id: int, whale: Whale, now: datetime) -> bool:
-        wrote = False
-        if self._backoff_active(whale.address):
-            logger.warning("Skipping Hyperliquid position fetch for %s due to backoff", whale.address)
-            return False
+    def _fetch_positions_state(self, address: str) -> dict[str, Any] | None:
+        if self._backoff_active(address):
+            logger.warning("Skipping Hyperliquid position fetch for %s due to backoff", address)
+            return None
         try:
-            state = hyperliquid_client.get_clearinghouse_state(whale.address, use_cache=True, ttl=5.0)
-            self._clear_backoff(whale.address)
-        except HTTPStatusError as exc:
-            self._record_backoff(whale.address, exc)
-            return False
+            state = hyperliquid_client.get_clearinghouse_state(address, use_cache=True, ttl=5.0)
+            self._clear_backoff(address)
         except Exception as exc:
-            self._record_backoff(whale.address, exc)
-            return False
+            self._record_backoff(address, exc)
+            return None
+        return state
+
+    def _apply_positions(self, session, chain_id: int, whale: Whale, state: dict[str, Any]) -> bool:
+        wrote = False
         positions = state.get("assetPositions") if isinstance(state, dict) else []
         logger.debug("HL positions whale=%s positions_len=%s", whale.address, len(positions) if positions else 0)
         if not isinstance(positions, list):
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import Any
+
+from websockets.asyncio.client import ClientConnection, connect
+from websockets.exceptions import WebSocketException
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models import Chain, Whale
+from app.services.hyperliquid_client import remember_clearinghouse_state
+from app.services.rate_limiter import Priority, request_priority
+from app.services.throttle import Throttle
+from app.workers.hyperliquid_ingestor import HyperliquidIngestor, _AccountPlan
+
+logger = logging.getLogger(__name__)
+
+# Hyperliquid drops connections that send nothing for 60s.
+PING_INTERVAL_SECONDS = 50.0
+# Newly subscribed whales whose catch-up poll fell short are polled again after this long.
+REPAIR_RETRY_SECONDS = 15.0
+# Each subscribed whale takes a `userFills` and a `webData2` subscription.
+SUBSCRIPTION_TYPES = ("userFills", "webData2")
+
+
+class HyperliquidWsIngestor:
+    """Push-based Hyperliquid ingest over one WebSocket connection per process.
+
+    The most recently active whales, up to `max_subscriptions` subscriptions, get `userFills`
+    and `webData2` pushes, which go through the polling ingestor's store path on its writer
+    thread (DB rows, metrics, live broadcast) as they arrive. Whales beyond the cap are polled
+    every `poll_interval` as before. Pushes are not replayed after a disconnect, so every newly
+    subscribed whale is polled after subscribing, and its pushes are held until a poll has stored
+    its fills up to the present. A poll skipped for backoff, failed or cut off by the page limit
+    leaves the pushes held and is retried, so the fill checkpoint never skips past the gap.
+    """
+
+    def __init__(
+        self,
+        ingestor: HyperliquidIngestor | None = None,
+        url: str | None = None,
+        max_subscriptions: int | None = None,
+        positions_interval: float = 5.0,
+        reconnect_delay: float = 1.0,
+        max_reconnect_delay: float = 30.0,
+        repair_retry: float = REPAIR_RETRY_SECONDS,
+    ) -> None:
+        self.ingestor = ingestor or HyperliquidIngestor()
+        self.url = url or settings.hyperliquid_ws_url
+        max_subscriptions = max_subscriptions or settings.hyperliquid_ws_max_subscriptions
+        self.max_whales = max(1, max_subscriptions // len(SUBSCRIPTION_TYPES))
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.repair_retry = repair_retry
+        # webData2 pushes on every state change; holdings and metrics are rewritten at most this often.
+        self._positions_throttle = Throttle(positions_interval)
+        self._subscribed: dict[str, _AccountPlan] = {}
+        self._held: dict[str, list[dict[str, Any]]] = {}
+        self._running = False
+        self.fills_received = 0
+        self.reconnects = 0
+
+    async def run_forever(self) -> None:
+        self._running = True
+        self.ingestor._loop = asyncio.get_running_loop()
+        logger.info("Hyperliquid WebSocket ingestor started (url=%s, max_whales=%s)", self.url, self.max_whales)
+        delay = self.reconnect_delay
+        while self._running:
+            try:
+                await self._run_connection()
+                delay = self.reconnect_delay
+            except (OSError, asyncio.TimeoutError, WebSocketException) as exc:
+                logger.warning("Hyperliquid WebSocket disconnected (%s); reconnecting in %.0fs", exc, delay)
+            except Exception:
+                logger.exception("Hyperliquid WebSocket ingestor error")
+            if not self._running:
+                break
+            await asyncio.sleep(delay)
+            delay = min(self.max_reconnect_delay, delay * 2)
+            self.reconnects += 1
+        logger.info("Hyperliquid WebSocket ingestor stopped")
+
+    def stop(self) -> None:
+        self._running = False
+        self.ingestor.stop()
+
+    async def _run_connection(self) -> None:
+        async with connect(self.url, ping_interval=None, max_size=None) as ws:
+            self._subscribed.clear()
+            self._held.clear()
+            tasks = [asyncio.create_task(self._maintain(ws)), asyncio.create_task(self._heartbeat(ws))]
+            try:
+                async for raw in ws:
+                    self._dispatch(raw)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _heartbeat(self, ws: ClientConnection) -> None:
+        while True:
+            await asyncio.sleep(PING_INTERVAL_SECONDS)
+            await ws.send(json.dumps({"method": "ping"}))
+
+    async def _maintain(self, ws: ClientConnection) -> None:
+        """Keep subscriptions in line with the tracked whales and poll everything not pushed."""
+        loop = asyncio.get_running_loop()
+        next_poll = 0.0
+        with request_priority(Priority.BACKGROUND):
+            while True:
+                try:
+                    await self._sync_subscriptions(ws)
+                    if self._held:
+                        await self._repair()
+                    if loop.time() >= next_poll:
+                        await self.ingestor.process_accounts_async(only=lambda address: address not in self._subscribed)
+                        next_poll = loop.time() + self.ingestor.poll_interval
+                except WebSocketException:
+                    return
+                except Exception:
+                    logger.exception("Hyperliquid WebSocket maintenance failed")
+                wait = next_poll - loop.time()
+                if self._held:
+                    wait = min(wait, self.repair_retry)
+                await asyncio.sleep(max(0.0, wait))
+
+    def _load_whales(self) -> list[_AccountPlan]:
+        with SessionLocal() as session:
+            chain = session.query(Chain).filter(Chain.slug == "hyperliquid").one_or_none()
+            if not chain:
+                return []
+            whales = (
+                session.query(Whale.id, Whale.address)
+                .filter(Whale.chain_id == chain.id)
+                .order_by(Whale.last_active_at.is_(None), Whale.last_active_at.desc())
+                .all()
+            )
+            return [_AccountPlan(whale_id, address, chain.id, 0, 0) for whale_id, address in whales]
+
+    async def _sync_subscriptions(self, ws: ClientConnection) -> list[str]:
+        """Subscribe the most active whales up to the cap, keeping existing ones; returns the new ones."""
+        loop = asyncio.get_running_loop()
+        tracked = {plan.address.lower(): plan for plan in await loop.run_in_executor(self.ingestor.writer(), self._load_whales)}
+        for address in [a for a in self._subscribed if a not in tracked]:
+            self._held.pop(address, None)
+            await self._send(ws, "unsubscribe", self._subscribed.pop(address).address)
+        slots = self.max_whales - len(self._subscribed)
+        added = [a for a in tracked if a not in self._subscribed][: max(0, slots)]
+        for address in added:
+            # Hold pushes from the first one on; _repair releases them once a poll has caught up.
+            self._held[address] = []
+            self._subscribed[address] = tracked[address]
+            await self._send(ws, "subscribe", tracked[address].address)
+        if added:
+            logger.info(
+                "HL ws subscribed whales=%d (+%d) polling=%d",
+                len(self._subscribed),
+                len(added),
+                len(tracked) - len(self._subscribed),
+            )
+        return added
+
+    async def _send(self, ws: ClientConnection, method: str, address: str) -> None:
+        for kind in SUBSCRIPTION_TYPES:
+            await ws.send(json.dumps({"method": method, "subscription": {"type": kind, "user": address}}))
+
+    async def _repair(self) -> None:
+        """Poll the whales awaiting repair; release the held pushes of those that caught up."""
+        pending = set(self._held)
+        caught_up = await self.ingestor.process_accounts_async(only=pending.__contains__)
+        for address in pending & caught_up:
+            fills = self._held.pop(address, [])
+            plan = self._subscribed.get(address)
+            if fills and plan is not None:
+                self._submit(plan, fills, None)
+        if self._held:
+            logger.warning(
+                "HL ws gap repair incomplete for %d whales; holding their pushes and retrying in %.0fs",
+                len(self._held),
+                self.repair_retry,
+            )
+
+    def _dispatch(self, raw: str | bytes) -> None:
+        try:
+            msg = json.loads(raw)
+        except ValueError:
+            logger.debug("Ignoring non-JSON Hyperliquid WebSocket message")
+            return
+        channel = msg.get("channel")
+        data = msg.get("data")
+        if channel == "error":
+            logger.warning("Hyperliquid WebSocket error: %s", data)
+            return
+        if channel not in SUBSCRIPTION_TYPES or not isinstance(data, dict):
+            return
+        address = str(data.get("user") or "").lower()
+        plan = self._subscribed.get(address)
+        if plan is None:
+            return
+        if channel == "userFills":
+            fills = data.get("fills") or []
+            if not fills:
+                return
+            self.fills_received += len(fills)
+            if address in self._held:
+                self._held[address].extend(fills)
+            else:
+                self._submit(plan, fills, None)
+            return
+        state = data.get("clearinghouseState")
+        if not isinstance(state, dict):
+            return
+        # Keeps /info clearinghouseState calls (metrics recompute, API) off the rate limit.
+        remember_clearinghouse_state(plan.address, state)
+        if address not in self._held and self._positions_throttle.can_run(address):
+            self._positions_throttle.touch(address)
+            self._submit(plan, [], state)
+
+    def _submit(self, plan: _AccountPlan, fills: list[dict[str, Any]], state: dict[str, Any] | None) -> None:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.ingestor.writer(), self.ingestor._store_planned, plan, fills, state)
+
+        def _log_failure(done: asyncio.Future) -> None:
+            if not done.cancelled() and done.exception() is not None:
+                logger.error("HL ws store failed whale=%s: %s", plan.address, done.exception())
+
+        future.add_done_callback(_log_failure)
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from app.models import TradeDirection  # noqa: E402
+from app.services.signal_alignment import align_entry_signals  # noqa: E402
+
+ASSETS = ["BTC", "ETH", "SOL", "HYPE", "ARB", "DOGE", "AVAX", "LINK"]
+DIRECTIONS = [TradeDirection.LONG, TradeDirection.SHORT, TradeDirection.BUY]
+
+
+def synthetic_entries(whales: int, days: int, fills_per_whale_day: int, seed: int = 7) -> list[tuple]:
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    span = days * 86_400
+    entries = [
+        (
+            start + timedelta(seconds=rng.randrange(span)),
+            rng.choice(ASSETS),
+            rng.choice(DIRECTIONS),
+            rng.uniform(1_000, 250_000),
+            f"whale-{w}",
+        )
+        for w in range(whales)
+        for _ in range(days * fills_per_whale_day)
+    ]
+    entries.sort(key=lambda e: e[0])
+    return entries
+
+
+def nested_scan(entries: list[tuple], window: timedelta, min_whales: int) -> list[dict]:
+    """The pre-deque alignment: a forward scan over the window for every entry."""
+    signals: list[dict] = []
+    last_signal_time: dict[tuple, datetime] = {}
+    longs = {TradeDirection.LONG, TradeDirection.BUY}
+    for i, (ts, asset, direction, value_usd, wid) in enumerate(entries):
+        side = TradeDirection.LONG if direction in longs else TradeDirection.SHORT
+        key = (asset, side)
+        if key in last_signal_time and ts - last_signal_time[key] <= window:
+            continue
+        aligned_ids = {wid}
+        notionals = [abs(float(value_usd))]
+        j = i + 1
+        while j < len(entries) and entries[j][0] - ts <= window:
+            _, asset2, dir2, val2, wid2 = entries[j]
+            side2 = TradeDirection.LONG if dir2 in longs else TradeDirection.SHORT
+            if asset2 == asset and side2 == side:
+                aligned_ids.add(wid2)
+                notionals.append(abs(float(val2)))
+            j += 1
+        if len(aligned_ids) >= min_whales:
+            signals.append(
+                {
+                    "timestamp": ts,
+                    "asset": asset,
+                    "direction": side,
+                    "notional_usd": sum(notionals) / len(notionals),
+                    "whales": aligned_ids,
+                }
+            )
+            last_signal_time[key] = ts
+    return signals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare multi-whale signal alignment against the nested scan.")
+    parser.add_argument("--whales", default="2,5,10,20", help="Comma-separated whale counts")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--fills-per-day", type=int, default=40, help="Entry fills per whale per day")
+    parser.add_argument("--window-minutes", type=int, default=60)
+    parser.add_argument("--min-whales", type=int, default=2)
+    parser.add_argument("--skip-nested", action="store_true", help="Only time the deque implementation")
+    args = parser.parse_args()
+
+    window = timedelta(minutes=args.window_minutes)
+    print(f"{'whales':>6} {'entries':>9} {'signals':>8} {'deque_s':>9} {'nested_s':>9} {'speedup':>8}")
+    for whales in [int(w) for w in args.whales.split(",") if w.strip()]:
+        entries = synthetic_entries(whales, args.days, args.fills_per_day)
+        t0 = time.perf_counter()
+        fast = align_entry_signals(iter(entries), window=window, min_whales=args.min_whales)
+        fast_s = time.perf_counter() - t0
+        nested_s = float("nan")
+        if not args.skip_nested:
+            t0 = time.perf_counter()
+            slow = nested_scan(entries, window, args.min_whales)
+            nested_s = time.perf_counter() - t0
+            if fast != slow:
+                raise SystemExit(f"alignment mismatch at {whales} whales")
+        print(
+            f"{whales:>6} {len(entries):>9} {len(fast):>8} {fast_s:>9.3f} {nested_s:>9.3f} {nested_s / fast_s:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ import argparse
 from datetime import datetime, timezone
 
 from app.db.session import SessionLocal
+from app.services.price_prefetch import CANDLES_PER_REQUEST
 from app.services.price_service import fetch_and_store_binance_prices
 
 
@@ -19,7 +20,12 @@ def main() -> None:
     parser.add_argument("--timeframe", default="1h", help="ccxt timeframe (default: 1h)")
     parser.add_argument("--since", help="ISO datetime UTC start (e.g., 2025-01-01T00:00:00Z)")
     parser.add_argument("--until", help="ISO datetime UTC end (e.g., 2025-02-01T00:00:00Z)")
-    parser.add_argument("--limit", type=int, default=1500, help="Max candles per request")
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=CANDLES_PER_REQUEST,
+        help=f"Max candles per request (default: {CANDLES_PER_REQUEST}, Binance's cap)",
+    )
     args = parser.parse_args()
 
     assets = [a.strip() for a in args.assets.split(",") if a.strip()]
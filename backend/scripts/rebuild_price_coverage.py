@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from app.db.session import SessionLocal, ensure_table  # noqa: E402
+from app.models import PriceCoverage, PriceHistory  # noqa: E402
+from app.services.price_coverage import contiguous_runs, to_dt, timeframe_ms  # noqa: E402
+from app.services.price_store import to_epoch_ms  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild the price_coverage index from price_history.")
+    parser.add_argument("--assets", help="Comma-separated asset symbols (default: every asset in price_history)")
+    parser.add_argument("--timeframe", default="1m", help="Candle timeframe to index (default: 1m)")
+    parser.add_argument("--min-run", type=int, default=2, help="Skip runs with fewer candles than this")
+    args = parser.parse_args()
+    timeframe_ms(args.timeframe)
+
+    with SessionLocal() as session:
+        if not ensure_table(session, PriceCoverage):
+            raise SystemExit("price_coverage table is not available")
+        if args.assets:
+            assets = sorted({a.strip().upper() for a in args.assets.split(",") if a.strip()})
+        else:
+            assets = sorted(r[0] for r in session.query(PriceHistory.asset_symbol).distinct() if r[0])
+
+        for asset in assets:
+            stamps = (
+                session.query(PriceHistory.timestamp)
+                .filter(PriceHistory.asset_symbol == asset, PriceHistory.price_usd.isnot(None))
+                .order_by(PriceHistory.timestamp)
+                .yield_per(50_000)
+            )
+            step = timeframe_ms(args.timeframe)
+            runs = [
+                (lo, hi)
+                for lo, hi in contiguous_runs((to_epoch_ms(ts) for (ts,) in stamps), args.timeframe)
+                if (hi - lo) // step + 1 >= args.min_run
+            ]
+            session.query(PriceCoverage).filter(
+                PriceCoverage.asset_symbol == asset, PriceCoverage.timeframe == args.timeframe
+            ).delete(synchronize_session=False)
+            session.add_all(
+                PriceCoverage(asset_symbol=asset, timeframe=args.timeframe, start_ts=to_dt(lo), end_ts=to_dt(hi))
+                for lo, hi in runs
+            )
+            session.commit()
+            print(f"{asset}: {len(runs)} {args.timeframe} coverage intervals")
+
+
+if __name__ == "__main__":
+    main()
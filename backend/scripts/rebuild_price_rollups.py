@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from app.db.session import SessionLocal  # noqa: E402
+from app.models import PriceHistory  # noqa: E402
+from app.services.price_rollups import upsert_rollups  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild 5m / 15m / 1h / 1d price_rollups from price_history.")
+    parser.add_argument("--assets", help="Comma-separated asset symbols (default: every asset in price_history)")
+    parser.add_argument("--batch", type=int, default=20_000, help="price_history rows folded per upsert")
+    args = parser.parse_args()
+
+    with SessionLocal() as session:
+        if args.assets:
+            assets = sorted({a.strip().upper() for a in args.assets.split(",") if a.strip()})
+        else:
+            assets = sorted(r[0] for r in session.query(PriceHistory.asset_symbol).distinct() if r[0])
+
+        for asset in assets:
+            rows = (
+                session.query(PriceHistory.timestamp, PriceHistory.price_usd)
+                .filter(PriceHistory.asset_symbol == asset, PriceHistory.price_usd.isnot(None))
+                .order_by(PriceHistory.timestamp)
+                .yield_per(args.batch)
+            )
+            batch: list[dict] = []
+            total = 0
+            for ts, price in rows:
+                batch.append({"asset_symbol": asset, "timestamp": ts, "price_usd": price})
+                if len(batch) >= args.batch:
+                    upsert_rollups(session, batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                upsert_rollups(session, batch)
+                total += len(batch)
+            session.commit()
+            print(f"{asset}: rolled up {total} price rows")
+
+
+if __name__ == "__main__":
+    main()
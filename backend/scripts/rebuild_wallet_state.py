@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from app.db.session import SessionLocal  # noqa: E402
+from app.models import WalletAssetState, Whale  # noqa: E402
+from app.services.metrics_service import recompute_wallet_metrics_batch  # noqa: E402
+from app.services.wallet_state import apply_new_trades, tables_ready, verify_wallet_state  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Verify or rebuild wallet_asset_state / trade_daily_agg from the full trade history."
+    )
+    parser.add_argument("--whales", help="Comma-separated whale ids (default: every whale)")
+    parser.add_argument("--verify", action="store_true", help="Only report whales whose state differs")
+    parser.add_argument(
+        "--missing",
+        action="store_true",
+        help="Backfill: only build state and daily rollups for whales that have none yet",
+    )
+    parser.add_argument("--batch", type=int, default=500, help="Whales per transaction")
+    args = parser.parse_args()
+
+    with SessionLocal() as session:
+        if not tables_ready(session):
+            raise SystemExit("wallet state tables are not available")
+        query = session.query(Whale)
+        if args.whales:
+            query = query.filter(Whale.id.in_([w.strip() for w in args.whales.split(",") if w.strip()]))
+        if args.missing:
+            query = query.filter(Whale.id.notin_(session.query(WalletAssetState.whale_id).distinct()))
+        whales = query.order_by(Whale.id).all()
+
+        for offset in range(0, len(whales), args.batch):
+            batch = whales[offset : offset + args.batch]
+            if args.verify:
+                for whale_id in verify_wallet_state(session, [w.id for w in batch]):
+                    print(f"{whale_id}: state differs from trade history")
+                continue
+            if args.missing:
+                apply_new_trades(session, [w.id for w in batch])
+            else:
+                recompute_wallet_metrics_batch(session, batch, full=True)
+            session.commit()
+            print(f"rebuilt {offset + len(batch)}/{len(whales)} whales")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Local stand-in for Hyperliquid's WebSocket API that replays recorded fills.
+
+Usage:
+    python backend/testing/hl_mock_ws_server.py backend/testing/hl_ws_fills_sample.json --port 8765
+
+then start the backend with HYPERLIQUID_INGEST_MODE=websocket and HYPERLIQUID_WS_URL=ws://127.0.0.1:8765.
+The recording is {"fills": {user: [fill, ...]}, "states": {user: clearinghouseState}}; each
+`userFills` subscriber gets an empty snapshot, then the user's fills one message at a time,
+re-stamped to the current time unless --keep-times is given.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any
+
+from websockets.asyncio.server import Server, ServerConnection, serve
+from websockets.exceptions import ConnectionClosed
+
+
+class MockHyperliquidWsServer:
+    def __init__(
+        self,
+        fills_by_user: dict[str, list[dict[str, Any]]],
+        states_by_user: dict[str, dict[str, Any]] | None = None,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        replay_interval: float = 0.05,
+        keep_times: bool = False,
+    ) -> None:
+        self.fills_by_user = {user.lower(): list(fills) for user, fills in fills_by_user.items()}
+        self.states_by_user = {user.lower(): state for user, state in (states_by_user or {}).items()}
+        self.host = host
+        self.port = port
+        self.replay_interval = replay_interval
+        self.keep_times = keep_times
+        # Every subscription received, and perf_counter() when each replayed fill (by tid) was sent.
+        self.subscriptions: list[dict[str, Any]] = []
+        self.sent_at: dict[Any, float] = {}
+        self._server: Server | None = None
+
+    @classmethod
+    def from_recording(cls, path: str | Path, **kwargs: Any) -> "MockHyperliquidWsServer":
+        recording = json.loads(Path(path).read_text())
+        return cls(recording.get("fills") or {}, recording.get("states") or {}, **kwargs)
+
+    @property
+    def url(self) -> str:
+        assert self._server is not None, "server not started"
+        host, port = next(iter(self._server.sockets)).getsockname()[:2]
+        return f"ws://{host}:{port}"
+
+    async def start(self) -> "MockHyperliquidWsServer":
+        self._server = await serve(self._handle, self.host, self.port)
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> "MockHyperliquidWsServer":
+        return await self.start()
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.stop()
+
+    async def _handle(self, ws: ServerConnection) -> None:
+        replays: list[asyncio.Task] = []
+        try:
+            async for raw in ws:
+                msg = json.loads(raw)
+                method = msg.get("method")
+                if method == "ping":
+                    await ws.send(json.dumps({"channel": "pong"}))
+                    continue
+                await ws.send(json.dumps({"channel": "subscriptionResponse", "data": msg}))
+                subscription = msg.get("subscription") or {}
+                if method != "subscribe":
+                    continue
+                self.subscriptions.append(subscription)
+                user = str(subscription.get("user") or "").lower()
+                if subscription.get("type") == "userFills":
+                    snapshot = {"isSnapshot": True, "user": user, "fills": []}
+                    await ws.send(json.dumps({"channel": "userFills", "data": snapshot}))
+                    replays.append(asyncio.create_task(self._replay(ws, user)))
+                elif subscription.get("type") == "webData2" and user in self.states_by_user:
+                    data = {"user": user, "clearinghouseState": self.states_by_user[user]}
+                    await ws.send(json.dumps({"channel": "webData2", "data": data}))
+        except ConnectionClosed:
+            pass
+        finally:
+            for task in replays:
+                task.cancel()
+
+    async def _replay(self, ws: ServerConnection, user: str) -> None:
+        for fill in self.fills_by_user.get(user, []):
+            await asyncio.sleep(self.replay_interval)
+            if not self.keep_times:
+                fill = {**fill, "time": int(time.time() * 1000)}
+            self.sent_at[fill.get("tid")] = time.perf_counter()
+            await ws.send(json.dumps({"channel": "userFills", "data": {"user": user, "fills": [fill]}}))
+
+
+async def _serve_forever(args: argparse.Namespace) -> None:
+    server = MockHyperliquidWsServer.from_recording(
+        args.recording, host=args.host, port=args.port, replay_interval=args.interval, keep_times=args.keep_times
+    )
+    async with server:
+        print(f"Replaying {args.recording} on {server.url}")
+        await asyncio.Future()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="JSON recording of fills (and optional states) per user")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between replayed fills")
+    parser.add_argument("--keep-times", action="store_true", help="send the recorded fill timestamps unchanged")
+    asyncio.run(_serve_forever(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
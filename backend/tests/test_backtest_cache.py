@@ -0,0 +1,95 @@
+import os
+import sys
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+os.environ["ENABLE_INGESTORS"] = "false"
+os.environ["ENABLE_SCHEDULER"] = "false"
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, Chain, Trade, TradeDirection, TradeSource, Whale, WhaleType
+from app.services.backtest_cache import BacktestResultCache, trade_watermark
+from app.services.price_service import bulk_upsert_prices
+
+
+def test_cache_lru_disk_tier(tmp_path):
+    cache = BacktestResultCache(max_bytes=50, directory=str(tmp_path))
+    keys = [cache.make_key("copier", {"leverage": lev}, {"trades": [["BTC", 3, 10, "t"]]}) for lev in (1, 2, 3)]
+    assert len(set(keys)) == 3
+    assert cache.make_key("copier", {"leverage": 1}, {"trades": [["BTC", 4, 11, "t"]]}) != keys[0]
+
+    for idx, key in enumerate(keys):
+        cache.put(key, {"summary": {"n": idx}})
+
+    # Two 21-byte results fit the memory tier; the oldest is still served from disk.
+    assert cache.stats()["memory_entries"] == 2 and cache.stats()["memory_bytes"] == 42
+    assert cache.get(keys[0]) == {"summary": {"n": 0}}
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.get(keys[2]) == {"summary": {"n": 2}}
+    assert cache.get("missing") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+
+
+def test_memory_tier_is_bounded_by_payload_size():
+    cache = BacktestResultCache(max_bytes=1000)
+    cache.put("small", {"n": 1})
+    cache.put("large", {"trades": ["x" * 10] * 100})
+    assert cache.get("large") is None and cache.get("small") == {"n": 1}
+
+    for idx in range(100):
+        cache.put(f"k{idx}", {"trades": ["x" * 10] * 5})
+    assert cache.stats()["memory_bytes"] <= 1000
+    assert cache.get("k99") is not None and cache.get("k0") is None
+
+
+def test_watermark_tracks_price_coverage_and_latest_price():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    chain = Chain(slug="hyperliquid", name="Hyperliquid")
+    session.add(chain)
+    session.flush()
+    whale = Whale(address="0x" + "1" * 40, chain_id=chain.id, type=WhaleType.TRADER)
+    session.add(whale)
+    session.flush()
+    start = datetime(2024, 1, 1)
+    session.add_all(
+        Trade(
+            whale_id=whale.id,
+            chain_id=chain.id,
+            timestamp=start + timedelta(hours=i),
+            tx_hash=f"0x{i}",
+            source=TradeSource.HYPERLIQUID,
+            direction=TradeDirection.LONG,
+            base_asset="BTC",
+            value_usd=Decimal(1000),
+        )
+        for i in range(3)
+    )
+    session.commit()
+
+    def watermark():
+        return trade_watermark(session, whale.id, start=None, end=None, asset_filter=None)
+
+    empty = watermark()
+    rows = [
+        {"asset_symbol": "BTC", "timestamp": start + timedelta(minutes=m), "price_usd": Decimal(40000 + m)}
+        for m in range(0, 60)
+    ]
+    bulk_upsert_prices(session, rows, timeframe="1m")
+    session.commit()
+    backfilled = watermark()
+    assert backfilled != empty and backfilled["prices"][0][2]
+
+    # A live tick inside the window records no coverage but moves the latest point.
+    bulk_upsert_prices(session, [{"asset_symbol": "BTC", "timestamp": start + timedelta(hours=2), "price_usd": 1}])
+    session.commit()
+    assert watermark() != backfilled
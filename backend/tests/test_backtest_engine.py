@@ -0,0 +1,351 @@
+import os
+import sys
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
+
+os.environ["ENABLE_INGESTORS"] = "false"
+os.environ["ENABLE_SCHEDULER"] = "false"
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.models import PriceHistory, TradeDirection
+from app.services import backtest_engine
+from app.services.backtest_engine import (
+    NUMPY_ENGINE_RTOL,
+    PositionBook,
+    load_fill_prices,
+    load_price_cache,
+    simulate_copy_trades,
+)
+from app.services.backtest_jobs import BacktestJobCancelled
+from app.services.downsample import downsample_indices, drawdown_indices
+from app.services.price_prefetch import PrefetchIncomplete
+from app.services.price_service import bulk_upsert_prices
+from app.services.price_store import PriceStore, from_epoch_ms, series_from_points
+from app.services.signal_alignment import align_entry_signals
+
+
+def _fixture():
+    start = datetime(2024, 1, 1, 0, 0)
+    minutes = [start + timedelta(minutes=i) for i in range(240)]
+    price_cache = {
+        "BTC": series_from_points(minutes, [40000 + 25 * i for i in range(240)]),
+        "ETH": series_from_points(minutes, [2500 - 3 * i for i in range(240)]),
+    }
+    plan = [
+        (3, "BTC", TradeDirection.LONG, 50_000),
+        (10, "ETH", TradeDirection.SHORT, 20_000),
+        (41, "BTC", TradeDirection.LONG, 30_000),
+        (95, "BTC", TradeDirection.CLOSE_LONG, 60_000),
+        (130, "ETH", TradeDirection.CLOSE_SHORT, 10_000),
+        (150, "SOL", TradeDirection.LONG, 5_000),
+        (200, "ETH", TradeDirection.CLOSE_SHORT, 30_000),
+        (230, "BTC", TradeDirection.CLOSE_LONG, 40_000),
+    ]
+    trades = [
+        SimpleNamespace(
+            id=idx,
+            timestamp=start + timedelta(minutes=minute, seconds=17),
+            base_asset=asset,
+            direction=direction,
+            value_usd=notional,
+            amount_base=Decimal(notional) / Decimal(100),
+        )
+        for idx, (minute, asset, direction, notional) in enumerate(plan, start=1)
+    ]
+    return trades, price_cache
+
+
+_KWARGS = dict(
+    initial_deposit=Decimal(10_000),
+    used_pct=0.1,
+    fee_rate=Decimal("0.0005"),
+    slippage_rate=Decimal("0.0005"),
+    whale_portfolio_value=Decimal(250_000),
+)
+
+
+@pytest.mark.parametrize("sampling", ["clock", "events"])
+@pytest.mark.parametrize("leverage", [None, Decimal(3)])
+def test_numpy_engine_matches_decimal_engine(leverage, sampling):
+    trades, price_cache = _fixture()
+    kwargs = dict(_KWARGS, leverage=leverage, sampling=sampling, max_curve_points=50)
+    exact = simulate_copy_trades(trades, price_cache, engine="decimal", **kwargs)
+    fast = simulate_copy_trades(trades, price_cache, engine="numpy", **kwargs)
+
+    assert [r.id for r in fast.results] == [r.id for r in exact.results]
+    for a, b in zip(fast.results, exact.results):
+        assert a.equity_usd == pytest.approx(b.equity_usd, rel=NUMPY_ENGINE_RTOL)
+        assert a.net_pnl_usd == pytest.approx(b.net_pnl_usd, rel=NUMPY_ENGINE_RTOL, abs=1e-9)
+    assert [p["timestamp"] for p in fast.equity_curve] == [p["timestamp"] for p in exact.equity_curve]
+    assert [p["equity_usd"] for p in fast.equity_curve] == pytest.approx(
+        [p["equity_usd"] for p in exact.equity_curve], rel=NUMPY_ENGINE_RTOL
+    )
+    for field in ("net_pnl", "gross_pnl", "total_fees", "max_drawdown_usd", "leverage_used"):
+        assert getattr(fast, field) == pytest.approx(getattr(exact, field), rel=NUMPY_ENGINE_RTOL, abs=1e-9)
+    assert fast.win_rate_percent == exact.win_rate_percent
+
+
+@pytest.mark.parametrize("engine", ["decimal", "numpy"])
+def test_fills_use_base_prices_when_marks_come_from_rollups(engine, monkeypatch):
+    trades, base = _fixture()
+    # Hourly marks, as a 1h rollup would hold them: the latest minute of each bucket.
+    hourly = {sym: (ts[59::60], px[59::60]) for sym, (ts, px) in base.items()}
+
+    engine_db = create_engine("sqlite://")
+    PriceHistory.__table__.create(engine_db)
+    session = sessionmaker(bind=engine_db)()
+    session.add_all(
+        PriceHistory(asset_symbol=sym, timestamp=ts, price_usd=Decimal(str(px)))
+        for sym, series in base.items()
+        for ts, px in zip(from_epoch_ms(series[0].tolist(), aware=False), series[1].tolist())
+    )
+    session.commit()
+    monkeypatch.setattr(backtest_engine, "price_store", PriceStore(max_bytes=10**9))
+    statements = []
+    event.listen(engine_db, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    fill_prices = load_fill_prices(session, trades)
+    # One windowed read per asset, however many trades or weeks it spans.
+    assert len(statements) == 3
+    # One point per trade (SOL has no prices), each the last minute at or before the trade.
+    assert {sym: len(ts) for sym, (ts, _) in fill_prices.items()} == {"BTC": 4, "ETH": 3}
+    assert fill_prices["BTC"][1][0] == base["BTC"][1][3]
+
+    # Small copies stay under every cap, so fills differ only in price.
+    kwargs = dict(_KWARGS, used_pct=0.001, leverage=Decimal(3), engine=engine)
+    exact = simulate_copy_trades(trades, base, **kwargs)
+    split = simulate_copy_trades(trades, hourly, fill_prices=fill_prices, **kwargs)
+    coarse = simulate_copy_trades(trades, hourly, **kwargs)
+
+    assert [r.pnl_usd for r in split.results] == pytest.approx([r.pnl_usd for r in exact.results])
+    assert split.gross_pnl == pytest.approx(exact.gross_pnl)
+    assert coarse.gross_pnl != pytest.approx(exact.gross_pnl)
+    assert len(split.equity_curve) == len(exact.equity_curve)
+
+
+def test_rollup_marks_fall_back_to_base_prices_where_buckets_are_missing(monkeypatch):
+    engine_db = create_engine("sqlite://")
+    PriceHistory.__table__.create(engine_db)
+    session = sessionmaker(bind=engine_db)()
+    start = datetime(2024, 1, 1, 0, 0)
+    rows = [
+        {"asset_symbol": "BTC", "timestamp": start + timedelta(minutes=i), "price_usd": Decimal(40000 + i)}
+        for i in range(6 * 60)
+    ]
+    # Hours 0-1 and 4-5 get rollups; hours 2-3 only ever reach price_history.
+    bulk_upsert_prices(session, rows[:120] + rows[240:])
+    session.add_all(PriceHistory(**row) for row in rows[120:240])
+    session.commit()
+    monkeypatch.setattr(backtest_engine, "price_store", PriceStore(max_bytes=10**9))
+    trades = [
+        SimpleNamespace(timestamp=start + timedelta(minutes=m, seconds=5), base_asset="BTC") for m in (10, 350)
+    ]
+
+    ts, px = load_price_cache(session, trades, preload_prices=False, resolution="1h")["BTC"]
+    minutes = ((ts - ts[0]) // 60_000 + 59).tolist()
+    # Hourly marks where rollups exist; every minute between the marks around the missing hours.
+    assert minutes == [59, 119] + list(range(120, 299)) + [299]
+    assert px.tolist() == [40000 + m for m in minutes]
+
+
+def test_incomplete_preload_keeps_fetched_prices_and_reports_failure(monkeypatch):
+    engine_db = create_engine("sqlite://")
+    PriceHistory.__table__.create(engine_db)
+    session = sessionmaker(bind=engine_db)()
+    start = datetime(2024, 1, 1, 0, 0)
+    row = {"asset_symbol": "BTC", "timestamp": start + timedelta(minutes=1), "price_usd": Decimal(40000)}
+
+    def prefetch(session, assets, lo, hi, checkpoint=None):
+        # One range stored, another failed: the prefetcher keeps the first and raises.
+        bulk_upsert_prices(session, [row])
+        raise PrefetchIncomplete(written=1, failed=1)
+
+    monkeypatch.setattr(backtest_engine.price_prefetcher, "prefetch", prefetch)
+    monkeypatch.setattr(backtest_engine, "price_store", PriceStore(max_bytes=10**9))
+    trades = [SimpleNamespace(timestamp=start + timedelta(minutes=1, seconds=5), base_asset="BTC")]
+    failures = []
+
+    cache = load_price_cache(session, trades, preload_prices=True, on_preload_failure=lambda: failures.append(1))
+    assert failures == [1]
+    assert cache["BTC"][1].tolist() == [40000]
+    assert session.query(PriceHistory).count() == 1
+
+
+def test_position_book_cursors_follow_forward_and_backward_marks(monkeypatch):
+    start = datetime(2024, 1, 1, 0, 0)
+    # BTC prices every minute, ETH every 7 minutes starting at 00:30.
+    btc_minutes = list(range(0, 600))
+    eth_minutes = list(range(30, 600, 7))
+    book = PositionBook(
+        {
+            "BTC": series_from_points([start + timedelta(minutes=m) for m in btc_minutes], [100 + m for m in btc_minutes]),
+            "ETH": series_from_points([start + timedelta(minutes=m) for m in eth_minutes], [50 + m for m in eth_minutes]),
+        }
+    )
+
+    def hold(key, qty, avg):
+        pos = book.position(key)
+        pos["qty"], pos["avg_price"], pos["margin"] = Decimal(qty), Decimal(avg), Decimal(10 if qty else 0)
+        book.refresh(key)
+
+    def expected(minute):
+        btc = Decimal(100 + min(minute, 599))
+        eth_seen = [m for m in eth_minutes if m <= minute]
+        eth = Decimal(0)
+        if "ETH" in book._marked and eth_seen:
+            eth = (Decimal(50 + eth_seen[-1]) - Decimal(60)) * -2
+        return (btc - Decimal(100)) * 3 + eth
+
+    book.mark_to(start)
+    hold("BTC", 3, 100)
+    hold("ETH", -2, 60)
+    searches = []
+    searchsorted = np.searchsorted
+    monkeypatch.setattr(np, "searchsorted", lambda *args, **kw: searches.append(1) or searchsorted(*args, **kw))
+    # Short forward steps, a backward re-mark to the start of the minute, long jumps both ways and
+    # moves before ETH's first price or past the end of both series.
+    for step, minute in enumerate([1, 2, 2, 3, 10, 9, 10, 11, 200, 199, 5, 0, 29, 31, 38, 37, 400, 30, 599, 700, 598]):
+        unreal, margin = book.mark_to(start + timedelta(minutes=minute, seconds=30))
+        assert unreal == expected(minute), minute
+        assert margin == Decimal(20)
+        if step == 7:
+            # Moves of a few prices either way only step the cursors.
+            assert searches == []
+
+    # Going flat drops the position's slot and its contribution; a flat book is exactly zero.
+    hold("ETH", 0, 0)
+    assert "ETH" not in book._marked
+    assert book.mark_to(start + timedelta(minutes=50)) == (Decimal(150), Decimal(10))
+    hold("BTC", 0, 0)
+    assert book.mark_to(start + timedelta(minutes=60)) == (Decimal(0), Decimal(0))
+
+
+@pytest.mark.parametrize("engine", ["decimal", "numpy"])
+def test_checkpoint_can_abort_a_running_simulation(engine, monkeypatch):
+    trades, price_cache = _fixture()
+    monkeypatch.setattr(backtest_engine, "CHECKPOINT_EVERY", 2)
+    calls = []
+
+    def checkpoint():
+        calls.append(len(calls))
+        if len(calls) == 3:
+            raise BacktestJobCancelled()
+
+    with pytest.raises(BacktestJobCancelled):
+        simulate_copy_trades(trades, price_cache, leverage=None, engine=engine, checkpoint=checkpoint, **_KWARGS)
+    assert len(calls) == 3
+
+
+def test_event_sampling_respects_budget_and_keeps_trades():
+    trades, price_cache = _fixture()
+    clock = simulate_copy_trades(trades, price_cache, leverage=None, **_KWARGS)
+    events = simulate_copy_trades(
+        trades, price_cache, leverage=None, sampling="events", max_curve_points=20, **_KWARGS
+    )
+
+    assert len(clock.equity_curve) == 228
+    assert len(events.equity_curve) <= 20
+    assert events.equity_curve[-1]["timestamp"] == trades[-1].timestamp
+    assert [r.id for r in events.results] == [r.id for r in clock.results]
+    assert [r.equity_usd for r in events.results] == pytest.approx([r.equity_usd for r in clock.results])
+
+
+def test_sweep_on_process_pool_matches_single_runs():
+    from app.services.backtest_sweep import SweepPoint, run_sweep
+
+    trades, price_cache = _fixture()
+    points = [
+        SweepPoint(leverage=lev, used_pct=pct, fee_rate=Decimal("0.0005"), slippage_rate=Decimal("0.0005"))
+        for lev in (None, Decimal(2))
+        for pct in (0.05, 0.2)
+    ]
+    swept = run_sweep(
+        trades,
+        price_cache,
+        points,
+        initial_deposit=_KWARGS["initial_deposit"],
+        whale_portfolio_value=_KWARGS["whale_portfolio_value"],
+        engine="decimal",
+        sampling="clock",
+        max_curve_points=1000,
+        max_workers=2,
+    )
+
+    assert [s.point for s in swept] == points
+    for point, result in zip(points, swept):
+        single = simulate_copy_trades(
+            trades,
+            price_cache,
+            initial_deposit=_KWARGS["initial_deposit"],
+            used_pct=point.used_pct,
+            fee_rate=point.fee_rate,
+            slippage_rate=point.slippage_rate,
+            leverage=point.leverage,
+            whale_portfolio_value=_KWARGS["whale_portfolio_value"],
+        )
+        assert result.trades_copied == len(single.results)
+        assert result.outcome.net_pnl == single.net_pnl
+        assert result.outcome.max_drawdown_usd == single.max_drawdown_usd
+
+
+def test_lttb_downsampling_keeps_extremes_and_forced_points():
+    x = np.arange(10_000, dtype=np.float64)
+    y = np.sin(x / 300.0) * 100 + x * 0.01
+    y[7_000] = -500.0  # sharp crash that LTTB alone could miss
+    keep = drawdown_indices(y) + [1234, 4321]
+    idx = downsample_indices(x, y, 200, keep)
+    assert len(idx) <= 200
+    assert {0, 9_999, 7_000, 1234, 4321} <= set(idx.tolist())
+    assert np.all(np.diff(idx) > 0)
+    assert downsample_indices(x[:50], y[:50], 200).tolist() == list(range(50))
+
+
+def test_signal_alignment_uses_forward_window_per_lane():
+    t0 = datetime(2024, 1, 1)
+    entries = [
+        (t0, "btc", TradeDirection.LONG, 100, "a"),
+        (t0 + timedelta(minutes=5), "BTC", TradeDirection.BUY, 300, "b"),
+        (t0 + timedelta(minutes=6), "BTC", TradeDirection.SHORT, 50, "c"),
+        (t0 + timedelta(minutes=20), "BTC", TradeDirection.LONG, 10, "c"),  # lane signalled within window
+        (t0 + timedelta(minutes=40), "ETH", TradeDirection.SHORT, 70, "a"),
+        (t0 + timedelta(minutes=45), "ETH", TradeDirection.SHORT, 90, "a"),  # same whale twice
+        (t0 + timedelta(minutes=90), "BTC", TradeDirection.LONG, 40, "a"),
+        (t0 + timedelta(minutes=95), "BTC", TradeDirection.LONG, 60, "b"),
+    ]
+    signals = align_entry_signals(iter(entries), window=timedelta(minutes=30), min_whales=2)
+    assert [(s["timestamp"], s["asset"], s["direction"], s["whales"]) for s in signals] == [
+        (t0, "BTC", TradeDirection.LONG, {"a", "b", "c"}),
+        (t0 + timedelta(minutes=90), "BTC", TradeDirection.LONG, {"a", "b"}),
+    ]
+    assert signals[0]["notional_usd"] == pytest.approx((100 + 300 + 10) / 3)
+    assert len(align_entry_signals(iter(entries), window=timedelta(minutes=30), min_whales=2, max_signals=1)) == 1
+
+
+def test_signal_alignment_stops_reading_once_capped_signals_are_final():
+    t0 = datetime(2024, 1, 1)
+    assets = ["BTC", "ETH", "SOL"]
+    directions = [TradeDirection.LONG, TradeDirection.SHORT]
+    entries = [
+        (t0 + timedelta(minutes=3 * i), assets[i % 3], directions[(i // 3) % 2], 100 + i, f"w{i % 4}")
+        for i in range(2_000)
+    ]
+    window = timedelta(minutes=30)
+    full = align_entry_signals(iter(entries), window=window, min_whales=2)
+    assert len(full) > 20
+    for cap in (1, 5, 20):
+        read = []
+        capped = align_entry_signals(
+            (read.append(e) or e for e in entries), window=window, min_whales=2, max_signals=cap
+        )
+        assert capped == full[:cap]
+        # Reading stops about one window past the last kept signal instead of draining the stream.
+        assert read[-1][0] - capped[-1]["timestamp"] <= 2 * window
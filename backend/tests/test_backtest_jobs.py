@@ -0,0 +1,79 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+os.environ["ENABLE_INGESTORS"] = "false"
+os.environ["ENABLE_SCHEDULER"] = "false"
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+import pytest
+
+from app.services.backtest_jobs import BacktestJobManager, BacktestJobQueueFull
+
+
+def _wait(manager, job_id, statuses=("done", "error", "cancelled")):
+    for _ in range(200):
+        job = manager.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} stuck in {job['status']}")
+
+
+def test_jobs_report_progress_cancel_and_keep_results():
+    manager = BacktestJobManager(max_workers=1, max_retained=2)
+    gate = threading.Event()
+
+    def slow(report):
+        report(10.0, "waiting")
+        gate.wait(2)
+        for step in range(5):
+            report(20.0 + step * 10, f"step {step}")
+            time.sleep(0.01)
+        return {"value": 42}
+
+    running = manager.submit("copier", slow)["job_id"]
+    queued = manager.submit("copier", lambda report: "never runs")["job_id"]
+    assert _wait(manager, running, ("running",))["status"] == "running"
+    assert manager.cancel(queued)["status"] == "cancelled"
+    assert manager.result(queued) is None
+
+    manager.cancel(running)
+    gate.set()
+    assert _wait(manager, running)["status"] == "cancelled"
+
+    done = manager.submit("multi", lambda report: report(50.0, "half") or {"value": 7})["job_id"]
+    job = _wait(manager, done)
+    assert job["status"] == "done" and job["progress"] == 100.0
+    assert manager.result(done) == {"value": 7}
+
+    failed = manager.submit("copier", lambda report: 1 / 0)["job_id"]
+    assert _wait(manager, failed)["error"] == "division by zero"
+    # Only the two most recent finished jobs are retained.
+    assert manager.get(running) is None and manager.get(done) is not None
+    manager.shutdown()
+
+
+def test_pending_jobs_are_capped_and_shutdown_cancels_the_queue():
+    manager = BacktestJobManager(max_workers=1, max_pending=2)
+    gate = threading.Event()
+
+    def blocked(report):
+        gate.wait(2)
+        report(None, None)
+
+    running = manager.submit("copier", blocked)["job_id"]
+    queued = manager.submit("copier", lambda report: "never runs")["job_id"]
+    assert _wait(manager, running, ("running",))["status"] == "running"
+    with pytest.raises(BacktestJobQueueFull):
+        manager.submit("multi", lambda report: None)
+
+    manager.shutdown()
+    assert manager.get(queued)["status"] == "cancelled"
+    gate.set()
+    assert _wait(manager, running)["status"] == "cancelled"
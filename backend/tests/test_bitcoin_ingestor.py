@@ -0,0 +1,68 @@
+import os
+import sys
+from pathlib import Path
+
+os.environ["ENABLE_INGESTORS"] = "false"
+os.environ["ENABLE_SCHEDULER"] = "false"
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, Chain, Trade, TradeDailyAgg, Whale, WhaleType
+from app.services import wallet_state
+from app.workers import bitcoin_ingestor
+from app.workers.bitcoin_ingestor import BitcoinIngestor
+
+WHALE = "bc1qwhale000000000000000000000000000000000"
+DAY = 86_400
+
+
+def _tx(n: int) -> dict:
+    """Deposit n, one per day; even ones come in, odd ones go out."""
+    inbound = n % 2 == 0
+    return {
+        "txid": f"{n:064x}",
+        "status": {"block_time": 1_700_000_000 + n * DAY},
+        "vin": [{"prevout": {"scriptpubkey_address": "bc1qother" if inbound else WHALE}}],
+        "vout": [{"scriptpubkey_address": WHALE if inbound else "bc1qother", "value": 10_000_000 * (n + 1)}],
+    }
+
+
+def test_backfill_refreshes_days_per_page_and_folds_state_once(monkeypatch):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, autoflush=False)()
+    chain = Chain(slug="bitcoin", name="Bitcoin")
+    session.add(chain)
+    session.flush()
+    whale = Whale(address=WHALE, chain_id=chain.id, type=WhaleType.HOLDER)
+    session.add(whale)
+    session.commit()
+
+    # The API lists newest first, so every later page is older than everything stored before it.
+    history = [_tx(n) for n in reversed(range(25))]
+
+    def get_address_txs(address, limit=20, offset=0):
+        return history[offset : offset + limit]
+
+    rebuilds: list[list[str]] = []
+    real_rebuild = wallet_state.rebuild_wallet_state
+
+    def rebuild(session, whale_ids):
+        rebuilds.append(list(whale_ids))
+        real_rebuild(session, whale_ids)
+
+    monkeypatch.setattr(bitcoin_ingestor.bitcoin_client, "get_address_txs", get_address_txs)
+    monkeypatch.setattr(wallet_state, "rebuild_wallet_state", rebuild)
+    ingestor = BitcoinIngestor()
+    ingestor._btc_price_usd = 40_000.0
+    assert ingestor.backfill_whale(session, chain.id, whale, batch_size=10)
+
+    assert session.query(Trade).count() == 25
+    assert session.query(TradeDailyAgg.date).distinct().count() == 25
+    assert len(rebuilds) <= 1
+    assert wallet_state.verify_wallet_state(session, [whale.id]) == []
@@ -0,0 +1,100 @@
+import os
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+os.environ["ENABLE_INGESTORS"] = "false"
+os.environ["ENABLE_SCHEDULER"] = "false"
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.time_utils import now
+from app.models import Base, Chain, DirtyWhale, Whale, WhaleType
+from app.services import dirty_whales
+
+
+@pytest.fixture()
+def session(monkeypatch):
+    monkeypatch.setattr(dirty_whales, "_last_sweep", {})
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, autoflush=False)()
+    yield session
+    session.close()
+
+
+def test_jobs_visit_only_dirty_whales_between_sweeps(session):
+    chain = Chain(slug="ethereum", name="Ethereum")
+    session.add(chain)
+    session.flush()
+    whales = [Whale(address=f"0x{i:040x}", chain_id=chain.id, type=WhaleType.HOLDER) for i in range(3)]
+    session.add_all(whales)
+    session.commit()
+    job = dirty_whales.METRICS_JOB
+
+    # The first run after start-up sweeps everything and clears older marks.
+    dirty_whales.mark_dirty(session, [whales[0].id])
+    session.commit()
+    started = now()
+    todo, full, marks = dirty_whales.whales_to_process(session, job, started)
+    assert full and len(todo) == 3
+    dirty_whales.finish_run(session, job, started, marks, full)
+    session.commit()
+    assert session.query(DirtyWhale).filter_by(job=job).count() == 0
+
+    dirty_whales.mark_dirty(session, [whales[1].id, whales[1].id])
+    dirty_whales.mark_dirty(session, [whales[1].id])
+    session.commit()
+    started = now()
+    todo, full, marks = dirty_whales.whales_to_process(session, job, started)
+    assert not full and [w.id for w in todo] == [whales[1].id]
+    # The whale is marked again while the run works on it.
+    session.query(DirtyWhale).filter_by(job=job).update({"marked_at": started + timedelta(seconds=1)})
+    dirty_whales.finish_run(session, job, started, marks, full)
+    session.commit()
+    assert session.query(DirtyWhale).filter_by(job=job).count() == 1
+    # Other jobs keep their own marks.
+    assert session.query(DirtyWhale).filter_by(job=dirty_whales.CLASSIFY_JOB).count() == 2
+
+    _, full, _ = dirty_whales.whales_to_process(session, job, started + timedelta(hours=2))
+    assert full
+
+
+def test_marks_committed_after_selection_survive_the_run(session):
+    chain = Chain(slug="ethereum", name="Ethereum")
+    session.add(chain)
+    session.flush()
+    whales = [Whale(address=f"0x{i:040x}", chain_id=chain.id, type=WhaleType.HOLDER) for i in range(2)]
+    session.add_all(whales)
+    session.commit()
+    job = dirty_whales.METRICS_JOB
+    dirty_whales._last_sweep[job] = now()
+
+    dirty_whales.mark_dirty(session, [whales[0].id], jobs=[job])
+    session.commit()
+    started = now() + timedelta(seconds=5)
+    todo, full, marks = dirty_whales.whales_to_process(session, job, started)
+    assert not full and [w.id for w in todo] == [whales[0].id]
+    # An ingestor stamps new activity before the run started, then commits after selection.
+    stamped = started - timedelta(seconds=1)
+    session.query(DirtyWhale).filter_by(job=job).update({"marked_at": stamped})
+    session.add(DirtyWhale(job=job, whale_id=whales[1].id, marked_at=stamped))
+    session.commit()
+    dirty_whales.finish_run(session, job, started, marks, full)
+    session.commit()
+    assert session.query(DirtyWhale).filter_by(job=job).count() == 2
+
+    # A full sweep clears only what it read, too.
+    todo, full, marks = dirty_whales.whales_to_process(session, job, started + timedelta(hours=2))
+    assert full and len(marks) == 2
+    session.query(DirtyWhale).filter_by(job=job, whale_id=whales[0].id).update({"marked_at": started})
+    session.commit()
+    dirty_whales.finish_run(session, job, started + timedelta(hours=2), marks, full)
+    session.commit()
+    assert [r.whale_id for r in session.query(DirtyWhale).filter_by(job=job)] == [whales[0].id]
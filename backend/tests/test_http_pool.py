@@ -0,0 +1,35 @@
+import os
+import sys
+from pathlib import Path
+
+os.environ["ENABLE_INGESTORS"] = "false"
+os.environ["ENABLE_SCHEDULER"] = "false"
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+import httpx
+
+from app.services.http_pool import HttpPool
+
+
+def test_pool_reuses_clients_and_records_host_latency(monkeypatch):
+    pool = HttpPool()
+    options = pool._client_options
+    transport = httpx.MockTransport(lambda request: httpx.Response(429 if "busy" in request.url.path else 200))
+    monkeypatch.setattr(pool, "_client_options", lambda: {**options(), "transport": transport})
+
+    client = pool.client("https://api.example.test", 5.0)
+    assert pool.client("https://api.example.test", 5.0) is client
+    client.post("/info", json={})
+    client.get("/busy")
+
+    stats = pool.stats()
+    host = stats["hosts"]["api.example.test"]
+    assert stats["open_clients"] == 1
+    assert host["requests"] == 2 and host["errors"] == 1 and host["p95_ms"] is not None
+
+    pool.close()
+    assert pool.stats()["open_clients"] == 0 and client.is_closed
+    assert pool.client("https://api.example.test", 5.0) is not client
@@ -0,0 +1,91 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+os.environ["ENABLE_INGESTORS"] = "false"
+os.environ["ENABLE_SCHEDULER"] = "false"
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.time_utils import now
+from app.models import Base, Chain, Holding, IngestionCheckpoint, Trade, Whale, WhaleType
+from app.services import metrics_service
+from app.workers import hyperliquid_ingestor
+from app.workers.hyperliquid_ingestor import HyperliquidIngestor
+
+
+@pytest.fixture()
+def session_factory(monkeypatch):
+    # One shared in-memory connection, so the writer thread sees the test's data.
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, autoflush=False)
+    monkeypatch.setattr(hyperliquid_ingestor, "SessionLocal", factory)
+    return factory
+
+
+def _fill(address, idx, ts_ms):
+    return {
+        "time": ts_ms,
+        "coin": "btc",
+        "sz": "0.5",
+        "px": "60000",
+        "dir": "Open Long",
+        "hash": f"0x{address[-4:]}{idx}",
+        "tid": idx,
+        "closedPnl": "0",
+    }
+
+
+def test_concurrent_mode_fetches_in_parallel_and_writes_through_one_writer(session_factory, monkeypatch):
+    with session_factory() as session:
+        chain = Chain(slug="hyperliquid", name="Hyperliquid")
+        session.add(chain)
+        session.flush()
+        session.add_all(
+            [Whale(address=f"0x{i:040x}", chain_id=chain.id, type=WhaleType.TRADER) for i in range(1, 7)]
+        )
+        session.commit()
+
+    state = {"assetPositions": [{"position": {"coin": "BTC", "szi": "0.5", "positionValue": "30000"}}]}
+    in_flight = 0
+    peak = 0
+    ts_ms = int(now().timestamp() * 1000) - 60_000
+
+    async def fills(address, start_time=None, max_pages=10, end_time=None):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        return [_fill(address, 1, ts_ms), _fill(address, 2, ts_ms + 1)]
+
+    async def clearinghouse(address, use_cache=True, ttl=10.0):
+        return state
+
+    client = hyperliquid_ingestor.async_hyperliquid_client
+    monkeypatch.setattr(client, "get_user_fills_paginated", fills)
+    monkeypatch.setattr(client, "get_clearinghouse_state", clearinghouse)
+    monkeypatch.setattr(
+        metrics_service.hyperliquid_client, "get_clearinghouse_state", lambda *a, **k: state
+    )
+
+    ingestor = HyperliquidIngestor(concurrency=3)
+    try:
+        asyncio.run(ingestor.process_accounts_async())
+    finally:
+        ingestor.stop()
+
+    assert peak == 3
+    with session_factory() as session:
+        assert session.query(Trade).count() == 12
+        assert session.query(Holding).filter(Holding.asset_symbol == "BTC").count() == 6
+        assert {cp.last_fill_time for cp in session.query(IngestionCheckpoint)} == {ts_ms + 1}
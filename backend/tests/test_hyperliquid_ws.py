@@ -0,0 +1,153 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+os.environ["ENABLE_INGESTORS"] = "false"
+os.environ["ENABLE_SCHEDULER"] = "false"
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+import httpx
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.time_utils import now
+from app.models import Base, Chain, Trade, Whale, WhaleType
+from app.services import metrics_service
+from app.workers import hyperliquid_ingestor, hyperliquid_ws
+from app.workers.hyperliquid_ingestor import HyperliquidIngestor
+from app.workers.hyperliquid_ws import HyperliquidWsIngestor
+from testing.hl_mock_ws_server import MockHyperliquidWsServer
+
+RECORDING = BASE_DIR / "testing" / "hl_ws_fills_sample.json"
+PUSHED = "0x00000000000000000000000000000000000000a1"
+POLLED = "0x00000000000000000000000000000000000000b2"
+
+
+@pytest.fixture()
+def recording():
+    return json.loads(RECORDING.read_text())
+
+
+@pytest.fixture()
+def session_factory(tmp_path, monkeypatch):
+    # A file database, so the test can read while the writer thread commits.
+    engine = create_engine(f"sqlite:///{tmp_path / 'hl_ws.db'}")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, autoflush=False)
+    monkeypatch.setattr(hyperliquid_ingestor, "SessionLocal", factory)
+    monkeypatch.setattr(hyperliquid_ws, "SessionLocal", factory)
+    return factory
+
+
+def _seed_whales(session_factory):
+    with session_factory() as session:
+        chain = Chain(slug="hyperliquid", name="Hyperliquid")
+        session.add(chain)
+        session.flush()
+        session.add_all(
+            [
+                Whale(address=PUSHED, chain_id=chain.id, type=WhaleType.TRADER, last_active_at=now()),
+                Whale(address=POLLED, chain_id=chain.id, type=WhaleType.TRADER, last_active_at=now() - timedelta(days=1)),
+            ]
+        )
+        session.commit()
+
+
+def _patch_io(monkeypatch, fills) -> dict[int, float]:
+    """Route the ingestor's polls to `fills` and record when each fill's event goes out, by tid."""
+    events: dict[int, float] = {}
+
+    async def clearinghouse(address, use_cache=True, ttl=10.0):
+        return {}
+
+    async def broadcast(msg):
+        events[msg["details"]["tid"]] = time.perf_counter()
+
+    client = hyperliquid_ingestor.async_hyperliquid_client
+    monkeypatch.setattr(client, "get_user_fills_paginated", fills)
+    monkeypatch.setattr(client, "get_clearinghouse_state", clearinghouse)
+    monkeypatch.setattr(metrics_service.hyperliquid_client, "get_clearinghouse_state", lambda *a, **k: {})
+    monkeypatch.setattr(hyperliquid_ingestor.broadcast_manager, "broadcast", broadcast)
+    return events
+
+
+async def _run_until(ws_ingestor: HyperliquidWsIngestor, events: dict[int, float], count: int) -> None:
+    task = asyncio.create_task(ws_ingestor.run_forever())
+    deadline = time.perf_counter() + 5
+    while len(events) < count and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    # Events go out before the store commits; let the writer finish before reading back.
+    await asyncio.get_running_loop().run_in_executor(ws_ingestor.ingestor.writer(), lambda: None)
+    ws_ingestor.stop()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+def test_ws_mode_stores_replayed_fills_and_polls_whales_over_the_cap(recording, session_factory, monkeypatch):
+    _seed_whales(session_factory)
+    polled: list[str] = []
+
+    async def fills(address, start_time=None, max_pages=10, end_time=None):
+        polled.append(address)
+        return []
+
+    events = _patch_io(monkeypatch, fills)
+
+    async def scenario() -> MockHyperliquidWsServer:
+        async with MockHyperliquidWsServer(recording["fills"], recording["states"], replay_interval=0.05) as server:
+            # Two subscriptions cover one whale; the less active one stays on polling.
+            ingestor = HyperliquidWsIngestor(HyperliquidIngestor(poll_interval=60), url=server.url, max_subscriptions=2)
+            await _run_until(ingestor, events, 3)
+        return server
+
+    server = asyncio.run(scenario())
+
+    assert {(s["type"], s["user"]) for s in server.subscriptions} == {("userFills", PUSHED), ("webData2", PUSHED)}
+    # The pushed whale is polled once to repair the gap before its subscription; the other on the tick.
+    assert sorted(polled) == [PUSHED, POLLED]
+    assert set(events) == set(server.sent_at) == {90001, 90002, 90003}
+    assert max(events[tid] - server.sent_at[tid] for tid in events) < 1.0
+    with session_factory() as session:
+        assert session.query(Trade).filter(Trade.tx_hash.like("0x6f1e%")).count() == 3
+
+
+def test_ws_mode_holds_pushes_until_a_failed_gap_repair_succeeds(recording, session_factory, monkeypatch):
+    _seed_whales(session_factory)
+    repaired_at: list[float] = []
+    # A fill from while the socket was down: older than every push, so it is lost if a push lands first.
+    gap_fill = {"coin": "BTC", "px": "64000", "sz": "0.1", "dir": "Open Long", "hash": "0xgap", "tid": 80000}
+
+    async def fills(address, start_time=None, max_pages=10, end_time=None):
+        if address != PUSHED:
+            return []
+        if not repaired_at:
+            repaired_at.append(0.0)
+            raise httpx.ConnectError("info endpoint unreachable")
+        repaired_at.append(time.perf_counter())
+        return [{**gap_fill, "time": int(time.time() * 1000) - 60_000}]
+
+    events = _patch_io(monkeypatch, fills)
+
+    async def scenario() -> None:
+        async with MockHyperliquidWsServer(recording["fills"], replay_interval=0.02) as server:
+            polling = HyperliquidIngestor(poll_interval=60)
+            polling._max_backoff_seconds = 0
+            ingestor = HyperliquidWsIngestor(polling, url=server.url, max_subscriptions=2, repair_retry=0.3)
+            await _run_until(ingestor, events, 4)
+
+    asyncio.run(scenario())
+
+    # Pushes that arrived before the retry were held, not stored past the gap.
+    assert len(repaired_at) == 2 and min(events.values()) >= repaired_at[1]
+    assert set(events) == {80000, 90001, 90002, 90003}
+    with session_factory() as session:
+        assert session.query(Trade).count() == 4
+        assert session.query(Trade).filter(Trade.tx_hash == "0xgap").count() == 1
@@ -0,0 +1,284 @@
+import os
+import sys
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+os.environ["ENABLE_INGESTORS"] = "false"
+os.environ["ENABLE_SCHEDULER"] = "false"
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.time_utils import now
+from app.models import (
+    Base,
+    Chain,
+    CurrentWalletMetrics,
+    Holding,
+    Trade,
+    TradeDailyAgg,
+    TradeDirection,
+    TradeSource,
+    WalletAssetState,
+    WalletMetricsDaily,
+    Whale,
+    WhaleType,
+)
+from app.services import metrics_service, wallet_state
+
+D = TradeDirection
+
+
+@pytest.fixture()
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, autoflush=False)()
+    yield session
+    session.close()
+
+
+def _seed_whale(session, fills):
+    chain = Chain(slug="ethereum", name="Ethereum")
+    session.add(chain)
+    session.flush()
+    whale = Whale(address="0x" + "1" * 40, chain_id=chain.id, type=WhaleType.TRADER)
+    session.add(whale)
+    session.flush()
+    current = now()
+    for idx, (age, direction, asset, qty, value, pnl) in enumerate(fills):
+        session.add(
+            Trade(
+                whale_id=whale.id,
+                timestamp=current - age,
+                chain_id=chain.id,
+                source=TradeSource.ONCHAIN,
+                direction=direction,
+                base_asset=asset,
+                amount_base=qty,
+                value_usd=value,
+                pnl_usd=pnl,
+                tx_hash=f"tx-{idx}",
+            )
+        )
+    session.add(Holding(whale_id=whale.id, asset_symbol="ETH", amount=Decimal(1), value_usd=Decimal(2500)))
+    session.commit()
+    return whale
+
+
+def test_recompute_wallet_metrics_aggregates_in_one_pass(session):
+    day = timedelta(days=1)
+    whale = _seed_whale(
+        session,
+        [
+            (40 * day, D.BUY, "ETH", Decimal(2), Decimal(4000), None),
+            (10 * day, D.SELL, "ETH", Decimal(1), Decimal(2600), Decimal(600)),
+            (5 * day, D.DEPOSIT, "ETH", Decimal(1), Decimal(1000), None),
+            (2 * day, D.SELL, "ETH", Decimal("0.5"), Decimal(900), Decimal(-100)),
+            (timedelta(hours=3), D.BUY, "ETH", Decimal("0.5"), Decimal(1200), Decimal(0)),
+            (timedelta(hours=1), D.CLOSE_LONG, "BTC", None, Decimal(50), Decimal(25)),
+        ],
+    )
+    metrics_service.recompute_wallet_metrics(session, whale)
+    # A second run the same day updates today's row instead of adding another.
+    metrics_service.recompute_wallet_metrics(session, whale)
+    session.commit()
+
+    current = session.get(CurrentWalletMetrics, whale.id)
+    assert current.trades_30d == 4 and float(current.volume_30d_usd) == 2600 + 900 + 1200 + 50
+    assert float(current.win_rate_percent) == pytest.approx(200 / 3)
+    # Trade PnL (525) plus average-cost realized sales: 2600 - 2000 and 900 - 0.5 * 1500.
+    assert float(current.realized_pnl_usd) == pytest.approx(525 + 600 + 150)
+    daily = session.query(WalletMetricsDaily).filter_by(whale_id=whale.id).all()
+    assert len(daily) == 1 and daily[0].trades_1d == 2 and float(daily[0].volume_1d_usd) == 1250
+    holding = session.query(Holding).filter_by(whale_id=whale.id).one()
+    assert float(holding.cost_basis_usd) == pytest.approx(2000 + 1000 - 750 + 1200)
+
+
+def test_batch_recompute_and_history_rebuild_match_per_whale(session):
+    day = timedelta(days=1)
+    first = _seed_whale(
+        session,
+        [
+            (3 * day, D.BUY, "ETH", Decimal(1), Decimal(2000), None),
+            (2 * day, D.SELL, "ETH", Decimal(1), Decimal(2500), Decimal(500)),
+        ],
+    )
+    second = Whale(address="0x" + "2" * 40, chain_id=first.chain_id, type=WhaleType.TRADER)
+    idle = Whale(address="0x" + "3" * 40, chain_id=first.chain_id, type=WhaleType.TRADER)
+    session.add_all([second, idle])
+    session.flush()
+    session.add(
+        Trade(
+            whale_id=second.id,
+            timestamp=now() - timedelta(seconds=1),
+            chain_id=first.chain_id,
+            source=TradeSource.ONCHAIN,
+            direction=D.CLOSE_LONG,
+            base_asset="BTC",
+            amount_base=Decimal(1),
+            value_usd=Decimal(300),
+            pnl_usd=Decimal(-20),
+            tx_hash="tx-second",
+        )
+    )
+    session.commit()
+
+    metrics_service.recompute_wallet_metrics_batch(session, [first, second, idle])
+    session.commit()
+    rows = {m.whale_id: m for m in session.query(CurrentWalletMetrics)}
+    assert set(rows) == {first.id, second.id, idle.id}
+    assert float(rows[first.id].realized_pnl_usd) == pytest.approx(500 + 500)
+    assert float(rows[second.id].win_rate_percent) == 0.0 and rows[second.id].trades_30d == 1
+    assert rows[idle.id].trades_30d == 0 and rows[idle.id].win_rate_percent is None
+
+    # History rebuilds upsert trade days and keep the ROI already stored for today.
+    metrics_service.rebuild_portfolio_histories(session, [first, second, idle])
+    session.commit()
+    days = session.query(WalletMetricsDaily).filter_by(whale_id=first.id).order_by(WalletMetricsDaily.date).all()
+    assert [d.trades_1d for d in days] == [1, 1, 0]
+    assert [float(d.portfolio_value_usd) for d in days[:2]] == [2000, 4500]
+    today = session.query(WalletMetricsDaily).filter_by(whale_id=second.id).one()
+    assert today.trades_1d == 1 and float(today.realized_pnl_usd) == pytest.approx(-20)
+
+
+def test_wallet_state_folds_new_trades_incrementally(session):
+    day = timedelta(days=1)
+    whale = _seed_whale(
+        session,
+        [
+            (5 * day, D.BUY, "ETH", Decimal(2), Decimal(4000), None),
+            (4 * day, D.SELL, "ETH", Decimal(1), Decimal(2500), Decimal(500)),
+        ],
+    )
+    metrics_service.recompute_wallet_metrics(session, whale)
+    session.commit()
+    eth = session.query(WalletAssetState).filter_by(whale_id=whale.id, asset_symbol="ETH").one()
+    assert float(eth.qty) == 1 and float(eth.cost_usd) == 2000 and float(eth.realized_usd) == 500
+
+    def add(age, direction, qty, value, pnl, tx):
+        session.add(
+            Trade(
+                whale_id=whale.id,
+                timestamp=now() - age,
+                chain_id=whale.chain_id,
+                source=TradeSource.ONCHAIN,
+                direction=direction,
+                base_asset="ETH",
+                amount_base=qty,
+                value_usd=value,
+                pnl_usd=pnl,
+                tx_hash=tx,
+            )
+        )
+        session.commit()
+
+    # A newer fill is folded on top of the stored state.
+    add(day, D.SELL, Decimal(1), Decimal(2200), Decimal(200), "tx-new")
+    metrics_service.recompute_wallet_metrics(session, whale)
+    session.commit()
+    session.refresh(eth)
+    assert float(eth.qty) == 0 and float(eth.realized_usd) == 500 + 200 and eth.closes == 2
+    assert sum(b.trades for b in session.query(TradeDailyAgg).filter_by(whale_id=whale.id)) == 3
+
+    # A back-dated fill changes the average cost of later sales, so the whale is refolded.
+    add(6 * day, D.BUY, Decimal(2), Decimal(2000), None, "tx-old")
+    metrics_service.recompute_wallet_metrics(session, whale)
+    session.commit()
+    session.refresh(eth)
+    assert float(eth.qty) == 2 and float(eth.cost_usd) == pytest.approx(3000)
+    assert float(eth.realized_usd) == pytest.approx(2500 - 1500 + 2200 - 1500)
+    assert wallet_state.verify_wallet_state(session, [whale.id]) == []
+    current = session.get(CurrentWalletMetrics, whale.id)
+    assert current.trades_30d == 4 and float(current.volume_30d_usd) == 4000 + 2500 + 2200 + 2000
+
+
+def test_partitioned_history_rebuild_uses_prefetched_states(session, monkeypatch):
+    from app.services import history_rebuild
+
+    chain = Chain(slug="hyperliquid", name="Hyperliquid")
+    session.add(chain)
+    session.flush()
+    whales = [Whale(address=f"0x{i}" + "a" * 39, chain_id=chain.id, type=WhaleType.TRADER) for i in range(3)]
+    session.add_all(whales)
+    session.flush()
+    for idx, whale in enumerate(whales):
+        session.add(
+            Trade(
+                whale_id=whale.id,
+                timestamp=now() - timedelta(days=1),
+                chain_id=chain.id,
+                source=TradeSource.HYPERLIQUID,
+                direction=D.CLOSE_LONG,
+                base_asset="BTC",
+                amount_base=Decimal(1),
+                value_usd=Decimal(100),
+                pnl_usd=Decimal(10),
+                tx_hash=f"hl-{idx}",
+            )
+        )
+    session.commit()
+    fetched = []
+
+    def fake_state(address):
+        fetched.append(address)
+        return {"marginSummary": {"accountValue": "1010"}, "assetPositions": []}
+
+    monkeypatch.setattr(history_rebuild, "fetch_clearinghouse_state", fake_state)
+    monkeypatch.setattr(metrics_service, "fetch_clearinghouse_state", lambda address: pytest.fail(address))
+    monkeypatch.setattr(history_rebuild, "BATCH_WHALE_IDS", 2)
+
+    # On SQLite the rebuild stays in-process, whatever the worker count.
+    monkeypatch.setattr(history_rebuild, "engine", session.get_bind())
+    monkeypatch.setattr(history_rebuild, "ProcessPoolExecutor", lambda *a, **k: pytest.fail("spawned workers"))
+    results = history_rebuild.rebuild_histories_partitioned(session, max_workers=4)
+    assert [(r.index, r.whales) for r in results] == [(0, 2), (1, 1)]
+    assert sorted(fetched) == sorted(w.address.lower() for w in whales)
+    days = session.query(WalletMetricsDaily).all()
+    assert len(days) == 3 and all(float(d.roi_percent) == pytest.approx(1.0) for d in days)
+
+
+def test_daily_rollup_backs_dashboard_volume_and_classifier(session):
+    from app.workers.classifier import WhaleClassifier
+
+    day = timedelta(days=1)
+    whale = _seed_whale(
+        session,
+        [
+            (3 * day, D.BUY, "ETH", Decimal(1), Decimal(2000), None),
+            (timedelta(hours=2), D.SELL, "ETH", Decimal(1), Decimal(2500), Decimal(500)),
+        ],
+    )
+    wallet_state.apply_new_trades(session, [whale.id])
+    # A whale without folded state is still counted, straight from its trades.
+    other = Whale(address="0x" + "4" * 40, chain_id=whale.chain_id, type=WhaleType.HOLDER)
+    session.add(other)
+    session.flush()
+    session.add(
+        Trade(
+            whale_id=other.id,
+            timestamp=now() - timedelta(hours=1),
+            chain_id=whale.chain_id,
+            source=TradeSource.ONCHAIN,
+            direction=D.DEPOSIT,
+            base_asset="ETH",
+            amount_base=Decimal(1),
+            value_usd=Decimal(300),
+            tx_hash="tx-other",
+        )
+    )
+    session.commit()
+
+    assert wallet_state.volume_since(session, now() - day) == pytest.approx(Decimal(2800))
+    assert wallet_state.volume_since(session, now() - 4 * day) == pytest.approx(Decimal(4800))
+
+    WhaleClassifier(trade_threshold=2, volume_threshold_usd=1e9).classify_whales(session, [whale, other])
+    assert whale.type == WhaleType.TRADER and other.type == WhaleType.HOLDER
+    # Classifying folds the unfolded whale, so its trades now sit in the rollup too.
+    assert session.query(TradeDailyAgg).filter_by(whale_id=other.id).one().trades == 1
@@ -0,0 +1,414 @@
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+os.environ["ENABLE_INGESTORS"] = "false"
+os.environ["ENABLE_SCHEDULER"] = "false"
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from app.db.session import ensure_table
+from app.models import PriceHistory, PriceRollup
+from app.services import price_coverage, price_prefetch, price_service
+from app.services.price_rollups import resolution_for_step
+from app.services.price_service import bulk_upsert_prices
+from app.services.price_store import CHUNK_MS, PriceStore, price_store, to_epoch_ms
+from app.services.rate_limiter import Priority, request_priority
+
+# ccxt's Binance spot maxLimit for fetch_ohlcv.
+BINANCE_MAX_LIMIT = 1000
+
+
+def test_price_store_loads_merges_and_evicts():
+    engine = create_engine("sqlite://")
+    PriceHistory.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    start = datetime(2024, 1, 1)
+    session.add_all(
+        PriceHistory(asset_symbol="BTC", timestamp=start + timedelta(hours=i), price_usd=Decimal(40000 + i))
+        for i in range(24 * 20)
+    )
+    session.commit()
+
+    store = PriceStore(max_bytes=10**9)
+    window_end = start + timedelta(days=10)
+    ts, px = store.load(session, ["btc"], start, window_end)["BTC"]
+    assert len(ts) == 24 * 10 + 1
+    assert ts[0] == to_epoch_ms(start) and px[-1] == 40000 + 240
+    loads = store.stats()["chunk_loads"]
+    store.load(session, ["BTC"], start, window_end)
+    assert store.stats()["chunk_loads"] == loads
+
+    # Fresh upserts land in resident chunks: one overwrite, one new point.
+    store.merge(
+        [
+            {"asset_symbol": "BTC", "timestamp": start + timedelta(hours=1), "price_usd": Decimal(1)},
+            {"asset_symbol": "BTC", "timestamp": start + timedelta(minutes=90), "price_usd": Decimal(2)},
+        ]
+    )
+    ts, px = store.series(session, "BTC", start, start + timedelta(hours=2))
+    assert px.tolist() == [40000, 1, 2, 40002]
+    assert store.load(session, ["DOGE"], start, window_end) == {}
+
+    # A cap below one week of data keeps only the most recently used chunk.
+    small = PriceStore(max_bytes=(CHUNK_MS // 3_600_000) * 16)
+    small.load(session, ["BTC"], start, window_end)
+    assert small.stats()["chunks"] == 1 and small.stats()["evictions"] > 0
+
+
+def test_prefetch_fetches_only_missing_ranges(monkeypatch):
+    engine = create_engine("sqlite://")
+    PriceHistory.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    start = datetime(2024, 3, 1)
+    # BTC has a day of 1m closes with a two-hour hole; ETH only lists on Binance at 12:00.
+    bulk_upsert_prices(
+        session,
+        [
+            {"asset_symbol": "BTC", "timestamp": start + timedelta(minutes=i), "price_usd": Decimal(100)}
+            for i in range(24 * 60)
+            if not 600 <= i < 720
+        ],
+        timeframe="1m",
+    )
+    session.commit()
+    assert price_coverage.covered_intervals(session, "BTC", start, start + timedelta(days=1)) == [
+        (to_epoch_ms(start), to_epoch_ms(start + timedelta(minutes=599))),
+        (to_epoch_ms(start + timedelta(minutes=720)), to_epoch_ms(start + timedelta(minutes=24 * 60 - 1))),
+    ]
+    price_store.invalidate()
+    listed_ms = {"BTC/USDT": to_epoch_ms(start), "ETH/USDT": to_epoch_ms(start + timedelta(hours=12))}
+    calls = []
+
+    class FakeBinance:
+        def __init__(self, config):
+            pass
+
+        def fetch_ohlcv(self, market, timeframe, since, limit):
+            calls.append((market, since))
+            first = max(-(-since // 60_000) * 60_000, listed_ms[market])
+            # Like ccxt's Binance spot client, clamp the page to the market's maxLimit.
+            return [[first + i * 60_000, 0, 0, 0, 7.0, 0] for i in range(min(limit, BINANCE_MAX_LIMIT))]
+
+    monkeypatch.setattr(price_prefetch.ccxt, "binance", FakeBinance)
+    prefetcher = price_prefetch.PricePrefetcher(max_workers=2, max_rps=0)
+    # Two days, so BTC's second day and ETH's 36 listed hours each take several clamped pages.
+    end = start + timedelta(days=2) - timedelta(minutes=1)
+
+    missing = prefetcher.missing_ranges(session, ["btc", "eth"], start, end)
+    assert missing["BTC"] == [
+        (to_epoch_ms(start + timedelta(minutes=600)), to_epoch_ms(start + timedelta(minutes=719))),
+        (to_epoch_ms(start + timedelta(days=1)), to_epoch_ms(end)),
+    ]
+    assert missing["ETH"] == [(to_epoch_ms(start), to_epoch_ms(end))]
+
+    written = prefetcher.prefetch(session, ["BTC", "ETH"], start, end)
+    assert written == 120 + 24 * 60 + 36 * 60
+    assert session.query(PriceHistory).filter(PriceHistory.asset_symbol == "ETH").count() == 36 * 60
+    assert sum(1 for market, _ in calls if market == "ETH/USDT") == 3
+    assert price_coverage.missing_ranges(session, "BTC", start, end) == []
+    # Covered now, and ETH's pre-listing morning is recorded as covered instead of re-requested.
+    calls.clear()
+    assert prefetcher.prefetch(session, ["BTC", "ETH"], start, end) == 0
+    assert calls == []
+    assert price_coverage.missing_ranges(session, "ETH", start, end) == []
+
+
+def test_prefetch_marks_coverage_only_up_to_the_pages_fetched(monkeypatch):
+    engine = create_engine("sqlite://")
+    PriceHistory.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    start = datetime(2024, 3, 1)
+    end = start + timedelta(days=1) - timedelta(minutes=1)
+    # Binance lists BTC from 02:00 but the mirror stops answering after 06:00.
+    listed_ms = to_epoch_ms(start + timedelta(hours=2))
+    cutoff_ms = to_epoch_ms(start + timedelta(hours=6))
+
+    class FakeBinance:
+        def __init__(self, config):
+            pass
+
+        def fetch_ohlcv(self, market, timeframe, since, limit):
+            first = max(-(-since // 60_000) * 60_000, listed_ms)
+            stamps = (first + i * 60_000 for i in range(min(limit, BINANCE_MAX_LIMIT)))
+            return [[ts, 0, 0, 0, 7.0, 0] for ts in stamps if ts < cutoff_ms]
+
+    monkeypatch.setattr(price_prefetch.ccxt, "binance", FakeBinance)
+    prefetcher = price_prefetch.PricePrefetcher(max_workers=1, max_rps=0)
+    assert prefetcher.prefetch(session, ["BTC"], start, end) == 4 * 60
+    # The pre-listing stretch counts as covered; everything past the last page stays missing.
+    assert price_coverage.missing_ranges(session, "BTC", start, end) == [(cutoff_ms, to_epoch_ms(end))]
+
+
+def test_prefetch_keeps_the_chunks_fetched_before_a_failure(monkeypatch):
+    engine = create_engine("sqlite://")
+    PriceHistory.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    start = datetime(2024, 3, 1)
+    end = start + timedelta(days=3) - timedelta(minutes=1)
+    calls = []
+
+    class FakeBinance:
+        def __init__(self, config):
+            pass
+
+        def fetch_ohlcv(self, market, timeframe, since, limit):
+            calls.append(since)
+            if len(calls) == 3:
+                raise RuntimeError("502 Bad Gateway")
+            first = -(-since // 60_000) * 60_000
+            return [[first + i * 60_000, 0, 0, 0, 7.0, 0] for i in range(min(limit, BINANCE_MAX_LIMIT))]
+
+    monkeypatch.setattr(price_prefetch.ccxt, "binance", FakeBinance)
+    # One page per chunk, so the pages before the failure are handed back on their own.
+    monkeypatch.setattr(price_prefetch, "UPSERT_BATCH_SIZE", BINANCE_MAX_LIMIT)
+    prefetcher = price_prefetch.PricePrefetcher(max_workers=1, max_rps=0)
+    with pytest.raises(price_prefetch.PrefetchIncomplete) as raised:
+        prefetcher.prefetch(session, ["BTC"], start, end)
+    assert raised.value.written == 2 * BINANCE_MAX_LIMIT
+    assert session.query(PriceHistory).count() == 2 * BINANCE_MAX_LIMIT
+    resume = to_epoch_ms(start + timedelta(minutes=2 * BINANCE_MAX_LIMIT))
+    assert price_coverage.missing_ranges(session, "BTC", start, end) == [(resume, to_epoch_ms(end))]
+
+
+def test_missing_ranges_report_uncovered_window_edges():
+    engine = create_engine("sqlite://")
+    PriceHistory.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    start = datetime(2024, 3, 1)
+    ms = to_epoch_ms(start)
+
+    # No coverage at all: even windows narrower than the gap tolerance are missing in full.
+    for timeframe, step in (("1m", timedelta(minutes=1)), ("1h", timedelta(hours=1)), ("1d", timedelta(days=1))):
+        for candles in (0, 1, 3):
+            end = start + candles * step
+            assert price_coverage.missing_ranges(session, "BTC", start, end, timeframe) == [(ms, to_epoch_ms(end))]
+
+    # Covered up to 12:00, with a 3-candle hole inside: the hole is tolerated, a short tail is not.
+    bulk_upsert_prices(
+        session,
+        [
+            {"asset_symbol": "BTC", "timestamp": start + timedelta(minutes=i), "price_usd": Decimal(100)}
+            for i in range(12 * 60 + 1)
+            if not 300 <= i < 303
+        ],
+        timeframe="1m",
+    )
+    session.commit()
+    noon = start + timedelta(hours=12)
+    assert price_coverage.missing_ranges(session, "BTC", start, noon) == []
+    end = noon + timedelta(minutes=2)
+    assert price_coverage.missing_ranges(session, "BTC", start, end) == [
+        (to_epoch_ms(noon + timedelta(minutes=1)), to_epoch_ms(end))
+    ]
+    # A leading stretch before the first covered candle is reported the same way.
+    early = start - timedelta(minutes=3)
+    assert price_coverage.missing_ranges(session, "BTC", early, noon) == [
+        (to_epoch_ms(early), to_epoch_ms(start - timedelta(minutes=1)))
+    ]
+
+
+def test_upserted_prices_reach_the_store_only_on_commit(monkeypatch):
+    engine = create_engine("sqlite://")
+    PriceHistory.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    start = datetime(2024, 3, 1)
+    session.add(PriceHistory(asset_symbol="BTC", timestamp=start, price_usd=Decimal(100)))
+    session.commit()
+    store = PriceStore(max_bytes=10**9)
+    monkeypatch.setattr(price_service, "price_store", store)
+    store.series(session, "BTC", start, start + timedelta(hours=1))
+
+    row = {"asset_symbol": "BTC", "timestamp": start + timedelta(minutes=1), "price_usd": Decimal(101)}
+    bulk_upsert_prices(session, [row])
+    session.rollback()
+    assert store.series(session, "BTC", start, start + timedelta(hours=1))[1].tolist() == [100]
+
+    bulk_upsert_prices(session, [row])
+    session.commit()
+    assert store.series(session, "BTC", start, start + timedelta(hours=1))[1].tolist() == [100, 101]
+
+
+def test_failed_table_creation_leaves_the_callers_transaction_intact(monkeypatch):
+    engine = create_engine("sqlite://")
+    PriceHistory.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    start = datetime(2024, 3, 1)
+    session.add(PriceHistory(asset_symbol="BTC", timestamp=start, price_usd=Decimal(100)))
+    session.flush()
+
+    def half_done_create(bind, checkfirst=False):
+        bind.execute(PriceHistory.__table__.insert().values(asset_symbol="ETH", timestamp=start, price_usd=1))
+        raise RuntimeError("CREATE TABLE raced another writer")
+
+    monkeypatch.setattr(PriceRollup.__table__, "create", half_done_create)
+    assert ensure_table(session, PriceRollup) is False
+    # Only the CREATE's own work is undone; the caller's pending row still commits.
+    session.commit()
+    assert [row.asset_symbol for row in session.query(PriceHistory)] == ["BTC"]
+
+
+def test_rollups_keep_latest_point_per_bucket():
+    engine = create_engine("sqlite://")
+    PriceHistory.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    start = datetime(2024, 5, 1)
+    rows = [
+        {"asset_symbol": "SOL", "timestamp": start + timedelta(minutes=i), "price_usd": Decimal(100 + i)}
+        for i in range(3 * 60)
+    ]
+    # Newest batch first: the older batch must not overwrite buckets it shares with it.
+    bulk_upsert_prices(session, rows[90:])
+    bulk_upsert_prices(session, rows[:90])
+    session.commit()
+
+    counts = dict(session.query(PriceRollup.resolution, func.count(PriceRollup.id)).group_by(PriceRollup.resolution))
+    assert counts == {"5m": 36, "15m": 12, "1h": 3, "1d": 1}
+    hourly = session.query(PriceRollup).filter_by(resolution="1h").order_by(PriceRollup.bucket_ts).all()
+    assert [int(r.price_usd) for r in hourly] == [159, 219, 279]
+
+    store = PriceStore(max_bytes=10**9)
+    ts, px = store.series(session, "SOL", start, start + timedelta(hours=3), resolution="1h")
+    # Keyed by source timestamp, so a lookup never sees a price from later in its bucket.
+    assert ts.tolist() == [to_epoch_ms(start + timedelta(minutes=m)) for m in (59, 119, 179)]
+    assert px.tolist() == [159, 219, 279]
+    assert resolution_for_step(10 * 60_000) == "5m" and resolution_for_step(60_000) == "1m"
+
+
+def test_price_archive_and_retention_prune(tmp_path, monkeypatch):
+    import app.services.price_store as price_store_module
+    from app.core.config import settings
+    from app.services import price_service
+    from app.services.price_archive import PriceArchive
+
+    archive = PriceArchive(tmp_path, max_open_months=1)
+    hour = 3_600_000
+    jan30 = to_epoch_ms(datetime(2024, 1, 30))
+    ts = np.arange(jan30, jan30 + 96 * hour, hour, dtype=np.int64)
+    archive.write("btc", ts[48:], np.full(48, 2.0))
+    archive.write("BTC", ts[:60], np.full(60, 1.0))  # older and overlapping: rewrites January
+    assert sorted(p.name for p in (tmp_path / "BTC").iterdir()) == ["2024-01.px", "2024-01.ts", "2024-02.px", "2024-02.ts"]
+    got_ts, got_px = archive.read("BTC", ts[0], ts[-1] + 1)
+    assert got_ts.tolist() == ts.tolist()
+    assert got_px.tolist() == [1.0] * 60 + [2.0] * 36
+    feb_ts, _ = archive.read("BTC", ts[60], ts[70])
+    # Copies, so the least recently used month can be unmapped under the open-map bound.
+    assert feb_ts.flags.owndata and not isinstance(feb_ts, np.memmap)
+    assert archive.stats()["open_months"] == 1
+
+    engine = create_engine("sqlite://")
+    PriceHistory.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+    session.add_all(
+        PriceHistory(asset_symbol="ETH", timestamp=now - timedelta(days=d, hours=12), price_usd=Decimal(d))
+        for d in range(10)
+    )
+    session.commit()
+    monkeypatch.setattr(price_service, "price_archive", archive)
+    monkeypatch.setattr(price_store_module, "price_archive", archive)
+    monkeypatch.setattr(settings, "price_db_retention_days", 3)
+
+    assert price_service.prune_price_history(session) == 7
+    assert session.query(PriceHistory).count() == 3
+    store = PriceStore(max_bytes=10**9)
+    _, px = store.series(session, "ETH", now - timedelta(days=10), now)
+    assert px.tolist() == list(range(9, -1, -1))
+
+
+def test_price_store_reloads_on_foreign_writes_and_reads_outside_the_lock(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'prices.db'}")
+    PriceHistory.__table__.create(engine)
+    factory = sessionmaker(bind=engine)
+    start = datetime(2024, 6, 3)
+    session = factory()
+    bulk_upsert_prices(
+        session,
+        [
+            {"asset_symbol": "BTC", "timestamp": start + timedelta(minutes=i), "price_usd": Decimal(100)}
+            for i in range(60)
+        ],
+        timeframe="1m",
+    )
+    session.commit()
+    store = PriceStore(max_bytes=10**9)
+    window = (start, start + timedelta(hours=2))
+    assert len(store.series(session, "BTC", *window)[0]) == 60
+
+    # Another process backfills the next hour: our store never saw the merge, only the coverage.
+    with factory() as writer:
+        monkeypatch.setattr(price_service, "price_store", PriceStore(max_bytes=10**9))
+        bulk_upsert_prices(
+            writer,
+            [
+                {"asset_symbol": "BTC", "timestamp": start + timedelta(minutes=i), "price_usd": Decimal(101)}
+                for i in range(60, 120)
+            ],
+            timeframe="1m",
+        )
+        writer.commit()
+    session.commit()
+    loads = store.stats()["chunk_loads"]
+    ts, px = store.series(session, "BTC", *window)
+    assert len(ts) == 120 and px[-1] == 101
+    assert store.stats()["chunk_loads"] == loads + 1
+    store.series(session, "BTC", *window)
+    assert store.stats()["chunk_loads"] == loads + 1
+
+    # A slow database read for one asset does not hold up lookups of resident chunks.
+    entered, release = threading.Event(), threading.Event()
+    real_query = store._query_rows
+
+    def slow_query(*args):
+        entered.set()
+        release.wait(5)
+        return real_query(*args)
+
+    monkeypatch.setattr(store, "_query_rows", slow_query)
+    with factory() as other:
+        loader = threading.Thread(target=store.series, args=(other, "ETH", *window))
+        loader.start()
+        done = threading.Event()
+        try:
+            assert entered.wait(5)
+            threading.Thread(target=lambda: (store.series(session, "BTC", *window), done.set())).start()
+            assert done.wait(2)
+        finally:
+            release.set()
+            loader.join(5)
+
+
+def test_prefetch_waits_on_a_shared_token_bucket(monkeypatch):
+    engine = create_engine("sqlite://")
+    PriceHistory.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    start = datetime(2024, 3, 1)
+    calls = []
+
+    class FakeBinance:
+        def __init__(self, config):
+            pass
+
+        def fetch_ohlcv(self, market, timeframe, since, limit):
+            calls.append(market)
+            first = -(-since // 60_000) * 60_000
+            return [[first + i * 60_000, 0, 0, 0, 7.0, 0] for i in range(min(limit, BINANCE_MAX_LIMIT))]
+
+    monkeypatch.setattr(price_prefetch.ccxt, "binance", FakeBinance)
+    prefetcher = price_prefetch.PricePrefetcher(max_workers=2, max_rps=1000, burst=1000)
+    with request_priority(Priority.BACKGROUND):
+        prefetcher.prefetch(session, ["BTC", "ETH"], start, start + timedelta(hours=1))
+    lanes = prefetcher.limiter.snapshot()["lanes"]
+    # Each Binance request took a token in the caller's lane, not the worker threads' default one.
+    assert calls and lanes["background"]["acquired"] == len(calls)
+    assert lanes["interactive"]["acquired"] == 0
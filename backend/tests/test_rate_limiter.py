@@ -0,0 +1,44 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+os.environ["ENABLE_INGESTORS"] = "false"
+os.environ["ENABLE_SCHEDULER"] = "false"
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from app.services.rate_limiter import Priority, TokenBucket, request_priority
+
+
+def test_bucket_serves_live_lane_first_and_slows_down_on_429():
+    bucket = TokenBucket(rate=20.0, burst=4.0, recover_after=3600)
+    # Banked burst credit is spent without waiting.
+    assert bucket.acquire(4.0) < 0.01
+    order: list[str] = []
+
+    def take(name: str, priority: Priority) -> None:
+        with request_priority(priority):
+            bucket.acquire(2.0)
+        order.append(name)
+
+    background = threading.Thread(target=take, args=("background", Priority.BACKGROUND))
+    background.start()
+    time.sleep(0.02)
+    live = threading.Thread(target=take, args=("live", Priority.LIVE))
+    live.start()
+    background.join()
+    live.join()
+    assert order == ["live", "background"]
+
+    snapshot = bucket.snapshot()
+    assert snapshot["lanes"]["live"]["acquired"] == 1
+    # Background waited for its own tokens after the live request took the first refill.
+    assert snapshot["lanes"]["background"]["max_wait_ms"] >= 150
+
+    bucket.penalize()
+    snapshot = bucket.snapshot()
+    assert snapshot["rate"] == 10.0 and snapshot["throttled"] == 1 and snapshot["tokens"] <= 1.0
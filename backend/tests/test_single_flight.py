@@ -0,0 +1,60 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+os.environ["ENABLE_INGESTORS"] = "false"
+os.environ["ENABLE_SCHEDULER"] = "false"
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.append(str(BASE_DIR))
+
+from app.services import hyperliquid_client as hl
+from app.services.single_flight import SingleFlight, TTLCache
+
+
+def test_concurrent_state_requests_share_one_call_and_cache(monkeypatch):
+    flights, cache = SingleFlight(), TTLCache(max_entries=2)
+    sync_client, async_client = hl.HyperliquidClient(), hl.AsyncHyperliquidClient()
+    calls: list[dict] = []
+
+    def send(payload):
+        calls.append(payload)
+        time.sleep(0.1)
+        return {"marginSummary": {"accountValue": "1"}}
+
+    async def send_async(payload):
+        calls.append(payload)
+        await asyncio.sleep(0.1)
+        return {"marginSummary": {"accountValue": "1"}}
+
+    for client in (sync_client, async_client):
+        monkeypatch.setattr(client, "_flights", flights)
+        monkeypatch.setattr(client, "_cache", cache)
+    monkeypatch.setattr(sync_client, "_send_info", send)
+    monkeypatch.setattr(async_client, "_send_info", send_async)
+
+    async def burst():
+        # Threads and coroutines ask for the same address while the first request is in flight.
+        threads = [threading.Thread(target=sync_client.get_clearinghouse_state, args=("0xAbC",)) for _ in range(4)]
+        for t in threads:
+            t.start()
+        states = await asyncio.gather(*(async_client.get_clearinghouse_state("0xabc") for _ in range(4)))
+        for t in threads:
+            t.join()
+        return states
+
+    states = asyncio.run(burst())
+    assert len(calls) == 1 and all(s is states[0] for s in states)
+    assert flights.stats()["shared"] == 7 and flights.stats()["in_flight"] == 0
+
+    # Later calls within the TTL come from the cache; the LRU keeps at most two addresses.
+    assert sync_client.get_clearinghouse_state("0xabc") is states[0]
+    sync_client.get_clearinghouse_state("0xdef")
+    sync_client.get_clearinghouse_state("0x123")
+    assert len(calls) == 3 and cache.stats()["evictions"] == 1
+    sync_client.get_clearinghouse_state("0xabc")
+    assert len(calls) == 4